@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Song ingestion benchmark: buffered download + retag on disk vs streaming multipart upload
+
+Serves synthetic MP3s (5 … 80 MB) from a local HTTP server and uploads them to a
+local S3 stand-in (path-style PutObject / multipart API, bodies are counted and
+dropped). Each run happens in a fresh subprocess, so peak RSS is that of the
+pipeline alone:
+- old: requests.get → file → MP3/EasyID3 save → new boto3 client → upload_file → presign
+- new: song_ingest.stream_song_to_s3 → presign with the shared client
+
+Usage:
+    python bench_song_ingest.py [--sizes 5 20 80] [--runs 2]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MB = 1024 * 1024
+
+# 128 kbps / 44.1 kHz MPEG-1 Layer III frame: 4-byte header + 413 bytes of payload
+FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+# ID3v2.4 tag with a TIT2 frame ("suno") and 2 KB of padding
+_TIT2 = b"TIT2" + (5).to_bytes(4, "big") + b"\x00\x00" + b"\x03suno"
+_TAG_BODY = _TIT2 + b"\x00" * 2048
+ID3_TAG = b"ID3\x04\x00\x00" + bytes([(len(_TAG_BODY) >> s) & 0x7F for s in (21, 14, 7, 0)]) + _TAG_BODY
+
+
+def song_bytes(size: int):
+    """Yield a synthetic MP3 of about `size` bytes in 64 KB blocks."""
+    yield ID3_TAG
+    block = FRAME * (64 * 1024 // len(FRAME))
+    sent = len(ID3_TAG)
+    while sent < size:
+        yield block
+        sent += len(block)
+
+
+class SongHandler(BaseHTTPRequestHandler):
+    """GET /<size>.mp3 → synthetic song of that many bytes."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        size = int(self.path.strip("/").split(".")[0])
+        blocks = list(song_bytes(size))  # sizes are computed up front, blocks are shared
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(sum(len(b) for b in blocks)))
+        self.end_headers()
+        for block in blocks:
+            self.wfile.write(block)
+
+
+class S3StandIn(BaseHTTPRequestHandler):
+    """Just enough of the S3 REST API for upload_file / upload_fileobj (path-style)."""
+
+    objects = {}  # key -> (size, first 64 KB)
+    uploads = {}  # upload id -> {part number: (size, head)}
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        remaining, head, size = int(self.headers.get("Content-Length", 0)), b"", 0
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 1 * MB))
+            if not head:
+                head = chunk[:64 * 1024]
+            size += len(chunk)
+            remaining -= len(chunk)
+        return size, head
+
+    def _reply(self, status=200, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        size, head = self._body()
+        if "uploadId" in query:
+            self.uploads[query["uploadId"][0]][int(query["partNumber"][0])] = (size, head)
+        else:
+            self.objects[url.path] = (size, head)
+        self._reply(headers={"ETag": f'"{uuid.uuid4().hex}"'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        self._body()
+        bucket, key = url.path.lstrip("/").split("/", 1)
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            xml = (f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                   f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+        else:
+            parts = self.uploads.pop(query["uploadId"][0])
+            ordered = [parts[n] for n in sorted(parts)]
+            self.objects[url.path] = (sum(size for size, _ in ordered), ordered[0][1])
+            xml = (f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                   f"<ETag>\"{uuid.uuid4().hex}\"</ETag></CompleteMultipartUploadResult>")
+        self._reply(body=xml.encode(), headers={"Content-Type": "application/xml"})
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ──────────────────────────
+#  PIPELINES (run in a subprocess)
+# ──────────────────────────
+
+def _client_config():
+    from botocore.config import Config
+    return Config(s3={"addressing_style": "path"},
+                  request_checksum_calculation="when_required",
+                  response_checksum_validation="when_required")
+
+
+def run_old(song_url, bucket, key, tags, workdir):
+    import boto3
+    import requests
+    from mutagen.easyid3 import EasyID3
+    from mutagen.mp3 import MP3
+
+    local_path = os.path.join(workdir, "song.mp3")
+    r = requests.get(song_url)
+    with open(local_path, "wb") as f:
+        f.write(r.content)
+    audio = MP3(local_path, ID3=EasyID3)
+    for name, value in tags.items():
+        audio[name] = value
+    audio.save()
+    s3 = boto3.client("s3", config=_client_config())
+    s3.upload_file(local_path, bucket, key, ExtraArgs={"ContentType": "audio/mpeg"})
+    s3 = boto3.client("s3", config=_client_config())
+    s3.generate_presigned_url(ClientMethod="get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=3600)
+
+
+def run_new(song_url, bucket, key, tags, workdir):
+    import boto3
+    import song_ingest
+
+    song_ingest._s3_client = boto3.client("s3", config=_client_config())
+    song_ingest.stream_song_to_s3(song_url, bucket, key, tags)
+    song_ingest.get_s3_client().generate_presigned_url(
+        ClientMethod="get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=3600)
+
+
+def worker(args):
+    sys.path.insert(0, HERE)
+    import boto3, botocore, mutagen, requests  # noqa: F401  (imports are not part of the measurement)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tags = {"title": "Песня", "artist": "bench", "composer": "AI"}
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        (run_old if args.worker == "old" else run_new)(args.song_url, "songs", args.key, tags, workdir)
+        elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak / 1024, "delta_rss_mb": (peak - rss_before) / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 80], help="song sizes in MB")
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--worker", choices=["old", "new"], help=argparse.SUPPRESS)
+    parser.add_argument("--song-url", help=argparse.SUPPRESS)
+    parser.add_argument("--key", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+
+    songs, s3 = serve(SongHandler), serve(S3StandIn)
+    env = dict(os.environ, AWS_ACCESS_KEY_ID="bench", AWS_SECRET_ACCESS_KEY="bench", AWS_DEFAULT_REGION="us-east-1",
+               AWS_ENDPOINT_URL=f"http://127.0.0.1:{s3.server_port}")
+    print(f"{'size':>6} {'pipeline':>8} {'seconds':>8} {'peak RSS':>9} {'+RSS':>8}")
+    for size_mb in args.sizes:
+        for pipeline in ("old", "new"):
+            results = []
+            for run in range(args.runs):
+                key = f"{pipeline}/{size_mb}-{run}.mp3"
+                out = subprocess.run(
+                    [sys.executable, __file__, "--worker", pipeline, "--key", key,
+                     "--song-url", f"http://127.0.0.1:{songs.server_port}/{size_mb * MB}.mp3"],
+                    env=env, capture_output=True, text=True, check=True)
+                results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+                uploaded, head = S3StandIn.objects[f"/songs/{key}"]
+                assert head.startswith(b"ID3") and "Песня".encode() in head, "tag was not rewritten"
+                assert uploaded >= size_mb * MB, "song was truncated"
+            best = min(results, key=lambda r: r["seconds"])
+            print(f"{size_mb:>4}MB {pipeline:>8} {best['seconds']:>8.2f} {best['peak_rss_mb']:>7.0f}MB "
+                  f"{best['delta_rss_mb']:>6.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
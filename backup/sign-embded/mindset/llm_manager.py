@@ -253,3 +253,36 @@ class LLMManager:
         except Exception as e:
             self.logger.error("Embedding call failed: %s", e)
             return False
+
+    def embd_many(self, texts: List[str], api_key: str = None, model: str = "text-embedding-3-small",
+                  batch_size: int = 128) -> List[List[float]]:
+        """
+        Делает OpenAI embedding списка текстов: запросы с массивом input по batch_size текстов,
+        повторяющиеся тексты отправляются один раз.
+
+        Returns:
+            Векторы в порядке texts; False для текстов, запрос которых не удался (как у embd_text)
+        """
+        if api_key is None:
+            api_key = self.openai_api_key
+
+        unique = list(dict.fromkeys(texts))
+        vectors: Dict[str, List[float]] = {}
+        for start in range(0, len(unique), batch_size):
+            chunk = unique[start:start + batch_size]
+            try:
+                resp = self.utils.get_session().post(
+                    "https://api.openai.com/v1/embeddings",
+                    headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+                    json={"input": chunk, "model": model},
+                    proxies=self.proxy,
+                    timeout=self.timeout
+                )
+                resp.raise_for_status()
+                data = resp.json()["data"]
+                self.logger.debug("Embedding batch response: %d vectors", len(data))
+                for item in data:
+                    vectors[chunk[item["index"]]] = item["embedding"]
+            except Exception as e:
+                self.logger.error("Embedding batch of %d failed: %s", len(chunk), e)
+        return [vectors.get(text, False) for text in texts]
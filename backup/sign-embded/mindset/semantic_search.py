@@ -70,35 +70,35 @@ class SemanticSearch:
         try:
             self.logger.info(f"Adding phrase '{phrase_key}' with {len(phrases)} variations")
 
-            # Add each phrase
+            # Existing phrases (regardless of processed status) are read once for the whole list
+            existing = {p['phrase']: p for p in self.db.get_phrases_by_key(phrase_key, include_processed=True)}
+
+            # New phrases are embedded together: one request per batch instead of one per phrase
+            new_phrases = list(dict.fromkeys(phrase for phrase in phrases if phrase not in existing))
+            embeddings = self.llm.embd_many(new_phrases) if new_phrases else []
+
             added_count = 0
-            for phrase in phrases:
-                self.logger.info(f"Adding phrase: {phrase}")
-
-                # Check if phrase already exists (regardless of processed status)
-                existing_phrases = self.db.get_phrases_by_key(phrase_key, include_processed=True)
-                phrase_exists = any(p['phrase'] == phrase for p in existing_phrases)
-
-                if not phrase_exists:
-                    # Create embedding for the phrase
-                    embedding = self.llm.embd_text(phrase)
-                    if embedding:
-                        # Save phrase and embedding to database
-                        phrase_id = self.db.save_phrase(phrase_key, phrase, embedding, processed, force_processed)
-                        self.logger.info(f"Saved phrase '{phrase}' with ID: {phrase_id}")
-                        added_count += 1
-                    else:
-                        self.logger.warning(f"Failed to create embedding for phrase: {phrase}")
+            for phrase, embedding in zip(new_phrases, embeddings):
+                if embedding:
+                    # Save phrase and embedding to database
+                    phrase_id = self.db.save_phrase(phrase_key, phrase, embedding, processed, force_processed)
+                    self.logger.info(f"Saved phrase '{phrase}' with ID: {phrase_id}")
+                    added_count += 1
                 else:
-                    # If phrase exists but is not processed and we want to mark it as processed, update it
-                    existing_phrase = next((p for p in existing_phrases if p['phrase'] == phrase), None)
-                    if existing_phrase and not existing_phrase['processed'] and processed:
-                        if self.db.update_phrase_processed_status(existing_phrase['id'], processed):
-                            self.logger.info(f"Updated phrase '{phrase}' to processed")
-                        else:
-                            self.logger.warning(f"Failed to update phrase '{phrase}' to processed")
+                    self.logger.warning(f"Failed to create embedding for phrase: {phrase}")
+
+            for phrase in dict.fromkeys(phrases):
+                existing_phrase = existing.get(phrase)
+                if existing_phrase is None:
+                    continue
+                # If phrase exists but is not processed and we want to mark it as processed, update it
+                if not existing_phrase['processed'] and processed:
+                    if self.db.update_phrase_processed_status(existing_phrase['id'], processed):
+                        self.logger.info(f"Updated phrase '{phrase}' to processed")
                     else:
-                        self.logger.debug(f"Phrase already exists in database: {phrase}")
+                        self.logger.warning(f"Failed to update phrase '{phrase}' to processed")
+                else:
+                    self.logger.debug(f"Phrase already exists in database: {phrase}")
 
             self.logger.info(f"Successfully added {added_count} new phrases for key '{phrase_key}'")
             return True
@@ -144,37 +144,16 @@ class SemanticSearch:
                         with open(file_path, 'r', encoding='utf-8') as f:
                             phrases = json.load(f)
 
-                        # Process each phrase in the JSON array
-                        for i, phrase_obj in enumerate(phrases):
+                        # Group the phrases of the JSON array by key, then add each group in bulk
+                        phrases_by_key: Dict[str, List[str]] = {}
+                        for phrase_obj in phrases:
                             for key, phrase in phrase_obj.items():
                                 # Use the key from the JSON object if it exists, otherwise use the filename-based key
-                                actual_key = key if key else phrase_key
-
-                                self.logger.debug(f"Processing phrase {i+1}: {phrase} with key: {actual_key}")
-
-                                # Check if phrase already exists (regardless of processed status)
-                                existing_phrases = self.db.get_phrases_by_key(actual_key, include_processed=False)
-                                phrase_exists = any(p['phrase'] == phrase for p in existing_phrases)
-
-                                if not phrase_exists:
-                                    # Create embedding for the phrase
-                                    embedding = self.llm.embd_text(phrase)
-                                    if embedding:
-                                        # Save phrase and embedding to database
-                                        phrase_id = self.db.save_phrase(actual_key, phrase, embedding, mark_as_processed, False)
-                                        self.logger.info(f"Saved phrase '{phrase}' with ID: {phrase_id}")
-                                    else:
-                                        self.logger.warning(f"Failed to create embedding for phrase: {phrase}")
-                                else:
-                                    # If phrase exists but is not processed and we want to mark it as processed, update it
-                                    existing_phrase = next((p for p in existing_phrases if p['phrase'] == phrase), None)
-                                    if existing_phrase and not existing_phrase['processed'] and mark_as_processed:
-                                        if self.db.update_phrase_processed_status(existing_phrase['id'], mark_as_processed):
-                                            self.logger.info(f"Updated phrase '{phrase}' to processed")
-                                        else:
-                                            self.logger.warning(f"Failed to update phrase '{phrase}' to processed")
-                                    else:
-                                        self.logger.debug(f"Phrase already exists in database: {phrase}")
+                                phrases_by_key.setdefault(key if key else phrase_key, []).append(phrase)
+
+                        for actual_key, key_phrases in phrases_by_key.items():
+                            self.logger.debug(f"Processing {len(key_phrases)} phrases with key: {actual_key}")
+                            self.add_phrase(actual_key, key_phrases, processed=mark_as_processed)
 
                         processed_files += 1
                     except Exception as e:
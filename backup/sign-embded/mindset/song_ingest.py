@@ -0,0 +1,186 @@
+"""
+Streaming song ingestion
+
+Suno hands over a finished MP3 by URL. The song is no longer downloaded whole,
+written to disk, retagged in place and read again for the upload. It now flows
+through in chunks:
+
+    requests (iter_content) -> new ID3v2 tag + original audio frames -> S3 multipart upload
+
+Memory is bounded by SONG_TRANSFER_CONFIG (part size x parts in memory) whatever
+the length of the song.
+
+This module contains:
+- get_s3_client(): process-wide boto3 S3 client (creating one costs more than a presign)
+- SONG_TRANSFER_CONFIG: multipart settings for song uploads
+- retag_stream(): replaces the leading ID3v2 tag of a chunk iterator
+- IterStream: read-only file object over a chunk iterator (for upload_fileobj)
+- stream_song_to_s3() / stream_song_to_file(): download -> retag -> upload / write
+"""
+
+import io
+import threading
+from typing import Dict, Iterable, Iterator, Optional
+
+import boto3
+import requests
+from boto3.s3.transfer import TransferConfig
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import error as ID3Error
+
+MB = 1024 * 1024
+
+# S3 parts must be at least 5 MB. Parts of a non-seekable stream are buffered in
+# memory, so max_in_memory_upload_chunks x multipart_chunksize is the memory bound.
+SONG_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * MB,
+    multipart_chunksize=8 * MB,
+    max_concurrency=8,
+    use_threads=True,
+)
+SONG_TRANSFER_CONFIG.max_in_memory_upload_chunks = 6
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Return the process-wide S3 client, creating it on first use (clients are thread-safe)."""
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client("s3")
+    return _s3_client
+
+
+def _id3_size(header: bytes) -> int:
+    """Total size of an ID3v2 tag from its 10-byte header (sizes are syncsafe integers)."""
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _read_at_least(chunks: Iterator[bytes], head: bytes, size: int) -> bytes:
+    while len(head) < size:
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        head += chunk
+    return head
+
+
+def retag_stream(chunks: Iterable[bytes], tags: Dict[str, str]) -> Iterator[bytes]:
+    """
+    Yield the MP3 from `chunks` with its leading ID3v2 tag rewritten.
+
+    Only the old tag is buffered. Its frames are kept, `tags` (EasyID3 keys such
+    as title, artist, composer) are set on top. The audio frames pass through
+    untouched.
+
+    Args:
+        chunks: MP3 bytes in order (e.g. response.iter_content())
+        tags: EasyID3 key -> value
+
+    Yields:
+        New tag, then the audio
+    """
+    chunks = iter(chunks)
+    head = _read_at_least(chunks, b"", 10)
+
+    if head[:3] == b"ID3" and len(head) >= 10:
+        tag_size = _id3_size(head[:10])
+        head = _read_at_least(chunks, head, tag_size)
+        old_tag, rest = head[:tag_size], head[tag_size:]
+        try:
+            tag = EasyID3(io.BytesIO(old_tag))
+        except ID3Error:
+            tag = EasyID3()
+    else:
+        tag, rest = EasyID3(), head
+
+    for key, value in tags.items():
+        tag[key] = value
+    out = io.BytesIO()
+    tag.save(out)
+
+    yield out.getvalue()
+    if rest:
+        yield rest
+    yield from chunks
+
+
+class IterStream(io.RawIOBase):
+    """Non-seekable file object reading from an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self.bytes_read += n
+        return n
+
+
+def stream_song_to_s3(song_url: str, bucket: str, key: str, tags: Dict[str, str],
+                      s3=None, session: Optional[requests.Session] = None, timeout=None,
+                      transfer_config: TransferConfig = SONG_TRANSFER_CONFIG) -> int:
+    """
+    Download a song, retag it and upload it to S3 without holding it in memory.
+
+    Args:
+        song_url: Source MP3 URL
+        bucket: Target bucket
+        key: Target key
+        tags: EasyID3 key -> value
+        s3: S3 client (the shared one by default)
+        session: HTTP session for the download (requests by default)
+        timeout: requests timeout (connect, read); read applies between chunks
+        transfer_config: Multipart settings
+
+    Returns:
+        Number of bytes uploaded
+    """
+    with (session or requests).get(song_url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        body = io.BufferedReader(IterStream(retag_stream(r.iter_content(DOWNLOAD_CHUNK_SIZE), tags)), DOWNLOAD_CHUNK_SIZE)
+        (s3 or get_s3_client()).upload_fileobj(
+            body, bucket, key, ExtraArgs={"ContentType": "audio/mpeg"}, Config=transfer_config
+        )
+        return body.raw.bytes_read
+
+
+def stream_song_to_file(song_url: str, path: str, tags: Dict[str, str],
+                        session: Optional[requests.Session] = None, timeout=None) -> int:
+    """
+    Download a song and write it retagged to `path`, chunk by chunk.
+
+    Used when the file itself is needed afterwards (e.g. for signing).
+
+    Returns:
+        Number of bytes written
+    """
+    written = 0
+    with (session or requests).get(song_url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in retag_stream(r.iter_content(DOWNLOAD_CHUNK_SIZE), tags):
+                f.write(chunk)
+                written += len(chunk)
+    return written
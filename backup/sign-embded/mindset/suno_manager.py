@@ -4,12 +4,6 @@ import logging
 from pathlib import Path
 from typing import Dict, Any, Optional
 
-# Third-party imports
-import boto3
-import requests
-from mutagen.easyid3 import EasyID3
-from mutagen.mp3 import MP3
-
 # Local imports
 from .config import Config
 from .database import DatabaseManager
@@ -17,6 +11,7 @@ from .telegram_bot import TelegramBot
 from .utils import Utils
 from .llm_manager import LLMManager
 from .audio_signer import AudioSigner
+from .song_ingest import SONG_TRANSFER_CONFIG, get_s3_client, stream_song_to_file, stream_song_to_s3
 
 
 class SunoManager:
@@ -75,8 +70,7 @@ class SunoManager:
             временная ссылка (signed url)
         """
         self.logger.debug("Generating signed URL for key %s, expires_in %d", key, expires_in)
-        s3 = boto3.client("s3")
-        url = s3.generate_presigned_url(
+        url = get_s3_client().generate_presigned_url(
             ClientMethod='get_object',
             Params={'Bucket': bucket, 'Key': key},
             ExpiresIn=expires_in
@@ -102,20 +96,28 @@ class SunoManager:
         self.logger.debug("Downloading song from %s for user %s", song_url, tg_user_id)
         local_path = os.path.join(f"{local_folder}/{tg_user_id}/", f"{song_title}.mp3")
         song_key = f"{tg_user_id}/{song_title}.mp3"
-        os.makedirs(f"{local_folder}/{tg_user_id}", exist_ok=True)
-        r = requests.get(song_url)
-        with open(local_path, "wb") as f:
-            f.write(r.content)
+        # ID3 tags are rewritten at the head of the stream, the audio frames pass through
+        tags = {"title": song_title, "artist": song_artist, "composer": self.ai_composer}
+        sign = self.signing_enabled and self.private_key_path
+
+        if song_bucket_name and not sign:
+            # Straight from Suno into a multipart upload, nothing is written to disk
+            self.logger.debug("Streaming song %s to bucket %s with key %s", song_title, song_bucket_name, song_key)
+            try:
+                size = stream_song_to_s3(song_url, song_bucket_name, song_key, tags,
+                                         session=self.utils.get_session(), timeout=self.timeout)
+            except Exception as e:
+                self.logger.exception("Failed to upload song to S3: %s", e)
+                raise
+            self.logger.debug("Uploaded %d bytes to %s", size, song_key)
+            return self.generate_song_url(bucket=song_bucket_name, key=song_key)
 
-        self.logger.debug("Changing metadata for song %s by %s", song_title, song_artist)
-        audio = MP3(local_path, ID3=EasyID3)
-        audio["title"] = song_title
-        audio["artist"] = song_artist
-        audio["composer"] = self.ai_composer
-        audio.save()
+        # Signing works on a file, so the song is streamed to disk first
+        os.makedirs(f"{local_folder}/{tg_user_id}", exist_ok=True)
+        stream_song_to_file(song_url, local_path, tags, session=self.utils.get_session(), timeout=self.timeout)
 
         # Sign the audio file if signing is enabled
-        if self.signing_enabled and self.private_key_path:
+        if sign:
             try:
                 sidecar_path = local_path.replace(".mp3", ".c2pa")
                 track_id = self.audio_signer.sign_audio(
@@ -129,8 +131,7 @@ class SunoManager:
                 
                 # Upload the sidecar file as well
                 sidecar_key = song_key.replace(".mp3", ".c2pa")
-                s3 = boto3.client("s3")
-                s3.upload_file(sidecar_path, song_bucket_name, sidecar_key)
+                get_s3_client().upload_file(sidecar_path, song_bucket_name, sidecar_key)
                 self.logger.debug("Uploaded sidecar file to %s", sidecar_key)
             except Exception as e:
                 self.logger.exception("Failed to sign audio file: %s", e)
@@ -140,9 +141,9 @@ class SunoManager:
             return song_url
 
         self.logger.debug("Uploading song %s to bucket %s with key %s", local_path, song_bucket_name, song_key)
-        s3 = boto3.client("s3")
         try:
-            s3.upload_file(local_path, song_bucket_name, song_key, ExtraArgs={"ContentType": "audio/mpeg"})
+            get_s3_client().upload_file(local_path, song_bucket_name, song_key, ExtraArgs={"ContentType": "audio/mpeg"},
+                                        Config=SONG_TRANSFER_CONFIG)
         except Exception as e:
             self.logger.exception("Failed to upload song to S3: %s", e)
             raise
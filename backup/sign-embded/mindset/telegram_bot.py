@@ -14,6 +14,7 @@ from requests import HTTPError
 # Local imports
 from .config import Config
 from .logger import get_default_logger
+from .telegram_dispatcher import get_dispatcher
 
 
 class TelegramBot:
@@ -43,6 +44,16 @@ class TelegramBot:
         # Telegram API base URL
         self.api_base_url = f"https://api.telegram.org/bot{self.bot_token}"
 
+        # Outgoing messages share the bot-wide and per-chat rate limits
+        self.dispatcher = get_dispatcher(
+            self.bot_token,
+            self._post_api,
+            global_rate=getattr(config, "telegram_global_rate", 30.0),
+            chat_rate=getattr(config, "telegram_chat_rate", 1.0),
+            chat_burst=getattr(config, "telegram_chat_burst", 1),
+            logger=self.logger,
+        )
+
         # Constants for text processing
         self.BOLD_PATTERNS = [
             re.compile(r"\*\*(?P<text>[^\n]+?)\*\*"),
@@ -60,6 +71,19 @@ class TelegramBot:
 
         self.logger.debug("TelegramBot initialized with token")
 
+    def _post_api(self, method: str, payload: Dict[str, Any]) -> requests.Response:
+        """
+        Perform one Bot API call (used by the dispatcher).
+
+        Args:
+            method: Bot API method name
+            payload: JSON payload
+
+        Returns:
+            Raw response
+        """
+        return self.session.post(f"{self.api_base_url}/{method}", json=payload, timeout=self.timeout)
+
     def send_callback_query_answer(self, callback_id: str, text: str = "", show_alert: bool = False) -> bool:
         """
         Answer a callback query.
@@ -109,7 +133,6 @@ class TelegramBot:
             title: Audio title
             caption: Audio caption
         """
-        url = f"{self.api_base_url}/sendAudio"
         payload = {
             "chat_id": chat_id,
             "audio": audio_url
@@ -123,9 +146,8 @@ class TelegramBot:
             payload["caption"] = title
 
         try:
-            response = self.session.post(url, json=payload, timeout=self.timeout)
-            response.raise_for_status()
-            self.logger.debug("Audio sent successfully: %s", response.status_code)
+            self.dispatcher.call(chat_id, "sendAudio", payload)
+            self.logger.debug("Audio sent successfully")
         except HTTPError as e:
             resp_text = getattr(getattr(e, "response", None), "text", "")
             self.logger.error("Failed to send audio: %s | response=%s", e, resp_text)
@@ -263,21 +285,23 @@ class TelegramBot:
         for i in range(0, len(text), size):
             yield text[i:i+size]
 
-    def send_message(self, chat_id: int, text: str, markup: Optional[Dict[str, Any]] = None,
-                    parse_mode: str = "MarkdownV2") -> None:
+    def _message_payload(self, chat_id: int, text: str, markup: Optional[Dict[str, Any]] = None,
+                         parse_mode: str = "MarkdownV2") -> Dict[str, Any]:
         """
-        Send a text message to chat.
+        Build the sendMessage payload.
 
         Args:
             chat_id: Chat ID to send to
             text: Message text
             markup: Reply markup (inline keyboard, etc.)
             parse_mode: Parse mode (MarkdownV2, HTML, etc.)
+
+        Returns:
+            Payload dictionary
         """
         # Clean think tags if needed
         clean_text = self._clean_think_tags(text) if self.ai_model == "qwen/qwen3-4b:free" else text
 
-        url = f"{self.api_base_url}/sendMessage"
         payload = {
             "chat_id": chat_id,
             "parse_mode": parse_mode,
@@ -286,11 +310,30 @@ class TelegramBot:
 
         if markup:
             payload["reply_markup"] = json.dumps(markup)
+        return payload
+
+    def send_message(self, chat_id: int, text: str, markup: Optional[Dict[str, Any]] = None,
+                    parse_mode: str = "MarkdownV2", coalesce: bool = True) -> Optional[int]:
+        """
+        Send a text message to chat.
+
+        Args:
+            chat_id: Chat ID to send to
+            text: Message text
+            markup: Reply markup (inline keyboard, etc.)
+            parse_mode: Parse mode (MarkdownV2, HTML, etc.)
+            coalesce: Allow the dispatcher to merge it with queued messages; pass False
+                when the returned message_id is edited later
+
+        Returns:
+            message_id of the sent message
+        """
+        payload = self._message_payload(chat_id, text, markup, parse_mode)
 
         try:
-            response = self.session.post(url, json=payload, timeout=self.timeout)
-            response.raise_for_status()
-            self.logger.debug("Message sent successfully: %s", response.status_code)
+            result = self.dispatcher.call(chat_id, "sendMessage", payload, coalesce=coalesce)
+            self.logger.debug("Message sent successfully")
+            return (result or {}).get("message_id")
         except HTTPError as e:
             resp_text = getattr(getattr(e, "response", None), "text", "")
             self.logger.error("Failed to send message: %s | response=%s", e, resp_text)
@@ -308,10 +351,20 @@ class TelegramBot:
         escaped_text = self.escape_markdown(text)
         chunks = list(self._split_text_into_chunks(escaped_text))
 
+        # All chunks are queued at once, so the dispatcher can pace (and merge) them
+        futures = []
         for i, chunk in enumerate(chunks):
             # Only apply markup to the last chunk
             chunk_markup = markup if i == len(chunks) - 1 else None
-            self.send_message(chat_id, chunk, chunk_markup)
+            futures.append(self.dispatcher.submit(chat_id, "sendMessage", self._message_payload(chat_id, chunk, chunk_markup)))
+
+        for future in futures:
+            try:
+                future.result()
+            except HTTPError as e:
+                resp_text = getattr(getattr(e, "response", None), "text", "")
+                self.logger.error("Failed to send message: %s | response=%s", e, resp_text)
+                raise
 
     def handle_callback_query(self, callback_data: Dict[str, Any], db, want_silence_message: str,
                              bot_id: str, session_lifetime: int, llm) -> Dict[str, Any]:
@@ -0,0 +1,313 @@
+"""
+Rate-limited outbound dispatcher for the Telegram Bot API
+
+Telegram accepts about 30 messages per second per bot and about one message per
+second per chat. Above that it answers 429 with parameters.retry_after, and
+blind exponential backoff only makes the stall longer.
+
+This module contains:
+- TokenBucket: token bucket with an explicit pause (for retry_after)
+- TelegramDispatcher: queue per chat, global and per-chat buckets, coalescing, metrics
+- get_dispatcher(): module-level registry so every TelegramBot in a container shares one dispatcher
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at", "paused_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for `seconds` (Telegram's retry_after)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class _Outgoing:
+    """One queued API call; several coalesced calls share it."""
+
+    __slots__ = ("method", "payload", "futures", "enqueued_at", "attempts", "coalesce")
+
+    def __init__(self, method: str, payload: Dict[str, Any], future: Future, coalesce: bool = True):
+        self.method = method
+        self.payload = payload
+        self.futures = [future]
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        self.coalesce = coalesce
+
+
+class TelegramDispatcher:
+    """
+    Sends Bot API calls within Telegram's limits.
+
+    - Calls for one chat are sent in order, one at a time.
+    - A call leaves the queue when both the global and the chat bucket have a token.
+    - A 429 pauses the chat for parameters.retry_after and the call is retried at the head of its queue.
+    - Consecutive sendMessage calls for a chat are merged while they fit into 4096 chars,
+      unless submitted with coalesce=False (the caller uses the returned message_id).
+      Consecutive editMessageText calls of one message collapse into the last one.
+    - submit() returns a Future; call() blocks, so synchronous handlers can use it directly.
+    """
+
+    MAX_TEXT = 4096
+
+    def __init__(self,
+                 post: Callable[[str, Dict[str, Any]], requests.Response],
+                 global_rate: float = 30.0,
+                 chat_rate: float = 1.0,
+                 chat_burst: int = 1,
+                 max_retries: int = 3,
+                 workers: int = 4,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            post: Performs one API call: post(method, payload) -> requests.Response
+            global_rate: Calls per second for the whole bot
+            chat_rate: Calls per second for one chat
+            chat_burst: Calls a chat may send back to back before chat_rate applies
+            max_retries: 429 answers tolerated for one call before it fails
+            workers: Number of calls in flight at once (different chats)
+            logger: Optional logger instance
+        """
+        self.post = post
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._queues: Dict[Any, deque] = {}
+        self._inflight: set = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tg-send")
+        self._latencies: deque = deque(maxlen=1000)
+        self._stats = {"submitted": 0, "sent": 0, "coalesced": 0, "rate_limited": 0,
+                       "failed": 0, "queue_depth": 0, "max_queue_depth": 0}
+
+        self._scheduler = threading.Thread(target=self._run, name="tg-dispatcher", daemon=True)
+        self._scheduler.start()
+
+    # ──────────────────────────
+    #  PUBLIC API
+    # ──────────────────────────
+
+    def submit(self, chat_id: Any, method: str, payload: Dict[str, Any], coalesce: bool = True) -> Future:
+        """
+        Queue an API call; the Future resolves to the `result` field of the answer.
+
+        A sendMessage with coalesce=False is never merged with another one, so its
+        result (message_id) belongs to this text only, e.g. for later edits.
+        """
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("TelegramDispatcher is closed")
+            if len(self._chats) > 1000:
+                self._prune_buckets()
+            self._queues.setdefault(chat_id, deque()).append(_Outgoing(method, payload, future, coalesce))
+            self._stats["submitted"] += 1
+            self._stats["queue_depth"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queue_depth"])
+            self._cond.notify()
+        return future
+
+    def call(self, chat_id: Any, method: str, payload: Dict[str, Any], timeout: Optional[float] = None,
+             coalesce: bool = True) -> Any:
+        """Queue an API call and wait for its result."""
+        return self.submit(chat_id, method, payload, coalesce).result(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return counters, the current queue depth and send latency percentiles (ms, enqueue to answer)."""
+        with self._cond:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        for name, q in (("latency_p50_ms", 0.50), ("latency_p95_ms", 0.95)):
+            stats[name] = round(latencies[int(q * (len(latencies) - 1))] * 1000, 1) if latencies else 0.0
+        return stats
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Send what is queued, then stop the scheduler."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._scheduler.join(timeout)
+        self._executor.shutdown(wait=True)
+
+    # ──────────────────────────
+    #  SCHEDULING
+    # ──────────────────────────
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _prune_buckets(self) -> None:
+        """Forget chats that are idle and whose bucket has refilled."""
+        now = time.monotonic()
+        for chat_id in [c for c, b in self._chats.items()
+                        if c not in self._queues and c not in self._inflight and b.delay(now) == 0
+                        and b.tokens >= b.capacity]:
+            del self._chats[chat_id]
+
+    def _next_ready(self) -> tuple:
+        """Chat whose head call may go now (oldest first), else the time to wait."""
+        now = time.monotonic()
+        ready, wait = None, None
+        global_delay = self._global.delay(now)
+        for chat_id, queue in self._queues.items():
+            if not queue or chat_id in self._inflight:
+                continue
+            delay = max(self._chat_bucket(chat_id).delay(now), global_delay)
+            if delay <= 0:
+                if ready is None or queue[0].enqueued_at < self._queues[ready][0].enqueued_at:
+                    ready = chat_id
+            else:
+                wait = delay if wait is None else min(wait, delay)
+        return ready, wait
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    chat_id, wait = self._next_ready()
+                    if chat_id is not None:
+                        break
+                    if self._closed and not self._stats["queue_depth"] and not self._inflight:
+                        return
+                    self._cond.wait(wait)
+                now = time.monotonic()
+                self._global.take(now)
+                self._chat_bucket(chat_id).take(now)
+                item = self._pop_coalesced(self._queues[chat_id])
+                self._inflight.add(chat_id)
+            self._executor.submit(self._send, chat_id, item)
+
+    def _pop_coalesced(self, queue: deque) -> _Outgoing:
+        item = queue.popleft()
+        self._stats["queue_depth"] -= 1
+        while queue:
+            nxt = queue[0]
+            if item.method == nxt.method == "editMessageText":
+                # Only the latest text of a message matters
+                if nxt.payload.get("message_id") != item.payload.get("message_id"):
+                    break
+                item.payload = nxt.payload
+            elif item.method == nxt.method == "sendMessage":
+                if not (item.coalesce and nxt.coalesce) or not self._can_merge(item.payload, nxt.payload):
+                    break
+                item.payload = dict(item.payload, text=item.payload["text"] + "\n" + nxt.payload["text"])
+            else:
+                break
+            queue.popleft()
+            item.futures.extend(nxt.futures)
+            self._stats["queue_depth"] -= 1
+            self._stats["coalesced"] += 1
+        return item
+
+    def _can_merge(self, first: Dict[str, Any], second: Dict[str, Any]) -> bool:
+        if first.get("reply_markup") or second.get("reply_markup"):
+            return False
+        if first.get("parse_mode") != second.get("parse_mode"):
+            return False
+        return len(first.get("text", "")) + 1 + len(second.get("text", "")) <= self.MAX_TEXT
+
+    # ──────────────────────────
+    #  SENDING
+    # ──────────────────────────
+
+    def _send(self, chat_id: Any, item: _Outgoing) -> None:
+        item.attempts += 1
+        try:
+            resp = self.post(item.method, item.payload)
+            if resp.status_code == 429 and item.attempts <= self.max_retries:
+                self._retry_later(chat_id, item, resp)
+                return
+            resp.raise_for_status()
+            result = resp.json().get("result")
+        except Exception as e:
+            self._finish(chat_id, item, error=e)
+            return
+        self._finish(chat_id, item, result=result)
+
+    def _retry_later(self, chat_id: Any, item: _Outgoing, resp: requests.Response) -> None:
+        try:
+            retry_after = float(resp.json().get("parameters", {}).get("retry_after", 1))
+        except ValueError:
+            retry_after = 1.0
+        self.logger.warning("Telegram %s for chat %s rate limited, retry after %ss", item.method, chat_id, retry_after)
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            self._stats["queue_depth"] += 1
+            self._chat_bucket(chat_id).pause(retry_after)
+            self._queues.setdefault(chat_id, deque()).appendleft(item)
+            self._inflight.discard(chat_id)
+            self._cond.notify()
+
+    def _finish(self, chat_id: Any, item: _Outgoing, result: Any = None, error: Optional[BaseException] = None) -> None:
+        latency = time.monotonic() - item.enqueued_at
+        with self._cond:
+            self._inflight.discard(chat_id)
+            self._stats["sent" if error is None else "failed"] += 1
+            self._latencies.append(latency)
+            if not self._queues.get(chat_id):
+                self._queues.pop(chat_id, None)
+            self._cond.notify()
+        for future in item.futures:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_dispatchers: Dict[str, TelegramDispatcher] = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(bot_token: str, post: Callable[[str, Dict[str, Any]], requests.Response], **kwargs) -> TelegramDispatcher:
+    """
+    Return the process-wide dispatcher for a bot, creating it on first use.
+
+    The Telegram limits are per bot, so every TelegramBot of a container must
+    draw from the same buckets.
+    """
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(bot_token)
+        if dispatcher is None:
+            dispatcher = TelegramDispatcher(post, **kwargs)
+            _dispatchers[bot_token] = dispatcher
+        return dispatcher
@@ -0,0 +1,123 @@
+"""
+Unit tests for the TelegramDispatcher class.
+"""
+
+import json
+import threading
+import time
+import unittest
+
+import requests
+
+from .telegram_dispatcher import TelegramDispatcher
+
+
+def make_response(status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode()
+    return response
+
+
+class FakeApi:
+    """Records calls and answers them from a script of (status, body) pairs."""
+
+    def __init__(self, answers=None, delay=0.0):
+        self.answers = list(answers or [])
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def post(self, method, payload):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls.append((time.monotonic(), method, payload))
+            status, body = self.answers.pop(0) if self.answers else (200, {"ok": True, "result": {"message_id": len(self.calls)}})
+        return make_response(status, body)
+
+
+class TestTelegramDispatcher(unittest.TestCase):
+    """Test cases for the TelegramDispatcher class."""
+
+    def make(self, api, **kwargs):
+        dispatcher = TelegramDispatcher(api.post, **kwargs)
+        self.addCleanup(dispatcher.close)
+        return dispatcher
+
+    def test_per_chat_rate(self):
+        """Calls to one chat are spaced by 1 / chat_rate."""
+        api = FakeApi()
+        dispatcher = self.make(api, chat_rate=10.0)
+        futures = [dispatcher.submit(1, "sendPhoto", {"chat_id": 1, "n": i}) for i in range(3)]
+        for future in futures:
+            future.result(2)
+        times = [t for t, _, _ in api.calls]
+        self.assertEqual([p["n"] for _, _, p in api.calls], [0, 1, 2])
+        self.assertGreaterEqual(times[2] - times[0], 0.18)
+
+    def test_global_rate(self):
+        """Different chats share the global bucket."""
+        api = FakeApi()
+        dispatcher = self.make(api, global_rate=20.0)
+        start = time.monotonic()
+        futures = [dispatcher.submit(chat, "sendAudio", {"chat_id": chat}) for chat in range(30)]
+        for future in futures:
+            future.result(5)
+        # 20 calls fit into the full bucket, the other 10 need half a second
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+        self.assertEqual(dispatcher.get_stats()["sent"], 30)
+
+    def test_retry_after(self):
+        """A 429 pauses the chat for retry_after and the call is repeated."""
+        api = FakeApi(answers=[(429, {"ok": False, "parameters": {"retry_after": 0.3}})])
+        dispatcher = self.make(api, chat_rate=100.0)
+        start = time.monotonic()
+        result = dispatcher.call(1, "sendMessage", {"chat_id": 1, "text": "hi"}, timeout=2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertEqual(result, {"message_id": 2})
+        self.assertEqual(dispatcher.get_stats()["rate_limited"], 1)
+
+    def test_coalescing(self):
+        """Queued messages of one chat are merged, queued edits of one message collapse."""
+        api = FakeApi(delay=0.1)
+        dispatcher = self.make(api, chat_rate=100.0)
+        first = dispatcher.submit(1, "sendMessage", {"chat_id": 1, "text": "a", "parse_mode": "MarkdownV2"})
+        time.sleep(0.02)  # "a" is in flight, the rest waits in the queue
+        merged = [dispatcher.submit(1, "sendMessage", {"chat_id": 1, "text": t, "parse_mode": "MarkdownV2"}) for t in "bc"]
+        edits = [dispatcher.submit(1, "editMessageText", {"chat_id": 1, "message_id": 7, "text": t}) for t in "xyz"]
+        for future in [first, *merged, *edits]:
+            future.result(2)
+        self.assertEqual([(m, p["text"]) for _, m, p in api.calls],
+                         [("sendMessage", "a"), ("sendMessage", "b\nc"), ("editMessageText", "z")])
+        self.assertEqual(merged[0].result(), merged[1].result())
+        stats = dispatcher.get_stats()
+        self.assertEqual(stats["coalesced"], 3)
+        self.assertEqual(stats["max_queue_depth"], 5)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_no_coalesce_keeps_own_message_id(self):
+        """A message sent with coalesce=False (a streamed reply that is edited later) is never merged."""
+        api = FakeApi(delay=0.1)
+        dispatcher = self.make(api, chat_rate=100.0)
+        first = dispatcher.submit(1, "sendMessage", {"chat_id": 1, "text": "a"})
+        time.sleep(0.02)
+        queued = dispatcher.submit(1, "sendMessage", {"chat_id": 1, "text": "b"})
+        stream = dispatcher.submit(1, "sendMessage", {"chat_id": 1, "text": "stream"}, coalesce=False)
+        after = dispatcher.submit(1, "sendMessage", {"chat_id": 1, "text": "c"})
+        for future in (first, queued, stream, after):
+            future.result(2)
+        self.assertEqual([p["text"] for _, _, p in api.calls], ["a", "b", "stream", "c"])
+        self.assertEqual(len({f.result()["message_id"] for f in (queued, stream, after)}), 3)
+        self.assertEqual(dispatcher.get_stats()["coalesced"], 0)
+
+    def test_error_is_raised(self):
+        """Other API errors reach the caller as HTTPError."""
+        api = FakeApi(answers=[(400, {"ok": False, "description": "chat not found"})])
+        dispatcher = self.make(api)
+        with self.assertRaises(requests.HTTPError):
+            dispatcher.call(1, "sendMessage", {"chat_id": 1, "text": "hi"}, timeout=2)
+        self.assertEqual(dispatcher.get_stats()["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 # Standard library imports
 import base64
+import bisect
 import json
 import logging
 import string
@@ -727,19 +728,16 @@ class Utils:
         if not messages:
             return []
 
-        # Calculate tokens for each message
-        message_tokens = [(msg, self._count_tokens(msg)) for msg in messages]
+        # Prefix sums of per-message tokens (stored token_count is used when present)
+        prefix = [0]
+        for msg in messages:
+            tokens = msg.get("token_count")
+            prefix.append(prefix[-1] + (tokens if tokens is not None else self._count_tokens(msg)))
 
-        # Start from the end and accumulate tokens until we reach the limit
-        selected_messages = []
-        total_tokens = 0
-
-        for msg, tokens in reversed(message_tokens):
-            if total_tokens + tokens <= max_tokens:
-                selected_messages.insert(0, msg)  # Insert at beginning to maintain order
-                total_tokens += tokens
-            else:
-                break
+        # Largest suffix within the limit: smallest start with prefix[-1] - prefix[start] <= max_tokens
+        start = bisect.bisect_left(prefix, prefix[-1] - max_tokens, 0, len(messages))
+        selected_messages = messages[start:]
+        total_tokens = prefix[-1] - prefix[start]
         # Calculate token drift and check if it's within acceptable range
         token_drift = abs(max_tokens - total_tokens)
         self.logger.debug(f"Selected {len(selected_messages)} messages with total tokens: {total_tokens}, drift: {token_drift}")
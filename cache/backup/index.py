@@ -155,8 +155,9 @@ def handler(event: Dict[str, Any], context):
     openai_msgs = ctx["openai_msgs"]
 
     # Detect intent and emotion
-    detect_intent = llm.llm_conversation(last_8_messages, config.system_prompt_intent)
-    detect_emotion = llm.llm_conversation(last_8_user_messages, config.system_prompt_detect_emotion)
+    detect_intent = llm.llm_conversation(last_8_messages, config.system_prompt_intent, cache_prompt="intent")
+    detect_emotion = llm.llm_conversation(last_8_user_messages, config.system_prompt_detect_emotion,
+                                        cache_prompt="emotion")
 
     logger.debug("User emotion: %s", detect_emotion)
     logger.debug("User intent: %s", detect_intent)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+History fetch benchmark: COUNT + OFFSET vs keyset "last N"
+
+Fills one session per size (100 … 100k messages) in a scratch schema and
+times fetching the last N messages with
+- the old strategy: SELECT COUNT(*) then ORDER BY created_at ASC OFFSET total-N LIMIT N
+- the new strategy: ORDER BY created_at DESC LIMIT N over (session_id, created_at DESC)
+
+Usage:
+    database_url=postgresql://... python bench_history.py [--limit 76] [--runs 20]
+
+The scratch schema is dropped at the end.
+"""
+
+import argparse
+import os
+import statistics
+import time
+import uuid
+
+from psycopg2 import connect
+
+SIZES = [100, 1_000, 10_000, 100_000]
+SCHEMA = "bench_history"
+
+OFFSET_COUNT_SQL = "SELECT COUNT(*) FROM {schema}.messages WHERE session_id = %s"
+OFFSET_PAGE_SQL = (
+    "SELECT role, content FROM {schema}.messages WHERE session_id = %s "
+    "ORDER BY created_at ASC OFFSET %s LIMIT %s"
+)
+KEYSET_SQL = (
+    "SELECT role, content FROM {schema}.messages WHERE session_id = %s "
+    "ORDER BY created_at DESC LIMIT %s"
+)
+
+
+def setup(cur, sizes):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"""
+        CREATE TABLE {SCHEMA}.messages (
+            id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+            session_id uuid NOT NULL,
+            role text NOT NULL,
+            content text NOT NULL,
+            token_count integer,
+            created_at timestamptz NOT NULL
+        )
+    """)
+    sessions = {}
+    for size in sizes:
+        session_id = str(uuid.uuid4())
+        sessions[size] = session_id
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.messages(session_id, role, content, token_count, created_at)
+            SELECT %s, CASE WHEN g %% 2 = 0 THEN 'user' ELSE 'assistant' END,
+                   repeat('сообщение ', 20) || g, 40,
+                   now() - interval '1 year' + g * interval '1 second'
+            FROM generate_series(1, %s) AS g
+        """, (session_id, size))
+    # Same index as flow-classify/migration-6.sql
+    cur.execute(f"CREATE INDEX ON {SCHEMA}.messages (session_id, created_at DESC) INCLUDE (role, token_count)")
+    cur.execute(f"ANALYZE {SCHEMA}.messages")
+    return sessions
+
+
+def time_ms(fn, runs):
+    fn()  # warm up
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def fetch_offset(cur, session_id, limit):
+    cur.execute(OFFSET_COUNT_SQL.format(schema=SCHEMA), (session_id,))
+    total = cur.fetchone()[0]
+    cur.execute(OFFSET_PAGE_SQL.format(schema=SCHEMA), (session_id, max(0, total - limit), limit))
+    return cur.fetchall()
+
+
+def fetch_keyset(cur, session_id, limit):
+    cur.execute(KEYSET_SQL.format(schema=SCHEMA), (session_id, limit))
+    rows = cur.fetchall()
+    rows.reverse()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("database_url"))
+    parser.add_argument("--limit", type=int, default=76, help="messages to fetch (HISTORY_CACHE_N)")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = connect(args.dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            sessions = setup(cur, SIZES)
+            print(f"{'messages':>10} {'count+offset ms':>16} {'keyset ms':>10} {'speedup':>8}")
+            for size, session_id in sessions.items():
+                assert fetch_offset(cur, session_id, args.limit) == fetch_keyset(cur, session_id, args.limit)
+                offset_ms = time_ms(lambda: fetch_offset(cur, session_id, args.limit), args.runs)
+                keyset_ms = time_ms(lambda: fetch_keyset(cur, session_id, args.limit), args.runs)
+                print(f"{size:>10} {offset_ms:>16.2f} {keyset_ms:>10.2f} {offset_ms / keyset_ms:>7.1f}x")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
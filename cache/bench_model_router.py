@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Model routing benchmark: static primary vs latency-aware router with hedging
+
+Starts a local stand-in for the OpenRouter chat-completions endpoint whose
+models answer with a configurable latency distribution (lognormal body plus
+a slow tail), then sends the same request stream
+- static: always the primary model with the fallback list, as before
+- hedged: ModelRouter, hedged to the next model after the primary's p95
+and prints p50/p95/p99 latency and the share of extra (hedged) requests.
+
+Usage:
+    python bench_model_router.py [--requests 400] [--concurrency 8] [--scale 0.1]
+
+--scale multiplies all stand-in latencies (1.0 = production-like seconds).
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from model_router import ModelRouter
+
+# model -> (median ms, sigma of the lognormal body, tail probability, tail ms)
+MODELS = {
+    "openai/gpt-4o-2024-05-13": (700, 0.35, 0.08, 4500),
+    "openai/gpt-4o-mini": (550, 0.30, 0.02, 3000),
+    "anthropic/claude-3.5-haiku": (800, 0.30, 0.02, 3500),
+}
+PRIMARY = "openai/gpt-4o-2024-05-13"
+
+
+def serve(scale, seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            median, sigma, tail_p, tail_ms = MODELS[body["model"]]
+            with lock:
+                latency = tail_ms if rng.random() < tail_p else median * math.exp(rng.gauss(0, sigma))
+            time.sleep(latency * scale / 1000)
+            payload = json.dumps({"model": body["model"], "choices": [
+                {"message": {"role": "assistant", "content": "{\"intent\": \"chat\"}"}}
+            ]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(router, url, n, concurrency):
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=4 * concurrency))
+
+    def send(model, fallbacks):
+        resp = session.post(url, json={"model": model, "models": fallbacks, "messages": []}, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+
+    def one(_):
+        started = time.monotonic()
+        router.call("classification", send)
+        return (time.monotonic() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(n)))
+
+
+def percentiles(latencies):
+    q = statistics.quantiles(latencies, n=100)
+    return q[49], q[94], q[98]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scale", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    models = list(MODELS)
+    scale_ms = lambda ms: ms * args.scale
+    print(f"{args.requests} requests, concurrency {args.concurrency}, latency scale {args.scale}")
+    print(f"{'strategy':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'extra req':>10}")
+    for name, router in (
+        ("static", ModelRouter({"classification": models}, hedge_classes=[], min_samples=10 ** 9)),
+        ("hedged", ModelRouter({"classification": models}, hedge_classes=["classification"], hedge_min_ms=scale_ms(300),
+                               hedge_max_ms=scale_ms(2500), max_workers=4 * args.concurrency)),
+    ):
+        server = serve(args.scale, args.seed)
+        url = f"http://127.0.0.1:{server.server_port}/api/v1/chat/completions"
+        latencies = run(router, url, args.requests, args.concurrency)
+        server.shutdown()
+        stats = router.get_stats()
+        p50, p95, p99 = (x / args.scale for x in percentiles(latencies))
+        print(f"{name:<10} {p50:8.0f} {p95:8.0f} {p99:8.0f} {stats['hedged'] / stats['calls']:10.1%}")
+        router.shutdown()
+    print("(latencies rescaled to production ms)")
+
+
+if __name__ == "__main__":
+    main()
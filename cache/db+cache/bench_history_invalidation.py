@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+History cache hit rate with N concurrent sessions: tenant wipe, per-session generation, segments, write-through
+
+Runs DatabaseManager.fetch_history / save_message for N sessions whose turns
+are interleaved, as with many users talking to the bot at once. One turn is:
+save the user message, fetch the history --reads-per-turn times (the reply
+and the classifiers), save the assistant message. All strategies use the
+same in-memory message store and cache:
+
+- wipe: stable/dynamic scheme, clear_tenant_cache("history_stable") on every
+  saved message, whatever the session
+- generation: stable/dynamic scheme, a new generation token for the saved session
+- segments: the segmented cache (history_segments.py), a saved message drops
+  the session's tail only
+- write-through: the segmented cache, a saved message is appended to the tail
+
+At the end of a write-through run, history_segments.check_consistency
+compares every session's cache with the message store.
+
+Reported per strategy: hit rate of the cached blocks (stable block, or
+segments and tail), database queries per fetch and cache operations per turn.
+
+Usage (from the directory that contains the mindset package):
+    python mindset/bench_history_invalidation.py [--sessions 1 10 100] [--turns 2000]
+                                                 [--history 100] [--reads-per-turn 2]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from mindset.database import DatabaseManager
+from mindset.history_segments import check_consistency
+
+
+class MemoryCache:
+    """The parts of the CacheManager interface DatabaseManager uses, in a dict."""
+
+    def __init__(self):
+        self.entries = {}
+        self.ops = 0
+
+    def get_cache_by_signature(self, tenant, key_signature, extend_ttl_seconds=None):
+        self.ops += 1
+        return self.entries.get((tenant, key_signature))
+
+    def put_cache(self, tenant, user, key_signature, text, ttl_seconds=None, embed=True):
+        self.ops += 1
+        self.entries[(tenant, key_signature)] = {"text": text, "tenant": tenant, "user": user, "created_at": 0}
+        return f"{tenant}:{key_signature}"
+
+    def clear_tenant_cache(self, tenant):
+        # FT.SEARCH + a batch delete in Redis; counted as one operation plus one per entry
+        keys = [key for key in self.entries if key[0] == tenant]
+        for key in keys:
+            del self.entries[key]
+        self.ops += 1 + len(keys)
+        return len(keys)
+
+
+class MemoryDatabase(DatabaseManager):
+    """DatabaseManager over an in-memory messages table; counts the queries."""
+
+    BACKEND = "stable"
+    WRITE_THROUGH = False
+
+    def __init__(self, cache):
+        config = SimpleNamespace(db_connection_params={"dbname": "bench-history-invalidation"},
+                                 retry_total=0, retry_backoff_factor=0, history_cache_backend=self.BACKEND,
+                                 history_write_through=self.WRITE_THROUGH)
+        logger = logging.getLogger("bench-history-invalidation")
+        logger.setLevel(logging.ERROR)
+        super().__init__(config, logger, cache_manager=cache)
+        self.messages = {}
+        self.queries = 0
+
+    def execute(self, query, params=None):
+        self.queries += 1
+        session_uuid, role, content = params[1], params[3], params[4]
+        self.messages.setdefault(session_uuid, []).append({"role": role, "content": content})
+
+    def execute_returning(self, query, params=None):
+        self.execute(query, params)
+        return {"seq": len(self.messages[params[1]])}
+
+    def query_one(self, query, params=None):
+        self.queries += 1
+        return {"cnt": len(self.messages.get(params[0], []))}
+
+    def query_all(self, query, params=None):
+        self.queries += 1
+        rows = self.messages.get(params[0], [])
+        if query == self.HISTORY_TAIL_SQL:
+            last_seq = len(rows)
+            tail = rows[last_seq - last_seq % params[2]:]
+            return [{"last_seq": last_seq, **r} for r in tail] or [{"last_seq": last_seq, "role": None, "content": None}]
+        if query == self.HISTORY_RANGE_SQL:
+            return rows[params[1] - 1:params[2]]
+        # The dynamic part: ORDER BY created_at DESC LIMIT %s
+        return list(reversed(rows[-params[1]:]))
+
+    def fetch_last_messages(self, session_uuid, limit_count, skip_newest=0):
+        self.queries += 1
+        rows = self.messages.get(session_uuid, [])
+        end = len(rows) - skip_newest
+        return [dict(r) for r in rows[max(end - limit_count, 0):max(end, 0)]]
+
+
+class Segments(MemoryDatabase):
+    BACKEND = "cache_manager"
+
+
+class WriteThrough(Segments):
+    WRITE_THROUGH = True
+
+
+class WipeTenant(MemoryDatabase):
+    """The invalidation before per-session generations."""
+
+    def _get_history_generation(self, session_uuid):
+        return "0"
+
+    def invalidate_history_cache(self, session_uuid):
+        self.cache_manager.clear_tenant_cache("history_stable")
+
+
+def run(db_class, sessions: int, turns: int, history: int, reads_per_turn: int, seed: int) -> dict:
+    cache = MemoryCache()
+    db = db_class(cache)
+    ids = [f"{n:08d}-0000-4000-8000-000000000000" for n in range(sessions)]
+    for session_uuid in ids:
+        db.messages[session_uuid] = [{"role": ("user", "assistant")[i % 2], "content": f"сообщение {i}"}
+                                     for i in range(history)]
+
+    hits = misses = 0
+    original = db._get_stable_messages_from_cache
+
+    def counted(*args, **kwargs):
+        nonlocal hits, misses
+        result = original(*args, **kwargs)
+        if result is None:
+            misses += 1
+        else:
+            hits += 1
+        return result
+    db._get_stable_messages_from_cache = counted
+
+    # Every session runs its turns step by step; a random session moves on each tick
+    script = ["user"] + ["fetch"] * reads_per_turn + ["assistant"]
+    position = {session_uuid: 0 for session_uuid in ids}
+    rng = random.Random(seed)
+    fetch_queries = fetches = completed = 0
+    while completed < turns:
+        session_uuid = rng.choice(ids)
+        step = script[position[session_uuid]]
+        if step == "fetch":
+            before = db.queries
+            db.fetch_history(session_uuid, db.HISTORY_CACHE_N)
+            fetch_queries += db.queries - before
+            fetches += 1
+        else:
+            db.save_message(session_uuid, "bench-user", step, f"{step} {completed}", [], 0, token_count=5)
+        position[session_uuid] = (position[session_uuid] + 1) % len(script)
+        if position[session_uuid] == 0:
+            completed += 1
+
+    drift = None
+    if db.history_segments is not None:
+        stats = db.history_segments.get_stats()
+        hits = stats["tail_hits"] + stats["segment_hits"]
+        misses = stats["tail_misses"] + stats["segment_misses"]
+        if db.history_write_through:
+            report = check_consistency(db.history_segments, ids, db.HISTORY_CACHE_N)
+            drift = report["drift"] + report["stale"]
+    return {"hit_rate": round(hits / max(hits + misses, 1), 3),
+            "db_queries_per_fetch": round(fetch_queries / max(fetches, 1), 2),
+            "cache_ops_per_turn": round(cache.ops / max(completed, 1), 2),
+            "drift": drift}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History cache hit rate: tenant wipe, per-session generation, "
+                                                 "segments, write-through")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=100, help="messages per session before the run")
+    parser.add_argument("--reads-per-turn", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.turns} turns, {args.reads_per_turn} history reads per turn, {args.history} messages per session")
+    print(f"  {'sessions':>8}  {'strategy':<13} {'hit rate':>8} {'DB queries/fetch':>16} {'cache ops/turn':>14}"
+          f" {'drifted':>7}")
+    for sessions in args.sessions:
+        for name, db_class in (("wipe", WipeTenant), ("generation", MemoryDatabase), ("segments", Segments),
+                               ("write-through", WriteThrough)):
+            r = run(db_class, sessions, args.turns, args.history, args.reads_per_turn, args.seed)
+            drift = "-" if r["drift"] is None else r["drift"]
+            print(f"  {sessions:8d}  {name:<13} {r['hit_rate']:8.1%} {r['db_queries_per_fetch']:16.2f} "
+                  f"{r['cache_ops_per_turn']:14.2f} {drift:>7}")
+
+
+if __name__ == "__main__":
+    main()
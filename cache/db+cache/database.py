@@ -12,14 +12,20 @@ This module contains:
 import hashlib
 import json
 import logging
+import threading
 import uuid
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from psycopg2 import connect, Error as PgError
 from psycopg2.extras import RealDictCursor
 
 from .config import Config
+from .db_pool import get_pool
+from .history_segments import (DEFAULT_SEGMENT_SIZE, CacheManagerSegmentStore, MemorySegmentStore,
+                               SegmentedHistory, check_consistency, put_plain_entry)
+from .unit_of_work import UnitOfWork
 
 
 class DatabaseManager:
@@ -37,7 +43,19 @@ class DatabaseManager:
         self.config = config
         self.logger = logger or logging.getLogger(__name__)
         self.cache_manager = cache_manager
+
+        # Shared, warm connection pool (one per process, reused across invocations)
+        self.pool = get_pool(
+            config.db_connection_params,
+            maxconn=getattr(config, "db_pool_maxconn", 4),
+            max_lifetime=getattr(config, "db_pool_max_lifetime", 1800),
+            health_check_interval=getattr(config, "db_pool_health_check_interval", 30),
+            logger=self.logger,
+        )
         
+        # Active unit of work (per thread), see unit_of_work()
+        self._local = threading.local()
+
         # Initialize utils for helper functions
         from .utils import Utils
         self.utils = Utils(config, logger)
@@ -46,9 +64,28 @@ class DatabaseManager:
         self.HISTORY_CACHE_N = 76  # Total messages to consider for caching
         self.HISTORY_CACHE_TTL = 86400  # 24 hours in seconds
         self.HISTORY_DYNAMIC_COUNT = 2  # Last N messages that change frequently
+        self.HISTORY_GENERATION_TENANT = "history_generation"  # Per-session generation tokens
+
+        # Segmented history cache (history_segments.py, needs migration-7.sql). history_cache_backend:
+        # "stable"        - the N-2 stable/dynamic scheme over cache_manager (default, no seq needed)
+        # "cache_manager" - segments in the cache_manager passed in (Redis or SQLite-vec manager)
+        # "memory"        - segments in this process only
+        backend = getattr(config, "history_cache_backend", "stable")
+        self.history_segments: Optional[SegmentedHistory] = None
+        if backend == "memory" or (backend == "cache_manager" and cache_manager is not None):
+            store = MemorySegmentStore() if backend == "memory" else CacheManagerSegmentStore(cache_manager)
+            self.history_segments = SegmentedHistory(
+                store, self._load_history_tail, self._load_history_range,
+                segment_size=getattr(config, "history_segment_size", DEFAULT_SEGMENT_SIZE),
+                tail_ttl=self.HISTORY_CACHE_TTL,
+                logger=self.logger,
+            )
+        # Write-through: save_message appends the new message to the cached tail
+        # (otherwise it only drops the tail). Segmented cache only.
+        self.history_write_through = getattr(config, "history_write_through", True)
 
     def get_connection(self):
-        """Return a new psycopg2 connection."""
+        """Return a new psycopg2 connection (bypasses the pool)."""
         try:
             conn = connect(**self.config.db_connection_params)
             conn.set_client_encoding('UTF8')
@@ -59,38 +96,69 @@ class DatabaseManager:
 
     def query_one(self, sql: str, params: tuple = ()) -> Optional[dict]:
         """Execute SELECT returning a single row as dict, or None."""
-        conn = self.get_connection()
-        try:
+        def _run(conn):
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(sql, params)
                 return cur.fetchone()
-        finally:
-            conn.close()
+        return self.pool.run(_run, idempotent=True)
 
     def query_all(self, sql: str, params: tuple = ()) -> List[dict]:
         """Execute SELECT returning all rows as list of dicts."""
-        conn = self.get_connection()
-        try:
+        def _run(conn):
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(sql, params)
                 return cur.fetchall()
-        finally:
-            conn.close()
+        return self.pool.run(_run, idempotent=True)
 
     def execute(self, sql: str, params: tuple = ()):
         """Execute INSERT/UPDATE/DELETE and commit."""
         # self.logger.debug("Executing SQL: %s with params: %s", sql, params)
-        conn = self.get_connection()
-        try:
+        def _run(conn):
             with conn:
                 with conn.cursor() as cur:
                     cur.execute(sql, params)
                     # self.logger.debug("SQL executed successfully, rowcount: %s", cur.rowcount)
+        try:
+            self.pool.run(_run)
         except Exception as e:
             self.logger.error("SQL execution failed: %s", e)
             raise
+
+    def execute_returning(self, sql: str, params: Any = ()) -> Optional[dict]:
+        """Execute a writing statement with RETURNING/SELECT, commit, and return one row as dict."""
+        def _run(conn):
+            with conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(sql, params)
+                    return cur.fetchone()
+        try:
+            return self.pool.run(_run)
+        except Exception as e:
+            self.logger.error("SQL execution failed: %s", e)
+            raise
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Return connection pool counters (checkouts, reuse rate, reconnects)."""
+        return self.pool.get_stats()
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Buffer writes to messages, songs and tg_users made inside the block and
+        commit them in one transaction on exit. Use uow.flush() for writes that
+        must be visible before an external call.
+        """
+        uow = UnitOfWork(self.pool, self.logger)
+        self._local.uow = uow
+        try:
+            with uow:
+                yield uow
         finally:
-            conn.close()
+            self._local.uow = None
+
+    @property
+    def current_unit_of_work(self) -> Optional[UnitOfWork]:
+        return getattr(self._local, "uow", None)
 
     # ──────────────────────────
     #  BOT OPERATIONS
@@ -158,10 +226,19 @@ class DatabaseManager:
 
     def update_user_warnings(self, tg_user_id: str, warnings: int):
         """Update user warnings count."""
+        uow = self.current_unit_of_work
+        if uow:
+            uow.update("tg_users", {"warnings": warnings}, tg_user_id)
+            return
         self.execute("UPDATE tg_users SET warnings = %s WHERE id = %s", (warnings, tg_user_id))
 
     def block_user(self, tg_user_id: str, reason: str):
         """Block user with reason."""
+        uow = self.current_unit_of_work
+        if uow:
+            uow.update("tg_users", {"blocked": True, "blocked_reason": reason,
+                                    "blocked_at": datetime.now(timezone.utc)}, tg_user_id)
+            return
         self.execute(
             "UPDATE tg_users SET blocked = TRUE, blocked_reason = %s, blocked_at = NOW() WHERE id = %s",
             (reason, tg_user_id)
@@ -203,6 +280,117 @@ class DatabaseManager:
         self.logger.debug("Created session %s", session_uuid)
         return session_uuid
 
+    # ──────────────────────────
+    #  TURN CONTEXT
+    # ──────────────────────────
+
+    # Upsert user and tg_user, resolve or open the session, read moderation
+    # state and the last N messages - all in one statement.
+    TURN_CONTEXT_SQL = """
+    WITH ins_user AS (
+        INSERT INTO users(id, chat_id, full_name)
+        VALUES (%(new_user_id)s, %(chat_id)s, %(full_name)s)
+        ON CONFLICT (chat_id) DO NOTHING
+        RETURNING id
+    ), u AS (
+        SELECT id FROM ins_user
+        UNION ALL
+        SELECT id FROM users WHERE chat_id = %(chat_id)s
+        LIMIT 1
+    ), ins_tg AS (
+        INSERT INTO tg_users(id, user_id, warnings, blocked)
+        SELECT %(tg_user_id)s, u.id, 0, FALSE FROM u
+        ON CONFLICT (id) DO NOTHING
+        RETURNING warnings, blocked
+    ), tg AS (
+        SELECT warnings, blocked FROM ins_tg
+        UNION ALL
+        SELECT warnings, blocked FROM tg_users WHERE id = %(tg_user_id)s
+        LIMIT 1
+    ), fresh AS (
+        SELECT s.id FROM conversation_sessions s JOIN u ON s.user_id = u.id
+        WHERE s.bot_id = %(bot_id)s AND s.ended_at IS NULL
+          AND s.started_at > NOW() - make_interval(secs => %(session_lifetime_seconds)s)
+        ORDER BY s.started_at DESC LIMIT 1
+    ), ins_session AS (
+        INSERT INTO conversation_sessions(id, user_id, bot_id, started_at, model)
+        SELECT %(new_session_id)s, u.id, %(bot_id)s, NOW(), %(model)s FROM u
+        WHERE NOT EXISTS (SELECT 1 FROM fresh)
+        RETURNING id
+    ), sess AS (
+        SELECT id, FALSE AS created FROM fresh
+        UNION ALL
+        SELECT id, TRUE AS created FROM ins_session
+    ), hist AS (
+        SELECT m.role, m.content, m.token_count, m.created_at
+        FROM messages m JOIN sess ON m.session_id = sess.id
+        ORDER BY m.created_at DESC
+        LIMIT %(history_limit)s
+    )
+    SELECT u.id AS user_id,
+           sess.id AS session_id,
+           sess.created AS session_created,
+           COALESCE(tg.warnings, 0) AS warnings,
+           COALESCE(tg.blocked, FALSE) AS blocked,
+           COALESCE(
+               (SELECT json_agg(json_build_object('role', h.role, 'content', h.content) ORDER BY h.created_at) FROM hist h),
+               '[]'::json
+           ) AS history,
+           COALESCE((SELECT json_agg(h.token_count ORDER BY h.created_at) FROM hist h), '[]'::json) AS history_tokens
+    FROM u CROSS JOIN sess LEFT JOIN tg ON TRUE
+    """
+
+    def load_turn_context(self, chat_id: int, tg_user_id: str, bot_uuid: str, full_name: str = "",
+                          session_lifetime_seconds: Optional[int] = None,
+                          history_limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Load everything a turn needs in a single round trip.
+
+        Replaces get_or_create_user + get_active_session + fetch_history +
+        ensure_user_exists + get_user_moderation_info. History is read
+        straight from Postgres (the incremental history cache is not used).
+
+        Args:
+            chat_id: Telegram chat ID
+            tg_user_id: Telegram user ID
+            bot_uuid: Bot UUID
+            full_name: User full name (used only when the user is created)
+            session_lifetime_seconds: Session lifetime, defaults to config.session_lifetime
+            history_limit: Number of last messages to return, None for the whole session
+
+        Returns:
+            Dict with user_uuid, session_uuid, warnings, blocked, history and
+            history_tokens (stored token count per history message, None if unknown)
+        """
+        if session_lifetime_seconds is None:
+            session_lifetime_seconds = getattr(self.config, "session_lifetime", 87600)
+        params = {
+            "new_user_id": str(uuid.uuid4()),
+            "chat_id": chat_id,
+            "full_name": full_name,
+            "tg_user_id": int(tg_user_id),
+            "bot_id": bot_uuid,
+            "session_lifetime_seconds": session_lifetime_seconds,
+            "new_session_id": str(uuid.uuid4()),
+            "model": self.config.ai_model,
+            "history_limit": history_limit,
+        }
+        rec = self.execute_returning(self.TURN_CONTEXT_SQL, params)
+        if rec is None:
+            # A concurrent update inserted the user after our snapshot was taken;
+            # a new statement sees the committed row.
+            rec = self.execute_returning(self.TURN_CONTEXT_SQL, params)
+        if rec["session_created"]:
+            self.logger.debug("Created session %s", rec["session_id"])
+        return {
+            "user_uuid": str(rec["user_id"]),
+            "session_uuid": str(rec["session_id"]),
+            "warnings": rec["warnings"],
+            "blocked": rec["blocked"],
+            "history": rec["history"],
+            "history_tokens": rec["history_tokens"],
+        }
+
     # ──────────────────────────
     #  MESSAGE OPERATIONS
     # ──────────────────────────
@@ -212,9 +400,22 @@ class DatabaseManager:
         
         # Debug: Log the incoming request with full context
         self.logger.info("[CACHE_DEBUG] ===== FETCH_HISTORY REQUEST START =====")
-        self.logger.info("[CACHE_DEBUG] fetch_history called: session=%s, limit=%s, cache_available=%s", 
-                        session_uuid[:8] + "...", limit_count, self.cache_manager is not None)
+        self.logger.info("[CACHE_DEBUG] fetch_history called: session=%.8s..., limit=%s, cache_available=%s", 
+                        session_uuid, limit_count, self.cache_manager is not None)
         
+        # Segmented cache: any limit, no COUNT(*)
+        if self.history_segments is not None and limit_count is not None:
+            try:
+                start_time = datetime.now()
+                result = self.history_segments.last(session_uuid, limit_count)
+                cache_time = (datetime.now() - start_time).total_seconds() * 1000
+                self.logger.info("[CACHE_DEBUG] RESULT: Segmented history returned %d messages in %.2fms",
+                               len(result), cache_time)
+                return result
+            except Exception as e:
+                self.logger.error("[CACHE_DEBUG] FALLBACK: Segmented history failed, falling back to database: %s", e)
+                return self._fetch_history_direct(session_uuid, limit_count)
+
         # Check cache conditions with detailed reasoning
         cache_conditions_met = (
             self.cache_manager is not None and 
@@ -222,13 +423,14 @@ class DatabaseManager:
             limit_count == self.HISTORY_CACHE_N
         )
         
-        self.logger.debug("[CACHE_DEBUG] Cache condition analysis:")
-        self.logger.debug("[CACHE_DEBUG]   - cache_manager available: %s", self.cache_manager is not None)
-        self.logger.debug("[CACHE_DEBUG]   - limit_count provided: %s (value: %s)", limit_count is not None, limit_count)
-        self.logger.debug("[CACHE_DEBUG]   - limit matches CACHE_N: %s (expected: %d)", 
-                         limit_count == self.HISTORY_CACHE_N if limit_count is not None else False, 
-                         self.HISTORY_CACHE_N)
-        self.logger.debug("[CACHE_DEBUG]   - all conditions met: %s", cache_conditions_met)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("[CACHE_DEBUG] Cache condition analysis:")
+            self.logger.debug("[CACHE_DEBUG]   - cache_manager available: %s", self.cache_manager is not None)
+            self.logger.debug("[CACHE_DEBUG]   - limit_count provided: %s (value: %s)", limit_count is not None, limit_count)
+            self.logger.debug("[CACHE_DEBUG]   - limit matches CACHE_N: %s (expected: %d)", 
+                             limit_count == self.HISTORY_CACHE_N if limit_count is not None else False, 
+                             self.HISTORY_CACHE_N)
+            self.logger.debug("[CACHE_DEBUG]   - all conditions met: %s", cache_conditions_met)
         
         # If cache conditions are met, try incremental caching
         if cache_conditions_met:
@@ -265,30 +467,15 @@ class DatabaseManager:
                 self.logger.warning("[CACHE_DEBUG] DECISION: Cache bypass - unknown condition failure")
         
         # Original implementation (fallback or non-cached scenarios)
-        self.logger.info("[CACHE_DEBUG] DECISION: Using direct database query for session %s", session_uuid[:8] + "...")
+        self.logger.info("[CACHE_DEBUG] DECISION: Using direct database query for session %.8s...", session_uuid)
         self.logger.debug("[CACHE_DEBUG] Direct query parameters: limit=%s", limit_count)
         
         start_time = datetime.now()
         
         if limit_count is not None:
-            self.logger.debug("[CACHE_DEBUG] Executing limited query with offset calculation")
-            # Получаем количество всех сообщений для вычисления OFFSET
-            count_start = datetime.now()
-            total_count = self.query_one(
-                "SELECT COUNT(*) as cnt FROM messages WHERE session_id = %s",
-                (session_uuid,)
-            )["cnt"]
-            count_time = (datetime.now() - count_start).total_seconds() * 1000
-            
-            offset = max(0, total_count - limit_count)
-            self.logger.debug("[CACHE_DEBUG] Query parameters: total=%d, offset=%d, limit=%d (count query: %.2fms)", 
-                            total_count, offset, limit_count, count_time)
-            
+            self.logger.debug("[CACHE_DEBUG] Executing keyset query for last %d messages", limit_count)
             query_start = datetime.now()
-            rows = self.query_all(
-                "SELECT role, content FROM messages WHERE session_id = %s ORDER BY created_at ASC OFFSET %s LIMIT %s",
-                (session_uuid, offset, limit_count)
-            )
+            rows = self.fetch_last_messages(session_uuid, limit_count)
             query_time = (datetime.now() - query_start).total_seconds() * 1000
             self.logger.debug("[CACHE_DEBUG] Main query completed in %.2fms, returned %d rows", query_time, len(rows))
         else:
@@ -322,24 +509,94 @@ class DatabaseManager:
         self.logger.info("[CACHE_DEBUG] ===== FETCH_HISTORY REQUEST END (DIRECT) =====")
         return result
 
-    def save_message(self, session_uuid: str, user_uuid: str, role: str, content: str, embedding: List[float], tg_msg_id: int) -> str:
-        """Save a message to the database and return message ID."""
+    # Last N messages: walk the (session_id, created_at DESC) index and stop after N rows
+    LAST_MESSAGES_SQL = (
+        "SELECT role, content FROM messages WHERE session_id = %s "
+        "ORDER BY created_at DESC LIMIT %s OFFSET %s"
+    )
+
+    def fetch_last_messages(self, session_uuid: str, limit_count: int, skip_newest: int = 0) -> List[Dict[str, str]]:
+        """
+        Return the last limit_count messages of a session in chronological order.
+
+        Cost depends on limit_count + skip_newest, not on the session length
+        (see migration-6.sql for the covering index).
+
+        Args:
+            session_uuid: Session ID
+            limit_count: Number of messages to return
+            skip_newest: Number of newest messages to leave out
+        """
+        rows = self.query_all(self.LAST_MESSAGES_SQL, (session_uuid, limit_count, skip_newest))
+        return [{"role": r["role"], "content": r["content"]} for r in reversed(rows)]
+
+    # Segmented history cache loaders (seq from migration-7.sql, range scans of messages_session_seq_idx)
+    HISTORY_TAIL_SQL = (
+        "SELECT l.last_seq, m.role, m.content "
+        "FROM (SELECT COALESCE(MAX(seq), 0) AS last_seq FROM messages WHERE session_id = %s) AS l "
+        "LEFT JOIN messages AS m ON m.session_id = %s AND m.seq > l.last_seq - l.last_seq %% %s "
+        "ORDER BY m.seq"
+    )
+    HISTORY_RANGE_SQL = (
+        "SELECT role, content FROM messages WHERE session_id = %s AND seq BETWEEN %s AND %s ORDER BY seq"
+    )
+
+    def _load_history_tail(self, session_uuid: str, segment_size: int):
+        """(last seq of the session, messages after its last full segment) in one query."""
+        rows = self.query_all(self.HISTORY_TAIL_SQL, (session_uuid, session_uuid, segment_size))
+        last_seq = rows[0]["last_seq"] if rows else 0
+        # No tail (last_seq is a multiple of segment_size): the LEFT JOIN yields one row of NULLs
+        return last_seq, [{"role": r["role"], "content": r["content"]} for r in rows if r["role"] is not None]
+
+    def _load_history_range(self, session_uuid: str, first_seq: int, last_seq: int) -> List[Dict[str, str]]:
+        rows = self.query_all(self.HISTORY_RANGE_SQL, (session_uuid, first_seq, last_seq))
+        return [{"role": r["role"], "content": r["content"]} for r in rows]
+
+    def _write_through_history(self, session_uuid: str, seq: Optional[int], role: str, content: str):
+        """Called once the message row is committed: append it to the cached history or invalidate."""
+        if self.history_segments is None or not self.history_write_through or seq is None:
+            self.invalidate_history_cache(session_uuid)
+            return
+        if self.history_segments.append(session_uuid, seq, {"role": role, "content": content}):
+            self.logger.debug("[CACHE_DEBUG] Message seq %s appended to the history cache of session %.8s...",
+                              seq, session_uuid)
+        else:
+            self.logger.debug("[CACHE_DEBUG] Message seq %s out of order for session %.8s..., tail dropped",
+                              seq, session_uuid)
+
+    def save_message(self, session_uuid: str, user_uuid: str, role: str, content: str, embedding: List[float], tg_msg_id: int,
+                     token_count: Optional[int] = None) -> str:
+        """Save a message to the database and return message ID (token_count is stored only if given)."""
         msg_id = str(uuid.uuid4())
         self.logger.debug("Saving message: session=%s, user=%s, role=%s, content_length=%d",
                          session_uuid, user_uuid, role, len(content))
+        # seq (migration-7.sql) is read back for the write-through of the segmented cache
+        write_through = self.history_segments is not None and self.history_write_through
+        uow = self.current_unit_of_work
+        if uow:
+            pending = uow.insert("messages", {
+                "id": msg_id, "session_id": session_uuid, "user_id": user_uuid, "role": role,
+                "content": content, "embedding": embedding, "tg_msg_id": tg_msg_id, "token_count": token_count,
+            }, returning="seq" if write_through else None)
+            # The cache must not be updated before the row is visible
+            uow.after_flush(lambda: self._write_through_history(session_uuid, pending.get("seq"), role, content))
+            return msg_id
         try:
-            self.execute(
-                "INSERT INTO messages(id, session_id, user_id, role, content, created_at, embedding, tg_msg_id) "
-                "VALUES (%s, %s, %s, %s, %s, NOW(), %s, %s)",
-                (msg_id, session_uuid, user_uuid, role, content, embedding, tg_msg_id)
-            )
+            sql = ("INSERT INTO messages(id, session_id, user_id, role, content, created_at, embedding, tg_msg_id, token_count) "
+                   "VALUES (%s, %s, %s, %s, %s, NOW(), %s, %s, %s)")
+            params = (msg_id, session_uuid, user_uuid, role, content, embedding, tg_msg_id, token_count)
+            seq = None
+            if write_through:
+                seq = (self.execute_returning(sql + " RETURNING seq", params) or {}).get("seq")
+            else:
+                self.execute(sql, params)
             self.logger.debug("Message saved successfully with ID: %s", msg_id)
-            
-            # Invalidate cache for this session since we added a new message
-            self.logger.info("[CACHE_DEBUG] New message saved, triggering cache invalidation for session %s", 
+
+            # Update (or invalidate) the history cache of this session since we added a new message
+            self.logger.info("[CACHE_DEBUG] New message saved, updating history cache for session %s",
                            session_uuid)
-            self.invalidate_history_cache(session_uuid)
-            
+            self._write_through_history(session_uuid, seq, role, content)
+
         except Exception as e:
             self.logger.error("Failed to save message: %s", e)
             raise
@@ -347,6 +604,10 @@ class DatabaseManager:
 
     def update_message_analysis(self, msg_id: str, analysis: Dict[str, Any]):
         """Update message with analysis data (intent, emotion, etc.)."""
+        uow = self.current_unit_of_work
+        if uow:
+            uow.update("messages", {"analysis": json.dumps(analysis)}, msg_id)
+            return
         self.execute(
             "UPDATE messages SET analysis = %s WHERE id = %s",
             (json.dumps(analysis), msg_id)
@@ -359,6 +620,11 @@ class DatabaseManager:
     def save_song(self, user_uuid: str, session_uuid: str, task_id: str, title: str, prompt: str, style: str) -> str:
         """Save song generation request and return song ID."""
         song_id = str(uuid.uuid4())
+        uow = self.current_unit_of_work
+        if uow:
+            uow.insert("songs", {"id": song_id, "user_id": user_uuid, "session_id": session_uuid,
+                                 "task_id": task_id, "title": title, "prompt": prompt, "style": style})
+            return song_id
         self.execute(
             "INSERT INTO songs(id, user_id, session_id, task_id, title, prompt, style, created_at)"
             "VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())",
@@ -368,6 +634,10 @@ class DatabaseManager:
 
     def update_song_path(self, task_id: str, path: str):
         """Update song path after processing."""
+        uow = self.current_unit_of_work
+        if uow:
+            uow.update("songs", {"path": path}, task_id, key_column="task_id")
+            return
         self.execute("UPDATE songs SET path = %s WHERE task_id = %s", (path, task_id))
 
     def get_user_by_song_task(self, task_id: str) -> Optional[Dict[str, Any]]:
@@ -407,13 +677,19 @@ class DatabaseManager:
         if warnings == 1 and not blocked:
             # First warning → ban
             self.block_user(tg_user_id, additional_reason)
-            return 1
+            result = 1
         elif warnings >= 2 and not blocked:
             # Second warning → permanent ban
             self.block_user(tg_user_id, additional_reason)
-            return 2
+            result = 2
+        else:
+            result = None
 
-        return None
+        # A second moderate_user in the same unit of work reads warnings from the database
+        uow = self.current_unit_of_work
+        if uow:
+            uow.flush()
+        return result
 
     # ──────────────────────────
     #  INCREMENTAL CACHING OPERATIONS
@@ -464,16 +740,20 @@ class DatabaseManager:
         self.logger.debug("[CACHE_DEBUG] Cache efficiency potential: %.1f%% (stable=%d, total=%d)", 
                          (stable_count / limit_count) * 100, stable_count, limit_count)
         
-        # Try to get stable messages from cache
+        # Try to get stable messages from cache. The generation is read before the rows it
+        # guards: an invalidation that lands after this point makes whatever we cache below
+        # unreachable. With Redis it comes in the same round trip as the stable entry.
         cache_start = datetime.now()
-        stable_messages = self._get_stable_messages_from_cache(session_uuid, stable_count, total_count)
+        generation, prefetched = self._read_history_generation(session_uuid, stable_count, total_count)
+        stable_messages = self._get_stable_messages_from_cache(session_uuid, stable_count, total_count, generation,
+                                                               prefetched)
         cache_time = (datetime.now() - cache_start).total_seconds() * 1000
         
         if stable_messages is None:
             # Case 3a: Cache miss - fetch and store
             self.logger.info("[CACHE_DEBUG] CASE 3a: Cache MISS for stable messages (took %.2fms to check)", cache_time)
             db_start = datetime.now()
-            stable_messages = self._fetch_and_cache_stable_messages(session_uuid, stable_count, total_count)
+            stable_messages = self._fetch_and_cache_stable_messages(session_uuid, stable_count, total_count, generation)
             db_time = (datetime.now() - db_start).total_seconds() * 1000
             self.logger.info("[CACHE_DEBUG] Fetched and cached %d stable messages from DB (took %.2fms)", 
                            len(stable_messages), db_time)
@@ -526,59 +806,26 @@ class DatabaseManager:
     def _fetch_history_direct(self, session_uuid: str, limit_count: int) -> List[Dict[str, str]]:
         """Direct database fetch without caching."""
         
-        self.logger.info("[CACHE_DEBUG] Direct fetch initiated: session=%s, limit=%d", 
-                        session_uuid[:8] + "...", limit_count)
+        self.logger.info("[CACHE_DEBUG] Direct fetch initiated: session=%.8s..., limit=%d", 
+                        session_uuid, limit_count)
         self.logger.debug("[CACHE_DEBUG] Reason for direct fetch: cache bypass or not applicable")
         
-        # Get total count for offset calculation
-        count_start = datetime.now()
-        total_count = self.query_one(
-            "SELECT COUNT(*) as cnt FROM messages WHERE session_id = %s",
-            (session_uuid,)
-        )["cnt"]
-        count_time = (datetime.now() - count_start).total_seconds() * 1000
-        
-        self.logger.debug("[CACHE_DEBUG] Total messages available: %d (count query: %.2fms)", 
-                        total_count, count_time)
-        
-        # Calculate offset and validate parameters
-        offset = max(0, total_count - limit_count)
-        effective_limit = min(limit_count, total_count)
-        
-        self.logger.debug("[CACHE_DEBUG] Query parameters: offset=%d, effective_limit=%d", 
-                        offset, effective_limit)
-        
-        # Validate query logic
-        if total_count == 0:
-            self.logger.warning("[CACHE_DEBUG] CASE A: No messages in session - returning empty list")
-            return []
-        
-        if limit_count > total_count:
-            self.logger.info("[CACHE_DEBUG] CASE B: Requested more messages (%d) than available (%d)", 
-                           limit_count, total_count)
-        
-        if offset > 0:
-            self.logger.debug("[CACHE_DEBUG] CASE C: Using offset %d to get last %d of %d messages", 
-                            offset, effective_limit, total_count)
-        else:
-            self.logger.debug("[CACHE_DEBUG] CASE D: Fetching all available messages (no offset needed)")
-        
-        # Execute main query
+        # Execute main query (newest first over the (session_id, created_at DESC) index, no COUNT/OFFSET)
         query_start = datetime.now()
         try:
-            rows = self.query_all(
-                "SELECT role, content FROM messages WHERE session_id = %s ORDER BY created_at ASC OFFSET %s LIMIT %s",
-                (session_uuid, offset, effective_limit)
-            )
+            rows = self.fetch_last_messages(session_uuid, limit_count)
             query_time = (datetime.now() - query_start).total_seconds() * 1000
             
             self.logger.info("[CACHE_DEBUG] Direct fetch completed: %d messages in %.2fms", 
                            len(rows), query_time)
             
-            # Validate query results
-            if len(rows) != effective_limit and total_count >= effective_limit:
-                self.logger.warning("[CACHE_DEBUG] Query result mismatch: expected %d, got %d", 
-                                  effective_limit, len(rows))
+            if not rows:
+                self.logger.warning("[CACHE_DEBUG] CASE A: No messages in session - returning empty list")
+                return []
+            
+            if len(rows) < limit_count:
+                self.logger.info("[CACHE_DEBUG] CASE B: Requested more messages (%d) than available (%d)", 
+                               limit_count, len(rows))
             
         except Exception as e:
             self.logger.error("[CACHE_DEBUG] CASE E: Direct fetch query failed - %s", e)
@@ -600,14 +847,14 @@ class DatabaseManager:
             self.logger.error("[CACHE_DEBUG] Found %d invalid messages in direct fetch result", invalid_messages)
         
         # Log performance comparison
-        total_time = count_time + query_time + transform_time
+        total_time = query_time + transform_time
         estimated_cache_time = 2.0  # Estimated cache lookup time
         
         self.logger.debug("[CACHE_DEBUG] Direct fetch performance: %.2fms total (%.2fx slower than estimated cache)", 
                         total_time, total_time / estimated_cache_time)
         
-        # Log content statistics
-        if messages:
+        # Log content statistics (computed only when DEBUG is on)
+        if messages and self.logger.isEnabledFor(logging.DEBUG):
             total_content = sum(len(msg["content"]) for msg in messages)
             role_distribution = {}
             for msg in messages:
@@ -619,26 +866,84 @@ class DatabaseManager:
         
         return messages
     
-    def _create_stable_signature(self, session_uuid: str, stable_count: int, total_count: int) -> str:
-        """Create signature for stable messages cache key."""
+    def _create_stable_signature(self, session_uuid: str, stable_count: int, total_count: int,
+                                 generation: str = "0") -> str:
+        """Create signature for stable messages cache key (scoped to the session's generation)."""
         return self.utils.create_content_signature(
-            session_uuid, stable_count, total_count,
+            session_uuid, stable_count, total_count, generation,
             prefix="stable",
             length=16
         )
+
+    def _history_redis(self):
+        """Redis client of the injected CacheManager (None for CacheSQLVecManager and others)."""
+        return getattr(self.cache_manager, "redis_client", None)
+
+    def _stable_cache_signature(self, session_uuid: str, stable_count: int, total_count: int,
+                                generation: str) -> str:
+        """Redis keeps the generation inside the stable entry, other managers key the entry by it."""
+        if self._history_redis() is not None:
+            generation = "0"
+        return self._create_stable_signature(session_uuid, stable_count, total_count, generation)
+
+    def _read_history_generation(self, session_uuid: str, stable_count: int,
+                                 total_count: int) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Generation token of the session and, with Redis, the stable entry in the same pipeline.
+
+        Returns:
+            (generation, entry): entry is the stable entry's text and generation fields
+            ({} if absent), or None when the cache manager is not Redis
+        """
+        client = self._history_redis()
+        if client is None:
+            return self._get_history_generation(session_uuid), None
+        signature = self._stable_cache_signature(session_uuid, stable_count, total_count, "0")
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.get(self.cache_manager._generate_key(self.HISTORY_GENERATION_TENANT, session_uuid))
+            pipe.hmget(self.cache_manager._generate_key("history_stable", signature), "text", "generation", "created_at")
+            raw_generation, fields = pipe.execute()
+        except Exception as e:
+            self.logger.warning("[CACHE_DEBUG] Could not read history generation: %s", e)
+            return "0", {}
+        text, entry_generation, created_at = [v.decode("utf-8") if isinstance(v, bytes) else v for v in fields]
+        generation = raw_generation.decode("utf-8") if isinstance(raw_generation, bytes) else raw_generation
+        if text is None:
+            return generation or "0", {}
+        return generation or "0", {"text": text, "generation": entry_generation or "0",
+                                   "created_at": int(created_at or 0)}
+
+    def _get_history_generation(self, session_uuid: str) -> str:
+        """Current generation token of a session's history cache ("0" until first invalidated)."""
+        try:
+            entry = self.cache_manager.get_cache_by_signature(self.HISTORY_GENERATION_TENANT, session_uuid)
+        except Exception as e:
+            self.logger.warning("[CACHE_DEBUG] Could not read history generation: %s", e)
+            return "0"
+        return (entry or {}).get("text") or "0"
     
-    def _get_stable_messages_from_cache(self, session_uuid: str, stable_count: int, total_count: int) -> Optional[List[Dict[str, str]]]:
-        """Get stable messages from cache."""
+    def _get_stable_messages_from_cache(self, session_uuid: str, stable_count: int, total_count: int,
+                                        generation: str = "0",
+                                        prefetched: Optional[Dict[str, Any]] = None) -> Optional[List[Dict[str, str]]]:
+        """Get stable messages from cache (prefetched: the entry read with the generation, Redis)."""
         try:
-            signature = self._create_stable_signature(session_uuid, stable_count, total_count)
+            signature = self._stable_cache_signature(session_uuid, stable_count, total_count, generation)
             tenant = f"history_stable"
             
             self.logger.debug("[CACHE_DEBUG] Cache lookup: tenant=%s, signature=%s", tenant, signature)
-            self.logger.debug("[CACHE_DEBUG] Signature components: session=%s, stable=%d, total=%d", 
-                            session_uuid[:8] + "...", stable_count, total_count)
+            self.logger.debug("[CACHE_DEBUG] Signature components: session=%.8s..., stable=%d, total=%d", 
+                            session_uuid, stable_count, total_count)
             
             cache_lookup_start = datetime.now()
-            cached_data = self.cache_manager.get_cache_by_signature(tenant, signature)
+            if prefetched is None:
+                cached_data = self.cache_manager.get_cache_by_signature(tenant, signature)
+            elif prefetched and prefetched["generation"] != generation:
+                self.logger.debug("[CACHE_DEBUG] Stable entry of generation %s, session is at %s",
+                                  prefetched["generation"], generation)
+                cached_data = None
+            else:
+                cached_data = prefetched
             lookup_time = (datetime.now() - cache_lookup_start).total_seconds() * 1000
             
             # Case A: No cached data found
@@ -650,7 +955,7 @@ class DatabaseManager:
             # Case B: Cached data exists but missing text field
             if "text" not in cached_data:
                 self.logger.warning("[CACHE_DEBUG] CASE B: Cache data corrupted - missing 'text' field in cached_data")
-                self.logger.debug("[CACHE_DEBUG] Available fields: %s", list(cached_data.keys()))
+                self.logger.debug("[CACHE_DEBUG] Available fields: %s", cached_data.keys())
                 return None
             
             # Case C: Cached data with text field - attempt to parse
@@ -695,7 +1000,7 @@ class DatabaseManager:
                 
             except json.JSONDecodeError as e:
                 self.logger.error("[CACHE_DEBUG] CASE C5: Cache data corrupted - JSON decode error: %s", e)
-                self.logger.debug("[CACHE_DEBUG] Raw cached text: %s", cached_data["text"][:200] + "...")
+                self.logger.debug("[CACHE_DEBUG] Raw cached text: %.200s...", cached_data["text"])
                 return None
             
         except Exception as e:
@@ -703,27 +1008,20 @@ class DatabaseManager:
             self.logger.debug("[CACHE_DEBUG] Exception type: %s", type(e).__name__)
             return None
     
-    def _fetch_and_cache_stable_messages(self, session_uuid: str, stable_count: int, total_count: int) -> List[Dict[str, str]]:
+    def _fetch_and_cache_stable_messages(self, session_uuid: str, stable_count: int, total_count: int,
+                                         generation: str = "0") -> List[Dict[str, str]]:
         """Fetch stable messages from database and cache them."""
         
         self.logger.info("[CACHE_DEBUG] Fetching stable messages from DB: stable_count=%d, total_count=%d", 
                         stable_count, total_count)
         
-        # Calculate database query parameters
-        offset = max(0, total_count - stable_count - self.HISTORY_DYNAMIC_COUNT)
-        
-        self.logger.debug("[CACHE_DEBUG] DB query parameters: OFFSET=%d, LIMIT=%d", offset, stable_count)
-        self.logger.debug("[CACHE_DEBUG] Query logic: offset = max(0, %d - %d - %d) = max(0, %d) = %d", 
-                         total_count, stable_count, self.HISTORY_DYNAMIC_COUNT, 
-                         total_count - stable_count - self.HISTORY_DYNAMIC_COUNT, offset)
+        self.logger.debug("[CACHE_DEBUG] DB query parameters: skip newest %d, LIMIT=%d",
+                         self.HISTORY_DYNAMIC_COUNT, stable_count)
         
         # Execute database query
         db_start = datetime.now()
         try:
-            rows = self.query_all(
-                "SELECT role, content FROM messages WHERE session_id = %s ORDER BY created_at ASC OFFSET %s LIMIT %s",
-                (session_uuid, offset, stable_count)
-            )
+            rows = self.fetch_last_messages(session_uuid, stable_count, skip_newest=self.HISTORY_DYNAMIC_COUNT)
             db_time = (datetime.now() - db_start).total_seconds() * 1000
             
             # Case A: Successful database query
@@ -753,18 +1051,19 @@ class DatabaseManager:
                 self.logger.warning("[CACHE_DEBUG] Message %d has empty content", i)
         
         # Calculate total content size for caching metrics
-        total_content_size = sum(len(msg["content"]) for msg in messages)
-        self.logger.debug("[CACHE_DEBUG] Total content size: %d characters (avg: %.1f per message)", 
-                        total_content_size, total_content_size / len(messages) if messages else 0)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            total_content_size = sum(len(msg["content"]) for msg in messages)
+            self.logger.debug("[CACHE_DEBUG] Total content size: %d characters (avg: %.1f per message)", 
+                            total_content_size, total_content_size / len(messages) if messages else 0)
         
         # Cache the stable messages
         try:
-            signature = self._create_stable_signature(session_uuid, stable_count, total_count)
+            signature = self._stable_cache_signature(session_uuid, stable_count, total_count, generation)
             tenant = f"history_stable"
             user = session_uuid  # Use session as user for cache isolation
             
-            self.logger.debug("[CACHE_DEBUG] Preparing cache storage: tenant=%s, user=%s, signature=%s, ttl=%ds", 
-                            tenant, user[:8] + "...", signature, self.HISTORY_CACHE_TTL)
+            self.logger.debug("[CACHE_DEBUG] Preparing cache storage: tenant=%s, user=%.8s..., signature=%s, ttl=%ds", 
+                            tenant, user, signature, self.HISTORY_CACHE_TTL)
             
             # Serialize message data
             serialize_start = datetime.now()
@@ -774,20 +1073,15 @@ class DatabaseManager:
             self.logger.debug("[CACHE_DEBUG] Serialized %d messages to JSON (%d bytes) in %.2fms", 
                             len(messages), len(serialized_data), serialize_time)
             
-            # Store in cache
+            # Store in cache (no embedding: history is never searched)
             cache_start = datetime.now()
-            cache_key = self.cache_manager.put_cache(
-                tenant=tenant,
-                user=user,
-                key_signature=signature,
-                text=serialized_data,
-                ttl_seconds=self.HISTORY_CACHE_TTL
-            )
+            put_plain_entry(self.cache_manager, tenant, signature, user, serialized_data,
+                            self.HISTORY_CACHE_TTL, generation=generation)
             cache_time = (datetime.now() - cache_start).total_seconds() * 1000
             
             # Case C: Successful cache storage
-            self.logger.info("[CACHE_DEBUG] CASE C: Successfully cached %d stable messages in %.2fms (key: %s)", 
-                           len(messages), cache_time, cache_key)
+            self.logger.info("[CACHE_DEBUG] CASE C: Successfully cached %d stable messages in %.2fms (signature: %s)", 
+                           len(messages), cache_time, signature)
             
             # Log cache efficiency metrics
             total_operation_time = db_time + transform_time + serialize_time + cache_time
@@ -805,8 +1099,8 @@ class DatabaseManager:
     def _fetch_dynamic_messages(self, session_uuid: str, count: int) -> List[Dict[str, str]]:
         """Fetch the most recent messages (dynamic part)."""
         
-        self.logger.debug("[CACHE_DEBUG] Fetching dynamic messages: session=%s, count=%d", 
-                        session_uuid[:8] + "...", count)
+        self.logger.debug("[CACHE_DEBUG] Fetching dynamic messages: session=%.8s..., count=%d", 
+                        session_uuid, count)
         
         # Execute query for most recent messages
         query_start = datetime.now()
@@ -851,8 +1145,8 @@ class DatabaseManager:
             elif not msg["content"]:
                 self.logger.warning("[CACHE_DEBUG] CASE C3: Dynamic message %d has empty content", i)
         
-        # Log content statistics
-        if messages:
+        # Log content statistics (computed only when DEBUG is on)
+        if messages and self.logger.isEnabledFor(logging.DEBUG):
             total_chars = sum(len(msg["content"]) for msg in messages)
             avg_chars = total_chars / len(messages)
             self.logger.debug("[CACHE_DEBUG] Dynamic messages stats: %d messages, %d total chars, %.1f avg chars", 
@@ -868,95 +1162,74 @@ class DatabaseManager:
         return messages
     
     def invalidate_history_cache(self, session_uuid: str):
-        """Invalidate history cache for a session when new messages are added."""
+        """
+        Invalidate the history cache of one session.
+
+        Segmented cache: only the session's tail is dropped, segments never change.
+
+        Stable/dynamic scheme: writes a new generation token for the session;
+        its stable entries are keyed by the token (see _create_stable_signature),
+        so the old ones become unreachable and expire by TTL. Other sessions
+        keep their entries, and the cost is one cache write whatever the cache size.
+        """
+        if self.history_segments is not None:
+            self.history_segments.drop_tail(session_uuid)
+            self.logger.debug("[CACHE_DEBUG] History tail of session %.8s... dropped", session_uuid)
+            return
         if not self.cache_manager:
             self.logger.debug("[CACHE_DEBUG] CASE A: No cache manager available, skipping cache invalidation")
             return
-            
+
+        # A fresh random token instead of a counter: no read-modify-write race between
+        # concurrent writers, and a token never comes back after the entry expires
+        generation = uuid.uuid4().hex[:12]
         try:
-            # Clear all stable cache entries for this session
-            tenant = f"history_stable"
-            
-            self.logger.info("[CACHE_DEBUG] Starting cache invalidation for session %s (tenant: %s)", 
-                           session_uuid[:8] + "...", tenant)
-            
-            # Check cache status before invalidation
-            pre_invalidation_start = datetime.now()
-            try:
-                cache_stats = self.cache_manager.get_cache_stats(tenant)
-                pre_entries = cache_stats.get("tenant_documents", "unknown")
-                self.logger.debug("[CACHE_DEBUG] Pre-invalidation: %s cache entries exist", pre_entries)
-            except Exception as e:
-                self.logger.warning("[CACHE_DEBUG] Could not get pre-invalidation stats: %s", e)
-                pre_entries = "unknown"
-            
-            # Perform cache invalidation
             invalidation_start = datetime.now()
-            cleared = self.cache_manager.clear_tenant_cache(tenant)
-            invalidation_time = (datetime.now() - invalidation_start).total_seconds() * 1000
-            
-            # Analyze invalidation results
-            if cleared > 0:
-                self.logger.info("[CACHE_DEBUG] CASE B: Cache invalidation successful - cleared %d entries in %.2fms", 
-                               cleared, invalidation_time)
-                
-                # Calculate invalidation efficiency
-                if isinstance(pre_entries, int) and pre_entries > 0:
-                    efficiency = (cleared / pre_entries) * 100
-                    self.logger.debug("[CACHE_DEBUG] Invalidation efficiency: %.1f%% (%d/%d entries)", 
-                                    efficiency, cleared, pre_entries)
-                
-                # Log cache impact assessment
-                if cleared >= 10:
-                    self.logger.warning("[CACHE_DEBUG] Large cache invalidation - %d entries cleared, may impact performance temporarily", cleared)
-                elif cleared >= 5:
-                    self.logger.info("[CACHE_DEBUG] Moderate cache invalidation - %d entries cleared", cleared)
-                else:
-                    self.logger.debug("[CACHE_DEBUG] Small cache invalidation - %d entries cleared", cleared)
-                    
-            elif cleared == 0:
-                self.logger.info("[CACHE_DEBUG] CASE C: No cache entries to clear (%.2fms) - cache was already empty or clean", 
-                               invalidation_time)
-                self.logger.debug("[CACHE_DEBUG] This is normal for new sessions or after previous invalidations")
+            # Must outlive every stable entry written under the previous token
+            client = self._history_redis()
+            if client is not None:
+                # A plain string, read with GET in the pipeline of _read_history_generation
+                client.set(self.cache_manager._generate_key(self.HISTORY_GENERATION_TENANT, session_uuid),
+                           generation, ex=self.HISTORY_CACHE_TTL)
             else:
-                self.logger.warning("[CACHE_DEBUG] CASE D: Unexpected invalidation result - cleared=%s", cleared)
-            
-            # Verify post-invalidation state
-            try:
-                post_stats = self.cache_manager.get_cache_stats(tenant)
-                post_entries = post_stats.get("tenant_documents", "unknown")
-                self.logger.debug("[CACHE_DEBUG] Post-invalidation: %s cache entries remain", post_entries)
-                
-                if isinstance(post_entries, int) and post_entries > 0:
-                    self.logger.info("[CACHE_DEBUG] Cache not fully cleared - %d entries remain (other sessions)", post_entries)
-            except Exception as e:
-                self.logger.debug("[CACHE_DEBUG] Could not verify post-invalidation state: %s", e)
-            
-            # Log invalidation frequency insight
-            current_time = datetime.now().timestamp()
-            last_invalidation_key = f"_last_invalidation_{session_uuid[:8]}"
-            
-            if hasattr(self, '_last_invalidations'):
-                last_time = getattr(self, '_last_invalidations', {}).get(last_invalidation_key, 0)
-                if last_time > 0:
-                    time_since_last = current_time - last_time
-                    self.logger.debug("[CACHE_DEBUG] Time since last invalidation: %.1f seconds", time_since_last)
-                    
-                    if time_since_last < 60:  # Less than 1 minute
-                        self.logger.warning("[CACHE_DEBUG] Frequent invalidation detected - %.1f seconds since last", time_since_last)
-                    elif time_since_last > 3600:  # More than 1 hour
-                        self.logger.debug("[CACHE_DEBUG] Infrequent invalidation - good cache utilization")
-            else:
-                self._last_invalidations = {}
-            
-            # Record this invalidation
-            self._last_invalidations[last_invalidation_key] = current_time
-                
+                put_plain_entry(self.cache_manager, self.HISTORY_GENERATION_TENANT, session_uuid, session_uuid,
+                                generation, self.HISTORY_CACHE_TTL)
+            invalidation_time = (datetime.now() - invalidation_start).total_seconds() * 1000
+            self.logger.info("[CACHE_DEBUG] CASE B: History cache of session %.8s... invalidated (generation %s, %.2fms)",
+                           session_uuid, generation, invalidation_time)
         except Exception as e:
             self.logger.error("[CACHE_DEBUG] CASE E: Cache invalidation failed with exception: %s", e)
             self.logger.debug("[CACHE_DEBUG] Exception type: %s", type(e).__name__)
             self.logger.warning("[CACHE_DEBUG] Cache may be in inconsistent state - monitor for cache misses")
     
+    # Sessions with the newest messages: the ones whose history is in the cache
+    RECENT_SESSIONS_SQL = (
+        "SELECT session_id FROM messages WHERE created_at > NOW() - %s * INTERVAL '1 second' "
+        "GROUP BY session_id ORDER BY MAX(created_at) DESC LIMIT %s"
+    )
+
+    def check_history_cache(self, sample_size: int = 20, limit_count: Optional[int] = None,
+                            repair: bool = False) -> Dict[str, Any]:
+        """
+        Compare the cached history of recently active sessions with the database.
+
+        Args:
+            sample_size: Number of sessions to check
+            limit_count: History window to compare (HISTORY_CACHE_N by default)
+            repair: Drop the cached tail/segment of sessions that drifted
+
+        Returns:
+            Report of history_segments.check_consistency, or {"enabled": False}
+        """
+        if self.history_segments is None:
+            return {"enabled": False}
+        rows = self.query_all(self.RECENT_SESSIONS_SQL, (self.HISTORY_CACHE_TTL, sample_size))
+        report = check_consistency(self.history_segments, [str(r["session_id"]) for r in rows],
+                                   limit_count or self.HISTORY_CACHE_N, repair=repair)
+        self.logger.info("[CACHE_DEBUG] History cache check: %d sessions, %d ok, %d not cached, %d stale, %d drift",
+                         report["checked"], report["ok"], report["not_cached"], report["stale"], report["drift"])
+        return report
+
     def get_cache_status(self) -> Dict[str, Any]:
         """Get detailed cache status for debugging purposes."""
         status = {
@@ -967,7 +1240,8 @@ class DatabaseManager:
                 "dynamic_count": self.HISTORY_DYNAMIC_COUNT
             },
             "cache_health": None,
-            "cache_stats": None
+            "cache_stats": None,
+            "history_segments": self.history_segments.get_stats() if self.history_segments else None,
         }
         
         if self.cache_manager:
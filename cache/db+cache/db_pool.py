@@ -0,0 +1,239 @@
+"""
+PostgreSQL connection pool
+
+Keeps psycopg2 connections warm between invocations of the serverless function.
+
+This module contains:
+- PgConnectionPool: thread-safe pool with health checks, max lifetime and reconnect on broken connections
+- get_pool(): module-level registry so every DatabaseManager in a container shares one pool
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from psycopg2 import connect, Error as PgError, InterfaceError, OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PooledConnection:
+    """psycopg2 connection plus the bookkeeping the pool needs."""
+
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PgConnectionPool:
+    """
+    Pool of psycopg2 connections.
+
+    - Idle connections are reused LIFO, so the warmest connection goes out first.
+    - A connection idle for longer than health_check_interval is pinged with SELECT 1 before checkout.
+    - A connection older than max_lifetime is closed instead of being reused.
+    - run(idempotent=True) retries once on a fresh connection when the old one turns out to be broken.
+    """
+
+    def __init__(self,
+                 conn_params: Dict[str, Any],
+                 maxconn: int = 4,
+                 max_lifetime: int = 1800,
+                 health_check_interval: int = 30,
+                 logger: Optional[logging.Logger] = None,
+                 connect_fn: Callable[..., Any] = connect):
+        """
+        Args:
+            conn_params: Keyword arguments for psycopg2.connect
+            maxconn: Maximum number of idle connections kept in the pool
+            max_lifetime: Seconds after which a connection is recycled
+            health_check_interval: Idle seconds after which a connection is pinged before reuse
+            logger: Optional logger instance
+            connect_fn: Connection factory (psycopg2.connect by default)
+        """
+        self.conn_params = conn_params
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._connect = connect_fn
+        self._idle: deque = deque()
+        self._lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "reused": 0,
+            "created": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "reconnects": 0,
+        }
+
+    # ──────────────────────────
+    #  CONNECTION LIFECYCLE
+    # ──────────────────────────
+
+    def _new_connection(self) -> PooledConnection:
+        try:
+            conn = self._connect(**self.conn_params)
+            conn.set_client_encoding('UTF8')
+        except PgError as e:
+            self.logger.exception("Failed to connect to Postgres: %s", e)
+            raise
+        with self._lock:
+            self._stats["created"] += 1
+        return PooledConnection(conn)
+
+    def _close(self, pooled: PooledConnection):
+        with self._lock:
+            self._stats["discarded"] += 1
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, pooled: PooledConnection, now: float) -> bool:
+        return now - pooled.created_at > self.max_lifetime
+
+    def _is_healthy(self, pooled: PooledConnection, now: float) -> bool:
+        """Check that an idle connection is still usable."""
+        if pooled.conn.closed:
+            return False
+        if now - pooled.last_used < self.health_check_interval:
+            return True
+        try:
+            with pooled.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            pooled.conn.rollback()
+            return True
+        except (OperationalError, InterfaceError) as e:
+            self.logger.debug("Pooled connection failed health check: %s", e)
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def getconn(self) -> PooledConnection:
+        """Check out a healthy connection, creating one if the pool is empty."""
+        now = time.monotonic()
+        with self._lock:
+            self._stats["checkouts"] += 1
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return self._new_connection()
+            if self._is_expired(pooled, now) or not self._is_healthy(pooled, now):
+                self._close(pooled)
+                continue
+            with self._lock:
+                self._stats["reused"] += 1
+            return pooled
+
+    def putconn(self, pooled: PooledConnection, discard: bool = False):
+        """Return a connection to the pool (or close it if it is broken, old or surplus)."""
+        conn = pooled.conn
+        now = time.monotonic()
+        if discard or conn.closed or self._is_expired(pooled, now):
+            self._close(pooled)
+            return
+        try:
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except (OperationalError, InterfaceError):
+            self._close(pooled)
+            return
+        pooled.last_used = now
+        with self._lock:
+            if len(self._idle) < self.maxconn:
+                self._idle.append(pooled)
+                return
+        self._close(pooled)
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a raw psycopg2 connection from the pool."""
+        pooled = self.getconn()
+        broken = False
+        try:
+            yield pooled.conn
+        except (OperationalError, InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(pooled, discard=broken or bool(pooled.conn.closed))
+
+    def run(self, fn: Callable[[Any], Any], idempotent: bool = False) -> Any:
+        """
+        Call fn(conn) on a pooled connection.
+
+        If the connection dies underneath us (server restart, idle timeout on a
+        NAT/proxy, broken pipe) the idle pool is dropped. The call is retried once
+        on a fresh connection only when idempotent=True: a write may already have
+        been committed when the socket broke, so replaying it could duplicate it.
+        Errors raised while the connection is still open are not retried.
+        """
+        try:
+            with self.connection() as conn:
+                return fn(conn)
+        except (OperationalError, InterfaceError) as e:
+            # Server-side errors carry a SQLSTATE; a dropped socket does not
+            if not self._last_error_was_disconnect(e):
+                raise
+            self.clear()
+            if not idempotent:
+                self.logger.warning("Postgres connection lost (%s), not retrying a write", e)
+                raise
+            self.logger.warning("Postgres connection lost (%s), reconnecting", e)
+            with self._lock:
+                self._stats["reconnects"] += 1
+            with self.connection() as conn:
+                return fn(conn)
+
+    @staticmethod
+    def _last_error_was_disconnect(error: Exception) -> bool:
+        if isinstance(error, InterfaceError):
+            return True
+        return getattr(error, "pgcode", None) is None
+
+    def clear(self):
+        """Close every idle connection (e.g. after the server went away)."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            self._close(pooled)
+
+    # ──────────────────────────
+    #  METRICS
+    # ──────────────────────────
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return pool counters including the connection reuse rate."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        stats["reuse_rate"] = stats["reused"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+
+_pools: Dict[tuple, PgConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_params: Dict[str, Any], **kwargs) -> PgConnectionPool:
+    """
+    Return the process-wide pool for conn_params, creating it on first use.
+
+    Module globals survive warm invocations, so the pool (and its open
+    connections) is reused by every request handled by the same container.
+    """
+    key = tuple(sorted((k, str(v)) for k, v in conn_params.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = PgConnectionPool(conn_params, **kwargs)
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for the PostgreSQL connection pool.
+
+Uses fake connections, so no database is required.
+"""
+
+import os
+import sys
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db_pool import PgConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        if self.conn.broken:
+            self.conn.closed = 2
+            raise OperationalError("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+
+    def set_client_encoding(self, encoding):
+        pass
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect_fn(**params):
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    return PgConnectionPool({"dsn": "fake"}, connect_fn=connect_fn, **kwargs), created
+
+
+def select_one(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1")
+    return 1
+
+
+def test_connections_are_reused():
+    pool, created = make_pool()
+    for _ in range(10):
+        assert pool.run(select_one) == 1
+
+    stats = pool.get_stats()
+    assert len(created) == 1
+    assert stats["checkouts"] == 10
+    assert stats["reused"] == 9
+    assert stats["reuse_rate"] == 0.9
+
+
+def test_expired_connection_is_recycled():
+    pool, created = make_pool(max_lifetime=0)
+    pool.run(select_one)
+    pool.run(select_one)
+
+    assert len(created) == 2
+    assert created[0].closed
+
+
+def test_unhealthy_idle_connection_is_replaced():
+    pool, created = make_pool(health_check_interval=0)
+    pool.run(select_one)
+    created[0].broken = True
+
+    assert pool.run(select_one) == 1
+    assert len(created) == 2
+    assert pool.get_stats()["health_check_failures"] == 1
+
+
+def test_broken_connection_is_retried_once():
+    pool, created = make_pool(health_check_interval=3600)
+    pool.run(select_one)
+    created[0].broken = True
+
+    assert pool.run(select_one, idempotent=True) == 1
+    stats = pool.get_stats()
+    assert stats["reconnects"] == 1
+    assert len(created) == 2
+
+
+def test_broken_connection_is_not_retried_for_writes():
+    pool, created = make_pool(health_check_interval=3600)
+    pool.run(select_one)
+    created[0].broken = True
+    calls = []
+
+    def insert(conn):
+        calls.append(conn)
+        return select_one(conn)
+
+    try:
+        pool.run(insert)
+    except OperationalError:
+        pass
+    else:
+        raise AssertionError("write was retried")
+    assert len(calls) == 1
+    assert pool.get_stats()["reconnects"] == 0
+    assert pool.get_stats()["idle"] == 0
+
+
+def test_pool_keeps_at_most_maxconn_idle():
+    pool, created = make_pool(maxconn=1)
+    first = pool.getconn()
+    second = pool.getconn()
+    pool.putconn(first)
+    pool.putconn(second)
+
+    assert pool.get_stats()["idle"] == 1
+    assert second.conn.closed
+
+
+if __name__ == "__main__":
+    test_connections_are_reused()
+    test_expired_connection_is_recycled()
+    test_unhealthy_idle_connection_is_replaced()
+    test_broken_connection_is_retried_once()
+    test_broken_connection_is_not_retried_for_writes()
+    test_pool_keeps_at_most_maxconn_idle()
+    print("✅ Connection pool tests passed!")
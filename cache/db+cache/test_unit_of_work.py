@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-request write buffer.
+
+Uses a fake pool that records statements, so no database is required.
+"""
+
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import unit_of_work
+from unit_of_work import UnitOfWork
+
+
+class RecordingCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        self.log.append(("execute", sql, params))
+
+
+class RecordingConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.log.append(("rollback",) if exc_type else ("commit",))
+        return False
+
+    def cursor(self):
+        return RecordingCursor(self.log)
+
+
+class RecordingPool:
+    def __init__(self):
+        self.log = []
+
+    def run(self, fn):
+        return fn(RecordingConnection(self.log))
+
+
+def fake_execute_values(cur, sql, rows, template=None, page_size=100):
+    cur.log.append(("execute_values", sql, [list(r) for r in rows], template))
+
+
+def test_turn_is_one_commit_with_multi_row_inserts():
+    pool = RecordingPool()
+    uow = UnitOfWork(pool)
+    uow.insert("messages", {"id": "m1", "role": "user", "content": "hi"})
+    uow.update("messages", {"analysis": "{}"}, "m1")
+    uow.insert("songs", {"id": "s1", "task_id": "t1"})
+    uow.insert("messages", {"id": "m2", "role": "assistant", "content": "a"})
+    uow.insert("messages", {"id": "m3", "role": "assistant", "content": "b"})
+
+    with patch.object(unit_of_work, "execute_values", fake_execute_values):
+        assert uow.flush() == 3
+
+    assert pool.log.count(("commit",)) == 1
+    inserts = [entry for entry in pool.log if entry[0] == "execute_values"]
+    # The analysis update is merged into the pending user message
+    assert "analysis" in inserts[0][1]
+    assert inserts[2][2] == [["m2", "assistant", "a", 2], ["m3", "assistant", "b", 3]]
+    assert "NOW() + %s * INTERVAL '1 microsecond'" in inserts[2][3]
+    assert uow.pending == 0
+
+
+def test_updates_of_flushed_rows_are_merged_and_run_after_flush_callbacks():
+    pool = RecordingPool()
+    uow = UnitOfWork(pool)
+    calls = []
+    uow.update("tg_users", {"warnings": 2}, "42")
+    uow.update("tg_users", {"blocked": True}, "42")
+    uow.after_flush(lambda: calls.append("invalidate"))
+
+    assert uow.flush() == 1
+    (_, sql, params), = [entry for entry in pool.log if entry[0] == "execute"]
+    assert sql == "UPDATE tg_users SET warnings = %s, blocked = %s WHERE id = %s"
+    assert params == (2, True, "42")
+    assert calls == ["invalidate"]
+
+
+def test_returning_fills_pending_rows_before_after_flush_callbacks():
+    pool = RecordingPool()
+    uow = UnitOfWork(pool)
+    seen = []
+
+    def execute_values_with_seq(cur, sql, rows, template=None, page_size=100, fetch=False):
+        cur.log.append(("execute_values", sql, [list(r) for r in rows], template))
+        return [(row[0], 41 + n) for n, row in enumerate(rows)] if fetch else None
+
+    user = uow.insert("messages", {"id": "m1", "role": "user", "content": "hi"}, returning="seq")
+    reply = uow.insert("messages", {"id": "m2", "role": "assistant", "content": "a"}, returning="seq")
+    uow.insert("messages", {"id": "m3", "role": "assistant", "content": "b"})
+    uow.after_flush(lambda: seen.append((user["seq"], reply["seq"])))
+
+    with patch.object(unit_of_work, "execute_values", execute_values_with_seq):
+        assert uow.flush() == 2  # a row without RETURNING is a separate statement
+
+    inserts = [entry for entry in pool.log if entry[0] == "execute_values"]
+    assert inserts[0][1].endswith("RETURNING id, seq") and "RETURNING" not in inserts[1][1]
+    assert seen == [(41, 42)]
+
+
+class FailingPool(RecordingPool):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def run(self, fn):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("connection lost")
+        return super().run(fn)
+
+
+def test_failed_flush_keeps_operations_for_the_next_flush():
+    pool = FailingPool(failures=1)
+    uow = UnitOfWork(pool)
+    calls = []
+    uow.insert("messages", {"id": "m1", "role": "user", "content": "hi"})
+    uow.update("tg_users", {"warnings": 1}, "42")
+    uow.after_flush(lambda: calls.append("invalidate"))
+
+    with patch.object(unit_of_work, "execute_values", fake_execute_values):
+        try:
+            uow.flush()
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("flush failure was swallowed")
+        assert uow.describe_pending() == ["insert messages m1", "update tg_users id=42"]
+        assert calls == []
+
+        assert uow.flush() == 2
+    assert uow.pending == 0
+    assert calls == ["invalidate"]
+
+
+def test_unknown_table_is_rejected():
+    uow = UnitOfWork(RecordingPool())
+    try:
+        uow.insert("users", {"id": 1})
+    except ValueError:
+        return
+    raise AssertionError("users is not buffered")
+
+
+if __name__ == "__main__":
+    test_turn_is_one_commit_with_multi_row_inserts()
+    test_updates_of_flushed_rows_are_merged_and_run_after_flush_callbacks()
+    test_returning_fills_pending_rows_before_after_flush_callbacks()
+    test_failed_flush_keeps_operations_for_the_next_flush()
+    test_unknown_table_is_rejected()
+    print("✅ Unit of work tests passed!")
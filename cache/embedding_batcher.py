@@ -0,0 +1,152 @@
+"""
+Micro-batching of embedding requests
+
+The embeddings endpoint takes an array of inputs, and one call for 64 texts
+costs about as long as a call for one. Single requests arriving at the same
+time (parallel handlers, fan-out) are held for a few milliseconds and sent
+together.
+
+This module contains:
+- EmbeddingBatcher: queue that groups concurrent embed() calls by model/key,
+  de-duplicates texts and dispatches one embed_many call per group, with up
+  to max_in_flight calls running at once
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+EmbedMany = Callable[[List[str], Hashable], List[List[float]]]
+
+
+class EmbeddingBatcher:
+    """
+    Collects embed() calls for up to max_wait_ms (or max_batch texts) and
+    sends them as one request.
+
+    - The first queued text opens a window; the batch leaves when the window
+      closes or max_batch distinct texts of one group are waiting.
+    - Texts are grouped by `group` (e.g. model and API key); every group is one call.
+    - Equal texts in a window share one input and one result.
+    - A failed call fails the futures of its batch only.
+    - Batches are sent from a small pool, so texts arriving during a round trip
+      form the next batch and go out without waiting for the previous one.
+    """
+
+    def __init__(self,
+                 embed_many: EmbedMany,
+                 max_batch: int = 64,
+                 max_wait_ms: float = 5.0,
+                 max_in_flight: int = 4,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            embed_many: embed_many(texts, group) -> vectors in the same order
+            max_batch: Distinct texts per request
+            max_wait_ms: How long the first text of a batch waits for company
+            max_in_flight: embed_many calls allowed to run at the same time
+            logger: Optional logger instance
+        """
+        self.embed_many = embed_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.logger = logger or logging.getLogger(__name__)
+
+        # group -> text -> futures waiting for it (dicts keep arrival order)
+        self._pending: Dict[Hashable, Dict[str, List[Future]]] = {}
+        self._window_opened_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {"requests": 0, "deduplicated": 0, "batches": 0, "texts_sent": 0, "failed_batches": 0}
+
+        self._sender = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedding-batch")
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str, group: Hashable = None) -> Future:
+        """Queue one text; the Future resolves to its vector."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            waiting = self._pending.setdefault(group, {})
+            if text in waiting:
+                self._stats["deduplicated"] += 1
+            waiting.setdefault(text, []).append(future)
+            self._stats["requests"] += 1
+            if self._window_opened_at is None:
+                self._window_opened_at = time.monotonic()
+            self._cond.notify()
+        return future
+
+    def embed(self, text: str, group: Hashable = None, timeout: Optional[float] = None) -> List[float]:
+        """Queue one text and wait for its vector."""
+        return self.submit(text, group).result(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+        stats["avg_batch_size"] = round(stats["texts_sent"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def close(self) -> None:
+        """Send what is queued, wait for the calls in flight, then stop."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+        self._sender.shutdown(wait=True)
+
+    def _take_ready(self) -> List[Tuple[Hashable, Dict[str, List[Future]]]]:
+        """Batches to send now: full groups, or everything once the window has closed."""
+        window_closed = self._closed or time.monotonic() - self._window_opened_at >= self.max_wait
+        batches = []
+        for group in list(self._pending):
+            waiting = self._pending[group]
+            while len(waiting) >= self.max_batch or (waiting and window_closed):
+                texts = list(waiting)[:self.max_batch]
+                batches.append((group, {text: waiting.pop(text) for text in texts}))
+            if not waiting:
+                del self._pending[group]
+        if not self._pending:
+            self._window_opened_at = None
+        return batches
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                while not self._closed and all(len(w) < self.max_batch for w in self._pending.values()):
+                    remaining = self.max_wait - (time.monotonic() - self._window_opened_at)
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batches = self._take_ready()
+            for group, waiting in batches:
+                self._sender.submit(self._send, group, waiting)
+
+    def _send(self, group: Hashable, waiting: Dict[str, List[Future]]) -> None:
+        texts = list(waiting)
+        try:
+            vectors = self.embed_many(texts, group)
+            if len(vectors) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            self.logger.warning("Embedding batch of %d failed: %s", len(texts), e)
+            with self._cond:
+                self._stats["failed_batches"] += 1
+            for futures in waiting.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+        with self._cond:
+            self._stats["batches"] += 1
+            self._stats["texts_sent"] += len(texts)
+        for text, vector in zip(texts, vectors):
+            for future in waiting[text]:
+                future.set_result(vector)
@@ -0,0 +1,175 @@
+"""
+Content-addressed cache keys and a shared embedding store
+
+Cache keys used to be built with hash(), which is salted per process: a key
+written by one container was never found by another, and every cold start
+began with an empty cache.
+
+This module contains:
+- normalize_text(): the form of a text that is hashed (and embedded)
+- content_hash() / embedding_key() / llm_cache_key(): stable BLAKE2b keys
+- pack_vector() / unpack_vector(): float32 or float16 vectors as bytes
+- EmbeddingStore: one vector per unique (text, model, dimensions), shared by all
+  tenants and users; in-process LRU in front of a Redis-like client, hit/miss counters
+"""
+
+import hashlib
+import json
+import logging
+import re
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Union
+
+KEY_VERSION = "v1"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """NFC, trimmed, runs of whitespace collapsed to one space."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def content_hash(*parts: Any) -> str:
+    """BLAKE2b-128 hex digest of the parts (unit separator between them)."""
+    h = hashlib.blake2b(digest_size=16)
+    for i, part in enumerate(parts):
+        if i:
+            h.update(b"\x1f")
+        h.update(str(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+def embedding_key(text: str, model: str, dimensions: int) -> str:
+    """Key of the embedding of `text`, the same in every process."""
+    return f"emb:{KEY_VERSION}:{model}:{dimensions}:{content_hash(normalize_text(text), model, dimensions)}"
+
+
+def llm_cache_key(messages: List[Dict[str, Any]], model: str, **params: Any) -> str:
+    """Key of an LLM answer: messages, model and request parameters that change the answer."""
+    payload = json.dumps({"messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return f"llm_response:{KEY_VERSION}:{model}:{content_hash(payload, model)}"
+
+
+_FORMATS = {"f32": ("f", 4), "f16": ("e", 2)}
+
+
+def pack_vector(vec: List[float], dtype: str = "f32") -> bytes:
+    """Little-endian float32 ("f32") or float16 ("f16") bytes."""
+    code, _ = _FORMATS[dtype]
+    return struct.pack(f"<{len(vec)}{code}", *vec)
+
+
+def unpack_vector(data: bytes, dtype: str = "f32") -> List[float]:
+    code, size = _FORMATS[dtype]
+    return list(struct.unpack(f"<{len(data) // size}{code}", data))
+
+
+class EmbeddingStore:
+    """
+    Embeddings by content key, stored once whoever asked for them.
+
+    Lookups go to a bounded in-process LRU first, then to `client` (anything
+    with redis-py's get/set). Vectors are stored packed: 4 bytes per dimension
+    as float32 or 2 as float16. Backend errors count as misses, so a broken
+    Redis degrades to calling the embeddings API.
+    """
+
+    DTYPES = tuple(_FORMATS)
+
+    def __init__(self,
+                 client: Union[Any, Callable[[], Any], None] = None,
+                 dtype: str = "f32",
+                 ttl_seconds: Optional[int] = None,
+                 local_size: int = 1024,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            client: Redis-like client, or a callable returning one (resolved on first use); None keeps the LRU only
+            dtype: "f32" or "f16"
+            ttl_seconds: Expiry of stored vectors (None: keep them)
+            local_size: Vectors kept in the in-process LRU
+            logger: Optional logger instance
+        """
+        if dtype not in self.DTYPES:
+            raise ValueError(f"dtype must be one of {self.DTYPES}, got {dtype!r}")
+        self._client = client
+        self.dtype = dtype
+        self.ttl_seconds = ttl_seconds
+        self.local_size = local_size
+        self.logger = logger or logging.getLogger(__name__)
+        self._local: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "local_hits": 0, "misses": 0, "stores": 0, "errors": 0, "bytes_stored": 0}
+
+    @property
+    def client(self):
+        if callable(self._client) and not hasattr(self._client, "get"):
+            self._client = self._client()
+        return self._client
+
+    def _storage_key(self, key: str) -> str:
+        return f"{key}:{self.dtype}"
+
+    def _remember(self, key: str, vec: List[float]) -> None:
+        with self._lock:
+            self._local[key] = vec
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Cached vector for `key`, or None."""
+        with self._lock:
+            vec = self._local.get(key)
+            if vec is not None:
+                self._local.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["local_hits"] += 1
+                return vec
+        data = None
+        if self._client is not None:
+            try:
+                data = self.client.get(self._storage_key(key))
+            except Exception as e:
+                self._count("errors")
+                self.logger.warning("Embedding store read failed: %s", e)
+        if not data:
+            self._count("misses")
+            return None
+        vec = unpack_vector(data, self.dtype)
+        self._remember(key, vec)
+        self._count("hits")
+        return vec
+
+    def put(self, key: str, vec: List[float]) -> None:
+        """Store the vector for `key` (locally and in the backend)."""
+        data = pack_vector(vec, self.dtype)
+        # Keep what a later get() would return (float16 rounds)
+        self._remember(key, unpack_vector(data, self.dtype))
+        if self._client is None:
+            return
+        try:
+            self.client.set(self._storage_key(key), data, ex=self.ttl_seconds)
+        except Exception as e:
+            self._count("errors")
+            self.logger.warning("Embedding store write failed: %s", e)
+            return
+        with self._lock:
+            self._stats["stores"] += 1
+            self._stats["bytes_stored"] += len(data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus hit_rate over all lookups."""
+        with self._lock:
+            stats = dict(self._stats, local_size=len(self._local))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
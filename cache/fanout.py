@@ -0,0 +1,117 @@
+"""
+Concurrent fan-out of independent calls
+
+Runs independent, I/O-bound calls (LLM classifications, analyzers) on a shared
+thread pool and collects whatever finished before the deadline.
+
+This module contains:
+- FanOutResult: results, errors and timed-out call names of one fan-out
+- FanOutExecutor: thread-pool executor with per-call deadlines and partial results
+- get_default_executor(): process-wide executor reused across warm invocations
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+
+class FanOutResult:
+    """Outcome of a fan-out: successful results plus the names that failed or timed out."""
+
+    def __init__(self):
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.timed_out: List[str] = []
+        self.elapsed_ms: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        """True if every call returned before its deadline without raising."""
+        return not self.errors and not self.timed_out
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.results.get(name, default)
+
+    def __repr__(self) -> str:
+        return (f"FanOutResult(ok={sorted(self.results)}, errors={sorted(self.errors)}, "
+                f"timed_out={self.timed_out}, elapsed_ms={self.elapsed_ms:.1f})")
+
+
+class FanOutExecutor:
+    """
+    Run several independent callables concurrently.
+
+    Every call gets its own deadline measured from the start of the fan-out.
+    Calls that miss their deadline are reported in FanOutResult.timed_out and
+    left to finish in the background; their results are discarded.
+    """
+
+    def __init__(self, max_workers: int = 8, default_timeout: float = 10.0,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            max_workers: Size of the shared thread pool
+            default_timeout: Deadline in seconds for calls without their own deadline
+            logger: Optional logger instance
+        """
+        self.default_timeout = default_timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout")
+
+    def run(self,
+            calls: Dict[str, Callable[[], Any]],
+            timeouts: Optional[Dict[str, float]] = None,
+            timeout: Optional[float] = None) -> FanOutResult:
+        """
+        Start all calls at once and wait for them.
+
+        Args:
+            calls: Mapping name -> zero-argument callable
+            timeouts: Optional per-call deadlines in seconds
+            timeout: Deadline for calls not listed in timeouts (defaults to default_timeout)
+
+        Returns:
+            FanOutResult with whatever finished in time
+        """
+        timeouts = timeouts or {}
+        fallback_timeout = self.default_timeout if timeout is None else timeout
+        result = FanOutResult()
+        started = time.monotonic()
+
+        futures = {name: self._executor.submit(fn) for name, fn in calls.items()}
+        deadlines = {name: started + timeouts.get(name, fallback_timeout) for name in futures}
+
+        # Wait in deadline order so one slow call never eats another call's budget
+        for name in sorted(futures, key=deadlines.get):
+            remaining = max(0.0, deadlines[name] - time.monotonic())
+            try:
+                result.results[name] = futures[name].result(timeout=remaining)
+            except FutureTimeoutError:
+                result.timed_out.append(name)
+                self.logger.warning("Fan-out call %s missed its %.1fs deadline",
+                                    name, deadlines[name] - started)
+            except Exception as e:
+                result.errors[name] = e
+                self.logger.error("Fan-out call %s failed: %s", name, e)
+
+        result.elapsed_ms = (time.monotonic() - started) * 1000
+        self.logger.debug("Fan-out finished: %s", result)
+        return result
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
+
+
+_default_executor: Optional[FanOutExecutor] = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor(logger: Optional[logging.Logger] = None) -> FanOutExecutor:
+    """Return the process-wide executor; module globals survive warm invocations."""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = FanOutExecutor(logger=logger)
+        return _default_executor
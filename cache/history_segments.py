@@ -0,0 +1,457 @@
+"""
+Append-only segmented history cache
+
+Messages of a session are numbered seq = 1, 2, 3, ... (migration-7.sql) and
+never change, so the history is cached as a log:
+- segment k holds seq (k*S, (k+1)*S]; it is written once, when it is full,
+  and never rewritten
+- the tail holds last_seq and the messages after the last full segment
+
+A "last N" read gets the tail and the segments before it (at most two while
+N <= S + 1 + len(tail)). Nothing counts the session's messages.
+
+A saved message is written through: append() adds it to the cached tail
+(closing the segment when the tail is full) if the tail ends right before
+its seq, so the next read needs no database. Otherwise - a concurrent writer
+got in between, or the tail is not cached - the tail is dropped and the next
+read rebuilds it with one index range query of < S rows. Tail writes are
+compare-and-put on the value read before, so neither a concurrent append nor
+a tail loaded while a message was being saved can overwrite a newer tail.
+
+This module contains:
+- MemorySegmentStore: in-process store (a single container; see its docstring)
+- CacheManagerSegmentStore: entries of a CacheManager (Redis) or
+  CacheSQLVecManager (SQLite-vec), tenant "history_segments"
+- SegmentedHistory: last(), append(), drop_tail(), verify(), hit/miss counters
+- check_consistency: compares the cache with the database for a sample of sessions
+- put_plain_entry: cache write without an embedding (history entries are never searched)
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:  # SQLite-vec or in-memory stores only
+    WatchError = None
+
+DEFAULT_SEGMENT_SIZE = 64  # two segments cover the default history window of 76
+TENANT = "history_segments"
+
+Message = Dict[str, str]
+
+
+def put_plain_entry(cache_manager, tenant: str, key_signature: str, user: str, text: str, ttl: int,
+                    **fields: Any) -> None:
+    """
+    Write a cache entry without put_cache's embedding request.
+
+    Redis CacheManager: HSET + EXPIRE in one round trip (extra fields go into
+    the hash), and the entry is dropped from this process's L1. Other managers:
+    put_cache(embed=False).
+    """
+    client = getattr(cache_manager, "redis_client", None)
+    if client is None:
+        cache_manager.put_cache(tenant=tenant, user=user, key_signature=key_signature, text=text,
+                                ttl_seconds=ttl, embed=False)
+        return
+    redis_key = cache_manager._generate_key(tenant, key_signature)
+    pipe = client.pipeline(transaction=False)
+    pipe.hset(redis_key, mapping={"text": text, "tenant": tenant, "user": user,
+                                  "created_at": int(time.time()), **fields})
+    pipe.expire(redis_key, ttl)
+    pipe.execute()
+    # The tracking invalidation of our own write arrives asynchronously
+    l1 = getattr(cache_manager, "l1", None)
+    if l1 is not None:
+        l1.invalidate([redis_key])
+
+
+class MemorySegmentStore:
+    """
+    Dict with TTLs and an LRU bound.
+
+    Only for deployments where one process writes a session's messages:
+    another container's save_message cannot drop this process's tail, so keep
+    the tail TTL short otherwise.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def put(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def compare_and_put(self, key: str, expected: Optional[str], value: str, ttl: int) -> bool:
+        """put() only if the key still holds expected (None: absent); atomic."""
+        with self._lock:
+            item = self._entries.get(key)
+            current = item[1] if item is not None and item[0] >= time.monotonic() else None
+            if current != expected:
+                return False
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            return True
+
+
+class CacheManagerSegmentStore:
+    """Segments and tails as entries of a CacheManager / CacheSQLVecManager."""
+
+    def __init__(self, cache_manager, tenant: str = TENANT):
+        self.cache_manager = cache_manager
+        self.tenant = tenant
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.cache_manager.get_cache_by_signature(self.tenant, key)
+        return (entry or {}).get("text") or None
+
+    def put(self, key: str, value: str, ttl: int) -> None:
+        # Never embedded: history blobs and drop markers are not searched
+        put_plain_entry(self.cache_manager, self.tenant, key, key.split(":", 1)[0], value, ttl)
+
+    def compare_and_put(self, key: str, expected: Optional[str], value: str, ttl: int) -> bool:
+        """
+        put() only if the entry still holds expected (None: absent).
+
+        Redis CacheManager: WATCH/MULTI on the entry's hash, atomic across
+        processes. Other managers (SQLite-vec, a file per container): under a
+        lock, atomic within this process.
+        """
+        client = getattr(self.cache_manager, "redis_client", None)
+        if client is None:
+            with self._lock:
+                if self.get(key) != expected:
+                    return False
+                self.put(key, value, ttl)
+                return True
+
+        redis_key = self.cache_manager._generate_key(self.tenant, key)
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(redis_key)
+                current = pipe.hget(redis_key, "text")
+                current = current.decode("utf-8") if current else None
+                if current != expected:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                # The fields put_cache writes; no embedding for history entries
+                pipe.hset(redis_key, mapping={"text": value, "tenant": self.tenant,
+                                              "user": key.split(":", 1)[0], "created_at": int(time.time())})
+                pipe.expire(redis_key, ttl)
+                pipe.execute()
+            except Exception as e:
+                if WatchError is not None and isinstance(e, WatchError):
+                    return False  # the entry changed between WATCH and EXEC
+                raise
+        # As put_cache does: the L1 must not serve the old tail until the tracking message arrives
+        l1 = getattr(self.cache_manager, "l1", None)
+        if l1 is not None:
+            l1.invalidate([redis_key])
+        return True
+
+
+class SegmentedHistory:
+    """Last-N reads of session histories over immutable segments and a mutable tail."""
+
+    def __init__(self,
+                 store,
+                 load_tail: Callable[[str, int], Tuple[int, List[Message]]],
+                 load_range: Callable[[str, int, int], List[Message]],
+                 segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 segment_ttl: int = 7 * 86400,
+                 tail_ttl: int = 86400,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            store: MemorySegmentStore, CacheManagerSegmentStore or anything with get(key) / put(key, value, ttl)
+            load_tail: (session, segment_size) -> (last_seq, messages with seq > last_seq - last_seq % segment_size)
+            load_range: (session, first_seq, last_seq) -> messages with first_seq <= seq <= last_seq, in order
+            segment_size: Messages per segment
+            segment_ttl: TTL of a full segment, seconds
+            tail_ttl: TTL of a tail, seconds
+            logger: Optional logger instance
+        """
+        self.store = store
+        self.load_tail = load_tail
+        self.load_range = load_range
+        self.segment_size = segment_size
+        self.segment_ttl = segment_ttl
+        self.tail_ttl = tail_ttl
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._stats = {"reads": 0, "tail_hits": 0, "tail_misses": 0, "segment_hits": 0,
+                       "segment_misses": 0, "rows_loaded": 0, "errors": 0,
+                       "appends": 0, "append_conflicts": 0}
+
+    # Segment size is part of the keys: changing it never mixes layouts
+    def _tail_key(self, session_uuid: str) -> str:
+        return f"{session_uuid}:s{self.segment_size}:tail"
+
+    def _segment_key(self, session_uuid: str, index: int) -> str:
+        return f"{session_uuid}:s{self.segment_size}:{index}"
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, n in counts.items():
+                self._stats[name] += n
+
+    def _get(self, key: str) -> Optional[str]:
+        try:
+            return self.store.get(key)
+        except Exception as e:
+            self._count(errors=1)
+            self.logger.warning("[CACHE_DEBUG] History segment read failed (%s): %s", key, e)
+            return None
+
+    def _read(self, key: str) -> Optional[Any]:
+        raw = self._get(key)
+        try:
+            return json.loads(raw) if raw else None
+        except ValueError:
+            return None
+
+    def _write(self, key: str, value: Any, ttl: int) -> None:
+        try:
+            self.store.put(key, json.dumps(value, ensure_ascii=False), ttl)
+        except Exception as e:
+            self._count(errors=1)
+            self.logger.warning("[CACHE_DEBUG] History segment write failed (%s): %s", key, e)
+
+    def _put_if(self, key: str, expected: Optional[str], value: Any, ttl: int) -> bool:
+        """Write value unless the key no longer holds expected (the raw value read before)."""
+        raw = json.dumps(value, ensure_ascii=False)
+        try:
+            compare_and_put = getattr(self.store, "compare_and_put", None)
+            if compare_and_put is not None:
+                return compare_and_put(key, expected, raw, ttl)
+            # Store without compare-and-put: the window is one cache round trip
+            if self.store.get(key) != expected:
+                return False
+            self.store.put(key, raw, ttl)
+            return True
+        except Exception as e:
+            self._count(errors=1)
+            self.logger.warning("[CACHE_DEBUG] History segment write failed (%s): %s", key, e)
+            return False
+
+    def _cached_tail(self, session_uuid: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """(raw value, tail) of the cached tail; tail is None when absent, dropped or malformed."""
+        raw = self._get(self._tail_key(session_uuid))
+        try:
+            tail = json.loads(raw) if raw else {}
+        except ValueError:
+            tail = {}
+        if "last_seq" in tail and len(tail["messages"]) == tail["last_seq"] % self.segment_size:
+            return raw, tail
+        return raw, None
+
+    def tail(self, session_uuid: str) -> Dict[str, Any]:
+        """{"last_seq": L, "messages": [...]} of the session, from the cache or the database."""
+        seen, tail = self._cached_tail(session_uuid)
+        if tail is not None:
+            self._count(tail_hits=1)
+            return tail
+        last_seq, messages = self.load_tail(session_uuid, self.segment_size)
+        tail = {"last_seq": last_seq, "messages": messages}
+        self._count(tail_misses=1, rows_loaded=len(messages))
+        # A message saved while we were loading has replaced what we saw (append/drop_tail);
+        # then our rows may be older than the database and are not cached
+        self._put_if(self._tail_key(session_uuid), seen, tail, self.tail_ttl)
+        return tail
+
+    def segment(self, session_uuid: str, index: int) -> List[Message]:
+        """Messages of full segment `index` (seq index*S+1 .. (index+1)*S)."""
+        key = self._segment_key(session_uuid, index)
+        messages = self._read(key)
+        if messages is not None and len(messages) == self.segment_size:
+            self._count(segment_hits=1)
+            return messages
+        first = index * self.segment_size + 1
+        messages = self.load_range(session_uuid, first, first + self.segment_size - 1)
+        self._count(segment_misses=1, rows_loaded=len(messages))
+        if len(messages) == self.segment_size:  # only a complete segment is immutable
+            self._write(key, messages, self.segment_ttl)
+        return messages
+
+    def last(self, session_uuid: str, limit_count: int) -> List[Message]:
+        """The last limit_count messages of the session in chronological order."""
+        self._count(reads=1)
+        tail = self.tail(session_uuid)
+        parts = [tail["messages"]]
+        have = len(tail["messages"])
+        index = tail["last_seq"] // self.segment_size  # full segments before the tail
+        while have < limit_count and index > 0:
+            index -= 1
+            messages = self.segment(session_uuid, index)
+            parts.append(messages)
+            have += len(messages)
+        history = [message for part in reversed(parts) for message in part]
+        return history[-limit_count:] if limit_count > 0 else []
+
+    def append(self, session_uuid: str, seq: int, message: Message) -> bool:
+        """
+        Write-through of a saved message: add it to the cached tail.
+
+        Call after the row with this seq is committed. The tail's last_seq is
+        the version: the message is appended only to a tail that ends at
+        seq - 1 (or, when nothing is cached, opens a new segment),
+        with compare-and-put on the tail read. In every other case the tail is
+        dropped and the next read loads it from the database.
+
+        Returns:
+            True if the cached tail now includes the message
+        """
+        key = self._tail_key(session_uuid)
+        seen, tail = self._cached_tail(session_uuid)
+        if tail is not None and tail["last_seq"] >= seq:
+            return True  # a read after our commit already loaded it
+        if tail is not None and tail["last_seq"] == seq - 1:
+            messages = tail["messages"] + [message]
+        elif seen is None and (seq - 1) % self.segment_size == 0:
+            # Nothing cached and the message opens a segment: the tail is just this message.
+            # Not over a drop marker - that may stand for a later message not appended yet
+            messages = [message]
+        else:
+            messages = None
+        if messages is not None:
+            if len(messages) == self.segment_size:
+                # The segment is complete and will never change: close it, start an empty tail
+                self._write(self._segment_key(session_uuid, (seq - 1) // self.segment_size),
+                            messages, self.segment_ttl)
+                messages = []
+            if self._put_if(key, seen, {"last_seq": seq, "messages": messages}, self.tail_ttl):
+                self._count(appends=1)
+                return True
+        # Out of order (another writer's message is not in the tail yet), lost the
+        # compare-and-put, or nothing cached: the database decides on the next read
+        self._count(append_conflicts=1)
+        self.drop_tail(session_uuid)
+        return False
+
+    def drop_tail(self, session_uuid: str) -> None:
+        """A message was appended: the tail changes, the segments do not."""
+        # A unique marker rather than a delete: a concurrent tail() sees that the key changed
+        self._write(self._tail_key(session_uuid), {"dropped": uuid.uuid4().hex}, self.tail_ttl)
+
+    def drop_segment(self, session_uuid: str, index: int) -> None:
+        """Forget a full segment (only for repairs: segments never change)."""
+        # An empty list is never a complete segment, so the next read reloads it
+        self._write(self._segment_key(session_uuid, index), [], self.segment_ttl)
+
+    def verify(self, session_uuid: str, limit_count: int) -> Dict[str, Any]:
+        """
+        Compare the cached last limit_count messages of a session with the database.
+
+        Reads the cache only (nothing is loaded into it) and the same seq range
+        from the database.
+
+        Returns:
+            {"status": ...} where status is
+            "ok"         - cache and database agree
+            "not_cached" - no tail, or a needed segment is missing
+            "stale"      - the cached tail ends before the database (last_seq, db_last_seq)
+            "drift"      - a cached message differs from the row with the same seq
+                           (seq, segment: its index, None for the tail)
+        """
+        _, tail = self._cached_tail(session_uuid)
+        if tail is None:
+            return {"status": "not_cached"}
+        last_seq = tail["last_seq"]
+        parts = [(last_seq // self.segment_size, tail["messages"])]
+        have = len(tail["messages"])
+        index = last_seq // self.segment_size
+        while have < limit_count and index > 0:
+            index -= 1
+            messages = self._read(self._segment_key(session_uuid, index))
+            if not isinstance(messages, list) or len(messages) != self.segment_size:
+                return {"status": "not_cached", "missing_segment": index}
+            parts.append((index, messages))
+            have += len(messages)
+
+        db_last_seq, _ = self.load_tail(session_uuid, self.segment_size)
+        if db_last_seq != last_seq:
+            return {"status": "stale", "last_seq": last_seq, "db_last_seq": db_last_seq}
+        first_seq = index * self.segment_size + 1
+        rows = self.load_range(session_uuid, first_seq, last_seq) if last_seq else []
+        cached = [(part, m) for part, messages in reversed(parts) for m in messages]
+        for offset, (part, message) in enumerate(cached):
+            row = rows[offset] if offset < len(rows) else None
+            if row is None or (row["role"], row["content"]) != (message.get("role"), message.get("content")):
+                return {"status": "drift", "seq": first_seq + offset,
+                        "segment": None if part == last_seq // self.segment_size else part}
+        return {"status": "ok", "last_seq": last_seq}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["segment_hits"] + stats["segment_misses"]
+        stats["segment_hit_rate"] = round(stats["segment_hits"] / lookups, 3) if lookups else 0.0
+        tails = stats["tail_hits"] + stats["tail_misses"]
+        stats["tail_hit_rate"] = round(stats["tail_hits"] / tails, 3) if tails else 0.0
+        return stats
+
+
+def check_consistency(history: SegmentedHistory,
+                      sessions: Iterable[str],
+                      limit_count: int,
+                      repair: bool = False) -> Dict[str, Any]:
+    """
+    Verify the cached history of each session against the database.
+
+    A session that is not "ok" is verified once more before it is reported:
+    a message saved between the cache and the database reads (and written
+    through right after) is not drift.
+
+    Args:
+        history: SegmentedHistory to check
+        sessions: Session IDs to check (a sample)
+        limit_count: History window to compare, as passed to last()
+        repair: Drop the tail of drifted or stale sessions (the next read reloads it)
+
+    Returns:
+        {"checked": n, "ok": n, "not_cached": n, "stale": n, "drift": n,
+         "drift_rate": drift / cached sessions, "sessions": {session: result} for the non-ok ones}
+    """
+    report: Dict[str, Any] = {"checked": 0, "ok": 0, "not_cached": 0, "stale": 0, "drift": 0, "sessions": {}}
+    for session_uuid in sessions:
+        result = history.verify(session_uuid, limit_count)
+        if result["status"] in ("stale", "drift"):
+            result = history.verify(session_uuid, limit_count)
+        report["checked"] += 1
+        report[result["status"]] += 1
+        if result["status"] != "ok":
+            report["sessions"][session_uuid] = result
+        if repair and result["status"] in ("stale", "drift"):
+            history.drop_tail(session_uuid)
+            if result.get("segment") is not None:
+                history.drop_segment(session_uuid, result["segment"])
+    cached = report["checked"] - report["not_cached"]
+    report["drift_rate"] = round((report["drift"] + report["stale"]) / cached, 3) if cached else 0.0
+    if report["drift"] or report["stale"]:
+        history.logger.warning("[CACHE_DEBUG] History cache drift in %d of %d cached sessions: %s",
+                               report["drift"] + report["stale"], cached, report["sessions"])
+    return report
@@ -0,0 +1,380 @@
+"""
+In-process L1 tier in front of the Redis CacheManager
+
+Within one warm container the same cache keys are read over and over (bot
+and session ids, embeddings of repeated phrases, stable history), and every
+read is a Redis round trip. L1Cache keeps the entries read from Redis in
+process memory:
+- one LRU per tenant with its own entry budget, so a burst of embeddings
+  cannot evict the history entries
+- an entry lives for min(the L1 TTL, the key's remaining TTL in Redis)
+- only entries read from Redis are stored (no negative caching); a fill is
+  skipped if the key was invalidated while it was being read
+- it serves nothing while invalidations are not being received
+
+Invalidation is server-assisted (Redis 6 client-side caching):
+RedisTrackingInvalidator subscribes one connection to __redis__:invalidate
+and enables CLIENT TRACKING ... BCAST PREFIX <key prefix> with a redirect to
+it, so any client's write, delete, expiry or eviction of a cached key drops
+it here. When the connection is lost, the L1 is flushed and disabled until
+tracking is re-established. Sliding-TTL reads (extend_ttl_seconds) served
+from the L1 extend the key at most every L1_EXTEND_FRACTION of the TTL,
+through the tracking connection (NOLOOP), so the extension does not
+invalidate the entry it keeps alive.
+
+This module contains:
+- parse_budgets: "tenant=entries,..." -> dict
+- L1Cache: per-tenant LRU/TTL store with hit/miss/eviction counters
+- RedisTrackingInvalidator: CLIENT TRACKING listener thread
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+L1_EXTEND_FRACTION = 0.1  # an L1 hit re-extends a sliding TTL after 10% of it has passed
+
+
+def parse_budgets(spec: Union[str, Dict[str, int], None]) -> Dict[str, int]:
+    """'history_segments=2000,embeddings=5000' (or a dict) -> {tenant: max entries}."""
+    if not spec:
+        return {}
+    if isinstance(spec, dict):
+        return {str(k): int(v) for k, v in spec.items()}
+    budgets = {}
+    for part in spec.split(","):
+        if "=" in part:
+            tenant, n = part.split("=", 1)
+            budgets[tenant.strip()] = int(n)
+    return budgets
+
+
+class _Tenant:
+    __slots__ = ("entries", "budget", "hits", "misses", "evictions", "expirations", "invalidations", "fills")
+
+    def __init__(self, budget: int):
+        # key -> (expires at, last TTL extension at, entry)
+        self.entries: "OrderedDict[str, Tuple[float, float, Dict[str, Any]]]" = OrderedDict()
+        self.budget = budget
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = self.fills = 0
+
+
+class L1Cache:
+    """
+    Per-tenant LRU of cache entries (dicts as returned by CacheManager.get_cache).
+
+    Reads go get() -> on a miss begin() -> read Redis -> fill(token). The
+    token makes the fill a no-op if the key (or everything) was invalidated
+    since begin(), so a value read just before a write never outlives it.
+    """
+
+    def __init__(self,
+                 default_budget: int = 1000,
+                 tenant_budgets: Optional[Dict[str, int]] = None,
+                 ttl: float = 300,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            default_budget: Max entries of a tenant without its own budget (0 disables it)
+            tenant_budgets: {tenant: max entries}
+            ttl: Max lifetime of an entry, seconds
+            logger: Optional logger instance
+        """
+        self.default_budget = default_budget
+        self.tenant_budgets = dict(tenant_budgets or {})
+        self.ttl = ttl
+        self.logger = logger or logging.getLogger(__name__)
+        self.enabled = False  # set by the invalidator once invalidations are received
+        self._tenants: Dict[str, _Tenant] = {}
+        self._where: Dict[str, str] = {}  # key -> tenant
+        self._lock = threading.Lock()
+        self._epoch = 0                    # bumped by invalidate_all()
+        self._pending: Dict[str, list] = {}  # key -> [readers in flight, invalidations since]
+        self.flushes = 0
+
+    def _tenant(self, tenant: str) -> _Tenant:
+        state = self._tenants.get(tenant)
+        if state is None:
+            state = self._tenants[tenant] = _Tenant(self.tenant_budgets.get(tenant, self.default_budget))
+        return state
+
+    def get(self, tenant: str, key: str) -> Optional[Dict[str, Any]]:
+        """A copy of the entry, or None (miss, expired or disabled)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            state = self._tenant(tenant)
+            item = state.entries.get(key)
+            if item is not None and item[0] < time.monotonic():
+                self._remove(state, key)
+                state.expirations += 1
+                item = None
+            if item is None:
+                state.misses += 1
+                return None
+            state.entries.move_to_end(key)
+            state.hits += 1
+            return dict(item[2])
+
+    def extend_due(self, key: str, interval: float, ttl: float) -> bool:
+        """True (once per interval) if the key's sliding TTL in Redis should be extended now."""
+        with self._lock:
+            tenant = self._where.get(key)
+            item = self._tenants[tenant].entries.get(key) if tenant is not None else None
+            now = time.monotonic()
+            if item is None or now - item[1] < interval:
+                return False
+            self._tenants[tenant].entries[key] = (now + min(self.ttl, ttl), now, item[2])
+            return True
+
+    def begin(self, key: str) -> Tuple[int, int]:
+        """Start a read of key from Redis; pass the token to fill()."""
+        with self._lock:
+            pending = self._pending.setdefault(key, [0, 0])
+            pending[0] += 1
+            return self._epoch, pending[1]
+
+    def fill(self, tenant: str, key: str, value: Optional[Dict[str, Any]], token: Tuple[int, int],
+             ttl: Optional[float] = None) -> bool:
+        """
+        Store value read from Redis unless key was invalidated since begin().
+
+        Every begin() needs its fill(); value None ends a read that found nothing or failed.
+
+        Args:
+            ttl: Remaining TTL of the key in Redis, seconds (None: unknown)
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            current = (self._epoch, pending[1] if pending else 0)
+            if pending is not None:
+                pending[0] -= 1
+                if pending[0] <= 0:
+                    del self._pending[key]
+            if value is None:
+                return False
+            state = self._tenant(tenant)
+            if not self.enabled or current != token or state.budget <= 0:
+                return False
+            lifetime = self.ttl if ttl is None or ttl < 0 else min(self.ttl, ttl)
+            if lifetime <= 0:
+                return False
+            now = time.monotonic()
+            state.entries[key] = (now + lifetime, now, dict(value))
+            state.entries.move_to_end(key)
+            self._where[key] = tenant
+            state.fills += 1
+            while len(state.entries) > state.budget:
+                evicted, _ = state.entries.popitem(last=False)
+                self._where.pop(evicted, None)
+                state.evictions += 1
+            return True
+
+    def _remove(self, state: _Tenant, key: str) -> None:
+        state.entries.pop(key, None)
+        self._where.pop(key, None)
+
+    def invalidate(self, keys: Iterable[str]) -> int:
+        """Drop keys (written elsewhere); returns how many were cached."""
+        dropped = 0
+        with self._lock:
+            for key in keys:
+                pending = self._pending.get(key)
+                if pending is not None:
+                    pending[1] += 1
+                tenant = self._where.get(key)
+                if tenant is not None:
+                    state = self._tenants[tenant]
+                    self._remove(state, key)
+                    state.invalidations += 1
+                    dropped += 1
+        return dropped
+
+    def invalidate_all(self) -> None:
+        """Drop everything (FLUSHALL, lost invalidations)."""
+        with self._lock:
+            for state in self._tenants.values():
+                state.entries.clear()
+            self._where.clear()
+            self._epoch += 1
+            self.flushes += 1
+
+    def clear_tenant(self, tenant: str) -> None:
+        with self._lock:
+            state = self._tenants.get(tenant)
+            if state is None:
+                return
+            for key in state.entries:
+                self._where.pop(key, None)
+            state.entries.clear()
+            # Reads in flight must not fill either (any tenant: the epoch is global)
+            self._epoch += 1
+
+    def get_stats(self, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """Counters of one tenant, or totals plus per-tenant counters."""
+        with self._lock:
+            tenants = {
+                name: {"size": len(s.entries), "budget": s.budget, "hits": s.hits, "misses": s.misses,
+                       "hit_rate": round(s.hits / (s.hits + s.misses), 3) if s.hits + s.misses else 0.0,
+                       "fills": s.fills, "evictions": s.evictions, "expirations": s.expirations,
+                       "invalidations": s.invalidations}
+                for name, s in self._tenants.items()
+            }
+        if tenant is not None:
+            return {"enabled": self.enabled, **tenants.get(tenant, {"size": 0, "hits": 0, "misses": 0})}
+        totals = {name: sum(t[name] for t in tenants.values())
+                  for name in ("size", "hits", "misses", "fills", "evictions", "expirations", "invalidations")}
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = round(totals["hits"] / lookups, 3) if lookups else 0.0
+        return {"enabled": self.enabled, "flushes": self.flushes, **totals, "tenants": tenants}
+
+
+class RedisTrackingInvalidator:
+    """
+    Keeps an L1Cache coherent with Redis through CLIENT TRACKING (BCAST mode).
+
+    Two dedicated connections, made with the settings of the client's pool but
+    outside it (so they never count against max_connections), held for the
+    lifetime of the listener: one subscribed to __redis__:invalidate, one that enabled
+    tracking with REDIRECT to the first (tracking ends with the connection
+    that enabled it, so it is pinged every health_check_interval). Any error
+    flushes and disables the L1, then the listener reconnects.
+
+    Writes made through execute_untracked() run on the tracking connection;
+    with NOLOOP they do not invalidate this process's L1.
+    """
+
+    def __init__(self, redis_client, l1: L1Cache, prefixes: Iterable[str],
+                 health_check_interval: float = 5.0, reconnect_delay: float = 1.0,
+                 logger: Optional[logging.Logger] = None):
+        self.redis_client = redis_client
+        self.l1 = l1
+        self.prefixes = list(prefixes)
+        self.health_check_interval = health_check_interval
+        self.reconnect_delay = reconnect_delay
+        self.logger = logger or logging.getLogger(__name__)
+        self._listener = None
+        self._tracker = None
+        self._tracker_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {"messages": 0, "keys": 0, "reconnects": 0}
+
+    @staticmethod
+    def _text(value) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+    def _open(self):
+        """A new connection that is not taken from (or returned to) the client's pool."""
+        pool = self.redis_client.connection_pool
+        conn = pool.connection_class(**pool.connection_kwargs)
+        conn.connect()
+        return conn
+
+    def connect(self) -> None:
+        """Subscribe and enable tracking; raises if Redis refuses (e.g. before 6.0)."""
+        listener = self._open()
+        try:
+            tracker = self._open()
+        except Exception:
+            listener.disconnect()
+            raise
+        try:
+            listener.send_command("CLIENT", "ID")
+            client_id = listener.read_response()
+            listener.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+            listener.read_response()
+            args = ["CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST", "NOLOOP"]
+            for prefix in self.prefixes:
+                args += ["PREFIX", prefix]
+            tracker.send_command(*args)
+            reply = tracker.read_response()
+            if self._text(reply) != "OK":
+                raise RuntimeError(f"CLIENT TRACKING failed: {reply!r}")
+        except Exception:
+            listener.disconnect()
+            tracker.disconnect()
+            raise
+        self._listener, self._tracker = listener, tracker
+        # Nothing older than the subscription can be trusted
+        self.l1.invalidate_all()
+        self.l1.enabled = True
+
+    def _disconnect(self) -> None:
+        self.l1.enabled = False
+        self.l1.invalidate_all()
+        with self._tracker_lock:
+            for conn in (self._listener, self._tracker):
+                if conn is not None:
+                    try:
+                        conn.disconnect()
+                    except Exception:
+                        pass
+            self._listener = self._tracker = None
+
+    def handle(self, message) -> None:
+        """One pub/sub message: [b"message", channel, [keys] | None]."""
+        if not isinstance(message, (list, tuple)) or len(message) < 3 or self._text(message[0]) != "message":
+            return
+        self.stats["messages"] += 1
+        keys = message[2]
+        if keys is None:  # FLUSHALL / FLUSHDB
+            self.l1.invalidate_all()
+            return
+        if not isinstance(keys, (list, tuple)):
+            keys = [keys]
+        self.stats["keys"] += len(keys)
+        self.l1.invalidate(self._text(k) for k in keys)
+
+    def poll(self, timeout: float) -> None:
+        """Handle the messages that arrive within timeout, then check the tracking connection."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._listener.can_read(timeout=remaining):
+                break
+            self.handle(self._listener.read_response())
+        self.execute_untracked("PING")
+
+    def execute_untracked(self, *args) -> Any:
+        """Run a command on the tracking connection: no invalidation for this process."""
+        with self._tracker_lock:
+            if self._tracker is None:
+                raise RuntimeError("L1 invalidation is not connected")
+            self._tracker.send_command(*args)
+            return self._tracker.read_response()
+
+    def start(self) -> bool:
+        """Connect and start the listener thread; False (L1 stays disabled) if tracking is unavailable."""
+        try:
+            self.connect()
+        except Exception as e:
+            self.logger.warning("L1 cache disabled: CLIENT TRACKING unavailable: %s", e)
+            self._disconnect()
+            return False
+        self._thread = threading.Thread(target=self._run, name="l1-invalidator", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._listener is None:
+                    self.connect()
+                    self.stats["reconnects"] += 1
+                self.poll(self.health_check_interval)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                self.logger.warning("L1 cache invalidation stream lost, L1 flushed: %s", e)
+                self._disconnect()
+                self._stop.wait(self.reconnect_delay)
+        self._disconnect()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.health_check_interval + 1)
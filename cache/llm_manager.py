@@ -1,7 +1,9 @@
 # Standard library imports
+import copy
 import json
 import logging
-from typing import List, Dict, Any, Optional
+from dataclasses import replace
+from typing import List, Dict, Any, Optional, Tuple
 
 # Third-party imports
 import requests
@@ -10,6 +12,14 @@ import requests
 from .config import Config
 from .utils import Utils
 from .cache_manager import CacheManager
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_store import EmbeddingStore, embedding_key, llm_cache_key, normalize_text
+from .fanout import FanOutResult, get_default_executor
+from .model_router import ModelRouter
+from .proxy_health import ProxyHealth
+from .semantic_cache import DEFAULT_POLICIES, PromptPolicy, SemanticCache
+from .single_flight import get_single_flight_stats, single_flight
+from .token_window import ContextWindow
 
 
 class LLMManager:
@@ -33,12 +43,42 @@ class LLMManager:
         self.proxy_url = config.proxy_url
         self.read_timeout = config.read_timeout
 
+        # Состояние прокси: кэш с TTL + circuit breaker, без проверки перед каждым запросом
+        self.proxy_health = ProxyHealth(
+            self.proxy_url,
+            config.proxy_test_url,
+            probe_timeout=self.read_timeout,
+            ttl=getattr(config, "proxy_health_ttl", 30),
+            failure_threshold=getattr(config, "proxy_failure_threshold", 2),
+            open_cooldown=getattr(config, "proxy_open_cooldown", 60),
+            logger=logger,
+        )
+
+        # Порядок моделей по p95 и ошибкам; медленный запрос классификации дублируется к следующей модели
+        # (llm_hedge_classes: дубль оплачивается, поэтому длинные conversation-ответы не хеджируются)
+        models = [self.ai_model] + [m for m in (self.ai_models_fallback or []) if m != self.ai_model]
+        self.model_router = ModelRouter(
+            getattr(config, "llm_router_classes", None) or {"classification": models, "conversation": models},
+            hedge_classes=getattr(config, "llm_hedge_classes", ("classification",)),
+            hedge_min_ms=getattr(config, "llm_hedge_min_ms", 300),
+            hedge_max_ms=getattr(config, "llm_hedge_max_ms", None),
+            logger=logger,
+        )
+
+        # Окно контекста: 51962 ~ 128k эмпирически
+        self.context_window = ContextWindow(max_tokens=getattr(config, "llm_max_context_tokens", 50_000))
+
+        # Общий пул потоков для параллельных классификаций
+        self.fanout = get_default_executor(logger)
+        self.fanout_timeout = getattr(config, "llm_fanout_timeout", 10)
+
         # Инициализируем кэш менеджер (опционально)
         self.cache_manager: Optional[CacheManager] = None
         self.cache_enabled = config.cache_enable_embeddings
         self.llm_cache_ttl = 86400  # 24 часа для LLM ответов
         self.embedding_cache_ttl = 604800  # неделя для embeddings
         self.tenant = "pmm_llm"
+        self.embedding_dim = getattr(config, "cache_embedding_dimensions", 1536)
         
         if self.cache_enabled:
             try:
@@ -48,6 +88,39 @@ class LLMManager:
                 self.logger.warning("Failed to initialize cache manager: %s, continuing without cache", e)
                 self.cache_enabled = False
 
+        # Общее для всех tenant/user хранилище embedding'ов: один вектор на уникальный текст.
+        # Redis подключается при первом обращении; без кэша остаётся только LRU процесса
+        self.embedding_store = EmbeddingStore(
+            (lambda: self.cache_manager.redis_client) if self.cache_manager else None,
+            dtype=getattr(config, "cache_embedding_dtype", "f32"),
+            ttl_seconds=self.embedding_cache_ttl,
+            logger=logger,
+        )
+
+        # Одиночные embd_text, пришедшие одновременно, уходят одним запросом с массивом input
+        self.embedding_batch_size = getattr(config, "embedding_batch_size", 128)
+        self.embedding_wait_timeout = getattr(config, "embedding_batch_timeout",
+                                              sum(self.timeout) + getattr(config, "embedding_batch_wait_ms", 5) / 1000)
+        self.embedding_batcher = EmbeddingBatcher(
+            self._embd_request,
+            max_batch=self.embedding_batch_size,
+            max_wait_ms=getattr(config, "embedding_batch_wait_ms", 5),
+            max_in_flight=getattr(config, "embedding_batch_in_flight", 4),
+            logger=logger,
+        )
+
+        # Семантический кэш ответов классификаторов (intent, emotion)
+        self.semantic_cache: Optional[SemanticCache] = None
+        if getattr(config, "semantic_cache_enabled", True):
+            policies = dict(DEFAULT_POLICIES)
+            for name, overrides in (getattr(config, "semantic_cache_policies", None) or {}).items():
+                policies[name] = replace(policies.get(name, PromptPolicy()), **overrides)
+            self.semantic_cache = SemanticCache(
+                policies,
+                audit_rate=getattr(config, "semantic_cache_audit_rate", 0.01),
+                logger=logger,
+            )
+
     def check_proxy(self, proxy_url: str, timeout: int = None, test_url: str = None) -> bool:
         """
         Проверяет работоспособность HTTP/HTTPS прокси, отправляя запрос на test_url.
@@ -66,6 +139,44 @@ class LLMManager:
             self.logger.debug(f"Proxy check failed: {e}")
             return False
 
+    def _post(self, url: str, **kwargs) -> requests.Response:
+        """
+        POST через прокси, если circuit breaker это разрешает.
+        При отказе прокси запрос повторяется напрямую; ошибки прокси открывают breaker, успешные ответы закрывают.
+        """
+        return self.proxy_health.post(self.utils.get_session(), url, **kwargs)
+
+    def _chat(self, payload: Dict[str, Any], call_class: str) -> Dict[str, Any]:
+        """
+        Запрос к chat completions через роутер моделей
+
+        model и models (fallback для OpenRouter) подставляет роутер; ответ без choices считается ошибкой модели.
+        call_class: "classification" или "conversation"
+        """
+        def send(model: str, fallbacks: List[str]) -> Dict[str, Any]:
+            resp = self._post(
+                self.ai_endpoint,
+                json={**payload, "model": model, "models": fallbacks},
+                headers={
+                    "Authorization": f"Bearer {self.operouter_key}",
+                    "Content-Type": "application/json"
+                },
+                timeout=self.timeout
+            )
+            data = resp.json()
+            if not data.get("choices"):
+                raise ValueError(f"{model}: {data.get('error', data)}")
+            return data
+
+        data, model = self.model_router.call(call_class, send)
+        self.logger.debug("LLM %s answered by %s", call_class, model)
+        return data
+
+    def get_model_router_stats(self) -> Dict[str, Any]:
+        """p50/p95 и доля ошибок по моделям, порядок моделей по классам, счётчики hedged запросов"""
+        return self.model_router.get_stats()
+
+    @single_flight()
     def is_text_flagged(self, text: str, api_key: str = None) -> bool:
         """Проверяет текст на наличие нарушений с помощью OpenAI Moderation API"""
         if api_key is None:
@@ -76,11 +187,10 @@ class LLMManager:
         payload = {"input": text, "model": "omni-moderation-latest"}
 
         try:
-            resp = self.utils.get_session().post(
+            resp = self._post(
                 url,
                 headers=headers,
                 json=payload,
-                proxies=self.proxy,
                 timeout=self.timeout
             )
             data = resp.json()
@@ -90,28 +200,51 @@ class LLMManager:
             self.logger.error("Moderation call failed: %s", e)
             return False
 
-    def llm_response(self, user_message: str, system_message: str) -> Dict[str, Any]:
-        """Отправляет простой запрос к LLM с одним пользовательским сообщением"""
+    def _semantic_cached(self, cache_prompt: str, system_message: str, messages: List[Dict[str, str]], call) -> Dict[str, Any]:
+        """
+        Ответ классификатора из семантического кэша, иначе call()
+
+        Ключ — хэш system prompt + embedding сообщений без system (для intent — последнего сообщения
+        пользователя). Ответы с ошибкой не кэшируются.
+        """
+        if self.semantic_cache is None:
+            return call()
+        text = self.semantic_cache.key_text(cache_prompt, messages)
+        answer, ticket = self.semantic_cache.lookup(cache_prompt, system_message or "", text, self.embd_text)
+        if answer is not None:
+            return copy.deepcopy(answer)
+
+        answer = call()
+        if isinstance(answer, dict) and "error" not in answer:
+            if ticket and ticket.get("audit"):
+                self.semantic_cache.audit(ticket, answer)
+            self.semantic_cache.store(ticket, copy.deepcopy(answer))
+        return answer
+
+    def get_single_flight_stats(self) -> Dict[str, Any]:
+        """Сколько одинаковых параллельных запросов (moderation, LLM, embedding) дождались уже идущего"""
+        return get_single_flight_stats(self)
+
+    def get_semantic_cache_stats(self) -> Dict[str, Any]:
+        """Hit rate, допуск в кэш и аудит ложных попаданий по каждому prompt"""
+        return self.semantic_cache.get_stats() if self.semantic_cache else {}
+
+    @single_flight()
+    def llm_response(self, user_message: str, system_message: str, cache_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Отправляет простой запрос к LLM с одним пользовательским сообщением
+
+        cache_prompt: имя политики семантического кэша ("intent", "emotion"), None — без кэша
+        """
+        if cache_prompt:
+            return self._semantic_cached(cache_prompt, system_message, [{"role": "user", "content": user_message}],
+                                         lambda: self.llm_response(user_message, system_message))
         messages = [{"role": "user", "content": user_message}]
         if system_message:
             messages.insert(0, {"role": "system", "content": system_message})
 
         try:
-            resp = self.utils.get_session().post(
-                self.ai_endpoint,
-                json={
-                    "model": self.ai_model,
-                    "messages": messages,
-                    "models": self.ai_models_fallback
-                },
-                headers={
-                    "Authorization": f"Bearer {self.operouter_key}",
-                    "Content-Type": "application/json"
-                },
-                proxies=(None if not self.check_proxy(self.proxy_url, self.read_timeout) else self.proxy),
-                timeout=self.timeout
-            )
-            data = resp.json()
+            data = self._chat({"messages": messages}, "classification")
             self.logger.debug("LLM one response: %s", data)
             content = data["choices"][0]["message"]["content"]
             return json.loads(content)
@@ -119,27 +252,22 @@ class LLMManager:
             self.logger.error("LLM one call failed: %s", e)
             return {"error": str(e)}
 
-    def llm_conversation(self, messages: List[Dict[str, str]], system_message: str) -> Dict[str, Any]:
-        """Отправляет запрос к LLM с историей сообщений"""
+    @single_flight()
+    def llm_conversation(self, messages: List[Dict[str, str]], system_message: str,
+                         cache_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Отправляет запрос к LLM с историей сообщений
+
+        cache_prompt: имя политики семантического кэша ("intent", "emotion"), None — без кэша
+        """
+        if cache_prompt:
+            return self._semantic_cached(cache_prompt, system_message, messages,
+                                         lambda: self.llm_conversation(messages, system_message))
         if system_message:
             messages.insert(0, {"role": "system", "content": system_message})
 
         try:
-            resp = self.utils.get_session().post(
-                self.ai_endpoint,
-                json={
-                    "model": self.ai_model,
-                    "messages": messages,
-                    "models": self.ai_models_fallback
-                },
-                headers={
-                    "Authorization": f"Bearer {self.operouter_key}",
-                    "Content-Type": "application/json"
-                },
-                proxies=(None if not self.check_proxy(self.proxy_url, self.read_timeout) else self.proxy),
-                timeout=self.timeout
-            )
-            data = resp.json()
+            data = self._chat({"messages": messages}, "classification")
             self.logger.debug("LLM conversation response: %s", data)
             content = data["choices"][0]["message"]["content"]
             return json.loads(content)
@@ -147,6 +275,43 @@ class LLMManager:
             self.logger.error("LLM conversation call failed: %s", e)
             return {"error": str(e)}
 
+    def llm_conversation_many(self,
+                              requests_by_name: Dict[str, Tuple[List[Dict[str, str]], str]],
+                              timeouts: Optional[Dict[str, float]] = None,
+                              timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Параллельно выполняет несколько независимых llm_conversation (эмоции, intent, ...)
+
+        Args:
+            requests_by_name: name -> (messages, system_message)
+            timeouts: Дедлайны отдельных вызовов в секундах
+            timeout: Дедлайн для остальных вызовов (по умолчанию config.llm_fanout_timeout)
+
+        Вызовы, чьё имя совпадает с политикой семантического кэша (intent, emotion, ...), идут через кэш.
+
+        Returns:
+            name -> ответ LLM; для упавших или не успевших вызовов {"error": "..."},
+            как у llm_conversation
+        """
+        calls = {
+            name: (lambda m=messages, s=system_message, p=self._cache_prompt_for(name): self.llm_conversation(list(m), s, p))
+            for name, (messages, system_message) in requests_by_name.items()
+        }
+        result: FanOutResult = self.fanout.run(
+            calls, timeouts=timeouts, timeout=self.fanout_timeout if timeout is None else timeout
+        )
+
+        answers = dict(result.results)
+        for name, error in result.errors.items():
+            answers[name] = {"error": str(error)}
+        for name in result.timed_out:
+            answers[name] = {"error": "timeout"}
+        self.logger.debug("Parallel LLM conversations finished in %.1fms: %s", result.elapsed_ms, result)
+        return answers
+
+    def _cache_prompt_for(self, name: str) -> Optional[str]:
+        return name if self.semantic_cache and name in self.semantic_cache.policies else None
+
     def llm_call(self, messages: List[Dict[str, str]], chat_id: str, tg_user_id: str, moderate_user_callback=None) -> str:
         """
         Основной метод для вызова LLM с поддержкой tool calls и модерации
@@ -157,62 +322,13 @@ class LLMManager:
             tg_user_id: ID пользователя Telegram для модерации
             moderate_user_callback: Функция обратного вызова для модерации пользователя
         """
-        MAX_TOKENS = 50_000  # 51962 ~ 128k эмпирически
-        try:
-            import tiktoken
-            encoder = tiktoken.encoding_for_model("gpt-4o")
-        except ImportError:
-            self.logger.warning("tiktoken not available, using approximate token counting")
-            encoder = None
-
-        # Функция для подсчёта токенов в одном сообщении
-        def count_tokens(msg: Dict[str, str]) -> int:
-            if encoder is None:
-                # Приблизительный подсчет: ~4 символа на токен
-                role_tokens = len(msg["role"]) // 4
-                content_tokens = len(msg["content"]) // 4
-                return role_tokens + content_tokens + 4
-            else:
-                # Точный подсчет с помощью tiktoken
-                role_tokens = len(encoder.encode(msg["role"]))
-                content_tokens = len(encoder.encode(msg["content"]))
-                return role_tokens + content_tokens + 4  # +4 — служебные токены системы
-
-        # Подсчитываем и обрезаем
-        total = sum(count_tokens(m) for m in messages)
-        self.logger.debug("Total tokens: %s", total)
-
-        # Всегда оставляем первый системный prompt
-        sys_msg = messages[0]
-        chat_msgs = messages[1:]
-
-        # Обрезаем oldest-first, пока не уложимся
-        while total > MAX_TOKENS and chat_msgs:
-            removed = chat_msgs.pop(0)
-            total -= count_tokens(removed)
-
-        messages = [sys_msg] + chat_msgs
-        total = sum(count_tokens(m) for m in messages)
+        # Обрезаем oldest-first, системный prompt всегда остаётся. Сохранённые счётчики токенов
+        # есть только в flow-classify: здесь история приходит из кэша без token_count
+        messages, total = self.context_window.select(messages)
         self.logger.debug("Total tokens after trim: %s", total)
 
         try:
-            resp = self.utils.get_session().post(
-                self.ai_endpoint,
-                json={
-                    "model": self.ai_model,
-                    "messages": messages,
-                    "tools": self.tools,
-                    "tool_choice": "auto",
-                    "models": self.ai_models_fallback
-                },
-                headers={
-                    "Authorization": f"Bearer {self.operouter_key}",
-                    "Content-Type": "application/json"
-                },
-                proxies=(None if not self.check_proxy(self.proxy_url, self.read_timeout) else self.proxy),
-                timeout=self.timeout
-            )
-            data = resp.json()
+            data = self._chat({"messages": messages, "tools": self.tools, "tool_choice": "auto"}, "conversation")
             self.logger.debug("LLM response: %s", data)
             choice = data["choices"][0]["message"]
 
@@ -236,71 +352,97 @@ class LLMManager:
             return self.fallback_answer
 
 
+    @single_flight()
     def embd_text(self, text: str, api_key: str = None, model: str = "text-embedding-3-small", user_id: str = "system", use_cache: bool = True) -> List[float]:
-        """Делает OpenAI embedding текста с поддержкой кэширования"""
+        """
+        Делает OpenAI embedding текста с поддержкой кэширования
+
+        Ключ — BLAKE2 от нормализованного текста, модели и размерности, поэтому он
+        одинаков во всех контейнерах, а вектор хранится один раз для всех пользователей
+        (user_id оставлен для совместимости).
+        """
         if api_key is None:
             api_key = self.openai_api_key
 
-        # Генерируем ключ кэша
-        text_hash = hash(f"{text}:{model}")
-        cache_key_signature = f"embedding:{model}:{text_hash}"
-        
-        # Пробуем получить из кэша
-        if use_cache and self.cache_enabled and self.cache_manager:
-            try:
-                cached = self.cache_manager.get_cache_by_signature(
-                    tenant=self.tenant,
-                    key_signature=cache_key_signature
-                )
-                
-                if cached and cached.get("embedding"):
-                    # Возвращаем кэшированный embedding
-                    embedding = self.cache_manager._unpack_f32(cached["embedding"])
-                    self.logger.debug("Found cached embedding for text hash %s", text_hash)
-                    return embedding
-            except Exception as e:
-                self.logger.warning("Cache retrieval failed: %s, generating new embedding", e)
+        text = normalize_text(text)
+        cache_key = embedding_key(text, model, self.embedding_dim)
 
-        # Кэш промах - создаем новый embedding
-        url = "https://api.openai.com/v1/embeddings"
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-        payload = {"input": text, "model": model}
+        if use_cache:
+            embedding = self.embedding_store.get(cache_key)
+            if embedding is not None:
+                self.logger.debug("Found cached embedding %s", cache_key)
+                return embedding
 
+        # Кэш промах - embedding в общем батче с параллельными запросами
         try:
-            resp = self.utils.get_session().post(
-                url,
-                headers=headers,
-                json=payload,
-                proxies=self.proxy,
-                timeout=self.timeout
-            )
-            data = resp.json()
-            self.logger.debug("Embedding response len: %s", len(data))
-            embedding = data['data'][0]['embedding']
-            
-            # Кэшируем результат
-            if use_cache and self.cache_enabled and self.cache_manager:
-                try:
-                    # Ограничиваем длину текста для хранения
-                    text_for_cache = text[:200] + "..." if len(text) > 200 else text
-                    
-                    self.cache_manager.put_cache(
-                        tenant=self.tenant,
-                        user=user_id,
-                        key_signature=cache_key_signature,
-                        text=text_for_cache,
-                        embedding=embedding,
-                        ttl_seconds=self.embedding_cache_ttl
-                    )
-                    self.logger.debug("Cached embedding for text hash %s", text_hash)
-                except Exception as e:
-                    self.logger.warning("Cache storage failed: %s", e)
-            
-            return embedding
+            # Не дольше самого запроса (connect + read) и окна батча: зависший батч не держит embd_text
+            embedding = self.embedding_batcher.embed(text, (model, api_key), timeout=self.embedding_wait_timeout)
         except Exception as e:
             self.logger.error("Embedding call failed: %s", e)
             return False
 
+        if use_cache:
+            self.embedding_store.put(cache_key, embedding)
+            self.logger.debug("Cached embedding %s", cache_key)
+        return embedding
+
+    def embd_many(self, texts: List[str], api_key: str = None, model: str = "text-embedding-3-small",
+                  use_cache: bool = True) -> List[List[float]]:
+        """
+        Embedding'и списка текстов: кэш для каждого, остальные — запросами по embedding_batch_size
+
+        Повторяющиеся тексты запрашиваются один раз, новые векторы попадают в кэш.
+
+        Returns:
+            Векторы в порядке texts; False для текстов, запрос которых не удался (как у embd_text)
+        """
+        if api_key is None:
+            api_key = self.openai_api_key
+
+        normalized = [normalize_text(text) for text in texts]
+        keys = {text: embedding_key(text, model, self.embedding_dim) for text in dict.fromkeys(normalized)}
+        vectors: Dict[str, List[float]] = {}
+        if use_cache:
+            for text, key in keys.items():
+                embedding = self.embedding_store.get(key)
+                if embedding is not None:
+                    vectors[text] = embedding
+
+        missing = [text for text in keys if text not in vectors]
+        for start in range(0, len(missing), self.embedding_batch_size):
+            chunk = missing[start:start + self.embedding_batch_size]
+            try:
+                embeddings = self._embd_request(chunk, (model, api_key))
+            except Exception as e:
+                self.logger.error("Embedding batch of %d failed: %s", len(chunk), e)
+                continue
+            for text, embedding in zip(chunk, embeddings):
+                vectors[text] = embedding
+                if use_cache:
+                    self.embedding_store.put(keys[text], embedding)
+
+        self.logger.debug("Embedded %d texts: %d unique, %d requested", len(texts), len(keys), len(missing))
+        return [vectors.get(text, False) for text in normalized]
+
+    def _embd_request(self, texts: List[str], group: Tuple[str, str]) -> List[List[float]]:
+        """Один запрос к OpenAI embeddings с массивом input; векторы в порядке texts"""
+        model, api_key = group
+        resp = self.utils.get_session().post(
+            "https://api.openai.com/v1/embeddings",
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            json={"input": texts, "model": model},
+            proxies=self.proxy,
+            timeout=self.timeout
+        )
+        resp.raise_for_status()
+        data = resp.json()["data"]
+        self.logger.debug("Embedding response: %d vectors", len(data))
+        return [item["embedding"] for item in sorted(data, key=lambda item: item["index"])]
+
+    def get_embedding_cache_stats(self) -> Dict[str, Any]:
+        """Счётчики хранилища embedding'ов (hits, misses, hit_rate, ...) и батчера (batches, avg_batch_size, ...)"""
+        return {**self.embedding_store.get_stats(), "batcher": self.embedding_batcher.get_stats()}
+
     def find_similar_embeddings(self, 
                                query_text: str, 
                                user_id: Optional[str] = None,
@@ -374,10 +516,8 @@ class LLMManager:
         Returns:
             Ответ LLM
         """
-        # Генерируем ключ кэша из содержимого сообщений
-        messages_text = json.dumps(messages, sort_keys=True, ensure_ascii=False)
-        messages_hash = hash(f"{messages_text}:{self.ai_model}")
-        cache_key_signature = f"llm_response:{self.ai_model}:{messages_hash}"
+        # Ключ кэша из содержимого сообщений (стабилен между процессами, в отличие от hash())
+        cache_key_signature = llm_cache_key(messages, self.ai_model)
         
         # Проверяем кэш
         if use_cache and self.cache_enabled and self.cache_manager:
@@ -0,0 +1,242 @@
+"""
+Latency-aware model routing with hedged requests
+
+ai_models_fallback used to be sent to OpenRouter as a static `models` list
+with a fixed read timeout, so a slow primary held up the whole turn. The
+router keeps rolling latency and error stats per model, orders the models of
+each call class by them and, when the first model is slower than its usual
+p95, sends the same request to the next one and takes whichever answers first.
+
+This module contains:
+- LatencyWindow: rolling window of latencies and failures of one model
+- ModelRouter: per-class model order, hedged calls, stats
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class LatencyWindow:
+    """Last `size` outcomes of one model: latency in ms and success."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+
+    def add(self, latency_ms: float, ok: bool) -> None:
+        self._samples.append((latency_ms, ok))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency percentile of successful calls (nearest rank), None without samples."""
+        latencies = sorted(latency for latency, ok in self._samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, max(0, math.ceil(q / 100 * len(latencies)) - 1))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+
+class ModelRouter:
+    """
+    Picks the model for a call and optionally hedges it.
+
+    Order: every call class (e.g. "classification", "conversation") has its
+    configured model list. Models with at least min_samples outcomes are
+    re-ordered among themselves by p95 / (1 - error_rate); models without
+    enough samples keep their configured place.
+
+    Hedging is opt-in per class (hedge_classes), since the duplicate request is
+    paid for: the request goes to the first model; if it has not answered after
+    its p95 (at least hedge_min_ms, at most hedge_max_ms if set) the same request
+    goes to the next model. A model with fewer than min_samples outcomes is not
+    hedged, its typical latency is not known yet. The first successful answer
+    wins; if the first model fails, the next model is asked right away. The
+    losing request is not cancelled, its latency still goes into the stats.
+    """
+
+    def __init__(self,
+                 classes: Dict[str, Sequence[str]],
+                 hedge_classes: Optional[Sequence[str]] = (),
+                 hedge_min_ms: float = 300,
+                 hedge_max_ms: Optional[float] = None,
+                 min_samples: int = 20,
+                 window: int = 200,
+                 max_workers: int = 8,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            classes: Call class -> models in preferred order
+            hedge_classes: Classes whose calls are hedged (None: all, empty: none)
+            hedge_min_ms: Shortest wait before the hedged request
+            hedge_max_ms: Longest wait before the hedged request (None: no cap, the p95 decides)
+            min_samples: Outcomes a model needs before its stats are trusted
+            window: Outcomes kept per model
+            max_workers: Threads for in-flight requests (two per hedged call)
+            logger: Optional logger instance
+        """
+        self.classes = {name: list(dict.fromkeys(models)) for name, models in classes.items()}
+        self.hedge_classes = None if hedge_classes is None else set(hedge_classes)
+        self.hedge_min_ms = hedge_min_ms
+        self.hedge_max_ms = hedge_max_ms
+        self.min_samples = min_samples
+        self.window = window
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "failed": 0}
+
+    # ──────────────────────────
+    #  STATS
+    # ──────────────────────────
+
+    def record(self, model: str, latency_ms: float, ok: bool) -> None:
+        with self._lock:
+            window = self._windows.get(model)
+            if window is None:
+                window = self._windows[model] = LatencyWindow(self.window)
+            window.add(latency_ms, ok)
+
+    def _score(self, model: str) -> Optional[float]:
+        window = self._windows.get(model)
+        if window is None or len(window) < self.min_samples:
+            return None
+        p95 = window.percentile(95)
+        if p95 is None:
+            return math.inf
+        return p95 / max(1.0 - window.error_rate, 0.05)
+
+    def order(self, call_class: str) -> List[str]:
+        """Models of a class, best first."""
+        models = self.classes[call_class]
+        with self._lock:
+            scores = {model: self._score(model) for model in models}
+        known = sorted((m for m in models if scores[m] is not None), key=scores.get)
+        ranked = iter(known)
+        return [next(ranked) if scores[m] is not None else m for m in models]
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait for `model` before hedging, None while its p95 is unknown."""
+        with self._lock:
+            window = self._windows.get(model)
+            p95 = window.percentile(95) if window is not None and len(window) >= self.min_samples else None
+        if p95 is None:
+            return None
+        delay_ms = max(self.hedge_min_ms, p95)
+        if self.hedge_max_ms is not None:
+            delay_ms = min(self.hedge_max_ms, delay_ms)
+        return delay_ms / 1000
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Call counters plus p50/p95/error_rate per model."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            models = {}
+            for model, window in self._windows.items():
+                p50, p95 = window.percentile(50), window.percentile(95)
+                models[model] = {
+                    "samples": len(window),
+                    "p50_ms": round(p50, 1) if p50 is not None else None,
+                    "p95_ms": round(p95, 1) if p95 is not None else None,
+                    "error_rate": round(window.error_rate, 4),
+                }
+        stats["models"] = models
+        stats["order"] = {call_class: self.order(call_class) for call_class in self.classes}
+        return stats
+
+    # ──────────────────────────
+    #  CALLS
+    # ──────────────────────────
+
+    def _timed(self, send: Callable[[str, List[str]], Any], model: str, fallbacks: List[str]) -> Any:
+        started = time.monotonic()
+        try:
+            result = send(model, fallbacks)
+        except Exception:
+            self.record(model, (time.monotonic() - started) * 1000, False)
+            raise
+        self.record(model, (time.monotonic() - started) * 1000, True)
+        return result
+
+    def _submit(self, send, models: List[str], i: int) -> Future:
+        return self._executor.submit(self._timed, send, models[i], models[i + 1:])
+
+    def call(self, call_class: str, send: Callable[[str, List[str]], Any]) -> Tuple[Any, str]:
+        """
+        Send one request through the router.
+
+        Args:
+            call_class: Key of `classes`
+            send: send(model, fallbacks) -> result; must raise on failure.
+                  fallbacks are the models after `model`, for the provider's own fallback list
+
+        Returns:
+            (result, model that produced it); the last error is raised if every model failed
+        """
+        models = self.order(call_class)
+        hedge = len(models) > 1 and (self.hedge_classes is None or call_class in self.hedge_classes)
+        with self._lock:
+            self._counters["calls"] += 1
+
+        if not hedge:
+            try:
+                return self._timed(send, models[0], models[1:]), models[0]
+            except Exception:
+                with self._lock:
+                    self._counters["failed"] += 1
+                raise
+
+        # model -> how it was started: "first", "hedge" (first one too slow) or "failover" (all failed)
+        started = {models[0]: "first"}
+        running: Dict[Future, str] = {self._submit(send, models, 0): models[0]}
+        next_model = 1
+        delay = self.hedge_delay(models[0])
+        deadline = None if delay is None else time.monotonic() + delay
+        last_error: Optional[BaseException] = None
+        while running:
+            can_hedge = deadline is not None and next_model == 1 and next_model < len(models)
+            timeout = max(0.0, deadline - time.monotonic()) if can_hedge else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                self.logger.debug("Hedging %s request from %s to %s", call_class, models[0], models[next_model])
+                started[models[next_model]] = "hedge"
+                running[self._submit(send, models, next_model)] = models[next_model]
+                next_model += 1
+                with self._lock:
+                    self._counters["hedged"] += 1
+                continue
+            for future in done:
+                model = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    self.logger.warning("Model %s failed: %s", model, e)
+                    continue
+                if started[model] != "first":
+                    with self._lock:
+                        self._counters["hedge_wins" if started[model] == "hedge" else "failovers"] += 1
+                return result, model
+            if not running and next_model < len(models):
+                # Everything in flight failed: ask the next model right away
+                started[models[next_model]] = "failover"
+                running[self._submit(send, models, next_model)] = models[next_model]
+                next_model += 1
+        with self._lock:
+            self._counters["failed"] += 1
+        raise last_error
+
+    def shutdown(self, wait_: bool = False) -> None:
+        self._executor.shutdown(wait=wait_)
@@ -468,8 +468,9 @@ class CacheYDBManager:
                   user: str,
                   key_signature: str,
                   text: str,
-                  ttl_seconds: Optional[int] = 86400) -> str:
-        """Store cache entry with automatically generated embedding"""
+                  ttl_seconds: Optional[int] = 86400,
+                  embed: bool = True) -> str:
+        """Store cache entry with automatically generated embedding (unless embed=False)"""
         try:
             self._initialize()
         except Exception as e:
@@ -505,7 +506,7 @@ class CacheYDBManager:
         }
 
         # Generate embedding if enabled
-        if self.ydb_settings.enable_embeddings and self.llm_manager is not None:
+        if embed and self.ydb_settings.enable_embeddings and self.llm_manager is not None:
             try:
                 embedding = self.llm_manager.embd_text(text)
                 if embedding and isinstance(embedding, list):
@@ -624,6 +625,197 @@ class CacheYDBManager:
             self.logger.error("Failed to delete cache entry: %s", e)
             return False
 
+    def _embed_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings of texts in one batched request (LLMManager.embd_many); None where unavailable"""
+        if not self.ydb_settings.enable_embeddings or self.llm_manager is None or not texts:
+            return [None] * len(texts)
+        try:
+            embd_many = getattr(self.llm_manager, "embd_many", None)
+            if embd_many is not None:
+                vectors = embd_many(texts)
+            else:
+                vectors = [self.llm_manager.embd_text(text) for text in texts]
+        except Exception as e:
+            self.logger.error("Failed to generate embeddings for %d entries: %s", len(texts), e)
+            return [None] * len(texts)
+        return [vector if vector and isinstance(vector, list) else None for vector in vectors]
+
+    def _bulk_upsert_columns(self) -> "ydb.BulkUpsertColumns":
+        """Column types of the cache table for BulkUpsert"""
+        embedding_type = (ydb.PrimitiveType.String if self.ydb_settings.vector_pass_as_bytes
+                          else ydb.ListType(ydb.PrimitiveType.Float))
+        return (
+            ydb.BulkUpsertColumns()
+            .add_column("id", ydb.OptionalType(ydb.PrimitiveType.Utf8))
+            .add_column("tenant", ydb.OptionalType(ydb.PrimitiveType.Utf8))
+            .add_column("user_hash", ydb.OptionalType(ydb.PrimitiveType.Utf8))
+            .add_column("text", ydb.OptionalType(ydb.PrimitiveType.Utf8))
+            .add_column("created_at", ydb.OptionalType(ydb.PrimitiveType.Uint64))
+            .add_column("expires_at", ydb.OptionalType(ydb.PrimitiveType.Datetime))
+            .add_column("embedding", ydb.OptionalType(embedding_type))
+        )
+
+    def put_cache_many(self,
+                       entries: List[Dict[str, Any]],
+                       ttl_seconds: Optional[int] = None) -> List[str]:
+        """
+        Store many cache entries: one batched embedding request, one BulkUpsert per cache_batch_size rows
+
+        Args:
+            entries: Dicts with tenant, user, key_signature, text and optionally ttl_seconds
+            ttl_seconds: TTL of entries without their own (uses default if None)
+
+        Returns:
+            Generated cache keys in the order of entries ("" for all in fault-tolerant mode on failure)
+        """
+        try:
+            self._initialize()
+        except Exception as e:
+            if self._fault_tolerant:
+                self.logger.warning("Cache initialization failed, skipping cache operation: %s", e)
+                return [""] * len(entries)
+            else:
+                raise
+
+        import datetime
+        texts = []
+        for entry in entries:
+            text = entry["text"]
+            if not isinstance(text, str):
+                text = json.dumps(text, ensure_ascii=False) if isinstance(text, (list, dict)) else str(text)
+            texts.append(text)
+        keys = [self._generate_key(entry["tenant"], entry["key_signature"]) for entry in entries]
+        embeddings = self._embed_many(texts)
+
+        now = datetime.datetime.utcnow()
+        created_at = int(time.time())
+        rows = []
+        for entry, key, text, embedding in zip(entries, keys, texts, embeddings):
+            packed = None
+            if embedding is not None:
+                try:
+                    packed = self._pack_f32(embedding)
+                except Exception as e:
+                    self.logger.error("Failed to pack embedding for %s: %s", key, e)
+            ttl = entry.get("ttl_seconds") or ttl_seconds or self.default_ttl
+            rows.append({
+                "id": key,
+                "tenant": entry["tenant"],
+                "user_hash": self._hash_user_id(entry["user"]),
+                "text": text,
+                "created_at": created_at,
+                "expires_at": now + datetime.timedelta(seconds=ttl),
+                "embedding": packed,
+            })
+
+        batch_size = getattr(self.config, "cache_batch_size", 100)
+        try:
+            # BulkUpsert goes through the driver of the ydb_dbapi connection
+            driver = getattr(self._get_connection(), "_driver", None)
+            if driver is not None:
+                columns = self._bulk_upsert_columns()
+                table_path = f"{self.ydb_settings.database}/{self.table_name}"
+                for start in range(0, len(rows), batch_size):
+                    driver.table_client.bulk_upsert(table_path, rows[start:start + batch_size], columns)
+            else:
+                self.logger.warning("YDB driver not available for BulkUpsert, upserting %d rows one by one", len(rows))
+                query = f"""
+                    UPSERT INTO `{self.table_name}` (id, tenant, user_hash, text, created_at, expires_at, embedding)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """
+                for row in rows:
+                    self._execute_query(query, [row["id"], row["tenant"], row["user_hash"], row["text"],
+                                                row["created_at"], row["expires_at"], row["embedding"]])
+
+            self.logger.debug("Cached %d entries (%d with embeddings)",
+                            len(rows), sum(row["embedding"] is not None for row in rows))
+            return keys
+
+        except Exception as e:
+            if self._fault_tolerant:
+                self.logger.warning("Failed to cache %d entries (fault-tolerant mode): %s", len(rows), e)
+                return [""] * len(entries)
+            else:
+                self.logger.error("Failed to cache %d entries: %s", len(rows), e)
+                raise
+
+    def get_cache_many(self, keys: List[str],
+                       extend_ttl_seconds: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        """Retrieve many cache entries with one SELECT ... IN per cache_batch_size keys; None where not found"""
+        try:
+            self._initialize()
+        except Exception as e:
+            if self._fault_tolerant:
+                self.logger.warning("Cache initialization failed, returning cache miss: %s", e)
+                return [None] * len(keys)
+            else:
+                raise
+
+        found: Dict[str, Dict[str, Any]] = {}
+        unique = list(dict.fromkeys(keys))
+        batch_size = getattr(self.config, "cache_batch_size", 100)
+        try:
+            for start in range(0, len(unique), batch_size):
+                chunk = unique[start:start + batch_size]
+                placeholders = ", ".join("?" * len(chunk))
+                for row in self._execute_query(
+                        f"SELECT * FROM `{self.table_name}` WHERE id IN ({placeholders})", list(chunk)):
+                    entry = {
+                        "text": row["text"],
+                        "tenant": row["tenant"],
+                        "user": row["user_hash"],
+                        "created_at": int(row["created_at"])
+                    }
+                    if row.get("embedding"):
+                        entry["embedding"] = row["embedding"]
+                    found[row["id"]] = entry
+
+                if extend_ttl_seconds:
+                    import datetime
+                    new_expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=extend_ttl_seconds)
+                    try:
+                        self._execute_query(
+                            f"UPDATE `{self.table_name}` SET expires_at = ? WHERE id IN ({placeholders})",
+                            [new_expires_at, *chunk])
+                    except Exception as e:
+                        self.logger.warning("Failed to extend TTL: %s", e)
+
+        except Exception as e:
+            if self._fault_tolerant:
+                self.logger.warning("Failed to retrieve %d cache entries (fault-tolerant mode): %s", len(keys), e)
+            else:
+                self.logger.error("Failed to retrieve %d cache entries: %s", len(keys), e)
+
+        return [dict(found[key]) if key in found else None for key in keys]
+
+    def get_cache_many_by_signature(self, tenant: str, key_signatures: List[str],
+                                    extend_ttl_seconds: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        """get_cache_many for signatures of one tenant"""
+        keys = [self._generate_key(tenant, signature) for signature in key_signatures]
+        return self.get_cache_many(keys, extend_ttl_seconds)
+
+    def delete_cache_many(self, keys: List[str]) -> int:
+        """
+        Delete many cache entries with one DELETE ... IN per cache_batch_size keys
+
+        Returns:
+            Number of keys passed to DELETE (like delete_cache, YDB does not report affected rows here)
+        """
+        if not keys:
+            return 0
+        batch_size = getattr(self.config, "cache_batch_size", 100)
+        try:
+            for start in range(0, len(keys), batch_size):
+                chunk = keys[start:start + batch_size]
+                placeholders = ", ".join("?" * len(chunk))
+                self._execute_query(f"DELETE FROM `{self.table_name}` WHERE id IN ({placeholders})", list(chunk))
+            self.logger.debug("Deleted %d cache entries", len(keys))
+            return len(keys)
+
+        except Exception as e:
+            self.logger.error("Failed to delete %d cache entries: %s", len(keys), e)
+            return 0
+
     def knn_search(self, tenant: str, query_vector: List[float], k: int = 10,
                    user: Optional[str] = None, additional_filters: Optional[str] = None) -> Dict[str, Any]:
         """Perform KNN similarity search using YDB's native vector capabilities with fallback"""
@@ -199,6 +199,101 @@ def performance_test():
     }
 
 
+def batch_performance_test():
+    """
+    put_cache / get_cache / delete_cache one by one vs put_cache_many / get_cache_many / delete_cache_many
+    (Redis pipeline, SQLite executemany in one transaction, YDB BulkUpsert).
+    """
+    logger.info("Starting batch performance test: single vs batch cache operations")
+
+    entry_counts = [10, 100, 500]
+    test_tenant = "perftest_batch"
+    test_user_uuid = "d9928cfe-3b37-4b26-9ddb-89c0275413ba"
+    test_results = {"single": {}, "batch": {}, "summary": {}}
+
+    for count in entry_counts:
+        logger.info(f"Testing with {count} entries")
+        texts = [f"Тестовая запись номер {i} для проверки пакетных операций кэша" for i in range(count)]
+
+        # One by one
+        start = time.time()
+        single_keys = [
+            cache_manager.put_cache(test_tenant, test_user_uuid, f"single_{count}_{i}", texts[i], ttl_seconds=3600)
+            for i in range(count)
+        ]
+        single_write_time = time.time() - start
+
+        start = time.time()
+        single_found = sum(cache_manager.get_cache(key) is not None for key in single_keys)
+        single_read_time = time.time() - start
+
+        start = time.time()
+        for key in single_keys:
+            cache_manager.delete_cache(key)
+        single_delete_time = time.time() - start
+
+        # Batch
+        entries = [
+            {"tenant": test_tenant, "user": test_user_uuid, "key_signature": f"batch_{count}_{i}", "text": texts[i]}
+            for i in range(count)
+        ]
+        start = time.time()
+        batch_keys = cache_manager.put_cache_many(entries, ttl_seconds=3600)
+        batch_write_time = time.time() - start
+
+        start = time.time()
+        batch_found = sum(entry is not None for entry in cache_manager.get_cache_many(batch_keys))
+        batch_read_time = time.time() - start
+
+        start = time.time()
+        cache_manager.delete_cache_many(batch_keys)
+        batch_delete_time = time.time() - start
+
+        single_total_time = single_write_time + single_read_time + single_delete_time
+        batch_total_time = batch_write_time + batch_read_time + batch_delete_time
+
+        test_results["single"][count] = {
+            "write_time": single_write_time,
+            "read_time": single_read_time,
+            "delete_time": single_delete_time,
+            "total_time": single_total_time,
+            "records_found": single_found
+        }
+        test_results["batch"][count] = {
+            "write_time": batch_write_time,
+            "read_time": batch_read_time,
+            "delete_time": batch_delete_time,
+            "total_time": batch_total_time,
+            "records_found": batch_found
+        }
+        test_results["summary"][count] = {
+            "write_faster_by": single_write_time / batch_write_time if batch_write_time > 0 else 0,
+            "read_faster_by": single_read_time / batch_read_time if batch_read_time > 0 else 0,
+            "delete_faster_by": single_delete_time / batch_delete_time if batch_delete_time > 0 else 0,
+            "batch_faster_by": single_total_time / batch_total_time if batch_total_time > 0 else 0
+        }
+
+        logger.info(f"Results for {count} entries:")
+        logger.info(f"  Single: Write={single_write_time:.4f}s, Read={single_read_time:.4f}s, "
+                    f"Delete={single_delete_time:.4f}s, Found={single_found}")
+        logger.info(f"  Batch: Write={batch_write_time:.4f}s, Read={batch_read_time:.4f}s, "
+                    f"Delete={batch_delete_time:.4f}s, Found={batch_found}")
+        logger.info(f"  Speed improvement: {test_results['summary'][count]['batch_faster_by']:.2f}x")
+
+    avg_improvement = sum(test_results["summary"][count]["batch_faster_by"]
+                          for count in entry_counts) / len(entry_counts)
+
+    logger.info("=== BATCH PERFORMANCE TEST SUMMARY ===")
+    logger.info(f"Average batch speed improvement: {avg_improvement:.2f}x")
+
+    return {
+        "status": "completed",
+        "results": test_results,
+        "average_improvement": avg_improvement,
+        "test_timestamp": time.time()
+    }
+
+
 def handler(event: Dict[str, Any], context):
     logger.debug("Incoming event: %s", event)
     body = utils.parse_body(event)
@@ -206,6 +301,8 @@ def handler(event: Dict[str, Any], context):
 
     results = performance_test()
     logger.info("Performance test results:", extra=results)
+    batch_results = batch_performance_test()
+    logger.info("Batch performance test results:", extra=batch_results)
     return
 
 # x1.5 with enabled embd generation x50 without embd generation sqlite
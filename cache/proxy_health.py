@@ -0,0 +1,233 @@
+"""
+Proxy health tracking
+
+Replaces the blocking check_proxy() call before every LLM request with a
+cached, circuit-breaker protected view of the proxy state.
+
+This module contains:
+- ProxyHealth: TTL-cached proxy status, background re-probing and a closed/open/half-open breaker
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+
+
+class ProxyHealth:
+    """
+    Decides whether outbound requests should go through the proxy.
+
+    Breaker states:
+    - closed: proxy is healthy, requests use it
+    - open: proxy is failing, requests go direct until open_cooldown expires
+    - half_open: cooldown expired, a single request is let through the proxy
+      as a trial while the rest go direct; success closes the breaker,
+      failure re-opens it
+
+    proxies() never performs network I/O. When the cached status is older than
+    ttl a probe is started in a background thread and the current decision is
+    returned immediately.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self,
+                 proxy_url: Optional[str],
+                 test_url: str,
+                 probe_timeout: float = 5,
+                 ttl: float = 30,
+                 failure_threshold: int = 2,
+                 open_cooldown: float = 60,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            proxy_url: Proxy URL (None disables the proxy entirely)
+            test_url: URL fetched through the proxy by health probes
+            probe_timeout: Timeout of a single probe in seconds
+            ttl: Seconds a probe result stays fresh
+            failure_threshold: Consecutive failures that open the breaker
+            open_cooldown: Seconds the breaker stays open before a trial
+            logger: Optional logger instance
+        """
+        self.proxy_url = proxy_url
+        self.proxy = {"http": proxy_url, "https": proxy_url}
+        self.test_url = test_url
+        self.probe_timeout = probe_timeout
+        self.ttl = ttl
+        self.failure_threshold = failure_threshold
+        self.open_cooldown = open_cooldown
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._checked_at = 0.0
+        self._probe_running = False
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+        self._metrics: Dict[str, Any] = {
+            "probes": 0,
+            "probe_failures": 0,
+            "probe_latency_ms_last": None,
+            "probe_latency_ms_total": 0.0,
+            "transitions": {},
+        }
+
+    # ──────────────────────────
+    #  STATE
+    # ──────────────────────────
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _transition(self, new_state: str):
+        """Switch breaker state; caller holds the lock."""
+        if new_state == self._state:
+            return
+        key = f"{self._state}->{new_state}"
+        self._metrics["transitions"][key] = self._metrics["transitions"].get(key, 0) + 1
+        self.logger.info("Proxy circuit breaker %s", key)
+        self._state = new_state
+        if new_state == self.OPEN:
+            self._opened_at = time.monotonic()
+
+    def _maybe_half_open(self, now: float):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_cooldown:
+            self._transition(self.HALF_OPEN)
+
+    def record_success(self):
+        """Report a request that went through the proxy successfully."""
+        with self._lock:
+            self._failures = 0
+            self._checked_at = time.monotonic()
+            self._trial_in_flight = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        """Report a request or probe that failed because of the proxy."""
+        with self._lock:
+            self._failures += 1
+            self._checked_at = time.monotonic()
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._transition(self.OPEN)
+
+    def release_trial(self):
+        """Free the half-open trial slot after a request that said nothing about the proxy."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    # ──────────────────────────
+    #  DECISION
+    # ──────────────────────────
+
+    def proxies(self) -> Optional[Dict[str, str]]:
+        """Return the proxies mapping for requests, or None to go direct. Never blocks."""
+        if not self.proxy_url:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_half_open(now)
+            state = self._state
+            stale = now - self._checked_at >= self.ttl
+            use_proxy = state == self.CLOSED
+            # One trial at a time; a trial that never reported back expires after open_cooldown
+            if state == self.HALF_OPEN and (not self._trial_in_flight
+                                            or now - self._trial_started_at >= self.open_cooldown):
+                self._trial_in_flight = True
+                self._trial_started_at = now
+                use_proxy = True
+        if stale:
+            self.probe_in_background()
+        return self.proxy if use_proxy else None
+
+    def post(self, session: requests.Session, url: str, **kwargs) -> requests.Response:
+        """
+        POST through the proxy while the breaker allows it and feed the breaker with the outcome.
+
+        A proxy-level failure (ProxyError, ConnectTimeout to the proxy) is recorded
+        and the same request is retried once direct, so a dead proxy never fails
+        a user request on its own.
+        """
+        proxies = self.proxies()
+        if not proxies:
+            return session.post(url, proxies=None, **kwargs)
+        try:
+            resp = session.post(url, proxies=proxies, **kwargs)
+        except (requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout) as e:
+            self.logger.warning("Proxy request failed (%s), retrying direct", e)
+            self.record_failure()
+            return session.post(url, proxies=None, **kwargs)
+        except Exception:
+            self.release_trial()
+            raise
+        self.record_success()
+        return resp
+
+    # ──────────────────────────
+    #  PROBING
+    # ──────────────────────────
+
+    def probe(self) -> bool:
+        """Fetch test_url through the proxy and update the breaker. Blocking."""
+        started = time.monotonic()
+        try:
+            response = requests.get(self.test_url, proxies=self.proxy, timeout=self.probe_timeout)
+            response.raise_for_status()
+            ok = True
+        except Exception as e:
+            self.logger.debug("Proxy check failed: %s", e)
+            ok = False
+        latency_ms = (time.monotonic() - started) * 1000
+
+        with self._lock:
+            self._metrics["probes"] += 1
+            self._metrics["probe_latency_ms_last"] = latency_ms
+            self._metrics["probe_latency_ms_total"] += latency_ms
+            if not ok:
+                self._metrics["probe_failures"] += 1
+        if ok:
+            self.record_success()
+        else:
+            self.record_failure()
+        return ok
+
+    def probe_in_background(self):
+        """Start a probe in a daemon thread unless one is already running."""
+        with self._lock:
+            if self._probe_running:
+                return
+            self._probe_running = True
+
+        def _run():
+            try:
+                self.probe()
+            finally:
+                with self._lock:
+                    self._probe_running = False
+
+        threading.Thread(target=_run, name="proxy-probe", daemon=True).start()
+
+    # ──────────────────────────
+    #  METRICS
+    # ──────────────────────────
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return probe latency and breaker transition counters."""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["transitions"] = dict(self._metrics["transitions"])
+            metrics["state"] = self._state
+            metrics["consecutive_failures"] = self._failures
+        probes = metrics["probes"]
+        metrics["probe_latency_ms_avg"] = metrics["probe_latency_ms_total"] / probes if probes else None
+        return metrics
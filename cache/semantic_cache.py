@@ -0,0 +1,307 @@
+"""
+Semantic cache for classification prompts
+
+cached_llm_call only hits on byte-identical messages. Classification prompts
+(intent, emotion) get the same answer for inputs that merely mean the same, so their answers are looked up by embedding similarity instead,
+generalizing find_cached_answer() from all/serverless_function.py.
+
+This module contains:
+- PromptPolicy: similarity threshold, TTL, capacity and admission frequency of one prompt
+- FrequencySketch: TinyLFU-style count-min sketch with aging
+- SemanticCache: per-prompt entries (system prompt hash + embedding of the
+  user-side messages or of the last user message), exact-match fast path, admission filter, hit rate and
+  false-hit audit sampling
+"""
+
+import hashlib
+import logging
+import math
+import operator
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .embedding_store import content_hash, normalize_text
+except ImportError:  # loaded as a top-level module (tests)
+    from embedding_store import content_hash, normalize_text
+
+
+@dataclass
+class PromptPolicy:
+    """How answers to one prompt are cached."""
+    threshold: float = 0.95        # cosine similarity needed for a hit
+    ttl_seconds: int = 3600
+    capacity: int = 512            # entries per system prompt
+    min_frequency: int = 2         # times an input must be seen before its answer is admitted
+    last_user_only: bool = False   # key on the latest user message instead of the whole window
+
+
+# Only prompts whose answer depends on what was said, not on who said it: the
+# Suno preparation prompt extracts one user's lyrics and title and is not shared
+DEFAULT_POLICIES: Dict[str, PromptPolicy] = {
+    "intent": PromptPolicy(threshold=0.93, ttl_seconds=86400, last_user_only=True),
+    "emotion": PromptPolicy(threshold=0.95, ttl_seconds=6 * 3600),
+}
+
+
+class FrequencySketch:
+    """
+    Count-min sketch of how often keys were seen (TinyLFU).
+
+    Counters saturate at 15 and are halved every `sample_size` increments, so
+    old popularity fades and the sketch stays a few KB whatever the traffic.
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4, sample_size: Optional[int] = None):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size or width * 10
+        self.rows = [array("B", bytes(width)) for _ in range(depth)]
+        self.additions = 0
+
+    def _indexes(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * i:4 * i + 4], "little") % self.width for i in range(self.depth)]
+
+    def increment(self, key: str) -> None:
+        for row, i in zip(self.rows, self._indexes(key)):
+            if row[i] < 15:
+                row[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in zip(self.rows, self._indexes(key)))
+
+    def _age(self) -> None:
+        for row in self.rows:
+            for i, count in enumerate(row):
+                row[i] = count >> 1
+        self.additions //= 2
+
+
+class _Entry:
+    __slots__ = ("vector", "answer", "expires_at", "hits")
+
+    def __init__(self, vector: array, answer: Any, expires_at: float):
+        self.vector = vector
+        self.answer = answer
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+def _unit(vector: List[float]) -> array:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+class SemanticCache:
+    """
+    Answers of classification prompts by meaning of the input.
+
+    Entries are grouped by (prompt name, system prompt hash), so editing a
+    prompt starts a fresh group. A lookup tries the exact content hash first,
+    then the most similar entry above the prompt's threshold.
+
+    Admission: every lookup counts the input in a FrequencySketch. An answer is
+    stored only once its input was seen min_frequency times, and a full group
+    evicts its least recently used entry only for an input seen at least as often.
+
+    Audit: a share (audit_rate) of similarity hits is reported as a miss, with
+    a ticket; the caller computes the real answer and passes it to audit(),
+    which counts a false hit when the answers differ.
+    """
+
+    def __init__(self,
+                 policies: Optional[Dict[str, PromptPolicy]] = None,
+                 audit_rate: float = 0.01,
+                 sketch_width: int = 4096,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            policies: Prompt name -> policy (DEFAULT_POLICIES by default); other names are not cached
+            audit_rate: Share of similarity hits re-checked against the LLM
+            sketch_width: Counters per row of the admission sketch
+            logger: Optional logger instance
+        """
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.audit_rate = audit_rate
+        self.logger = logger or logging.getLogger(__name__)
+        self._sketch = FrequencySketch(sketch_width)
+        self._groups: Dict[Tuple[str, str], "OrderedDict[str, _Entry]"] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.false_hit_samples: deque = deque(maxlen=50)
+
+    # ──────────────────────────
+    #  KEYS
+    # ──────────────────────────
+
+    @staticmethod
+    def user_side_text(messages: List[Dict[str, Any]]) -> str:
+        """Everything but the system prompt, one "role: content" line per message."""
+        return "\n".join(f"{m.get('role', '')}: {normalize_text(str(m.get('content') or ''))}"
+                         for m in messages if m.get("role") != "system")
+
+    def key_text(self, prompt: str, messages: List[Dict[str, Any]]) -> str:
+        """
+        Text a prompt's answers are keyed by.
+
+        A window of 8 messages embeds mostly history, so two windows ending in
+        different requests look alike; last_user_only prompts use the latest
+        user message alone.
+        """
+        policy = self.policies.get(prompt)
+        if policy is not None and policy.last_user_only:
+            users = [m for m in messages if m.get("role") == "user"]
+            return self.user_side_text(users[-1:])
+        return self.user_side_text(messages)
+
+    def _group(self, prompt: str, system_prompt: str) -> "OrderedDict[str, _Entry]":
+        key = (prompt, content_hash(system_prompt))
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = OrderedDict()
+        return group
+
+    def _count(self, prompt: str, name: str, n: int = 1) -> None:
+        stats = self._stats.setdefault(prompt, {
+            "lookups": 0, "hits": 0, "exact_hits": 0, "semantic_hits": 0, "misses": 0, "admitted": 0,
+            "rejected": 0, "evicted": 0, "expired": 0, "audits": 0, "false_hits": 0,
+        })
+        stats[name] += n
+
+    # ──────────────────────────
+    #  LOOKUP / STORE
+    # ──────────────────────────
+
+    def lookup(self, prompt: str, system_prompt: str, text: str,
+               embed: Callable[[str], Optional[List[float]]]) -> Tuple[Optional[Any], Optional[dict]]:
+        """
+        Find a cached answer.
+
+        Args:
+            prompt: Prompt name (policy)
+            system_prompt: The system prompt the answer was generated with
+            text: User-side content (key_text())
+            embed: text -> embedding (only called when there is no exact match)
+
+        Returns:
+            (answer or None, ticket). Pass the ticket to store() after a miss,
+            or to audit() when it carries "audit".
+        """
+        policy = self.policies.get(prompt)
+        if policy is None:
+            return None, None
+        text_key = content_hash(text)
+        now = time.time()
+        with self._lock:
+            self._sketch.increment(f"{prompt}:{text_key}")
+            self._count(prompt, "lookups")
+            group = self._group(prompt, system_prompt)
+            self._drop_expired(prompt, group, now)
+            entry = group.get(text_key)
+            if entry is not None:
+                group.move_to_end(text_key)
+                entry.hits += 1
+                self._count(prompt, "hits")
+                self._count(prompt, "exact_hits")
+                return entry.answer, None
+
+        vector = embed(text)
+        ticket = {"prompt": prompt, "system_prompt": system_prompt, "text_key": text_key,
+                  "vector": _unit(vector) if vector else None}
+        if not vector:
+            with self._lock:
+                self._count(prompt, "misses")
+            return None, ticket
+
+        # Score a snapshot outside the lock: vectors never change once stored, so
+        # other lookups and stores are not serialized behind the dot products
+        with self._lock:
+            candidates = list(group.items())
+        query = ticket["vector"]
+        best_key, best_entry, best = None, None, -1.0
+        for key, entry in candidates:
+            similarity = sum(map(operator.mul, query, entry.vector))
+            if similarity > best:
+                best_key, best_entry, best = key, entry, similarity
+
+        with self._lock:
+            # The best entry may have been evicted or replaced while scoring
+            if best_key is None or best < policy.threshold or group.get(best_key) is not best_entry:
+                self._count(prompt, "misses")
+                return None, ticket
+            entry = best_entry
+            if random.random() < self.audit_rate:
+                self._count(prompt, "audits")
+                self._count(prompt, "misses")
+                ticket.update(audit=True, cached_answer=entry.answer, similarity=best)
+                return None, ticket
+            group.move_to_end(best_key)
+            entry.hits += 1
+            self._count(prompt, "hits")
+            self._count(prompt, "semantic_hits")
+        self.logger.debug("Semantic cache hit for %s (similarity %.3f)", prompt, best)
+        return entry.answer, None
+
+    def store(self, ticket: Optional[dict], answer: Any) -> bool:
+        """Offer the answer computed after a miss; returns whether it was admitted."""
+        if not ticket or ticket.get("vector") is None:
+            return False
+        prompt = ticket["prompt"]
+        policy = self.policies[prompt]
+        frequency = self._sketch.estimate(f"{prompt}:{ticket['text_key']}")
+        with self._lock:
+            group = self._group(prompt, ticket["system_prompt"])
+            if frequency < policy.min_frequency:
+                self._count(prompt, "rejected")
+                return False
+            if ticket["text_key"] not in group and len(group) >= policy.capacity:
+                victim_key = next(iter(group))
+                if self._sketch.estimate(f"{prompt}:{victim_key}") > frequency:
+                    self._count(prompt, "rejected")
+                    return False
+                del group[victim_key]
+                self._count(prompt, "evicted")
+            group[ticket["text_key"]] = _Entry(ticket["vector"], answer, time.time() + policy.ttl_seconds)
+            group.move_to_end(ticket["text_key"])
+            self._count(prompt, "admitted")
+        return True
+
+    def audit(self, ticket: dict, answer: Any) -> bool:
+        """Compare an audited similarity hit with the real answer; returns True for a false hit."""
+        false_hit = ticket["cached_answer"] != answer
+        if false_hit:
+            with self._lock:
+                self._count(ticket["prompt"], "false_hits")
+            self.false_hit_samples.append({"prompt": ticket["prompt"], "similarity": round(ticket["similarity"], 4),
+                                           "cached": ticket["cached_answer"], "actual": answer, "at": time.time()})
+            self.logger.info("Semantic cache false hit for %s (similarity %.3f)", ticket["prompt"], ticket["similarity"])
+        return false_hit
+
+    def _drop_expired(self, prompt: str, group: "OrderedDict[str, _Entry]", now: float) -> None:
+        expired = [key for key, entry in group.items() if entry.expires_at <= now]
+        for key in expired:
+            del group[key]
+        if expired:
+            self._count(prompt, "expired", len(expired))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters per prompt with hit_rate and false_hit_rate (false hits / audits)."""
+        with self._lock:
+            stats = {prompt: dict(counters) for prompt, counters in self._stats.items()}
+            sizes: Dict[str, int] = {}
+            for (prompt, _), group in self._groups.items():
+                sizes[prompt] = sizes.get(prompt, 0) + len(group)
+        for prompt, counters in stats.items():
+            counters["entries"] = sizes.get(prompt, 0)
+            counters["hit_rate"] = round(counters["hits"] / counters["lookups"], 4) if counters["lookups"] else 0.0
+            counters["false_hit_rate"] = round(counters["false_hits"] / counters["audits"], 4) if counters["audits"] else 0.0
+        return stats
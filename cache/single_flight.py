@@ -0,0 +1,169 @@
+"""
+Single-flight coalescing of identical in-flight requests
+
+When Telegram retries a webhook or a user double-sends, the same moderation,
+embedding and LLM calls run at the same time in one warm container. Only the
+first of them goes upstream; the others wait for it and get its result.
+
+This module contains:
+- request_hash: stable hash of a call (name, args, kwargs)
+- SingleFlight: key -> in-flight Future, with per-name counters
+- single_flight: decorator for methods; every instance gets its own SingleFlight
+- get_single_flight_stats: counters of a decorated instance
+"""
+
+import copy
+import functools
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from .embedding_store import content_hash
+except ImportError:  # loaded as a top-level module (tests)
+    from embedding_store import content_hash
+
+GROUP_ATTR = "_single_flight"
+_group_lock = threading.Lock()
+
+
+def request_hash(name: str, args: tuple = (), kwargs: Optional[Dict[str, Any]] = None) -> str:
+    """Hash of a call; kwargs order does not matter, unserializable values hash by repr()."""
+    payload = json.dumps([name, list(args), kwargs or {}], sort_keys=True, ensure_ascii=False, default=repr)
+    return f"{name}:{content_hash(payload)}"
+
+
+class _Call:
+    __slots__ = ("future", "owner", "waiters")
+
+    def __init__(self):
+        self.future: Future = Future()
+        self.owner = threading.get_ident()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time; callers arriving while it runs wait for it.
+
+    - The result (or exception) is shared; waiters get a deep copy, so nobody
+      mutates the dict the first caller received.
+    - Nothing is remembered after the call returns: this is coalescing, not caching.
+    - A nested call with the same key from the running thread is executed
+      directly instead of waiting for itself.
+    """
+
+    def __init__(self, copy_result: bool = True, logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            copy_result: Give waiters a deep copy of the result
+            logger: Optional logger instance
+        """
+        self.copy_result = copy_result
+        self.logger = logger or logging.getLogger(__name__)
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, counter: str) -> None:
+        stats = self._stats.setdefault(name, {"calls": 0, "executed": 0, "coalesced": 0, "errors": 0})
+        stats[counter] += 1
+
+    def do(self, key: str, fn: Callable[[], Any], name: str = "default") -> Any:
+        """
+        fn() for the first caller with this key, its result for everyone who comes while it runs.
+
+        Args:
+            key: Request key (request_hash())
+            fn: The call itself
+            name: Counter name (usually the method name)
+        """
+        with self._lock:
+            self._count(name, "calls")
+            call = self._calls.get(key)
+            if call is not None and call.owner != threading.get_ident():
+                call.waiters += 1
+                self._count(name, "coalesced")
+                leader = False
+            elif call is not None:
+                leader = None  # re-entrant call, run it outside the group
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if leader is None:
+            return fn()
+        if not leader:
+            self.logger.debug("Coalesced %s into the in-flight request", name)
+            result = call.future.result()
+            return copy.deepcopy(result) if self.copy_result else result
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+                self._count(name, "errors")
+            call.future.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+            self._count(name, "executed")
+            shared = call.waiters > 0
+        # waiters copy from a snapshot, the first caller may already be changing its result
+        call.future.set_result(copy.deepcopy(result) if shared and self.copy_result else result)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters per name: calls, executed, coalesced, errors, coalesced_rate; inflight total."""
+        with self._lock:
+            stats: Dict[str, Any] = {name: dict(counters) for name, counters in self._stats.items()}
+            inflight = len(self._calls)
+        for counters in stats.values():
+            counters["coalesced_rate"] = round(counters["coalesced"] / counters["calls"], 4) if counters["calls"] else 0.0
+        stats["inflight"] = inflight
+        return stats
+
+
+def _group_of(instance: Any) -> SingleFlight:
+    group = instance.__dict__.get(GROUP_ATTR)
+    if group is None:
+        with _group_lock:
+            group = instance.__dict__.get(GROUP_ATTR)
+            if group is None:
+                group = SingleFlight(logger=getattr(instance, "logger", None))
+                setattr(instance, GROUP_ATTR, group)
+    return group
+
+
+def single_flight(key: Optional[Callable[..., str]] = None):
+    """
+    Coalesce concurrent identical calls of a method.
+
+    The key is computed before the call (so a method that mutates its arguments
+    still gets the key of what the caller passed): key(self, *args, **kwargs)
+    if given, otherwise request_hash() of the method name and arguments.
+
+        class TelegraphManager:
+            @single_flight()
+            def get_page(self, page_path, return_content=True): ...
+    """
+    def decorator(method: Callable) -> Callable:
+        name = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            request_key = key(self, *args, **kwargs) if key else request_hash(name, args, kwargs)
+            return _group_of(self).do(request_key, lambda: method(self, *args, **kwargs), name)
+
+        return wrapper
+
+    return decorator
+
+
+def get_single_flight_stats(instance: Any) -> Dict[str, Any]:
+    """Coalescing counters of an object with @single_flight methods ({} before the first call)."""
+    group = instance.__dict__.get(GROUP_ATTR)
+    return group.get_stats() if group else {}
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Tests for the bulk cache APIs (put_cache_many, get_cache_many, delete_cache_many).
+
+CacheManager runs against the fake Redis of test_l1_cache.py, CacheYDBManager
+against a fake ydb_dbapi connection and CacheSQLVecManager against a temporary
+SQLite file (built-in sqlite3, no sqlite-vec); embeddings come from a fake LLM manager.
+"""
+
+import importlib
+import os
+import sys
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from test_l1_cache import FakeRedis, make_cache_manager
+
+ENTRIES = [
+    {"tenant": "history", "user": "u1", "key_signature": "session|1", "text": "first", "ttl_seconds": 60},
+    {"tenant": "history", "user": "u2", "key_signature": "session|2", "text": {"role": "user"}},
+    {"tenant": "bot", "user": "u1", "key_signature": "bot|id", "text": "third"},
+]
+
+
+class FakeLLM:
+    """embd_many / embd_text recording their calls; `vectors` overrides the answer of embd_many."""
+
+    def __init__(self, fail=False, vectors=None):
+        self.fail = fail
+        self.vectors = vectors
+        self.many_calls = []
+        self.single_calls = []
+
+    def embd_many(self, texts):
+        self.many_calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("embeddings API is down")
+        return self.vectors if self.vectors is not None else [[float(len(t)), 0.0, 1.0] for t in texts]
+
+    def embd_text(self, text):
+        self.single_calls.append(text)
+        return [0.0, 0.0, 0.0]
+
+
+class DeletingRedis(FakeRedis):
+    def delete(self, *keys):
+        deleted = sum(key in self.hashes for key in keys)
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.ttls.pop(key, None)
+        return deleted
+
+
+def bulk_cache_manager(llm=None, **config):
+    manager = make_cache_manager()
+    manager._redis_client = DeletingRedis()
+    manager.llm_manager = llm
+    manager.config.cache_enable_embeddings = llm is not None
+    for name, value in config.items():
+        setattr(manager.config, name, value)
+    return manager
+
+
+# ──────────────────────────
+#  CacheManager (Redis)
+# ──────────────────────────
+
+def test_put_cache_many_keeps_order_and_per_entry_ttl():
+    manager = bulk_cache_manager(cache_batch_size=2)
+    redis = manager.redis_client
+    keys = manager.put_cache_many(ENTRIES, ttl_seconds=600)
+
+    assert keys == [manager._generate_key(e["tenant"], e["key_signature"]) for e in ENTRIES]
+    assert [redis.ttls[key] for key in keys] == [60, 600, 600]
+    assert redis.pipelines == 2  # one per cache_batch_size entries
+    assert [e["text"] for e in manager.get_cache_many(keys)] == ["first", '{"role": "user"}', "third"]
+
+    manager.put_cache_many(ENTRIES[1:2])
+    assert redis.ttls[keys[1]] == manager.default_ttl
+
+
+def test_put_cache_many_embeds_all_texts_in_one_call():
+    llm = FakeLLM()
+    manager = bulk_cache_manager(llm)
+    keys = manager.put_cache_many(ENTRIES)
+
+    assert llm.many_calls == [["first", '{"role": "user"}', "third"]] and llm.single_calls == []
+    stored = manager.redis_client.hashes
+    assert [stored[key][b"embedding"] for key in keys] == [
+        manager._pack_f32(vector) for vector in llm.embd_many(["first", '{"role": "user"}', "third"])]
+
+
+def test_failed_embeddings_store_entries_without_vectors():
+    manager = bulk_cache_manager(FakeLLM(fail=True))
+    keys = manager.put_cache_many(ENTRIES)
+    assert all(b"embedding" not in manager.redis_client.hashes[key] for key in keys)
+    assert [e["text"] for e in manager.get_cache_many(keys)] == ["first", '{"role": "user"}', "third"]
+
+    # A vector missing for one text does not drop the others
+    manager = bulk_cache_manager(FakeLLM(vectors=[[1.0, 2.0, 3.0], None, False]))
+    keys = manager.put_cache_many(ENTRIES)
+    assert [b"embedding" in manager.redis_client.hashes[key] for key in keys] == [True, False, False]
+
+
+def test_get_and_delete_many_keep_key_order():
+    manager = bulk_cache_manager()
+    keys = manager.put_cache_many(ENTRIES)
+    manager.get_cache(keys[0])  # in the L1 from now on
+
+    entries = manager.get_cache_many([keys[2], "cache:history:missing", keys[0]])
+    assert [e and e["text"] for e in entries] == ["third", None, "first"]
+
+    assert manager.delete_cache_many([keys[0], keys[2], "cache:history:missing"]) == 2
+    assert [e and e["text"] for e in manager.get_cache_many(keys)] == [None, '{"role": "user"}', None]
+    assert manager.delete_cache_many([]) == 0
+
+
+# ──────────────────────────
+#  CacheYDBManager
+# ──────────────────────────
+
+def load_cache_ydb():
+    """no-yet/cache_ydb.py as a package module; config.py and utils.py live with the function."""
+    if "ydbpkg.cache_ydb" not in sys.modules:
+        package = types.ModuleType("ydbpkg")
+        package.__path__ = [os.path.join(HERE, "no-yet")]
+        sys.modules["ydbpkg"] = package
+        config = types.ModuleType("ydbpkg.config")
+        config.Config = object
+        sys.modules["ydbpkg.config"] = config
+        utils = types.ModuleType("ydbpkg.utils")
+        utils.Utils = lambda config, logger: None
+        sys.modules["ydbpkg.utils"] = utils
+    return importlib.import_module("ydbpkg.cache_ydb")
+
+
+class FakeCursor:
+    description = None
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append((" ".join(query.split()), params))
+
+
+class FakeYDBConnection:
+    """ydb_dbapi connection; give it a `_driver` to enable BulkUpsert."""
+
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self.statements)
+
+
+class FakeTableClient:
+    def __init__(self):
+        self.bulk_upserts = []
+
+    def bulk_upsert(self, table_path, rows, columns):
+        self.bulk_upserts.append((table_path, [row["id"] for row in rows], rows))
+
+
+def ydb_manager(llm=None, **config):
+    config = types.SimpleNamespace(**{
+        "cache_embedding_dimensions": 3, "cache_default_ttl": 3600, "cache_enable_embeddings": llm is not None,
+        "cache_fault_tolerant": False, "cache_ydb_database": "/local", **config})
+    manager = load_cache_ydb().CacheYDBManager(config, llm)
+    manager._initialized = True
+    manager.connection = FakeYDBConnection()
+    return manager
+
+
+def test_ydb_upserts_row_by_row_without_a_driver():
+    manager = ydb_manager()
+    keys = manager.put_cache_many(ENTRIES, ttl_seconds=600)
+
+    assert keys == [manager._generate_key(e["tenant"], e["key_signature"]) for e in ENTRIES]
+    statements = manager.connection.statements
+    assert len(statements) == 3 and all(query.startswith("UPSERT INTO `cache_entries`") for query, _ in statements)
+    assert [params[0] for _, params in statements] == keys
+    assert [params[3] for _, params in statements] == ["first", '{"role": "user"}', "third"]
+    # expires_at: 60s for the entry with its own TTL, the 600s of the call for the others
+    expires = [params[5] for _, params in statements]
+    assert [round((e - expires[0]).total_seconds()) for e in expires] == [0, 540, 540]
+    assert all(params[6] is None for _, params in statements)
+
+
+def test_ydb_bulk_upserts_per_batch_with_a_driver():
+    llm = FakeLLM()
+    manager = ydb_manager(llm, cache_batch_size=2)
+    table_client = FakeTableClient()
+    manager.connection._driver = types.SimpleNamespace(table_client=table_client)
+    keys = manager.put_cache_many(ENTRIES)
+
+    assert manager.connection.statements == []
+    assert [(path, ids) for path, ids, _ in table_client.bulk_upserts] == [
+        ("/local/cache_entries", keys[:2]), ("/local/cache_entries", keys[2:])]
+    assert len(llm.many_calls) == 1
+    rows = [row for _, _, batch in table_client.bulk_upserts for row in batch]
+    assert [row["embedding"] for row in rows] == [manager._pack_f32([float(len(t)), 0.0, 1.0])
+                                                  for t in llm.many_calls[0]]
+
+
+# ──────────────────────────
+#  CacheSQLVecManager
+# ──────────────────────────
+
+SQLVEC_DIR = os.path.join(HERE, "..", "poymoymir", "docs", "sql_vec", "code")
+
+
+def load_cache_sqlvec():
+    """sql_vec/code/cache_sqlvec.py as a package module; runs on the built-in sqlite3 without sqlite-vec."""
+    if "sqlvecpkg.cache_sqlvec" not in sys.modules:
+        package = types.ModuleType("sqlvecpkg")
+        package.__path__ = [SQLVEC_DIR]
+        sys.modules["sqlvecpkg"] = package
+        config = types.ModuleType("sqlvecpkg.config")
+        config.Config = object
+        sys.modules["sqlvecpkg.config"] = config
+        utils = types.ModuleType("sqlvecpkg.utils")
+        utils.Utils = lambda config, logger: None
+        sys.modules["sqlvecpkg.utils"] = utils
+    return importlib.import_module("sqlvecpkg.cache_sqlvec")
+
+
+def sqlvec_manager(tmp_path, llm=None, **config):
+    config = types.SimpleNamespace(**{
+        "cache_sqlite_path": str(tmp_path / "cache.db"), "cache_index_name": "idx:cache",
+        "cache_key_prefix": "cache:", "cache_embedding_dimensions": 3, "cache_default_ttl": 3600,
+        "cache_fault_tolerant": False, "cache_enable_embeddings": False, **config})
+    return load_cache_sqlvec().CacheSQLVecManager(config, llm)
+
+
+def sqlvec_rows(manager, keys):
+    rows = manager._execute(f"""
+        SELECT id, text, created_at, expires_at FROM cache_entries WHERE id IN ({", ".join("?" * len(keys))})
+    """, tuple(keys)).fetchall()
+    return {row["id"]: row for row in rows}
+
+
+def test_sqlvec_put_cache_many_is_one_executemany_transaction(tmp_path, monkeypatch):
+    manager = sqlvec_manager(tmp_path)
+    executemany = []
+    original = manager._executemany
+    monkeypatch.setattr(manager, "_executemany",
+                        lambda conn, query, rows: executemany.append(len(rows)) or original(conn, query, rows))
+    keys = manager.put_cache_many(ENTRIES, ttl_seconds=600)
+
+    assert keys == [manager._generate_key(e["tenant"], e["key_signature"]) for e in ENTRIES]
+    assert executemany == [3]
+    rows = sqlvec_rows(manager, keys)
+    assert [rows[key]["text"] for key in keys] == ["first", '{"role": "user"}', "third"]
+    assert [rows[key]["expires_at"] - rows[key]["created_at"] for key in keys] == [60, 600, 600]
+    assert [e["text"] for e in manager.get_cache_many(keys)] == ["first", '{"role": "user"}', "third"]
+
+
+def test_sqlvec_failed_batch_rolls_back(tmp_path):
+    manager = sqlvec_manager(tmp_path)
+    broken = ENTRIES[:2] + [dict(ENTRIES[2], tenant=None)]  # tenant is NOT NULL
+    keys = [manager._generate_key(e["tenant"], e["key_signature"]) for e in broken]
+
+    try:
+        manager.put_cache_many(broken)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("put_cache_many did not raise on the NOT NULL violation")
+    assert manager.get_cache_many(keys) == [None, None, None]
+
+
+def test_sqlvec_get_and_delete_many_keep_key_order(tmp_path):
+    manager = sqlvec_manager(tmp_path, cache_batch_size=2)
+    keys = manager.put_cache_many(ENTRIES)
+
+    entries = manager.get_cache_many([keys[2], "cache:history:missing", keys[0], keys[2]])
+    assert [e and e["text"] for e in entries] == ["third", None, "first", "third"]
+
+    assert manager.delete_cache_many([keys[0], keys[2], "cache:history:missing"]) == 2
+    assert [e and e["text"] for e in manager.get_cache_many(keys)] == [None, '{"role": "user"}', None]
+    assert manager.delete_cache_many([]) == 0
+
+
+def test_sqlvec_embeds_all_texts_in_one_call(tmp_path):
+    llm = FakeLLM()
+    manager = sqlvec_manager(tmp_path, llm, cache_enable_embeddings=True)
+    assert manager._embed_many(["a", "bb"]) == [[1.0, 0.0, 1.0], [2.0, 0.0, 1.0]]
+    assert llm.many_calls == [["a", "bb"]] and llm.single_calls == []
+
+    manager.llm_manager = FakeLLM(fail=True)
+    assert manager._embed_many(["a", "bb"]) == [None, None]
+    manager.llm_manager = FakeLLM(vectors=[[1.0, 2.0, 3.0], None])
+    assert manager._embed_many(["a", "bb"]) == [[1.0, 2.0, 3.0], None]
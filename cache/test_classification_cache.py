@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the classification calls of LLMManager going through the semantic cache.
+
+The chat and embedding requests are replaced by fakes, so no API is required.
+"""
+
+import importlib
+import logging
+import os
+import sys
+import types
+from dataclasses import replace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from test_l1_cache import load_cache_manager
+
+
+def load_llm_manager():
+    """llm_manager.py in the package test_l1_cache builds (utils.py, like config.py, lives with the function)."""
+    package = load_cache_manager().__name__.rpartition(".")[0]
+    if f"{package}.utils" not in sys.modules:
+        utils = types.ModuleType(f"{package}.utils")
+        utils.Utils = object
+        sys.modules[f"{package}.utils"] = utils
+    return importlib.import_module(f"{package}.llm_manager")
+
+
+def make_llm():
+    """LLMManager with only what llm_conversation uses; records chat requests and embedded texts."""
+    module = load_llm_manager()
+    llm = module.LLMManager.__new__(module.LLMManager)
+    llm.logger = logging.getLogger("test-classification-cache")
+    llm.semantic_cache = module.SemanticCache({name: replace(policy, min_frequency=1)
+                                               for name, policy in module.DEFAULT_POLICIES.items()}, audit_rate=0)
+    llm.chats = []
+    llm.embedded = []
+
+    def embd_text(text):
+        llm.embedded.append(text)
+        return [1.0, 0.0, 0.0] if "грустно" in text else [0.0, 1.0, 0.0]
+
+    def chat(body, request_class):
+        llm.chats.append(body["messages"][0]["content"])
+        return {"choices": [{"message": {"content": '{"intent": "conversation", "emotions": []}'}}]}
+
+    llm.embd_text = embd_text
+    llm._chat = chat
+    return llm
+
+
+def window(*history, last):
+    return [{"role": role, "content": content} for role, content in history] + [{"role": "user", "content": last}]
+
+
+def test_repeated_input_is_answered_from_cache():
+    llm = make_llm()
+    for _ in range(3):
+        messages = window(last="мне грустно")
+        assert llm.llm_conversation(list(messages), "detect intent", cache_prompt="intent")["intent"] == "conversation"
+        llm.llm_conversation(list(messages), "detect emotion", cache_prompt="emotion")
+
+    # One request per classifier; the other calls hit the cache of their own prompt
+    assert llm.chats == ["detect intent", "detect emotion"]
+    stats = llm.get_semantic_cache_stats()
+    assert stats["intent"]["exact_hits"] == 2 and stats["emotion"]["exact_hits"] == 2
+
+
+def test_intent_keys_on_the_last_user_message():
+    llm = make_llm()
+    llm.llm_conversation(window(("user", "привет"), ("assistant", "О чём поём?"), last="мне грустно"),
+                         "detect intent", cache_prompt="intent")
+    # Other history, same request: an exact hit; another request after the same history: a miss
+    llm.llm_conversation(window(("user", "добрый вечер"), last="мне грустно"), "detect intent", cache_prompt="intent")
+    llm.llm_conversation(window(("user", "привет"), ("assistant", "О чём поём?"), last="хочу песню"),
+                         "detect intent", cache_prompt="intent")
+    assert llm.chats == ["detect intent", "detect intent"]
+    assert llm.embedded == ["user: мне грустно", "user: хочу песню"]
+
+
+def test_song_preparation_is_not_shared_between_users():
+    llm = make_llm()
+    for _ in range(2):
+        llm.llm_conversation(window(("assistant", "куплет"), last="готово"), "prepare suno", cache_prompt="suno_prep")
+    assert llm.chats == ["prepare suno", "prepare suno"]
+    assert llm.embedded == []
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for embedding micro-batching.
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from embedding_batcher import EmbeddingBatcher
+
+
+class FakeEmbeddings:
+    def __init__(self, latency=0.0, fail_on=None):
+        self.latency = latency
+        self.fail_on = fail_on
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, texts, group):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls.append((group, list(texts)))
+        if self.fail_on in texts:
+            raise RuntimeError("upstream error")
+        return [[float(len(text)), float(hash(group) % 7)] for text in texts]
+
+
+def test_concurrent_requests_share_one_call():
+    api = FakeEmbeddings(latency=0.02)
+    batcher = EmbeddingBatcher(api, max_wait_ms=20)
+    texts = [f"text {i}" for i in range(20)] + ["text 1"] * 5
+    with ThreadPoolExecutor(max_workers=25) as pool:
+        results = list(pool.map(batcher.embed, texts))
+    batcher.close()
+    assert results == [[float(len(t)), float(hash(None) % 7)] for t in texts]
+    assert len(api.calls) == 1
+    assert sorted(api.calls[0][1]) == sorted(set(texts))
+    stats = batcher.get_stats()
+    assert stats["deduplicated"] == 5
+    assert stats["avg_batch_size"] == 20
+
+
+def test_max_batch_splits_and_groups_are_separate():
+    api = FakeEmbeddings()
+    batcher = EmbeddingBatcher(api, max_batch=3, max_wait_ms=50)
+    futures = [batcher.submit(f"t{i}", "small") for i in range(7)] + [batcher.submit("x", "large")]
+    for future in futures:
+        future.result(2)
+    batcher.close()
+    sizes = sorted((group, len(texts)) for group, texts in api.calls)
+    assert sizes == [("large", 1), ("small", 1), ("small", 3), ("small", 3)]
+
+
+def test_single_request_waits_at_most_the_window():
+    batcher = EmbeddingBatcher(FakeEmbeddings(), max_wait_ms=10)
+    start = time.monotonic()
+    batcher.embed("alone", timeout=2)
+    assert time.monotonic() - start < 0.5
+    batcher.close()
+
+
+def test_failure_only_fails_its_batch():
+    api = FakeEmbeddings(fail_on="bad")
+    batcher = EmbeddingBatcher(api, max_wait_ms=10)
+    bad = batcher.submit("bad", "a")
+    good = batcher.submit("good", "b")
+    assert good.result(2) == [4.0, float(hash("b") % 7)]
+    try:
+        bad.result(2)
+        assert False, "expected the batch to fail"
+    except RuntimeError:
+        pass
+    batcher.close()
+    assert batcher.get_stats()["failed_batches"] == 1
+
+
+def test_slow_batch_does_not_hold_the_next_one():
+    api = FakeEmbeddings(latency=0.3)
+    batcher = EmbeddingBatcher(api, max_batch=2, max_wait_ms=5, max_in_flight=4)
+    start = time.monotonic()
+    futures = [batcher.submit(f"t{i}") for i in range(6)]
+    for future in futures:
+        future.result(2)
+    elapsed = time.monotonic() - start
+    batcher.close()
+    assert len(api.calls) == 3
+    assert elapsed < 0.6
+
+
+def test_close_waits_for_batches_in_flight():
+    api = FakeEmbeddings(latency=0.1)
+    batcher = EmbeddingBatcher(api, max_wait_ms=5)
+    future = batcher.submit("late")
+    batcher.close()
+    assert future.done()
+    assert future.result() == [4.0, float(hash(None) % 7)]
+
+
+def test_embed_timeout_bounds_a_stuck_batch():
+    release = threading.Event()
+    batcher = EmbeddingBatcher(lambda texts, group: release.wait() and [[0.0]] * len(texts), max_wait_ms=5)
+    start = time.monotonic()
+    try:
+        batcher.embed("stuck", timeout=0.1)
+        assert False, "expected a timeout"
+    except Exception as e:
+        assert type(e).__name__ == "TimeoutError"
+    assert time.monotonic() - start < 1
+    release.set()
+    batcher.close()
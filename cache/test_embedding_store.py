@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for content-addressed keys and the embedding store.
+"""
+
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from embedding_store import EmbeddingStore, embedding_key, llm_cache_key, pack_vector, unpack_vector
+
+
+class FakeRedis:
+    def __init__(self, fail=False):
+        self.data = {}
+        self.fail = fail
+
+    def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis is down")
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis is down")
+        self.data[key] = value
+
+
+def test_keys_are_stable_across_processes():
+    code = ("import sys; sys.path.insert(0, %r); from embedding_store import embedding_key; "
+            "print(embedding_key('привет, мир', 'text-embedding-3-small', 1536))") % os.path.dirname(os.path.abspath(__file__))
+    # Different hash seeds: hash() would give different keys here
+    keys = {subprocess.run([sys.executable, "-c", code], env=dict(os.environ, PYTHONHASHSEED=seed),
+                           capture_output=True, text=True, check=True).stdout.strip() for seed in ("1", "2")}
+    assert keys == {embedding_key("привет, мир", "text-embedding-3-small", 1536)}
+
+
+def test_keys_normalize_text_and_separate_models():
+    key = embedding_key("привет,  мир\n", "m", 1536)
+    assert key == embedding_key(" привет, мир", "m", 1536)
+    assert key != embedding_key("привет, мир", "other", 1536)
+    assert key != embedding_key("привет, мир", "m", 512)
+    messages = [{"role": "user", "content": "hi"}]
+    assert llm_cache_key(messages, "gpt-4o") == llm_cache_key([{"content": "hi", "role": "user"}], "gpt-4o")
+    assert llm_cache_key(messages, "gpt-4o") != llm_cache_key(messages, "gpt-4o", temperature=0)
+
+
+def test_pack_roundtrip():
+    vec = [0.5, -0.25, 0.125, 1.0]
+    assert unpack_vector(pack_vector(vec)) == vec
+    assert len(pack_vector(vec, "f16")) == 2 * len(vec)
+    assert unpack_vector(pack_vector(vec, "f16"), "f16") == vec
+
+
+def test_store_shares_vectors_and_counts():
+    redis = FakeRedis()
+    first, second = EmbeddingStore(redis), EmbeddingStore(redis, local_size=1)
+    assert first.get("k") is None
+    first.put("k", [0.5, 0.25])
+    # Another process (fresh LRU) finds it in the backend, then locally
+    assert second.get("k") == [0.5, 0.25]
+    assert second.get("k") == [0.5, 0.25]
+    stats = second.get_stats()
+    assert (stats["hits"], stats["local_hits"], stats["misses"]) == (2, 1, 0)
+    assert first.get_stats()["misses"] == 1
+    assert first.get_stats()["bytes_stored"] == 8
+
+
+def test_backend_errors_are_misses():
+    store = EmbeddingStore(FakeRedis(fail=True))
+    store.put("k", [1.0])
+    assert store.get("k") == [1.0]  # still in the local LRU
+    assert store.get("other") is None
+    stats = store.get_stats()
+    assert stats["errors"] == 2
+    assert stats["hit_rate"] == 0.5
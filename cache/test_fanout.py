@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the concurrent fan-out executor.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fanout import FanOutExecutor
+
+
+def slow(seconds, value):
+    def _call():
+        time.sleep(seconds)
+        return value
+    return _call
+
+
+def test_calls_run_concurrently():
+    executor = FanOutExecutor(max_workers=4)
+    started = time.monotonic()
+    result = executor.run({"emotion": slow(0.2, "e"), "intent": slow(0.2, "i")}, timeout=2)
+    elapsed = time.monotonic() - started
+
+    assert result.complete
+    assert result.results == {"emotion": "e", "intent": "i"}
+    assert elapsed < 0.35, "calls should overlap, not run back to back"
+
+
+def test_partial_results_on_timeout_and_error():
+    def boom():
+        raise ValueError("bad json")
+
+    executor = FanOutExecutor(max_workers=4)
+    result = executor.run(
+        {"fast": slow(0.0, 1), "slow": slow(1.0, 2), "broken": boom},
+        timeouts={"slow": 0.1},
+        timeout=2,
+    )
+
+    assert not result.complete
+    assert result.results == {"fast": 1}
+    assert result.timed_out == ["slow"]
+    assert isinstance(result.errors["broken"], ValueError)
+
+
+def test_per_call_deadline_is_measured_from_start():
+    executor = FanOutExecutor(max_workers=4)
+    result = executor.run(
+        {"a": slow(0.15, "a"), "b": slow(0.15, "b")},
+        timeouts={"a": 0.3, "b": 0.3},
+    )
+
+    # Waiting for "a" must not consume "b"'s budget
+    assert result.complete
+
+
+if __name__ == "__main__":
+    test_calls_run_concurrently()
+    test_partial_results_on_timeout_and_error()
+    test_per_call_deadline_is_measured_from_start()
+    print("✅ Fan-out tests passed!")
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Tests for the append-only segmented history cache.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_segments import CacheManagerSegmentStore, MemorySegmentStore, SegmentedHistory, check_consistency
+
+
+class Messages:
+    """messages table of one or more sessions; seq is the position + 1."""
+
+    def __init__(self):
+        self.rows = {}
+        self.queries = []
+
+    def add(self, session, n):
+        rows = self.rows.setdefault(session, [])
+        for _ in range(n):
+            rows.append({"role": ("user", "assistant")[len(rows) % 2], "content": f"m{len(rows) + 1}"})
+        return len(rows)
+
+    def load_tail(self, session, size):
+        rows = self.rows.get(session, [])
+        self.queries.append(("tail", session))
+        return len(rows), rows[len(rows) - len(rows) % size:]
+
+    def load_range(self, session, first, last):
+        self.queries.append(("range", first, last))
+        return self.rows.get(session, [])[first - 1:last]
+
+
+class FakeCacheManager:
+    """put_cache / get_cache_by_signature of CacheManager and CacheSQLVecManager."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def put_cache(self, tenant, user, key_signature, text, ttl_seconds=None, embed=True):
+        assert embed is False, "history entries are never embedded"
+        self.entries[(tenant, key_signature)] = {"text": text, "user": user}
+        return key_signature
+
+    def get_cache_by_signature(self, tenant, key_signature, extend_ttl_seconds=None):
+        return self.entries.get((tenant, key_signature))
+
+
+def make(store=None, size=4):
+    db = Messages()
+    return db, SegmentedHistory(store or MemorySegmentStore(), db.load_tail, db.load_range, segment_size=size)
+
+
+def contents(history):
+    return [m["content"] for m in history]
+
+
+def test_last_n_across_segments_and_tail():
+    db, cache = make()
+    db.add("s", 10)  # segments 1-4, 5-8, tail 9-10
+    assert contents(cache.last("s", 7)) == [f"m{i}" for i in range(4, 11)]
+    assert db.queries == [("tail", "s"), ("range", 5, 8), ("range", 1, 4)]
+
+    db.queries.clear()
+    assert contents(cache.last("s", 7)) == [f"m{i}" for i in range(4, 11)]
+    assert contents(cache.last("s", 50)) == [f"m{i}" for i in range(1, 11)]
+    assert db.queries == []
+    assert cache.get_stats()["segment_hit_rate"] == 0.667  # 4 hits after 2 misses
+
+
+def test_new_message_only_rebuilds_the_tail():
+    db, cache = make()
+    db.add("s", 10)
+    cache.last("s", 10)
+    for expected_last in range(11, 15):
+        db.add("s", 1)
+        cache.drop_tail("s")
+        db.queries.clear()
+        assert contents(cache.last("s", 6))[-1] == f"m{expected_last}"
+        # Crossing into a new segment reads it once from the database, then it is immutable
+        assert db.queries in ([("tail", "s")], [("tail", "s"), ("range", 9, 12)])
+    assert contents(cache.last("s", 6)) == [f"m{i}" for i in range(9, 15)]
+
+
+def test_short_and_empty_sessions_and_partial_segments_are_not_cached():
+    db, cache = make()
+    assert cache.last("empty", 5) == []
+    db.add("short", 3)
+    assert contents(cache.last("short", 5)) == ["m1", "m2", "m3"]
+
+    # A segment that comes back short from the database (rows still being written) is not stored
+    store = MemorySegmentStore()
+    db, cache = make(store)
+    db.add("s", 8)
+    cache.load_range = lambda session, first, last: db.load_range(session, first, last)[:2] if first == 1 else \
+        db.load_range(session, first, last)
+    cache.last("s", 8)
+    assert store.get("s:s4:0") is None and store.get("s:s4:1") is not None
+
+
+def test_stale_tail_is_not_cached_when_a_message_lands_during_the_load():
+    db, cache = make()
+    db.add("s", 5)
+    load_tail = db.load_tail
+
+    def racing_load(session, size):
+        result = load_tail(session, size)
+        db.add(session, 1)          # another writer saves a message...
+        cache.drop_tail(session)    # ...and drops the tail after our query
+        return result
+    cache.load_tail = racing_load
+    assert contents(cache.last("s", 2)) == ["m4", "m5"]
+
+    cache.load_tail = db.load_tail
+    assert contents(cache.last("s", 2)) == ["m5", "m6"]
+
+
+def test_cache_manager_store():
+    manager = FakeCacheManager()
+    db, cache = make(CacheManagerSegmentStore(manager))
+    db.add("sess", 9)
+    first = cache.last("sess", 9)
+    assert cache.last("sess", 9) == first and len(db.queries) == 3
+    assert {tenant for tenant, _ in manager.entries} == {"history_segments"}
+    assert manager.entries[("history_segments", "sess:s4:0")]["user"] == "sess"
+
+
+def save(db, cache, session):
+    """save_message with write-through: insert, then append with the seq the database assigned."""
+    seq = db.add(session, 1)
+    return cache.append(session, seq, db.rows[session][-1])
+
+
+def test_write_through_keeps_reads_off_the_database():
+    db, cache = make()
+    db.add("s", 10)
+    cache.last("s", 8)
+    db.queries.clear()
+    for _ in range(7):  # fills the tail, closes segment 2 (seq 9-12), starts the next tail
+        assert save(db, cache, "s") is True
+        assert contents(cache.last("s", 8)) == [f"m{i}" for i in range(len(db.rows["s"]) - 7, len(db.rows["s"]) + 1)]
+    assert db.queries == []
+    # A new session needs no read before its first message
+    assert save(db, cache, "new") is True and contents(cache.last("new", 5)) == ["m1"]
+    assert db.queries == [] and cache.get_stats()["appends"] == 8
+
+
+def test_out_of_order_append_drops_the_tail():
+    db, cache = make()
+    db.add("s", 5)
+    cache.last("s", 5)
+    # Two writers: seq 6 and 7 are committed, the writer of 7 appends first
+    db.add("s", 2)
+    assert cache.append("s", 7, db.rows["s"][6]) is False
+    assert cache.append("s", 6, db.rows["s"][5]) is False  # the tail is a drop marker now
+    db.queries.clear()
+    assert contents(cache.last("s", 3)) == ["m5", "m6", "m7"]
+    assert db.queries == [("tail", "s")]
+    assert cache.get_stats()["append_conflicts"] == 2
+
+
+def test_consistency_check_reports_and_repairs_drift():
+    store = MemorySegmentStore()
+    db, cache = make(store)
+    for session in ("a", "b", "c", "d"):
+        db.add(session, 10)
+        cache.last(session, 10)
+    db.rows["b"][9]["content"] = "edited"  # tail of b
+    db.rows["c"][1]["content"] = "edited"  # segment 0 of c
+    db.add("d", 1)                          # saved without write-through
+
+    report = check_consistency(cache, ["a", "b", "c", "d", "never-read"], 10, repair=True)
+    assert (report["ok"], report["drift"], report["stale"], report["not_cached"]) == (1, 2, 1, 1)
+    assert report["sessions"]["b"] == {"status": "drift", "seq": 10, "segment": None}
+    assert report["sessions"]["c"] == {"status": "drift", "seq": 2, "segment": 0}
+    assert report["drift_rate"] == 0.75
+
+    for session in ("b", "c", "d"):
+        cache.last(session, 11)
+    assert check_consistency(cache, ["a", "b", "c", "d"], 10)["ok"] == 4
+
+
+class FakeRedis:
+    """hget/hset/expire and WATCH/MULTI/EXEC of redis-py; a write during WATCH fails EXEC."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.version = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.ops = redis, []
+        self.watched = redis.version
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, key):
+        self.watched = self.redis.version
+
+    def unwatch(self):
+        pass
+
+    def hget(self, key, field):
+        value = self.redis.hashes.get(key, {}).get(field)
+        return value.encode() if value is not None else None
+
+    def multi(self):
+        pass
+
+    def hset(self, key, mapping):
+        self.ops.append((key, mapping))
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        if self.redis.version != self.watched:
+            raise RuntimeError("WatchError")
+        for key, mapping in self.ops:
+            self.redis.hashes[key] = dict(mapping)
+        self.redis.version += 1
+
+
+def test_cache_manager_store_writes_redis_hashes_without_put_cache():
+    manager = FakeCacheManager()
+    manager.redis_client = FakeRedis()
+    manager._generate_key = lambda tenant, signature: f"cache:{tenant}:{signature}"
+    manager.put_cache = None  # would call the embeddings API with CACHE_ENABLE_EMBEDDINGS on
+    invalidated = []
+    manager.l1 = type("L1", (), {"invalidate": lambda self, keys: invalidated.extend(keys)})()
+    manager.get_cache_by_signature = lambda tenant, signature, extend_ttl_seconds=None: (
+        {"text": manager.redis_client.hashes[f"cache:{tenant}:{signature}"]["text"]}
+        if f"cache:{tenant}:{signature}" in manager.redis_client.hashes else None)
+    db, cache = make(CacheManagerSegmentStore(manager))
+    db.add("sess", 9)
+    cache.last("sess", 9)
+    cache.drop_tail("sess")
+    assert set(manager.redis_client.hashes) == {"cache:history_segments:sess:s4:0",
+                                                "cache:history_segments:sess:s4:1",
+                                                "cache:history_segments:sess:s4:tail"}
+    assert manager.redis_client.hashes["cache:history_segments:sess:s4:0"]["user"] == "sess"
+    assert "cache:history_segments:sess:s4:tail" in invalidated
+
+
+def test_cache_manager_store_compare_and_put_uses_redis_watch():
+    manager = FakeCacheManager()
+    manager.redis_client = FakeRedis()
+    manager._generate_key = lambda tenant, signature: f"cache:{tenant}:{signature}"
+    invalidated = []
+    manager.l1 = type("L1", (), {"invalidate": lambda self, keys: invalidated.extend(keys)})()
+    store = CacheManagerSegmentStore(manager)
+
+    assert store.compare_and_put("s:s4:tail", None, "v1", 60) is True
+    assert manager.redis_client.hashes["cache:history_segments:s:s4:tail"]["text"] == "v1"
+    assert store.compare_and_put("s:s4:tail", None, "v2", 60) is False
+    assert store.compare_and_put("s:s4:tail", "v1", "v2", 60) is True
+    # The in-process L1 of the manager drops the old value at once
+    assert invalidated == ["cache:history_segments:s:s4:tail"] * 2
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process L1 cache and its CLIENT TRACKING invalidation.
+
+Redis connections are replaced by fakes that record the commands sent.
+"""
+
+import importlib
+import os
+import sys
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from l1_cache import INVALIDATE_CHANNEL, L1Cache, RedisTrackingInvalidator, parse_budgets
+
+
+def enabled_l1(**kwargs):
+    l1 = L1Cache(**kwargs)
+    l1.enabled = True
+    return l1
+
+
+def read(l1, tenant, key, value, ttl=None):
+    """The CacheManager.get_cache miss path: begin, read Redis, fill."""
+    token = l1.begin(key)
+    return l1.fill(tenant, key, value, token, ttl=ttl)
+
+
+def test_per_tenant_budgets_and_counters():
+    l1 = enabled_l1(default_budget=2, tenant_budgets=parse_budgets("history_segments=3, bot=1"))
+    for n in range(5):
+        read(l1, "embeddings", f"e{n}", {"text": f"v{n}"})
+        read(l1, "history_segments", f"h{n}", {"text": f"h{n}"})
+    read(l1, "bot", "b", {"text": "bot-id"})
+
+    assert l1.get("embeddings", "e4") == {"text": "v4"}
+    assert l1.get("embeddings", "e0") is None  # evicted by its own tenant only
+    assert l1.get("history_segments", "h2") is not None and l1.get("bot", "b") is not None
+
+    stats = l1.get_stats()
+    assert stats["tenants"]["embeddings"]["evictions"] == 3
+    assert stats["tenants"]["history_segments"]["size"] == 3
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (3, 1, 0.75)
+    assert l1.get_stats("bot")["budget"] == 1
+
+
+def test_values_are_copies_and_ttl_follows_redis():
+    l1 = enabled_l1(ttl=300)
+    value = {"text": "a"}
+    read(l1, "t", "k", value, ttl=0.05)
+    value["text"] = "changed"
+    l1.get("t", "k")["text"] = "changed too"
+    assert l1.get("t", "k") == {"text": "a"}
+    time.sleep(0.06)
+    assert l1.get("t", "k") is None and l1.get_stats("t")["expirations"] == 1
+    # A key without a TTL (-1) or already gone (-2 -> None) does not outlive the L1 TTL
+    assert read(l1, "t", "forever", {"text": "x"}, ttl=None)
+
+
+def test_fill_after_invalidation_is_skipped():
+    l1 = enabled_l1()
+    token = l1.begin("k")
+    l1.invalidate(["k"])  # written by someone while we were reading the old value
+    assert l1.fill("t", "k", {"text": "old"}, token) is False
+    assert read(l1, "t", "k", {"text": "new"}) is True
+
+    token = l1.begin("other")
+    l1.invalidate_all()
+    assert l1.fill("t", "other", {"text": "x"}, token) is False
+    assert l1.get("t", "k") is None
+
+    # Nothing is served or stored while invalidations are not received
+    l1.enabled = False
+    assert read(l1, "t", "k", {"text": "new"}) is False and l1.get("t", "k") is None
+    assert l1._pending == {}
+
+
+def test_extend_due_once_per_interval():
+    l1 = enabled_l1()
+    read(l1, "llm", "k", {"text": "answer"})
+    assert l1.extend_due("k", 0.05, 3600) is False  # just extended by the read
+    time.sleep(0.06)
+    assert l1.extend_due("k", 0.05, 3600) is True
+    assert l1.extend_due("k", 0.05, 3600) is False
+
+
+class FakeConnection:
+    def __init__(self, replies=None, messages=None):
+        self.sent = []
+        self.replies = list(replies or [])
+        self.messages = list(messages or [])
+        self.closed = False
+
+    def send_command(self, *args):
+        if self.closed:
+            raise ConnectionError("closed")
+        self.sent.append(args)
+
+    def read_response(self):
+        return self.replies.pop(0) if self.replies else self.messages.pop(0)
+
+    def can_read(self, timeout=0):
+        return bool(self.messages)
+
+    def connect(self):
+        self.closed = False
+
+    def disconnect(self):
+        self.closed = True
+
+
+class FakePool:
+    """Only the settings are used: the tracking connections are made outside the pool."""
+
+    def __init__(self, *connections):
+        connections = list(connections)
+        self.connection_kwargs = {}
+        self.connection_class = lambda: connections.pop(0)
+
+    def get_connection(self, command_name, *keys, **options):
+        raise AssertionError("tracking connections must not be checked out of the pool")
+
+
+class FakeClient:
+    def __init__(self, *connections):
+        self.connection_pool = FakePool(*connections)
+
+
+def test_tracking_invalidates_and_flushes_on_disconnect():
+    listener = FakeConnection(replies=[42, [b"subscribe", INVALIDATE_CHANNEL.encode(), 1]],
+                              messages=[[b"message", INVALIDATE_CHANNEL.encode(), [b"cache:t:a"]],
+                                        [b"message", INVALIDATE_CHANNEL.encode(), None]])
+    tracker = FakeConnection(replies=[b"OK", b"PONG", 1])
+    l1 = L1Cache()
+    invalidator = RedisTrackingInvalidator(FakeClient(listener, tracker), l1, ["cache:"])
+    invalidator.connect()
+
+    assert tracker.sent == [("CLIENT", "TRACKING", "ON", "REDIRECT", 42, "BCAST", "NOLOOP", "PREFIX", "cache:")]
+    assert l1.enabled
+    read(l1, "t", "cache:t:a", {"text": "a"})
+    read(l1, "t", "cache:t:b", {"text": "b"})
+
+    invalidator.handle(listener.messages.pop(0))
+    assert l1.get("t", "cache:t:a") is None and l1.get("t", "cache:t:b") is not None
+    invalidator.poll(0.01)  # FLUSHALL, then the health ping
+    assert l1.get("t", "cache:t:b") is None and tracker.sent[-1] == ("PING",)
+    assert invalidator.execute_untracked("EXPIRE", "cache:t:b", 60) == 1
+
+    read(l1, "t", "cache:t:b", {"text": "b"})
+    invalidator._disconnect()  # what the listener thread does on any error
+    assert not l1.enabled and l1.get_stats()["size"] == 0 and listener.closed and tracker.closed
+
+
+def test_start_without_client_tracking_leaves_l1_disabled():
+    listener = FakeConnection(replies=[7, [b"subscribe", INVALIDATE_CHANNEL.encode(), 1]])
+    tracker = FakeConnection(replies=[b"ERR unknown subcommand 'TRACKING'"])
+    l1 = L1Cache()
+    assert RedisTrackingInvalidator(FakeClient(listener, tracker), l1, ["cache:"]).start() is False
+    assert not l1.enabled and listener.closed
+
+
+def load_cache_manager():
+    """
+    backup/cache_manager.py as a package module next to l1_cache.py (its
+    package also holds config.py, which it needs only for a type hint).
+    """
+    if "l1pkg.cache_manager" not in sys.modules:
+        package = types.ModuleType("l1pkg")
+        package.__path__ = [os.path.join(HERE, "backup"), HERE]
+        sys.modules["l1pkg"] = package
+        config = types.ModuleType("l1pkg.config")
+        config.Config = object
+        sys.modules["l1pkg.config"] = config
+    return importlib.import_module("l1pkg.cache_manager")
+
+
+class FakeRedis:
+    """Hashes with a TTL; counts HGETALLs and pipelines. on_execute runs once inside the next pipeline."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+        self.reads = 0
+        self.pipelines = 0
+        self.on_execute = None
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(
+            {k.encode(): v if isinstance(v, bytes) else str(v).encode() for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        self.reads += 1
+        return dict(self.hashes.get(key, {}))
+
+    def pttl(self, key):
+        return self.ttls.get(key, 0) * 1000 if key in self.hashes else -2
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+        return key in self.hashes
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        self.redis.pipelines += 1
+        results = [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+        hook, self.redis.on_execute = self.redis.on_execute, None
+        if hook:
+            hook()
+        return results
+
+
+class FakeInvalidator:
+    def __init__(self):
+        self.untracked = []
+
+    def execute_untracked(self, *args):
+        self.untracked.append(args)
+        return 1
+
+
+def make_cache_manager():
+    config = types.SimpleNamespace(
+        cache_redis_url="redis://fake", cache_index_name="idx", cache_key_prefix="cache:",
+        cache_embedding_dimensions=3, cache_default_ttl=3600, cache_fault_tolerant=True,
+        cache_enable_embeddings=False)
+    manager = load_cache_manager().CacheManager(config)
+    manager._initialized = True
+    manager._redis_client = FakeRedis()
+    manager._l1_invalidator = FakeInvalidator()
+    manager.l1.enabled = True  # what a connected RedisTrackingInvalidator does
+    return manager
+
+
+def test_cache_manager_get_cache_is_served_from_l1():
+    manager = make_cache_manager()
+    redis = manager.redis_client
+    key = manager.put_cache("history", "u1", "session|1", "hello")
+
+    pipelines = redis.pipelines
+    assert manager.get_cache(key)["text"] == "hello"
+    assert (redis.reads, redis.pipelines - pipelines) == (1, 1)  # HGETALL + PTTL in one pipeline
+    assert manager.get_cache(key)["text"] == "hello"
+    assert redis.reads == 1
+    assert manager.l1.get_stats("history")["hits"] == 1
+
+    # A sliding TTL on an L1 hit goes through the tracking connection, not a tracked EXPIRE
+    time.sleep(0.01)
+    manager.get_cache(key, extend_ttl_seconds=0.02)
+    assert redis.reads == 1
+    assert manager._l1_invalidator.untracked == [("EXPIRE", key, 0.02)]
+
+
+def test_cache_manager_fill_loses_to_a_concurrent_put_cache():
+    manager = make_cache_manager()
+    redis = manager.redis_client
+    key = manager.put_cache("history", "u1", "session|1", "old")
+
+    # put_cache lands between the Redis read and the L1 fill of this get_cache
+    redis.on_execute = lambda: manager.put_cache("history", "u1", "session|1", "new")
+    assert manager.get_cache(key)["text"] == "old"
+    assert manager.get_cache(key)["text"] == "new", "the stale read must not have been cached"
+    assert manager.get_cache(key)["text"] == "new"
+    assert redis.reads == 2
+
+
+def test_cache_manager_get_cache_many_reads_only_l1_misses():
+    manager = make_cache_manager()
+    redis = manager.redis_client
+    keys = [manager.put_cache("history", "u1", f"session|{n}", f"m{n}") for n in range(3)]
+    manager.get_cache(keys[0])
+    redis.reads = redis.pipelines = 0
+
+    entries = manager.get_cache_many(keys + ["cache:history:missing"])
+    assert [e and e["text"] for e in entries] == ["m0", "m1", "m2", None]
+    assert (redis.reads, redis.pipelines) == (3, 1)  # keys[0] came from the L1
+    assert [e and e["text"] for e in manager.get_cache_many(keys)] == ["m0", "m1", "m2"]
+    assert (redis.reads, redis.pipelines) == (3, 1)
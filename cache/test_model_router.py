@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for latency-aware model routing and hedged requests.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from model_router import LatencyWindow, ModelRouter
+
+
+def fake_send(latencies, failing=()):
+    calls = []
+
+    def send(model, fallbacks):
+        calls.append((model, list(fallbacks)))
+        time.sleep(latencies[model])
+        if model in failing:
+            raise RuntimeError(f"{model} is down")
+        return {"model": model}
+
+    send.calls = calls
+    return send
+
+
+def warm(router, model, latency_ms, n=20, ok=True):
+    for _ in range(n):
+        router.record(model, latency_ms, ok)
+
+
+def test_window_percentiles_and_error_rate():
+    window = LatencyWindow(size=10)
+    for latency in range(1, 11):
+        window.add(latency * 10, ok=latency != 10)
+    assert window.percentile(50) == 50
+    assert window.percentile(95) == 90
+    assert window.error_rate == 0.1
+
+
+def test_order_uses_stats_once_there_are_enough_samples():
+    router = ModelRouter({"classification": ["a", "b", "c"]}, min_samples=5)
+    assert router.order("classification") == ["a", "b", "c"]
+    warm(router, "a", 900, n=5)
+    warm(router, "c", 100, n=5)
+    assert router.order("classification") == ["c", "b", "a"]
+    warm(router, "c", 100, n=45, ok=False)  # 90% errors: 100ms / 0.1 > 900ms
+    assert router.order("classification") == ["a", "b", "c"]
+
+
+def test_slow_first_model_is_hedged():
+    router = ModelRouter({"conversation": ["slow", "fast"]}, hedge_classes=["conversation"],
+                         hedge_min_ms=10, hedge_max_ms=50, min_samples=5)
+    warm(router, "slow", 20, n=5)
+    send = fake_send({"slow": 0.5, "fast": 0.01})
+    started = time.monotonic()
+    result, model = router.call("conversation", send)
+    assert (result, model) == ({"model": "fast"}, "fast")
+    assert time.monotonic() - started < 0.2
+    assert send.calls == [("slow", ["fast"]), ("fast", [])]
+    stats = router.get_stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_fast_first_model_is_not_hedged_and_failures_fail_over():
+    router = ModelRouter({"classification": ["a", "b"]}, hedge_classes=["classification"], hedge_max_ms=200)
+    send = fake_send({"a": 0.0, "b": 0.0})
+    assert router.call("classification", send) == ({"model": "a"}, "a")
+    assert [model for model, _ in send.calls] == ["a"]
+
+    send = fake_send({"a": 0.0, "b": 0.0}, failing={"a"})
+    assert router.call("classification", send) == ({"model": "b"}, "b")
+    stats = router.get_stats()
+    assert (stats["hedged"], stats["failovers"]) == (0, 1)
+    assert stats["models"]["a"]["error_rate"] == 0.5
+
+
+def test_hedging_is_opt_in_and_waits_for_samples():
+    send = fake_send({"slow": 0.1, "fast": 0.0})
+    router = ModelRouter({"conversation": ["slow", "fast"]}, hedge_min_ms=10, min_samples=5)
+    warm(router, "slow", 20, n=5)
+    assert router.call("conversation", send) == ({"model": "slow"}, "slow")
+
+    # Opted in, but the model has no stats yet: its typical latency is unknown, no hedge
+    router = ModelRouter({"conversation": ["slow", "fast"]}, hedge_classes=["conversation"],
+                         hedge_min_ms=10, min_samples=5)
+    assert router.hedge_delay("slow") is None
+    assert router.call("conversation", send) == ({"model": "slow"}, "slow")
+    assert [model for model, _ in send.calls] == ["slow", "slow"]
+    assert router.get_stats()["hedged"] == 0
+
+    # Without hedge_max_ms the delay follows the p95, however long it is
+    warm(router, "slow", 8000, n=5)
+    assert router.hedge_delay("slow") == 8.0
+
+
+def test_all_models_failing_raises_and_hedging_can_be_disabled():
+    router = ModelRouter({"classification": ["a", "b"]}, hedge_classes=[])
+    send = fake_send({"a": 0.0, "b": 0.0}, failing={"a", "b"})
+    try:
+        router.call("classification", send)
+        assert False, "expected the call to fail"
+    except RuntimeError as e:
+        assert "a is down" in str(e)
+    assert send.calls == [("a", ["b"])]
+    assert router.get_stats()["failed"] == 1
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for the proxy health circuit breaker.
+
+No network: probes are not started (ttl is large) or requests.get is patched.
+"""
+
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from proxy_health import ProxyHealth
+
+
+def make_health(**kwargs):
+    health = ProxyHealth("http://proxy:3128", "http://test", **kwargs)
+    # Pretend a probe has just run so proxies() does not start one
+    health.record_success()
+    return health
+
+
+def test_breaker_opens_after_threshold_and_goes_direct():
+    health = make_health(ttl=3600, failure_threshold=2)
+    assert health.proxies() == health.proxy
+
+    health.record_failure()
+    assert health.state == ProxyHealth.CLOSED
+    health.record_failure()
+    assert health.state == ProxyHealth.OPEN
+    assert health.proxies() is None
+
+
+def test_half_open_trial_closes_or_reopens():
+    health = make_health(ttl=3600, failure_threshold=1, open_cooldown=0.05)
+    health.record_failure()
+    assert health.state == ProxyHealth.OPEN
+
+    time.sleep(0.06)
+    with patch.object(health, "probe_in_background"):
+        assert health.proxies() == health.proxy
+    assert health.state == ProxyHealth.HALF_OPEN
+
+    health.record_failure()
+    assert health.state == ProxyHealth.OPEN
+
+    time.sleep(0.06)
+    assert health.state == ProxyHealth.HALF_OPEN
+    health.record_success()
+    assert health.state == ProxyHealth.CLOSED
+
+    transitions = health.get_metrics()["transitions"]
+    assert transitions["closed->open"] == 1
+    assert transitions["half_open->open"] == 1
+    assert transitions["half_open->closed"] == 1
+
+
+def test_half_open_lets_one_trial_through():
+    health = make_health(ttl=3600, failure_threshold=1, open_cooldown=0.05)
+    health.record_failure()
+    time.sleep(0.06)
+
+    assert health.proxies() == health.proxy
+    assert health.proxies() is None, "concurrent requests must go direct during the trial"
+    health.release_trial()
+    assert health.proxies() == health.proxy
+    health.record_success()
+    assert health.proxies() == health.proxy
+    assert health.proxies() == health.proxy
+
+
+def test_proxy_failure_is_retried_direct():
+    health = make_health(ttl=3600, failure_threshold=2)
+    session = MagicMock()
+    ok = object()
+    session.post.side_effect = [requests.exceptions.ProxyError("proxy down"), ok]
+
+    assert health.post(session, "http://llm", json={}) is ok
+    assert [c.kwargs["proxies"] for c in session.post.call_args_list] == [health.proxy, None]
+    assert health.get_metrics()["consecutive_failures"] == 1
+
+
+def test_direct_failure_is_not_retried():
+    health = make_health(ttl=3600, failure_threshold=1)
+    health.record_failure()
+    session = MagicMock()
+    session.post.side_effect = requests.exceptions.ConnectTimeout("llm down")
+
+    try:
+        health.post(session, "http://llm")
+    except requests.exceptions.ConnectTimeout:
+        pass
+    else:
+        raise AssertionError("direct request was retried")
+    assert session.post.call_count == 1
+
+
+def test_stale_status_is_probed_in_background():
+    health = ProxyHealth("http://proxy:3128", "http://test", ttl=0, failure_threshold=1)
+
+    def slow_failing_get(*args, **kwargs):
+        time.sleep(0.2)
+        raise ConnectionError("proxy down")
+
+    with patch("proxy_health.requests.get", side_effect=slow_failing_get):
+        started = time.monotonic()
+        assert health.proxies() == health.proxy
+        assert time.monotonic() - started < 0.1, "proxies() must not wait for the probe"
+        time.sleep(0.3)
+
+    metrics = health.get_metrics()
+    assert metrics["probes"] == 1
+    assert metrics["probe_failures"] == 1
+    assert metrics["probe_latency_ms_last"] >= 200
+    assert health.proxies() is None
+
+
+def test_no_proxy_configured():
+    health = ProxyHealth(None, "http://test")
+    assert health.proxies() is None
+
+
+if __name__ == "__main__":
+    test_breaker_opens_after_threshold_and_goes_direct()
+    test_half_open_trial_closes_or_reopens()
+    test_half_open_lets_one_trial_through()
+    test_proxy_failure_is_retried_direct()
+    test_direct_failure_is_not_retried()
+    test_stale_status_is_probed_in_background()
+    test_no_proxy_configured()
+    print("✅ Proxy health tests passed!")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for the semantic classification cache.
+"""
+
+import operator
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import semantic_cache
+from semantic_cache import FrequencySketch, PromptPolicy, SemanticCache
+
+VECTORS = {
+    "user: мне грустно": [1.0, 0.0, 0.0],
+    "user: мне очень грустно": [0.98, 0.2, 0.0],
+    "user: хочу песню": [0.0, 1.0, 0.0],
+}
+
+
+def embed(text):
+    return VECTORS.get(text, [0.0, 0.0, 1.0])
+
+
+def ask(cache, text, answer, prompt="emotion", system="detect emotion"):
+    """One classifier call through the cache; returns (answer, came_from_cache)."""
+    cached, ticket = cache.lookup(prompt, system, text, embed)
+    if cached is not None:
+        return cached, True
+    if ticket and ticket.get("audit"):
+        cache.audit(ticket, answer)
+    cache.store(ticket, answer)
+    return answer, False
+
+
+def make(**policy):
+    return SemanticCache({"emotion": PromptPolicy(**{"threshold": 0.95, "min_frequency": 2, **policy})}, audit_rate=0)
+
+
+def test_similar_input_hits_after_admission():
+    cache = make()
+    sad = {"emotion": "sad"}
+    # First sighting is not admitted (TinyLFU), the second is
+    assert ask(cache, "user: мне грустно", sad) == (sad, False)
+    assert ask(cache, "user: мне грустно", sad) == (sad, False)
+    assert ask(cache, "user: мне грустно", {}) == (sad, True)
+    assert ask(cache, "user: мне очень грустно", {}) == (sad, True)
+    assert ask(cache, "user: хочу песню", {"emotion": "joy"}) == ({"emotion": "joy"}, False)
+    stats = cache.get_stats()["emotion"]
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["rejected"], stats["admitted"]) == (1, 1, 2, 1)
+    assert stats["hit_rate"] == 0.4
+
+
+def test_other_system_prompt_and_unknown_prompt_do_not_hit():
+    cache = make(min_frequency=1)
+    ask(cache, "user: мне грустно", {"emotion": "sad"})
+    assert ask(cache, "user: мне грустно", {"emotion": "?"}, system="edited prompt")[1] is False
+    assert cache.lookup("intent", "x", "user: мне грустно", embed) == (None, None)
+
+
+def test_ttl_and_capacity():
+    cache = make(min_frequency=1, ttl_seconds=0.05, capacity=1)
+    ask(cache, "user: мне грустно", {"emotion": "sad"})
+    ask(cache, "user: хочу песню", {"emotion": "joy"})  # evicts the first entry
+    assert ask(cache, "user: мне грустно", {"emotion": "sad"})[1] is False
+    time.sleep(0.06)
+    assert ask(cache, "user: мне грустно", {})[1] is False
+    stats = cache.get_stats()["emotion"]
+    assert stats["evicted"] >= 1 and stats["expired"] >= 1
+
+
+def test_audit_counts_false_hits():
+    cache = make(min_frequency=1)
+    ask(cache, "user: мне грустно", {"emotion": "sad"})
+    cache.audit_rate = 1.0
+    assert ask(cache, "user: мне очень грустно", {"emotion": "anxious"}) == ({"emotion": "anxious"}, False)
+    stats = cache.get_stats()["emotion"]
+    assert (stats["audits"], stats["false_hits"], stats["false_hit_rate"]) == (1, 1, 1.0)
+    assert cache.false_hit_samples[-1]["cached"] == {"emotion": "sad"}
+
+
+def test_similarity_is_scored_outside_the_lock(monkeypatch):
+    cache = make(min_frequency=1)
+    ask(cache, "user: мне грустно", {"emotion": "sad"})
+    locked = []
+
+    def mul(a, b):
+        locked.append(cache._lock.locked())
+        return operator.mul(a, b)
+
+    monkeypatch.setattr(semantic_cache, "operator", SimpleNamespace(mul=mul))
+    assert ask(cache, "user: мне очень грустно", {}) == ({"emotion": "sad"}, True)
+    assert locked and not any(locked)
+
+
+def test_intent_is_keyed_by_the_last_user_message():
+    cache = SemanticCache(audit_rate=0)
+    window = [{"role": "system", "content": "s"}, {"role": "user", "content": "привет"},
+              {"role": "assistant", "content": "О чём споём?"}, {"role": "user", "content": "Хочу  песню"}]
+    assert cache.key_text("intent", window) == "user: Хочу песню"
+    assert cache.key_text("emotion", window) == "user: привет\nassistant: О чём споём?\nuser: Хочу песню"
+    assert cache.key_text("intent", window[:1]) == ""
+
+
+def test_suno_preparation_is_not_cached():
+    cache = SemanticCache(audit_rate=0)
+    assert "suno_prep" not in cache.policies
+    assert cache.lookup("suno_prep", "prepare suno", "assistant: куплет", embed) == (None, None)
+
+
+def test_sketch_counts_and_ages():
+    sketch = FrequencySketch(width=64, sample_size=20)
+    for _ in range(6):
+        sketch.increment("a")
+    assert sketch.estimate("a") == 6
+    assert sketch.estimate("never") <= 6
+    for i in range(14):
+        sketch.increment(f"k{i}")
+    assert sketch.estimate("a") == 3
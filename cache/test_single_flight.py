@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for single-flight request coalescing.
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from single_flight import SingleFlight, get_single_flight_stats, request_hash, single_flight
+
+
+class FakeManager:
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.Lock()
+
+    @single_flight()
+    def llm_conversation(self, messages, system_message):
+        with self.lock:
+            self.calls.append(("llm", len(messages)))
+        time.sleep(self.latency)
+        messages.insert(0, {"role": "system", "content": system_message})
+        return {"answer": len(messages)}
+
+    @single_flight()
+    def is_text_flagged(self, text):
+        with self.lock:
+            self.calls.append(("moderation", text))
+        time.sleep(self.latency)
+        if text == "boom":
+            raise RuntimeError("upstream error")
+        return text == "bad"
+
+
+def test_concurrent_identical_calls_share_one_request():
+    manager = FakeManager()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: manager.llm_conversation([{"role": "user", "content": "hi"}], "sys"), range(8)))
+    assert results == [{"answer": 2}] * 8
+    assert manager.calls == [("llm", 1)]
+    stats = get_single_flight_stats(manager)["llm_conversation"]
+    assert (stats["calls"], stats["executed"], stats["coalesced"]) == (8, 1, 7)
+    # Waiters get copies, not the dict the first caller holds
+    assert len({id(result) for result in results}) == 8
+
+
+def test_different_arguments_and_later_calls_are_not_coalesced():
+    manager = FakeManager(latency=0.01)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert list(pool.map(manager.is_text_flagged, ["bad", "ok"])) == [True, False]
+    assert manager.is_text_flagged("bad") is True
+    assert len(manager.calls) == 3
+    assert get_single_flight_stats(manager)["is_text_flagged"]["coalesced"] == 0
+    assert get_single_flight_stats(manager)["inflight"] == 0
+
+
+def test_exception_reaches_every_waiter():
+    manager = FakeManager()
+    errors = []
+
+    def call():
+        try:
+            manager.is_text_flagged("boom")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4 and len(manager.calls) == 1
+    assert get_single_flight_stats(manager)["is_text_flagged"]["errors"] == 1
+
+
+def test_reentrant_call_does_not_deadlock_and_keys_are_stable():
+    group = SingleFlight()
+    key = request_hash("f", ("x",), {"b": 1, "a": 2})
+    assert key == request_hash("f", ("x",), {"a": 2, "b": 1})
+    assert key != request_hash("g", ("x",), {"a": 2, "b": 1})
+    assert group.do(key, lambda: group.do(key, lambda: 42)) == 42
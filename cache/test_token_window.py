@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for prefix-sum context windowing.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from token_window import ContextWindow
+
+
+def test_fit_keeps_largest_suffix_under_budget():
+    window = ContextWindow(max_tokens=100)
+    assert window.fit([10, 20, 30, 40, 50]) == (3, 90)
+    assert window.fit([10, 20, 30], reserved_tokens=60) == (2, 30)
+    assert window.fit([200]) == (1, 0)
+    assert window.fit([]) == (0, 0)
+
+
+def test_session_prefix_sums_are_extended_not_rebuilt():
+    window = ContextWindow(max_tokens=100)
+    first = window.prefix_sums([1, 2, 3], session_id="s")
+    extended = window.prefix_sums([1, 2, 3, 4], session_id="s")
+    assert extended is first
+    assert extended == [0, 1, 3, 6, 10]
+
+    # A different history for the same session is rebuilt from scratch
+    assert window.prefix_sums([5, 5], session_id="s") == [0, 5, 10]
+
+
+def test_select_always_keeps_system_prompt():
+    window = ContextWindow(max_tokens=20)
+    messages = [{"role": "system", "content": ""}] + [{"role": "user", "content": str(i)} for i in range(5)]
+    trimmed, total = window.select(messages, token_counts=[8, 8, 8, 8, 8])
+    assert trimmed[0]["role"] == "system"
+    assert [m["content"] for m in trimmed[1:]] == ["4"]
+    assert total <= 20
+
+
+if __name__ == "__main__":
+    test_fit_keeps_largest_suffix_under_budget()
+    test_session_prefix_sums_are_extended_not_rebuilt()
+    test_select_always_keeps_system_prompt()
+    print("✅ Token window tests passed!")
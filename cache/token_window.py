@@ -0,0 +1,161 @@
+"""
+Token accounting and context windowing
+
+Keeps token counting off the hot path of long sessions: the encoder is built
+once per process, per-message counts are stored with the message, and the
+window that fits the model budget is found with a binary search over
+per-session prefix sums.
+
+This module contains:
+- get_encoder(): cached tiktoken encoder (None if tiktoken is not installed)
+- count_message_tokens(): token count of one chat message
+- ContextWindow: picks the largest suffix of a conversation that fits a token budget
+"""
+
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Служебные токены, которые OpenAI добавляет к каждому сообщению
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str = "gpt-4o"):
+    """Return a process-wide tiktoken encoder, or None if it cannot be loaded."""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        # ImportError or the BPE file could not be fetched
+        logging.getLogger(__name__).warning("tiktoken not available (%s), using approximate token counting", e)
+        return None
+
+
+def count_text_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Count tokens in a string (~4 chars per token without tiktoken)."""
+    encoder = get_encoder(model)
+    if encoder is None:
+        return len(text) // 4
+    return len(encoder.encode(text))
+
+
+@lru_cache(maxsize=64)
+def _count_cached(text: str, model: str) -> int:
+    return count_text_tokens(text, model)
+
+
+def count_message_tokens(role: str, content: str, model: str = "gpt-4o", cache: bool = False) -> int:
+    """
+    Count tokens of one chat message: role + content + per-message overhead.
+
+    Args:
+        role: Message role
+        content: Message content
+        model: Model whose tokenizer is used
+        cache: Memoise the count (use for system prompts that repeat every turn)
+    """
+    count = _count_cached if cache else count_text_tokens
+    return count(role, model) + count(content or "", model) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    """
+    Finds the largest suffix of a conversation that fits a token budget.
+
+    Prefix sums are cached per session, so a new turn only appends the counts
+    of new messages. The cache assumes append-only histories (the whole
+    session, oldest first); if the history does not extend the cached one,
+    the prefix sums are rebuilt.
+    """
+
+    def __init__(self, max_tokens: int, max_sessions: int = 1024):
+        """
+        Args:
+            max_tokens: Token budget for the whole request including the system prompt
+            max_sessions: Number of sessions whose prefix sums are kept in memory
+        """
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        self._prefix: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prefix_sums(self, token_counts: Sequence[int], session_id: Optional[str] = None) -> List[int]:
+        """Return prefix sums (prefix[0] == 0) for token_counts, reusing the session cache."""
+        if session_id is None:
+            return self._build([0], token_counts)
+
+        with self._lock:
+            cached = self._prefix.get(session_id)
+            known = len(cached) - 1 if cached else 0
+            extends_cache = (
+                cached is not None
+                and known <= len(token_counts)
+                and (known == 0 or cached[known] - cached[known - 1] == token_counts[known - 1])
+            )
+            if extends_cache:
+                prefix = self._build(cached, token_counts[known:])
+            else:
+                prefix = self._build([0], token_counts)
+            self._prefix[session_id] = prefix
+            self._prefix.move_to_end(session_id)
+            while len(self._prefix) > self.max_sessions:
+                self._prefix.popitem(last=False)
+            return prefix
+
+    @staticmethod
+    def _build(prefix: List[int], token_counts: Sequence[int]) -> List[int]:
+        total = prefix[-1]
+        for count in token_counts:
+            total += count
+            prefix.append(total)
+        return prefix
+
+    def fit(self, token_counts: Sequence[int], reserved_tokens: int = 0,
+            session_id: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Find where the largest suffix under the budget starts.
+
+        Args:
+            token_counts: Token count of every chat message, oldest first
+            reserved_tokens: Tokens already used (system prompt)
+            session_id: Session whose cached prefix sums may be reused
+
+        Returns:
+            (start index, tokens of the selected suffix)
+        """
+        prefix = self.prefix_sums(token_counts, session_id)
+        n = len(token_counts)
+        budget = self.max_tokens - reserved_tokens
+        total = prefix[n]
+        # Smallest start with total - prefix[start] <= budget
+        start = min(bisect.bisect_left(prefix, total - budget, 0, n + 1), n)
+        return start, total - prefix[start]
+
+    def select(self, messages: List[Dict[str, str]], token_counts: Optional[Sequence[Optional[int]]] = None,
+               session_id: Optional[str] = None, model: str = "gpt-4o") -> Tuple[List[Dict[str, str]], int]:
+        """
+        Trim a messages list (system prompt first) to the budget, always keeping the system prompt.
+
+        Args:
+            messages: [system, *chat] messages
+            token_counts: Stored counts for the chat messages; None entries are counted here
+            session_id: Session whose cached prefix sums may be reused
+            model: Model whose tokenizer is used for missing counts
+
+        Returns:
+            (trimmed messages, total tokens)
+        """
+        sys_msg, chat_msgs = messages[0], messages[1:]
+        if token_counts is None or len(token_counts) != len(chat_msgs):
+            token_counts = [None] * len(chat_msgs)
+        counts = [
+            count if count is not None else count_message_tokens(msg["role"], msg["content"], model)
+            for msg, count in zip(chat_msgs, token_counts)
+        ]
+        sys_tokens = count_message_tokens(sys_msg["role"], sys_msg["content"], model, cache=True)
+        start, chat_tokens = self.fit(counts, sys_tokens, session_id)
+        return [sys_msg] + chat_msgs[start:], sys_tokens + chat_tokens
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: handler CPU time with DEBUG logging on vs. off, sync vs. async
+
+Calls handler() in-process with webhook updates that carry no text (photos
+with a long reply_to_message), so the handler parses, logs and traces the
+update and returns before any database or LLM work: what is left is mostly
+the logging every update pays. Records are written as JSON (YcLoggingFormatter)
+to /dev/null.
+
+Per mode it reports, per update:
+- request CPU: CPU time of the thread that runs handler() (time.thread_time)
+- process CPU: CPU time of the whole process, listener thread included
+- wall: handler latency including the final log_pipeline.flush()
+
+Usage:
+    python bench_logging.py [--updates 2000] [--reply-chars 3000]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from log_pipeline import LogPipeline, parse_rates
+
+MODES = (
+    ("sync DEBUG", logging.DEBUG, False, ""),
+    ("sync INFO", logging.INFO, False, ""),
+    ("async DEBUG", logging.DEBUG, True, ""),
+    ("async DEBUG sampled", logging.DEBUG, True, "payload=0.05,stats=0.05"),
+    ("async INFO", logging.INFO, True, ""),
+)
+
+
+def photo_update(update_id: int, reply_chars: int) -> dict:
+    chat = {"id": 900_000_000 + update_id % 50, "type": "private"}
+    sender = {"id": chat["id"], "is_bot": False, "first_name": "Нагрузка", "language_code": "ru"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "from": sender, "chat": chat, "date": 1_700_000_000 + update_id,
+            "photo": [{"file_id": f"AgAC{update_id:08d}{size}", "file_unique_id": f"AQAD{size}",
+                       "file_size": size * 1000, "width": size, "height": size} for size in (90, 320, 800, 1280)],
+            "caption": "Вот фото к песне",
+            "reply_to_message": {
+                "message_id": update_id - 1, "from": {"id": 1, "is_bot": True, "first_name": "ПойМойМир"},
+                "chat": chat, "date": 1_700_000_000 + update_id - 1,
+                "text": ("Куплет про лето, бабушку и запах яблок. " * (reply_chars // 40 + 1))[:reply_chars],
+            },
+        },
+    }
+
+
+def run_mode(index, events, level: int, asynchronous: bool, rates: str) -> dict:
+    index.log_pipeline.stop()
+    sink = logging.StreamHandler(open(os.devnull, "w"))
+    sink.setFormatter(index.console_formatter)
+    pipeline = LogPipeline(index.logger, sink, level=level, asynchronous=asynchronous, rates=parse_rates(rates))
+    index.log_pipeline = pipeline
+
+    for event in events[:50]:  # warm-up
+        index.handler(event, None)
+    thread_cpu = process_cpu = wall = 0.0
+    for event in events:
+        t0, p0, w0 = time.thread_time(), time.process_time(), time.perf_counter()
+        index.handler(event, None)
+        thread_cpu += time.thread_time() - t0
+        wall += time.perf_counter() - w0
+        process_cpu += time.process_time() - p0
+    pipeline.flush(timeout=10)
+    n = len(events)
+    return {"request_cpu_us": round(thread_cpu / n * 1e6, 1), "process_cpu_us": round(process_cpu / n * 1e6, 1),
+            "wall_us": round(wall / n * 1e6, 1), "sampling": pipeline.get_stats()["sampling"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handler CPU time per logging mode")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--reply-chars", type=int, default=3000, help="length of the replied-to message")
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    args = parser.parse_args()
+
+    os.environ.setdefault("bot_token", "bench")
+    os.environ.setdefault("operouter_key", "bench")
+    os.environ.setdefault("database_url", "postgresql://localhost/none")  # never connected on this path
+    os.environ.pop("proxy_url", None)
+    import index
+
+    events = [{"httpMethod": "POST", "headers": {"Content-Type": "application/json"}, "isBase64Encoded": False,
+               "body": json.dumps(photo_update(i + 1, args.reply_chars), ensure_ascii=False)}
+              for i in range(args.updates)]
+    report = {name: run_mode(index, events, level, asynchronous, rates)
+              for name, level, asynchronous, rates in MODES}
+    index.log_pipeline.stop()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    print(f"{args.updates} updates, reply_to_message {args.reply_chars} chars")
+    print(f"  {'mode':<22} {'request CPU us':>14} {'process CPU us':>14} {'wall us':>9}")
+    for name, r in report.items():
+        print(f"  {name:<22} {r['request_cpu_us']:14.1f} {r['process_cpu_us']:14.1f} {r['wall_us']:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
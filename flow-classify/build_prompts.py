@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Build step: pack the prompts read by index.py into one JSON file.
+
+index.py loads the bundle with a single read at cold start instead of opening
+every prompt file. PROMPT_FILES is taken from index.py without importing it
+(the function needs its env and database to import).
+
+The bundle also records the size, mtime and SHA-256 of every source file under
+"_sources", so index.py can tell when a prompt file was edited after the build.
+
+Usage (from flow-classify/, before packaging the function):
+    python build_prompts.py [--out prompts.bundle.json]
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def prompt_files(index_path: str = os.path.join(HERE, "index.py")) -> dict:
+    with open(index_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), index_path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "PROMPT_FILES" for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise LookupError(f"PROMPT_FILES not found in {index_path}")
+
+
+def source_signature(path: str) -> dict:
+    with open(path, "rb") as f:
+        data = f.read()
+    return {"size": len(data), "mtime": int(os.stat(path).st_mtime),
+            "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def build(out_path: str) -> dict:
+    prompts, sources = {}, {}
+    for name, path in prompt_files().items():
+        full_path = os.path.join(HERE, path)
+        with open(full_path, "r", encoding="utf-8") as f:
+            prompts[name] = f.read()
+        sources[path] = source_signature(full_path)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(dict(prompts, _sources=sources), f, ensure_ascii=False)
+    os.replace(tmp_path, out_path)
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.path.join(HERE, "prompts.bundle.json"))
+    args = parser.parse_args()
+    prompts = build(args.out)
+    print(f"{len(prompts)} prompts, {os.path.getsize(args.out)} bytes -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
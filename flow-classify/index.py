@@ -1,9 +1,11 @@
 import os
+import io
 import re
 import json
 import hashlib
 import uuid
 import logging
+import atexit
 from pythonjsonlogger import jsonlogger
 from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, Optional
@@ -13,12 +15,20 @@ from psycopg2 import connect, Error as PgError
 from psycopg2.extras import RealDictCursor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-import tiktoken
 import random
-from mutagen.easyid3 import EasyID3
-from mutagen.mp3 import MP3
-import boto3
-from pydantic import TypeAdapter, Base64Bytes, ValidationError
+import threading
+import time
+from functools import lru_cache
+from tracing import propagate, tracer_from_env
+from log_pipeline import lazy, pipeline_from_env
+from db_pool import PgConnectionPool
+from fanout import FanOutExecutor
+from proxy_health import ProxyHealth
+from token_window import ContextWindow, count_message_tokens
+from telegram_dispatcher import TelegramDispatcher
+from unit_of_work import UnitOfWork
+# boto3, mutagen, tiktoken and pydantic are imported where they are first used:
+# most invocations never touch them, and together they are most of the import time
 
 # ──────────────────────────
 #  LOGGING
@@ -31,13 +41,19 @@ class YcLoggingFormatter(jsonlogger.JsonFormatter):
         log_record['level'] = record.levelname.replace("WARNING", "WARN").replace("CRITICAL", "FATAL")
 
 logger = logging.getLogger('MyLogger')
-logger.setLevel(logging.DEBUG)
 logger.propagate = False
 
 console_handler = logging.StreamHandler()
 console_formatter = YcLoggingFormatter('%(message)s %(level)s %(logger)s')
 console_handler.setFormatter(console_formatter)
-logger.addHandler(console_handler)
+
+# Level, per-category sampling and formatting off the request thread
+# (log_level, log_async, log_sample_rates, log_flush_timeout)
+log_pipeline = pipeline_from_env(logger, console_handler)
+atexit.register(log_pipeline.stop)
+
+# Per-update spans, one summary line per update (tracing_enabled, otel_enabled)
+tracer = tracer_from_env(logger)
 
 # ──────────────────────────
 #  ENVIRONMENT VARIABLES
@@ -48,6 +64,8 @@ operouter_key    = os.getenv("operouter_key")
 ai_model         = os.getenv("ai_model", "openai/gpt-4o")
 ai_models_fallback  = os.getenv("ai_models_fallback", ["openai/gpt-4o,openai/gpt-4o-2024-11-20,openai/gpt-4o-2024-08-06"])
 ai_endpoint      = os.getenv("ai_endpoint", "https://openrouter.ai/api/v1/chat/completions")
+openai_api_base  = os.getenv("openai_api_base", "https://api.openai.com/v1")
+telegram_api_base = os.getenv("telegram_api_base", "https://api.telegram.org")
 session_lifetime = int(os.getenv("session_lifetime", "87600"))  # hours
 connect_timeout  = int(os.getenv('connect_timeout', 1))
 read_timeout     = int(os.getenv('read_timeout', 5))
@@ -56,6 +74,20 @@ retry_backoff_factor = int(os.getenv('retry_backoff_factor', 2))
 timeout = (int(connect_timeout), int(read_timeout))
 proxy_url = os.getenv("proxy_url")
 openai_api_key = os.getenv("openai_key")
+db_pool_maxconn = int(os.getenv("db_pool_maxconn", 4))
+db_pool_max_lifetime = int(os.getenv("db_pool_max_lifetime", 1800))  # seconds
+db_pool_health_check_interval = int(os.getenv("db_pool_health_check_interval", 30))  # seconds
+llm_fanout_timeout = float(os.getenv("llm_fanout_timeout", 10))  # seconds
+proxy_health_ttl = int(os.getenv("proxy_health_ttl", 30))  # seconds
+proxy_failure_threshold = int(os.getenv("proxy_failure_threshold", 2))
+proxy_open_cooldown = int(os.getenv("proxy_open_cooldown", 60))  # seconds
+llm_max_context_tokens = int(os.getenv("llm_max_context_tokens", 50_000))  # 51962 ~ 128k эмпирически
+llm_stream_enabled = os.getenv("llm_stream", "true").lower() == "true"
+telegram_edit_interval = float(os.getenv("telegram_edit_interval", 1.0))  # seconds between edits of a streamed reply
+telegram_first_flush_chars = int(os.getenv("telegram_first_flush_chars", 120))  # send before the first sentence ends
+telegram_global_rate = float(os.getenv("telegram_global_rate", 30))  # messages per second for the bot
+telegram_chat_rate = float(os.getenv("telegram_chat_rate", 1))  # messages per second for one chat
+telegram_chat_burst = int(os.getenv("telegram_chat_burst", 1))
 
 FALLBACK_ANSWER = "Сейчас не могу ответить, загляни чуть позже 🌿"
 SONG_GENERATING_MESSAGE = "Твоя песня уже в пути.\nДай ей немного времени — она рождается 🌿\n\nПесня придёт отдельным сообщением через 2 минуты"
@@ -63,7 +95,6 @@ CONFUSED_INTENT_ANSWER_MP3 = "https://storage.yandexcloud.net/pmm-static/audio/p
 FEEDBACK_INTENT_ANSWER_MP3 = "https://storage.yandexcloud.net/pmm-static/audio/pmm-bot/feedback.mp3"
 AI_COMPOSER = "AI сгенерировано с помощью https://t.me/PoyMoyMirBot"
 
-PROXY = {"http": proxy_url, "https": proxy_url}
 test_url = "https://pmm-http-bin.website.yandexcloud.net"
 song_path = "/function/storage/songs/"
 song_bucket_name = os.getenv("song_bucket_name")
@@ -83,23 +114,57 @@ suno_model = os.getenv("suno_model", "V4_5")
 suno_callback_url = os.getenv("suno_callback_url")
 suno_api_key = os.getenv("suno_api_key")
 
-with open("knowledge_bases/prepare_suno.txt", "r", encoding="utf-8") as file_suno:
-    system_prompt_prepare_suno = file_suno.read()
-
-with open("system_prompt.txt", "r", encoding="utf-8") as file:
-    system_prompt = file.read()
-
-with open("knowledge_bases/determinate_intent.txt", "r", encoding="utf-8") as file_intent:
-    system_prompt_intent = file_intent.read()
-
-with open("knowledge_bases/detect_emotional_state.txt", "r", encoding="utf-8") as file_emotion:
-    system_prompt_detect_emotion = file_emotion.read()
-
-with open("knowledge_bases/classify.md", "r", encoding="utf-8") as file_classify:
-    system_prompt_classify = file_classify.read()
+# Prompt name -> source file. build_prompts.py packs them into PROMPT_BUNDLE,
+# which is loaded with one read; the files are the fallback for local runs and
+# for prompt files edited after the bundle was built.
+PROMPT_FILES = {
+    "system_prompt_prepare_suno": "knowledge_bases/prepare_suno.txt",
+    "system_prompt": "system_prompt.txt",
+    "system_prompt_intent": "knowledge_bases/determinate_intent.txt",
+    "system_prompt_detect_emotion": "knowledge_bases/detect_emotional_state.txt",
+    "system_prompt_classify": "knowledge_bases/classify.md",
+    "intents": "knowledge_bases/intents.txt",
+}
+PROMPT_BUNDLE = os.getenv("prompt_bundle", "prompts.bundle.json")
+
+def _source_changed(path: str, built: dict) -> bool:
+    # stat() is enough while size and mtime match; otherwise (e.g. mtime reset by
+    # packaging) the file is hashed. A missing source file cannot contradict the bundle.
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if st.st_size != built.get("size"):
+        return True
+    if int(st.st_mtime) == built.get("mtime"):
+        return False
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest() != built.get("sha256")
 
-with open("knowledge_bases/intents.txt", "r", encoding="utf-8") as file_intents:
-    intents = file_intents.read()
+def load_prompts(bundle_path: str = PROMPT_BUNDLE) -> Dict[str, str]:
+    try:
+        with open(bundle_path, "rb") as f:
+            prompts = json.loads(f.read())
+        sources = prompts.pop("_sources", None)
+        if (PROMPT_FILES.keys() <= prompts.keys() and sources is not None
+                and not any(_source_changed(path, sources.get(path, {})) for path in PROMPT_FILES.values())):
+            return prompts
+        logger.warning("Prompt bundle %s is stale, reading prompt files", bundle_path)
+    except FileNotFoundError:
+        pass
+    prompts = {}
+    for name, path in PROMPT_FILES.items():
+        with open(path, "r", encoding="utf-8") as f:
+            prompts[name] = f.read()
+    return prompts
+
+_prompts = load_prompts()
+system_prompt_prepare_suno = _prompts["system_prompt_prepare_suno"]
+system_prompt = _prompts["system_prompt"]
+system_prompt_intent = _prompts["system_prompt_intent"]
+system_prompt_detect_emotion = _prompts["system_prompt_detect_emotion"]
+system_prompt_classify = _prompts["system_prompt_classify"]
+intents = _prompts["intents"]
 
 # with open("knowledge_bases/detect_userflow_state.txt", "r", encoding="utf-8") as system_prompt_userflow_state:
 #     system_prompt_detect_emotion = system_prompt_userflow_state.read()
@@ -124,26 +189,22 @@ for var in ("bot_token", "operouter_key"):
 
 logger.info("Environment variables loaded")
 
-def check_proxy(proxy_url, timeout=read_timeout, test_url=test_url):
-    """
-    Проверяет работоспособность HTTP/HTTPS прокси, отправляя запрос на test_url.
-    Возвращает True, если прокси работает, иначе False.
-    """
-    proxies = {"http": proxy_url, "https": proxy_url}
-    try:
-        response = requests.get(test_url, proxies=proxies, timeout=timeout)
-        response.raise_for_status()
-        return True
-    except Exception as e:
-        logger.debug(f"Proxy check failed: {e}")
-        return False
+# Cached proxy status behind a circuit breaker, so LLM requests never wait for a probe
+proxy_health = ProxyHealth(proxy_url, test_url, probe_timeout=read_timeout, ttl=proxy_health_ttl,
+                           failure_threshold=proxy_failure_threshold, open_cooldown=proxy_open_cooldown,
+                           logger=logger)
 
 # ──────────────────────────
 #  DATABASE HELPERS
 # ──────────────────────────
 
+# Lives as long as the warm container does; run(idempotent=True) retries once on a
+# fresh connection, writes are never replayed
+db_pool = PgConnectionPool(conn_params, db_pool_maxconn, db_pool_max_lifetime, db_pool_health_check_interval,
+                           logger=logger)
+
 def get_conn():
-    """Return a new psycopg2 connection."""
+    """Return a new psycopg2 connection (bypasses the pool)."""
     try:
         conn = connect(**conn_params)
         conn.set_client_encoding('UTF8')
@@ -154,33 +215,63 @@ def get_conn():
 
 def query_one(sql: str, params: tuple = ()) -> Optional[dict]:
     """Execute SELECT returning a single row as dict, or None."""
-    conn = get_conn()
-    try:
+    def _run(conn):
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(sql, params)
             return cur.fetchone()
-    finally:
-        conn.close()
+    return db_pool.run(_run, idempotent=True)
 
 def query_all(sql: str, params: tuple = ()) -> list[dict]:
     """Execute SELECT returning all rows as list of dicts."""
-    conn = get_conn()
-    try:
+    def _run(conn):
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(sql, params)
             return cur.fetchall()
-    finally:
-        conn.close()
+    return db_pool.run(_run, idempotent=True)
 
 def execute(sql: str, params: tuple = ()):
     """Execute INSERT/UPDATE/DELETE and commit."""
-    conn = get_conn()
-    try:
+    def _run(conn):
         with conn:
             with conn.cursor() as cur:
                 cur.execute(sql, params)
-    finally:
-        conn.close()
+    db_pool.run(_run)
+
+def execute_returning(sql: str, params: tuple | dict = ()) -> Optional[dict]:
+    """Execute a writing statement with RETURNING/SELECT, commit, and return one row as dict."""
+    def _run(conn):
+        with conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, params)
+                return cur.fetchone()
+    return db_pool.run(_run)
+
+# ──────────────────────────
+#  UNIT OF WORK
+# ──────────────────────────
+
+# Per-update write buffer (one transaction per update), see unit_of_work.py
+_uow_local = threading.local()
+
+def write_insert(table: str, row: Dict[str, Any]):
+    """INSERT into the current update's unit of work, or immediately outside of handler."""
+    uow = getattr(_uow_local, "uow", None) or UnitOfWork(db_pool, logger)
+    uow.insert(table, row)
+    if uow is not getattr(_uow_local, "uow", None):
+        uow.flush()
+
+def write_update(table: str, values: Dict[str, Any], key: Any, key_column: str = "id"):
+    """UPDATE through the current update's unit of work, or immediately outside of handler."""
+    uow = getattr(_uow_local, "uow", None) or UnitOfWork(db_pool, logger)
+    uow.update(table, values, key, key_column)
+    if uow is not getattr(_uow_local, "uow", None):
+        uow.flush()
+
+def flush_writes():
+    """Early flush: make buffered writes visible before an external call."""
+    uow = getattr(_uow_local, "uow", None)
+    if uow is not None:
+        uow.flush()
 
 # ──────────────────────────
 #  HTTP SESSION
@@ -193,6 +284,13 @@ adapter = HTTPAdapter(max_retries=retries)
 session.mount('https://', adapter)
 logger.info("HTTP session initialised")
 
+def post_via_proxy(url: str, **kwargs) -> requests.Response:
+    """
+    POST through the proxy while the circuit breaker allows it; feeds the breaker with the outcome.
+    A proxy-level failure is recorded and the same request is retried once direct.
+    """
+    return proxy_health.post(session, url, **kwargs)
+
 # ──────────────────────────
 #  TOOL DEFINITIONS
 # ──────────────────────────
@@ -240,6 +338,7 @@ def ensure_user_exists(tg_user_id: str, user_uuid: str):
             (tg_user_id, user_uuid, 0, False)
         )
 
+@tracer.traced("db.moderate_user")
 def moderate_user(chat_id: int, tg_user_id: str, additional_reason: str = "Нарушение правил") -> Optional[int]:
     # Fetch warnings and blocked
     rec = query_one("SELECT warnings, blocked FROM tg_users WHERE id = %s", (tg_user_id,))
@@ -249,15 +348,17 @@ def moderate_user(chat_id: int, tg_user_id: str, additional_reason: str = "На
     if warnings > 2 and blocked:
         return 3
 
-    new_warnings = warnings + 1
-    execute("UPDATE tg_users SET warnings = %s WHERE id = %s", (new_warnings, tg_user_id))
+    # One UPDATE per call, flushed before returning: a second moderate_user in the same
+    # update (tool call + flagged content) reads warnings from the database
+    values = {"warnings": warnings + 1}
+    if not blocked and warnings >= 1:
+        values.update({"blocked": True, "blocked_reason": additional_reason,
+                       "blocked_at": datetime.now(timezone.utc)})
+    write_update("tg_users", values, tg_user_id)
+    flush_writes()  # the ban must also be in the database before the user can reply
 
     if warnings == 1 and not blocked:
         # First warning → ban
-        execute(
-            "UPDATE tg_users SET blocked = TRUE, blocked_reason = %s, blocked_at = NOW() WHERE id = %s",
-            (additional_reason, tg_user_id)
-        )
         reason_msg = (
             f"Первое предупреждение, причина:\n- {additional_reason}\n"
             "Свобода ≠ вседозволенность. Ознакомьтесь с правилами:\n"
@@ -267,8 +368,6 @@ def moderate_user(chat_id: int, tg_user_id: str, additional_reason: str = "На
         return 1
     elif warnings >= 2 and not blocked:
         # Second warning → permanent ban
-        execute("UPDATE tg_users SET blocked = TRUE, blocked_reason = %s, blocked_at = NOW() WHERE id = %s",
-                (additional_reason, tg_user_id))
         reason_msg = "Вы перемещены в Комнату Забвения, бан навсегда."
         _send_telegram_chunks(chat_id, reason_msg)
         return 2
@@ -306,18 +405,105 @@ def _get_active_session(user_uuid: str, bot_uuid: str) -> str:
     logger.debug("Created session %s", session_uuid)
     return session_uuid
 
+# One round trip per update: upsert user and tg_user, resolve or open the
+# session, read moderation state and the last N messages.
+TURN_CONTEXT_SQL = """
+WITH ins_user AS (
+    INSERT INTO users(id, chat_id, full_name)
+    VALUES (%(new_user_id)s, %(chat_id)s, %(full_name)s)
+    ON CONFLICT (chat_id) DO NOTHING
+    RETURNING id
+), u AS (
+    SELECT id FROM ins_user
+    UNION ALL
+    SELECT id FROM users WHERE chat_id = %(chat_id)s
+    LIMIT 1
+), ins_tg AS (
+    INSERT INTO tg_users(id, user_id, warnings, blocked)
+    SELECT %(tg_user_id)s, u.id, 0, FALSE FROM u
+    ON CONFLICT (id) DO NOTHING
+    RETURNING warnings, blocked
+), tg AS (
+    SELECT warnings, blocked FROM ins_tg
+    UNION ALL
+    SELECT warnings, blocked FROM tg_users WHERE id = %(tg_user_id)s
+    LIMIT 1
+), fresh AS (
+    SELECT s.id FROM conversation_sessions s JOIN u ON s.user_id = u.id
+    WHERE s.bot_id = %(bot_id)s AND s.ended_at IS NULL
+      AND s.started_at > NOW() - make_interval(secs => %(session_lifetime_seconds)s)
+    ORDER BY s.started_at DESC LIMIT 1
+), ins_session AS (
+    INSERT INTO conversation_sessions(id, user_id, bot_id, started_at, model)
+    SELECT %(new_session_id)s, u.id, %(bot_id)s, NOW(), %(model)s FROM u
+    WHERE NOT EXISTS (SELECT 1 FROM fresh)
+    RETURNING id
+), sess AS (
+    SELECT id, FALSE AS created FROM fresh
+    UNION ALL
+    SELECT id, TRUE AS created FROM ins_session
+), hist AS (
+    SELECT m.role, m.content, m.token_count, m.created_at
+    FROM messages m JOIN sess ON m.session_id = sess.id
+    ORDER BY m.created_at DESC
+    LIMIT %(history_limit)s
+)
+SELECT u.id AS user_id,
+       sess.id AS session_id,
+       sess.created AS session_created,
+       COALESCE(tg.warnings, 0) AS warnings,
+       COALESCE(tg.blocked, FALSE) AS blocked,
+       COALESCE(
+           (SELECT json_agg(json_build_object('role', h.role, 'content', h.content) ORDER BY h.created_at) FROM hist h),
+           '[]'::json
+       ) AS history,
+       COALESCE((SELECT json_agg(h.token_count ORDER BY h.created_at) FROM hist h), '[]'::json) AS history_tokens
+FROM u CROSS JOIN sess LEFT JOIN tg ON TRUE
+"""
+
+@tracer.traced("db.turn_context")
+def load_turn_context(chat_id: int, tg_user_id: str, bot_uuid: str, full_name: str = "",
+                      history_limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Replaces _get_or_create_user + _get_active_session + _fetch_history +
+    ensure_user_exists + the tg_users warnings lookup with one CTE statement.
+    history_limit=None returns the whole session.
+    """
+    params = {
+        "new_user_id": str(uuid.uuid4()),
+        "chat_id": chat_id,
+        "full_name": full_name,
+        "tg_user_id": tg_user_id,
+        "bot_id": bot_uuid,
+        "session_lifetime_seconds": session_lifetime * 3600,
+        "new_session_id": str(uuid.uuid4()),
+        "model": ai_model,
+        "history_limit": history_limit,
+    }
+    rec = execute_returning(TURN_CONTEXT_SQL, params)
+    if rec is None:
+        # A concurrent update inserted the user after our snapshot was taken;
+        # the row is visible to a new statement.
+        rec = execute_returning(TURN_CONTEXT_SQL, params)
+    if rec["session_created"]:
+        logger.debug("Created session %s", rec["session_id"])
+    return {
+        "user_uuid": str(rec["user_id"]),
+        "session_uuid": str(rec["session_id"]),
+        "warnings": rec["warnings"],
+        "blocked": rec["blocked"],
+        "history": rec["history"],
+        "history_tokens": rec["history_tokens"],  # stored counts, None for rows saved before migration-5
+    }
+
 def _fetch_history(session_uuid: str, limit_count: int = None) -> list[Dict[str, str]]:
     if limit_count is not None:
-        # Получаем количество всех сообщений для вычисления OFFSET
-        total_count = query_one(
-            "SELECT COUNT(*) as cnt FROM messages WHERE session_id = %s",
-            (session_uuid,)
-        )["cnt"]
-        offset = max(0, total_count - limit_count)
+        # Последние N сообщений по индексу (session_id, created_at DESC), без COUNT(*) и OFFSET
         rows = query_all(
-            "SELECT role, content FROM messages WHERE session_id = %s ORDER BY created_at ASC OFFSET %s LIMIT %s",
-            (session_uuid, offset, limit_count)
+            "SELECT role, content FROM messages WHERE session_id = %s ORDER BY created_at DESC LIMIT %s",
+            (session_uuid, limit_count)
         )
+        rows.reverse()
     else:
         rows = query_all(
             "SELECT role, content FROM messages WHERE session_id = %s ORDER BY created_at ASC",
@@ -325,10 +511,32 @@ def _fetch_history(session_uuid: str, limit_count: int = None) -> list[Dict[str,
         )
     return [{"role": r["role"], "content": r["content"]} for r in rows]
 
+def insert_message(session_uuid: str, user_uuid: str, role: str, content: str,
+                   msg_id: Optional[str] = None, token_count: Optional[int] = None) -> str:
+    """Save a message together with its token count; returns the message id."""
+    msg_id = msg_id or str(uuid.uuid4())
+    if token_count is None:
+        token_count = count_message_tokens(role, content)
+    write_insert("messages", {"id": msg_id, "session_id": session_uuid, "user_id": user_uuid,
+                              "role": role, "content": content, "token_count": token_count})
+    return msg_id
+
 # ──────────────────────────
 #  TELEGRAM HELPERS
 # ──────────────────────────
 
+def _telegram_post(method: str, payload: dict) -> requests.Response:
+    r = session.post(f"{telegram_api_base}/bot{bot_token}/{method}", json=payload, timeout=timeout)
+    # 429 is retried by the dispatcher; an unchanged edit is not a failure
+    if r.status_code >= 400 and r.status_code != 429 and "message is not modified" not in r.text:
+        logger.error("Telegram %s failed: HTTP %s | response=%s", method, r.status_code, r.text)
+    return r
+
+# Outbound Bot API calls within Telegram's limits: ~30 msg/s per bot, ~1 msg/s per chat
+telegram_dispatcher = TelegramDispatcher(_telegram_post, telegram_global_rate, telegram_chat_rate, telegram_chat_burst,
+                                         logger=logger)
+
+@tracer.traced("telegram.send_audio")
 def _send_audio(chat_id: int, audio_url: str, title: str = "") -> None:
     payload = {
         "chat_id": chat_id,
@@ -337,14 +545,8 @@ def _send_audio(chat_id: int, audio_url: str, title: str = "") -> None:
     }
     if title:
         payload["caption"] = title
-    url = f"https://api.telegram.org/bot{bot_token}/sendAudio"
-    r = session.post(url, json=payload, timeout=timeout)
-    try:
-        r.raise_for_status()
-    except HTTPError as e:
-        logger.error("Telegram sendAudio failed: %s | response=%s", e, r.text)
-        raise
-    logger.debug("Telegram audio OK %s", r.status_code)
+    telegram_dispatcher.call(chat_id, "sendAudio", payload)
+    logger.debug("Telegram audio OK")
 
 SPECIAL = r"_*[]()~`>#+-=|{}.!\\"
 def _clean_think_tags(text: str) -> str:
@@ -358,30 +560,156 @@ def chunks(text: str, size: int = 4096):
     for i in range(0, len(text), size):
         yield text[i:i+size]
 
-def _send_telegram(chat_id: int, text: str) -> None:
-    clean = _clean_think_tags(text) if ai_model == "qwen/qwen3-4b:free" else text
-    payload = {
+def _message_payload(chat_id: int, text: str) -> dict:
+    return {
         "chat_id": chat_id,
         "disable_web_page_preview": True,
         "parse_mode": "MarkdownV2",
-        "text": clean
+        "text": _clean_think_tags(text) if ai_model == "qwen/qwen3-4b:free" else text
     }
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    r = session.post(url, json=payload, timeout=timeout)
+
+@tracer.traced("telegram.send")
+def _send_telegram(chat_id: int, text: str) -> Optional[int]:
+    # Not merged with queued messages: TelegramStream edits the returned message_id
+    result = telegram_dispatcher.call(chat_id, "sendMessage", _message_payload(chat_id, text), coalesce=False)
+    logger.debug("Telegram OK")
+    return (result or {}).get("message_id")
+
+@tracer.traced("telegram.edit")
+def _edit_telegram(chat_id: int, message_id: int, text: str) -> None:
+    payload = dict(_message_payload(chat_id, text), message_id=message_id)
     try:
-        r.raise_for_status()
+        telegram_dispatcher.call(chat_id, "editMessageText", payload)
     except HTTPError as e:
-        logger.error("Telegram sendMessage failed: %s | response=%s", e, r.text)
-        raise
-    logger.debug("Telegram OK %s", r.status_code)
+        if "message is not modified" not in getattr(e.response, "text", ""):
+            raise
+    logger.debug("Telegram edit OK")
 
+@tracer.traced("telegram.send_chunks")
 def _send_telegram_chunks(chat_id: int, text: str) -> None:
-    for part in chunks(tg_escape(text)):
-        _send_telegram(chat_id, part)
+    # All chunks are queued at once, so the dispatcher can pace (and merge) them
+    futures = [telegram_dispatcher.submit(chat_id, "sendMessage", _message_payload(chat_id, part))
+               for part in chunks(tg_escape(text))]
+    for future in futures:
+        future.result()
+
+SENTENCE_END = re.compile(r"[.!?…](?:\s|$)|\n")
+
+class TelegramStream:
+    """
+    Progressive Telegram reply for a streamed LLM answer.
+
+    The first message goes out as soon as the first sentence is complete, then it is
+    updated with editMessageText at most once per `edit_interval`. When the escaped text
+    would exceed the 4096-char limit, the message is finished and the rest continues in a
+    new one. The split is made on the raw text (preferring a newline, then a space) and each
+    message is escaped as a whole, so an escape pair is never cut in half.
+    """
+    limit = 4096
+
+    def __init__(self, chat_id: int, escape=tg_escape, send=_send_telegram, edit=_edit_telegram,
+                 edit_interval: float = telegram_edit_interval, first_chars: int = telegram_first_flush_chars):
+        self.chat_id = chat_id
+        self.escape = escape
+        self.send = send
+        self.edit = edit
+        self.edit_interval = edit_interval
+        self.first_chars = first_chars
+        self.parts: list[str] = []        # raw text of finished messages
+        self.text = ""                    # raw text of the current message
+        self.message_id: Optional[int] = None
+        self.shown = ""                   # escaped text currently visible in the chat
+        self.flushed_at = 0.0
+        self.started_at = time.monotonic()
+        self.first_visible: Optional[float] = None  # seconds until the first message was sent
+
+    @property
+    def visible(self) -> bool:
+        return bool(self.parts) or self.message_id is not None
+
+    def feed(self, delta: str) -> None:
+        if not delta:
+            return
+        self.text += delta
+        # Escaping at most doubles the text, so the exact length is only needed near the limit
+        while len(self.text) * 2 > self.limit and len(self.escape(self.text)) > self.limit:
+            self._roll_over()
+        if self.message_id is None:
+            if SENTENCE_END.search(self.text) or len(self.text) >= self.first_chars:
+                self._flush()
+        elif time.monotonic() - self.flushed_at >= self.edit_interval:
+            self._flush()
+
+    def close(self) -> str:
+        """Shows the remaining text regardless of the throttle and returns the whole reply."""
+        self._flush()
+        return "".join(self.parts) + self.text
+
+    def _split_point(self) -> int:
+        # Longest raw prefix that fits once escaped, then back off to a line or word boundary
+        lo, hi = 1, len(self.text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if len(self.escape(self.text[:mid])) <= self.limit:
+                lo = mid
+            else:
+                hi = mid - 1
+        for sep in ("\n", " "):
+            pos = self.text.rfind(sep, 0, lo)
+            if pos >= lo // 2:
+                return pos + 1
+        return lo
+
+    def _roll_over(self) -> None:
+        cut = self._split_point()
+        head, self.text = self.text[:cut], self.text[cut:]
+        self._flush(head)
+        self.parts.append(head)
+        self.message_id = None
+        self.shown = ""
+
+    def _flush(self, text: Optional[str] = None) -> None:
+        rendered = self.escape(self.text if text is None else text)
+        if not rendered.strip() or rendered == self.shown:
+            return
+        if self.message_id is None:
+            self.message_id = self.send(self.chat_id, rendered)
+            if self.first_visible is None:
+                self.first_visible = time.monotonic() - self.started_at
+                logger.debug("First reply chunk visible after %.2fs", self.first_visible)
+        else:
+            self.edit(self.chat_id, self.message_id, rendered)
+        self.shown = rendered
+        self.flushed_at = time.monotonic()
 
 # ──────────────────────────
 #  SUNO HELPER
 # ──────────────────────────
+MB = 1024 * 1024
+SONG_CHUNK_SIZE = 256 * 1024
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+def get_s3():
+    """One S3 client per container: creating it costs more than the presign or upload it is used for."""
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                import boto3
+                _s3_client = boto3.client("s3")
+    return _s3_client
+
+@lru_cache(maxsize=None)
+def song_transfer_config():
+    from boto3.s3.transfer import TransferConfig
+    # Parts of a non-seekable stream are buffered: max_in_memory_upload_chunks x multipart_chunksize bounds memory
+    config = TransferConfig(multipart_threshold=8 * MB, multipart_chunksize=8 * MB, max_concurrency=8)
+    config.max_in_memory_upload_chunks = 6
+    return config
+
+@tracer.traced("s3.presign")
 def generate_song_url(bucket: str, key: str, expires_in: int = 3600) -> str:
     """
     Генерирует временную (signed) ссылку на файл в приватном S3/Yandex Object Storage бакете.
@@ -390,35 +718,102 @@ def generate_song_url(bucket: str, key: str, expires_in: int = 3600) -> str:
     :param expires_in: время жизни ссылки в секундах (по умолчанию 1 час)
     :return: временная ссылка (signed url)
     """
-    s3 = boto3.client("s3")
-    url = s3.generate_presigned_url(
+    url = get_s3().generate_presigned_url(
         ClientMethod='get_object',
         Params={'Bucket': bucket, 'Key': key},
         ExpiresIn=expires_in
     )
     return url
 
+def _read_at_least(chunks, head: bytes, size: int) -> bytes:
+    while len(head) < size:
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        head += chunk
+    return head
+
+def retag_stream(chunks, tags: Dict[str, str]):
+    """
+    Yields the MP3 from `chunks` with its leading ID3v2 tag rewritten: only the old tag is
+    buffered (its frames are kept, `tags` are set on top), the audio frames pass through.
+    """
+    from mutagen.easyid3 import EasyID3
+    from mutagen.id3 import error as ID3Error
+
+    chunks = iter(chunks)
+    head = _read_at_least(chunks, b"", 10)
+    tag, rest = EasyID3(), head
+    if head[:3] == b"ID3" and len(head) >= 10:
+        # Syncsafe size of the tag body, plus header and optional footer
+        size = 0
+        for byte in head[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        tag_size = 10 + size + (10 if head[5] & 0x10 else 0)
+        head = _read_at_least(chunks, head, tag_size)
+        rest = head[tag_size:]
+        try:
+            tag = EasyID3(io.BytesIO(head[:tag_size]))
+        except ID3Error:
+            pass
+    for key, value in tags.items():
+        tag[key] = value
+    out = io.BytesIO()
+    tag.save(out)
+    yield out.getvalue()
+    if rest:
+        yield rest
+    yield from chunks
+
+class IterStream(io.RawIOBase):
+    """Non-seekable file object over an iterator of byte chunks (for upload_fileobj)."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self.bytes_read += n
+        return n
+
+@tracer.traced("suno.download_upload")
 def download_and_process_song(song_url, tg_user_id, song_title, song_artist, local_folder, song_bucket_name):
-    # 1. Скачать mp3
-    local_path = os.path.join(f"{local_folder}/{tg_user_id}/", f"{song_title}.mp3")
+    # Suno → new ID3 tag at the head of the stream → S3 multipart upload, the song is never held whole
     song_key = f"{tg_user_id}/{song_title}.mp3"
-    os.makedirs(f"{local_folder}/{tg_user_id}", exist_ok=True)
-    r = requests.get(song_url)
-    with open(local_path, "wb") as f:
-        f.write(r.content)
-
-    # 2. Изменить ID3 теги
-    audio = MP3(local_path, ID3=EasyID3)
-    audio["title"] = song_title
-    audio["artist"] = song_artist
-    audio["composer"] = AI_COMPOSER
-    audio.save()
-
-    # 3. Generate signed url
+    tags = {"title": song_title, "artist": song_artist, "composer": AI_COMPOSER}
+    with session.get(song_url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        song = retag_stream(r.iter_content(SONG_CHUNK_SIZE), tags)
+        if song_bucket_name:
+            body = IterStream(song)
+            get_s3().upload_fileobj(io.BufferedReader(body, SONG_CHUNK_SIZE), song_bucket_name, song_key,
+                                    ExtraArgs={"ContentType": "audio/mpeg"}, Config=song_transfer_config())
+            logger.debug("Uploaded %d bytes to %s", body.bytes_read, song_key)
+        else:
+            os.makedirs(f"{local_folder}/{tg_user_id}", exist_ok=True)
+            with open(os.path.join(f"{local_folder}/{tg_user_id}/", f"{song_title}.mp3"), "wb") as f:
+                for chunk in song:
+                    f.write(chunk)
+            return song_url
+
+    # Generate signed url
     signed_url = generate_song_url(bucket = song_bucket_name, key = song_key)
     return signed_url
 
 
+@tracer.traced("suno.generate")
 def request_suno(prompt: str, style: str, title: str, suno_model: str, suno_api_key: str) -> None:
     """
     Request a Suno AI audio generation for the given prompt, style, and title.
@@ -466,94 +861,106 @@ def request_suno(prompt: str, style: str, title: str, suno_model: str, suno_api_
 #  MODERATION HELPER
 # ──────────────────────────
 
+@tracer.traced("moderation")
 def is_text_flagged(text: str, api_key: str) -> bool:
-    url = "https://api.openai.com/v1/moderations"
+    url = f"{openai_api_base}/moderations"
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {"input": text, "model": "omni-moderation-latest"}
     try:
-        resp = session.post(url, headers=headers, json=payload, proxies=PROXY, timeout=timeout)
+        resp = post_via_proxy(url, headers=headers, json=payload, timeout=timeout)
         data = resp.json()
-        logger.debug("Moderation response: %s", data)
+        logger.debug("Moderation response: %s", data, extra={"category": "payload"})
         return data.get("results", [{}])[0].get("flagged", False)
     except Exception as e:
         logger.error("Moderation call failed: %s", e)
         return False
 
 # ────────LLM CALL---------------
+@tracer.traced("llm.response")
 def llm_response(user_message: str, system_message: str) -> str:
     messages = [{"role": "user", "content": user_message}]
     if system_message:
         messages.insert(0, {"role": "system", "content": system_message})
     try:
-        resp = session.post(
+        resp = post_via_proxy(
             ai_endpoint,
             json={"model": ai_model, "messages": messages, "models": ai_models_fallback},
             headers={"Authorization": f"Bearer {operouter_key}", "Content-Type": "application/json"},
-            proxies=(None if not check_proxy(proxy_url, read_timeout) else PROXY),
             timeout=timeout
         )
         data = resp.json()
-        logger.debug("LLM one response: %s", data)
+        logger.debug("LLM one response: %s", data, extra={"category": "payload"})
         content = data["choices"][0]["message"]["content"]
         return json.loads(content)
     except Exception as e:
         logger.error("LLM one call failed: %s", e)
         return  {"error": str(e)}
 
+@tracer.traced("llm.conversation")
 def llm_conversation(messages: list[dict], system_message: str) -> str:
     if system_message:
         messages.insert(0, {"role": "system", "content": system_message})
     try:
-        resp = session.post(
+        resp = post_via_proxy(
             ai_endpoint,
             json={"model": ai_model, "messages": messages, "models": ai_models_fallback},
             headers={"Authorization": f"Bearer {operouter_key}", "Content-Type": "application/json"},
-            proxies=(None if not check_proxy(proxy_url, read_timeout) else PROXY),
             timeout=timeout
         )
         data = resp.json()
-        logger.debug("LLM conversation response: %s", data)
+        logger.debug("LLM conversation response: %s", data, extra={"category": "payload"})
         content = data["choices"][0]["message"]["content"]
         return json.loads(content)
     except Exception as e:
         logger.error("LLM conversation call failed: %s", e)
         return  {"error": str(e)}
 
-def llm_call(messages: list[dict]) -> str:
-    MAX_TOKENS = 50_000 # 51962 ~ 128k эмпиричеси
-    encoder = tiktoken.encoding_for_model("gpt-4o")
-
-    # Функция для подсчёта токенов в одном сообщении
-    def count_tokens(msg: dict) -> int:
-        # Суммируем токены ролей и контента
-        role_tokens = len(encoder.encode(msg["role"]))
-        content_tokens = len(encoder.encode(msg["content"]))
-        return role_tokens + content_tokens + 4  # +4 — служебные токены системы
-
-    # Подсчитываем и обрезаем
-    total = sum(count_tokens(m) for m in messages)
-    logger.debug("Total tokens: %s", total)
-    # Всегда оставляем первый системный prompt
-    sys_msg = messages[0]
-    chat_msgs = messages[1:]
-    # Обрезаем oldest-first, пока не уложимся
-    while total > MAX_TOKENS and chat_msgs:
-        removed = chat_msgs.pop(0)
-        total -= count_tokens(removed)
-    messages = [sys_msg] + chat_msgs
-    total = sum(count_tokens(m) for m in messages)
+# Shared pool for independent LLM calls; survives warm invocations
+fanout_executor = FanOutExecutor(max_workers=8, default_timeout=llm_fanout_timeout, logger=logger)
+
+@tracer.traced("llm.fan_out")
+def fan_out(calls: Dict[str, Any], timeouts: Optional[Dict[str, float]] = None,
+            timeout: float = llm_fanout_timeout) -> Dict[str, Any]:
+    """
+    Run independent zero-argument callables concurrently on fanout_executor.
+    A call that raises or misses its deadline yields {"error": ...} (same
+    contract as llm_conversation) and is left to finish in the background.
+    """
+    result = fanout_executor.run({name: propagate(fn) for name, fn in calls.items()},
+                                 timeouts=timeouts, timeout=timeout)
+    answers = dict(result.results)
+    for name, error in result.errors.items():
+        answers[name] = {"error": str(error)}
+    for name in result.timed_out:
+        answers[name] = {"error": "timeout"}
+    return answers
+
+# ──────────────────────────
+#  TOKEN WINDOW
+# ──────────────────────────
+
+# Largest suffix of a session that fits the budget; prefix sums are cached per session
+context_window = ContextWindow(llm_max_context_tokens)
+
+@tracer.traced("llm.call")
+def llm_call(messages: list[dict], token_counts: Optional[list] = None, session_id: Optional[str] = None) -> str:
+    """
+    token_counts: stored counts of messages[1:] (None entries are counted here);
+    session_id: keys the cached prefix sums when messages[1:] is the whole session history.
+    """
+    logger.debug("Messages before trim: %s", len(messages))
+    messages, total = context_window.select(messages, token_counts, session_id)
     logger.debug("Total tokens after trim: %s", total)
 
     try:
-        resp = session.post(
+        resp = post_via_proxy(
             ai_endpoint,
             json={"model": ai_model, "messages": messages, "tools": tools, "tool_choice": "auto", "models": ai_models_fallback},
             headers={"Authorization": f"Bearer {operouter_key}", "Content-Type": "application/json"},
-            proxies=(None if not check_proxy(proxy_url, read_timeout) else PROXY),
             timeout=timeout
         )
         data = resp.json()
-        logger.debug("LLM response: %s", data)
+        logger.debug("LLM response: %s", data, extra={"category": "payload"})
         choice = data["choices"][0]["message"]
         # Tool call moderation
         if "tool_calls" in choice and choice["tool_calls"][0]["function"]["name"] == "moderate_user":
@@ -568,10 +975,88 @@ def llm_call(messages: list[dict]) -> str:
         logger.error("LLM call failed: %s", e)
         return FALLBACK_ANSWER
 
+def _iter_sse(resp: requests.Response):
+    """Decoded `data:` payloads of a server-sent events response, up to [DONE]."""
+    for line in resp.iter_lines():
+        # Blank separators and ": OPENROUTER PROCESSING" keep-alive comments carry no data
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        yield json.loads(data)
+
+def llm_stream(messages: list[dict], chat_id: int, tg_user_id: str,
+               token_counts: Optional[list] = None, session_id: Optional[str] = None):
+    """
+    Streaming variant of llm_call: yields content deltas as they arrive.
+    Tool calls are assembled from their fragments and, like the moderation check,
+    handled once the stream is over.
+    """
+    messages, total = context_window.select(messages, token_counts, session_id)
+    logger.debug("Total tokens after trim: %s", total)
+
+    resp = post_via_proxy(
+        ai_endpoint,
+        json={"model": ai_model, "messages": messages, "tools": tools, "tool_choice": "auto",
+              "models": ai_models_fallback, "stream": True},
+        headers={"Authorization": f"Bearer {operouter_key}", "Content-Type": "application/json"},
+        timeout=timeout,
+        stream=True
+    )
+    content, calls = [], {}
+    with resp:
+        resp.raise_for_status()
+        for event in _iter_sse(resp):
+            if "error" in event:
+                raise RuntimeError(f"LLM stream error: {event['error']}")
+            choices = event.get("choices") or [{}]
+            delta = choices[0].get("delta") or {}
+            for call in delta.get("tool_calls") or []:
+                acc = calls.setdefault(call.get("index", 0), {"name": "", "arguments": ""})
+                acc["name"] += (call.get("function") or {}).get("name") or ""
+                acc["arguments"] += (call.get("function") or {}).get("arguments") or ""
+            if delta.get("content"):
+                content.append(delta["content"])
+                yield delta["content"]
+
+    for call in calls.values():
+        if call["name"] == "moderate_user":
+            args = json.loads(call["arguments"] or "{}")
+            moderate_user(args["chat_id"], str(args["user_id"]), args.get("additional_reason", ""))
+    text = "".join(content)
+    logger.debug("LLM content: %s", text)
+    if text == "Извините, я не могу помочь с этой просьбой." or is_text_flagged(text, openai_api_key):
+        moderate_user(chat_id, tg_user_id, "LLM or moderation flagged message")
+
+@tracer.traced("llm.stream_reply")
+def stream_reply(messages: list[dict], chat_id: int, tg_user_id: str,
+                 token_counts: Optional[list] = None, session_id: Optional[str] = None) -> str:
+    """
+    Streams the LLM answer into Telegram and returns its text. If the stream fails
+    before anything was shown, the fallback answer is sent instead; if it fails midway,
+    the part already written is kept.
+    """
+    reply = TelegramStream(chat_id)
+    try:
+        for delta in llm_stream(messages, chat_id, tg_user_id, token_counts, session_id):
+            reply.feed(delta)
+    except Exception as e:
+        logger.error("LLM stream failed: %s", e)
+        if not reply.visible:
+            _send_telegram_chunks(chat_id, FALLBACK_ANSWER)
+            return FALLBACK_ANSWER
+    text = reply.close()
+    if not text:
+        _send_telegram_chunks(chat_id, FALLBACK_ANSWER)
+        return FALLBACK_ANSWER
+    return text
+
 # ──────────────────────────
 #  UTILS
 # ──────────────────────────
 
+@tracer.traced("parse_body")
 def parse_body(event: Dict[str, Any]) -> Any:
     """
     Универсально разбирает event['body'] из Yandex Cloud (или AWS / GCP):
@@ -581,7 +1066,6 @@ def parse_body(event: Dict[str, Any]) -> Any:
       • голый текст → str
     """
     raw: str | bytes = event.get("body", "")
-    b64 = TypeAdapter(Base64Bytes)
 
     # 1. Пытаемся сразу прочитать JSON
     try:
@@ -589,6 +1073,9 @@ def parse_body(event: Dict[str, Any]) -> Any:
     except (TypeError, json.JSONDecodeError):
         pass          # не JSON — едем дальше
 
+    from pydantic import TypeAdapter, Base64Bytes, ValidationError
+    b64 = TypeAdapter(Base64Bytes)
+
     # 2. Пытаемся декодировать Base-64
     #    (неважно, что говорит isBase64Encoded)
     try:
@@ -629,17 +1116,51 @@ def get_last_messages(history, count=2, role=None, force_last_user=False, extra_
 #  INITIALIZATION
 # ──────────────────────────
 
-bot_id = _get_or_create_bot(bot_token)
-logger.info("Bot initialized with ID %s", bot_id)
+_bot_id = os.getenv("bot_id")  # set it to skip the lookup altogether
+_bot_id_lock = threading.Lock()
+
+def get_bot_id() -> str:
+    """Bot UUID, looked up (or created) on the first request and kept for the life of the container."""
+    global _bot_id
+    if _bot_id is None:
+        with _bot_id_lock:
+            if _bot_id is None:
+                _bot_id = _get_or_create_bot(bot_token)
+                logger.info("Bot initialized with ID %s", _bot_id)
+    return _bot_id
 
 # ──────────────────────────
 #  HANDLER
 # ──────────────────────────
 
 def handler(event: Dict[str, Any], context):
-    logger.debug("Incoming event: %s", event)
+    # All writes of one update go to the database in a single transaction
+    uow = UnitOfWork(db_pool, logger)
+    _uow_local.uow = uow
+    try:
+        with tracer.trace("update", request_id=getattr(context, "request_id", None)):
+            try:
+                return _handle(event, context)
+            finally:
+                _uow_local.uow = None
+                with tracer.span("db.flush"):
+                    try:
+                        uow.flush()
+                    except Exception:
+                        logger.error("Unit of work dropped %d ops: %s", uow.pending, uow.describe_pending())
+                        raise
+                logger.debug("Unit of work stats: %s", uow.stats, extra={"category": "stats"})
+                logger.debug("Telegram dispatcher stats: %s", lazy(telegram_dispatcher.get_stats), extra={"category": "stats"})
+    finally:
+        # The runtime may freeze the instance as soon as the handler returns
+        log_pipeline.flush()
+
+def _handle(event: Dict[str, Any], context):
+    logger.debug("Incoming event: %s", event, extra={"category": "payload"})
+    logger.debug("DB pool stats: %s", lazy(db_pool.get_stats), extra={"category": "stats"})
+    logger.debug("Proxy health: %s", lazy(proxy_health.get_metrics), extra={"category": "stats"})
     body = parse_body(event)
-    logger.debug("Incoming body: %s", body)
+    logger.debug("Incoming body: %s", body, extra={"category": "payload"})
 
     # Parse suno api callback
     if body.get("data") and body["data"].get("callbackType") and body["data"]["callbackType"] == "complete":
@@ -653,16 +1174,12 @@ def handler(event: Dict[str, Any], context):
         logger.debug("Telegram user found: %s", rec)
         song_url = download_and_process_song(song_url = song_url, song_title = song_title, tg_user_id = tg_user_id, song_artist = song_artist, local_folder = song_path, song_bucket_name = song_bucket_name)
         path_prefix = f"{tg_user_id}/{song_title}.mp3"
-        execute("UPDATE songs SET path = %s WHERE task_id = %s", (path_prefix, task_id))
+        write_update("songs", {"path": path_prefix}, task_id, key_column="task_id")
         # Send final version
         user_uuid = _get_or_create_user(tg_user_id, full_name="Dummy")
-        session_uuid = _get_active_session(user_uuid, bot_id)
+        session_uuid = _get_active_session(user_uuid, get_bot_id())
         _send_audio(chat_id=tg_user_id, audio_url=song_url, title=song_title)
-        execute(
-            "INSERT INTO messages(id, session_id, user_id, role, content, created_at) "
-            "VALUES (%s, %s, %s, %s, %s, NOW())",
-            (str(uuid.uuid4()), session_uuid, user_uuid, "assistant", "финальная версия песни получена пользователем")
-        )
+        insert_message(session_uuid, user_uuid, "assistant", "финальная версия песни получена пользователем")
         return {"statusCode": 200, "body": ""}
 
     message = body.get("message") or body.get("edited_message")
@@ -674,27 +1191,23 @@ def handler(event: Dict[str, Any], context):
 
     user = message["from"]
     full_name = f"{user.get('first_name','')} {user.get('last_name','')}".strip()
-    user_uuid = _get_or_create_user(chat_id, full_name)
     tg_user_id = str(user.get("id"))
 
-    # Session & history
-    session_uuid = _get_active_session(user_uuid, bot_id)
-    history = _fetch_history(session_uuid)
-
-    ensure_user_exists(tg_user_id, user_uuid)
+    # User, session, history and moderation state in one round trip
+    turn = load_turn_context(chat_id, tg_user_id, get_bot_id(), full_name)
+    user_uuid = turn["user_uuid"]
+    session_uuid = turn["session_uuid"]
+    history = turn["history"]
+    history_tokens = turn["history_tokens"]
 
     # Check warnings/block
-    urec = query_one("SELECT warnings, blocked FROM tg_users WHERE id = %s", (tg_user_id,))
-    if urec and urec.get("warnings",0) > 2 and urec.get("blocked", False):
+    if turn["warnings"] > 2 and turn["blocked"]:
         return {"statusCode": 200, "body": "banned"}
 
     # Save user message
     msg_id = str(uuid.uuid4())
-    execute(
-        "INSERT INTO messages(id, session_id, user_id, role, content, created_at) "
-        "VALUES (%s, %s, %s, %s, %s, NOW())",
-        (msg_id, session_uuid, user_uuid, "user", text)
-    )
+    user_tokens = count_message_tokens("user", text)
+    insert_message(session_uuid, user_uuid, "user", text, msg_id=msg_id, token_count=user_tokens)
 
     # Получаем последние сообщения
     last_50_messages = get_last_messages(history, count=50)
@@ -727,8 +1240,12 @@ def handler(event: Dict[str, Any], context):
         last_3_assistant_messages = get_last_messages(msgs_from_phrase, count=3, role="assistant")
         last_8_user_messages = get_last_messages(msgs_from_phrase, count=8, role="user")
         openai_msgs = [{"role": "system", "content": system_prompt}, *msgs_from_phrase, {"role": "user", "content": text}]
+        openai_tokens = [*history_tokens[len(history_tokens) - len(msgs_from_phrase):], user_tokens]
+        window_session = None  # the window start moves, cached prefix sums would not extend
     else:
         openai_msgs = [{"role": "system", "content": system_prompt}, *history, {"role": "user", "content": text}]
+        openai_tokens = [*history_tokens, user_tokens]
+        window_session = session_uuid
 
     # Detect intent and emotion
     intent_prompt = (
@@ -743,8 +1260,13 @@ def handler(event: Dict[str, Any], context):
         intent_prompt += f"{role}: {msg['content']}\n"
 
     # detect_intent = llm_conversation(last_8_messages, system_prompt_intent)
-    detect_emotion = llm_conversation(last_8_user_messages, system_prompt_detect_emotion)
-    classify_intent = llm_conversation([{"role": "user", "content": intent_prompt}], system_prompt_classify)
+    # Emotion and intent are independent - classify them concurrently
+    analyzers = fan_out({
+        "emotion": lambda: llm_conversation(list(last_8_user_messages), system_prompt_detect_emotion),
+        "intent": lambda: llm_conversation([{"role": "user", "content": intent_prompt}], system_prompt_classify),
+    })
+    detect_emotion = analyzers["emotion"]
+    classify_intent = analyzers["intent"]
 
     # detect_userflow_state = llm_conversation(last_8_messages, system_prompt_userflow_state)
     # if detect_userflow_state == "assembly":
@@ -753,10 +1275,7 @@ def handler(event: Dict[str, Any], context):
     logger.debug("User intent: %s", classify_intent)
     # Save intent and emotion analysis to DB
     analysis = {"intent": classify_intent, "emotion": detect_emotion}
-    execute(
-        "UPDATE messages SET analysis = %s WHERE id = %s",
-        (json.dumps(analysis), msg_id)
-    )
+    write_update("messages", {"analysis": json.dumps(analysis)}, msg_id)
     # MVP_2_2 final можно назвать по semever 0.6.1
     # Сделать пересохранение песня на yandex s3 и редактирование id3 тегов Done + тест suno-generating регресс
     # Сделать прежний формат песню последоватьено пишет строка строка + куплет  куплет + куплет чтобы пользовател видел процесс а не только текущий куплет
@@ -810,23 +1329,15 @@ def handler(event: Dict[str, Any], context):
             if random.choice([True, False]):
                 # Отправляем текст
                 ANSWER = random.choice(CONFUSED_INTENT_ANSWER)
-                execute(
-                    "INSERT INTO messages(id, session_id, user_id, role, content, created_at) "
-                    "VALUES (%s, %s, %s, %s, %s, NOW())",
-                    (str(uuid.uuid4()), session_uuid, user_uuid, "assistant", f"{ANSWER}")
-                )
+                insert_message(session_uuid, user_uuid, "assistant", f"{ANSWER}")
                 _send_telegram_chunks(chat_id, ANSWER)
             else:
                 # Отправляем аудио
                 _send_audio(chat_id, audio_url=CONFUSED_INTENT_ANSWER_MP3, title="Ты можешь...")
-            execute(
-                "INSERT INTO messages(id, session_id, user_id, role, content, created_at) "
-                "VALUES (%s, %s, %s, %s, %s, NOW())",
-                (str(uuid.uuid4()), session_uuid, user_uuid, "assistant", "confused_send")
-            )
+            insert_message(session_uuid, user_uuid, "assistant", "confused_send")
             return {"statusCode": 200, "body": ""}
 
-    if classify_intent["class"] == "finalize_song" and not is_final_song:
+    if classify_intent.get("class") == "finalize_song" and not is_final_song:
         logger.debug("Song request detected")
         logger.debug("Parse song from history")
         get_song = llm_conversation(last_3_assistant_messages, system_prompt_prepare_suno)
@@ -838,43 +1349,35 @@ def handler(event: Dict[str, Any], context):
         task_id = song["data"]["taskId"]
         song_id = str(uuid.uuid4())
         _send_telegram_chunks(chat_id, SONG_GENERATING_MESSAGE)
-        execute(
-            "INSERT INTO songs(id, user_id, session_id, task_id, title, prompt, style, created_at)"
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())",
-            (song_id, user_uuid, session_uuid, task_id, title, lyrics, style)
-        )
-        execute(
-            "INSERT INTO messages(id, session_id, user_id, role, content, created_at) "
-            "VALUES (%s, %s, %s, %s, %s, NOW())",
-            (str(uuid.uuid4()), session_uuid, user_uuid, "assistant", SONG_GENERATING_MESSAGE)
-        )
-        execute(
-            "INSERT INTO messages(id, session_id, user_id, role, content, created_at) "
-            "VALUES (%s, %s, %s, %s, %s, NOW())",
-            (str(uuid.uuid4()), session_uuid, user_uuid, "assistant", "финальная версия песни отправлена пользователю")
-        )
+        write_insert("songs", {"id": song_id, "user_id": user_uuid, "session_id": session_uuid,
+                               "task_id": task_id, "title": title, "prompt": lyrics, "style": style})
+        insert_message(session_uuid, user_uuid, "assistant", SONG_GENERATING_MESSAGE)
+        insert_message(session_uuid, user_uuid, "assistant", "финальная версия песни отправлена пользователю")
         logger.debug("Suno task ID: %s", task_id)
         return {"statusCode": 200, "body": ""}
 
-    if classify_intent["class"] == "feedback" and is_final_song and classify_intent["confidence"] > 90:
+    if classify_intent.get("class") == "feedback" and is_final_song and classify_intent.get("confidence", 0) > 90:
         if not any(msg["content"] == "feedback_audio_send" for msg in last_5_assistant_messages):
             _send_audio(chat_id, audio_url=FEEDBACK_INTENT_ANSWER_MP3, title="Береги своё вдохновение...")
-            execute(
-                "INSERT INTO messages(id, session_id, user_id, role, content, created_at) "
-                "VALUES (%s, %s, %s, %s, %s, NOW())",
-                (str(uuid.uuid4()), session_uuid, user_uuid, "assistant", "feedback_audio_send")
-            )
+            insert_message(session_uuid, user_uuid, "assistant", "feedback_audio_send")
             return {"statusCode": 200, "body": ""}
 
-    ai_answer = llm_call(openai_msgs)
+    if llm_stream_enabled:
+        # The reply is shown while it is generated, so it is saved after it was sent
+        try:
+            ai_answer = stream_reply(openai_msgs, chat_id, tg_user_id, openai_tokens, window_session)
+        except Exception:
+            logger.exception("Failed to stream message to Telegram %s", chat_id)
+            return {"statusCode": 200, "body": ""}
+        if ai_answer and ai_answer != FALLBACK_ANSWER:
+            insert_message(session_uuid, user_uuid, "assistant", ai_answer)
+        return {"statusCode": 200, "body": ""}
+
+    ai_answer = llm_call(openai_msgs, openai_tokens, window_session)
 
     if ai_answer and ai_answer != FALLBACK_ANSWER:
         # Save assistant response
-        execute(
-            "INSERT INTO messages(id, session_id, user_id, role, content, created_at) "
-            "VALUES (%s, %s, %s, %s, %s, NOW())",
-            (str(uuid.uuid4()), session_uuid, user_uuid, "assistant", ai_answer)
-        )
+        insert_message(session_uuid, user_uuid, "assistant", ai_answer)
 
     # Send back to Telegram
     try:
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Load generator: replays Telegram updates against handler(event, context)
+
+Starts the local stand-in (standin.py) for OpenRouter, OpenAI, Telegram and
+Suno, points index.py at it and calls handler() in-process with webhook
+events, like the function runtime does. Each chat sends its updates in order;
+`--concurrency` chats are served at the same time.
+
+Reports p50/p95/p99 and mean of the handler latency, throughput, and a
+per-stage breakdown. A stage's time is exclusive (a moderation request made
+inside the LLM stream counts as moderation, not LLM):
+- db: db_pool.run (every query and the unit-of-work flush)
+- classify: fan_out() of the intent/emotion classifiers
+- llm: the streamed main answer (llm_stream) or other chat completion requests
+- moderation, embeddings, suno, http: other outbound requests by URL
+- telegram: waiting for telegram_dispatcher.call()
+- local: the rest of the handler (parsing, token counting, prompt assembly)
+
+Usage:
+    database_url=postgresql://... python loadgen.py [--chats 20] [--messages 10] [--concurrency 4]
+                                                    [--updates updates.jsonl] [--profile profile.json]
+                                                    [--speed 1] [--suno] [--json]
+
+The database must have the schema of migration-*.sql; the load creates users,
+sessions and messages in it. --updates replays recorded webhook bodies (one JSON
+update per line) instead of generated ones. --suno replays the Suno "complete"
+callbacks of the songs requested during the run (set the stand-in's
+scenario.song_rate in the profile to request some).
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from standin import StandIn, load_profile, percentiles
+
+TEXTS = (
+    "Привет! Хочу написать песню",
+    "Она про мою бабушку и лето в деревне",
+    "Пусть будет спокойная, немного грустная",
+    "Добавь припев про запах яблок",
+    "Мне нравится, давай второй куплет",
+    "А можно проще слова?",
+    "Да, так лучше",
+    "Сделай песню",
+    "Спасибо, очень трогательно",
+    "Давай начнём всё с начала",
+)
+
+
+class StageClock:
+    """Exclusive time per stage of the current thread: a nested stage pauses its parent."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self) -> Dict[str, float]:
+        self._local.totals = {}
+        self._local.stack = []
+        return self._local.totals
+
+    def enter(self, name: str) -> list:
+        frame = [name, time.perf_counter(), 0.0]
+        getattr(self._local, "stack", []).append(frame)
+        return frame
+
+    def exit(self, frame: list) -> None:
+        stack = getattr(self._local, "stack", None)
+        if not stack or stack[-1] is not frame:
+            return  # not inside a measured update (e.g. a dispatcher thread)
+        stack.pop()
+        elapsed = time.perf_counter() - frame[1]
+        totals = self._local.totals
+        totals[frame[0]] = totals.get(frame[0], 0.0) + elapsed - frame[2]
+        if stack:
+            stack[-1][2] += elapsed
+
+    def wrap(self, name: Callable[..., str], fn: Callable) -> Callable:
+        """fn timed as stage name(*args, **kwargs)."""
+        def timed(*args, **kwargs):
+            frame = self.enter(name(*args, **kwargs))
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.exit(frame)
+        return timed
+
+    def wrap_generator(self, stage: str, fn: Callable) -> Callable:
+        """Generator function whose own work (not the consumer's) is timed as stage."""
+        def timed(*args, **kwargs):
+            iterator = iter(fn(*args, **kwargs))
+            while True:
+                frame = self.enter(stage)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.exit(frame)
+                yield item
+        return timed
+
+
+def request_stage(method: str, url: str, *args, **kwargs) -> str:
+    if "/chat/completions" in url:
+        return "llm"
+    if url.endswith("/moderations"):
+        return "moderation"
+    if url.endswith("/embeddings"):
+        return "embeddings"
+    if "/bot" in url:
+        return "telegram"
+    if "suno" in url or url.endswith("/generate"):
+        return "suno"
+    return "http"
+
+
+def instrument(index, clock: StageClock) -> None:
+    """Time the handler's stages; only calls made on the handler's own thread are attributed."""
+    index.db_pool.run = clock.wrap(lambda fn: "db", index.db_pool.run)
+    index.session.request = clock.wrap(request_stage, index.session.request)
+    index.telegram_dispatcher.call = clock.wrap(lambda *a, **k: "telegram", index.telegram_dispatcher.call)
+    index.fan_out = clock.wrap(lambda *a, **k: "classify", index.fan_out)
+    index.llm_stream = clock.wrap_generator("llm", index.llm_stream)
+
+
+def generated_updates(chats: int, messages: int, first_chat_id: int = 900_000_000) -> Dict[int, List[dict]]:
+    """chat id -> its Telegram updates, the same for every run."""
+    updates: Dict[int, List[dict]] = {}
+    update_id = 1
+    for c in range(chats):
+        chat_id = first_chat_id + c
+        for m in range(messages):
+            updates.setdefault(chat_id, []).append({
+                "update_id": update_id,
+                "message": {
+                    "message_id": m + 1,
+                    "from": {"id": chat_id, "is_bot": False, "first_name": "Нагрузка", "last_name": str(c)},
+                    "chat": {"id": chat_id, "type": "private"},
+                    "date": 1_700_000_000 + update_id,
+                    "text": TEXTS[m % len(TEXTS)],
+                },
+            })
+            update_id += 1
+    return updates
+
+
+def recorded_updates(path: str) -> Dict[int, List[dict]]:
+    """chat id -> updates of a JSONL file of webhook bodies, in file order."""
+    updates: Dict[int, List[dict]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                update = json.loads(line)
+                message = update.get("message") or update.get("edited_message") or {}
+                updates.setdefault((message.get("chat") or {}).get("id"), []).append(update)
+    return updates
+
+
+def event_for(body: Dict[str, Any]) -> Dict[str, Any]:
+    return {"httpMethod": "POST", "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(body, ensure_ascii=False), "isBase64Encoded": False}
+
+
+class Run:
+    """Latencies, stage times and errors of one replay."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, latency_ms: float, stages: Dict[str, float], error: str = None) -> None:
+        with self.lock:
+            self.latencies.append(latency_ms)
+            for stage, seconds in stages.items():
+                self.stages.setdefault(stage, []).append(seconds * 1000)
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        n = len(self.latencies)
+        total = sum(self.latencies) or 1.0
+        stages = {}
+        for stage, values in sorted(self.stages.items(), key=lambda item: -sum(item[1])):
+            # Updates that never entered a stage count as 0 ms for it
+            values = values + [0.0] * (n - len(values))
+            stages[stage] = {**percentiles(values), "share": round(sum(values) / total, 3)}
+        return {"updates": n, "errors": self.errors, "wall_s": round(wall_seconds, 2),
+                "throughput_rps": round(n / wall_seconds, 2) if wall_seconds else 0.0,
+                "latency": percentiles(self.latencies), "stages": stages}
+
+
+def replay(handler, clock: StageClock, events: Iterable[List[dict]], concurrency: int) -> Dict[str, Any]:
+    """Every element of events is one chat's update bodies, sent one after another."""
+    run = Run()
+
+    def one_chat(bodies: List[dict]) -> None:
+        for body in bodies:
+            started = time.perf_counter()
+            local = clock.reset()
+            stages, error = {}, None
+            frame = clock.enter("local")
+            try:
+                response = handler(event_for(body), None)
+                if (response or {}).get("statusCode") != 200:
+                    error = f"status {(response or {}).get('statusCode')}"
+            except Exception as e:
+                error = type(e).__name__
+            finally:
+                clock.exit(frame)
+                stages = dict(local)
+            run.add((time.perf_counter() - started) * 1000, stages, error)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_chat, events))
+    return run.summary(time.perf_counter() - started)
+
+
+def print_report(name: str, summary: Dict[str, Any]) -> None:
+    latency = summary["latency"]
+    print(f"\n{name}: {summary['updates']} updates in {summary['wall_s']}s, "
+          f"{summary['throughput_rps']} updates/s, errors {summary['errors'] or 0}")
+    print(f"  latency ms  p50 {latency['p50_ms']:8.1f}  p95 {latency['p95_ms']:8.1f}  "
+          f"p99 {latency['p99_ms']:8.1f}  mean {latency['mean_ms']:8.1f}")
+    print(f"  {'stage':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'share':>6}")
+    for stage, s in summary["stages"].items():
+        print(f"  {stage:<12} {s['p50_ms']:8.1f} {s['p95_ms']:8.1f} {s['p99_ms']:8.1f} {s['mean_ms']:8.1f} {s['share']:6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay Telegram updates against handler() with a local stand-in")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=10, help="updates per chat")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--updates", help="JSONL file of recorded webhook bodies")
+    parser.add_argument("--profile", help="stand-in profile JSON (see standin.DEFAULT_PROFILE)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--speed", type=float, default=1.0, help="divide every stand-in latency by this")
+    parser.add_argument("--suno", action="store_true", help="replay Suno callbacks of requested songs")
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    args = parser.parse_args()
+
+    if not os.getenv("database_url"):
+        parser.error("database_url must point to a test database with the bot schema")
+
+    standin = StandIn(load_profile(args.profile), args.seed, speed=args.speed).start()
+    os.environ.update(standin.env())
+    os.environ.setdefault("bot_token", "standin")
+    os.environ.setdefault("operouter_key", "standin")
+    os.environ.setdefault("openai_key", "standin")
+    os.environ.pop("proxy_url", None)
+
+    import index  # reads the environment above at import time
+
+    clock = StageClock()
+    instrument(index, clock)
+    updates = recorded_updates(args.updates) if args.updates else generated_updates(args.chats, args.messages)
+
+    report = {"updates": replay(index.handler, clock, updates.values(), args.concurrency)}
+    if args.suno:
+        callbacks = [[callback] for callback in standin.pop_callbacks()]
+        report["suno_callbacks"] = replay(index.handler, clock, callbacks, args.concurrency)
+    report["standin"] = standin.get_stats()
+    report["telegram_dispatcher"] = index.telegram_dispatcher.get_stats()
+    standin.stop()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    print_report("Telegram updates", report["updates"])
+    if "suno_callbacks" in report:
+        print_report("Suno callbacks", report["suno_callbacks"])
+    print(f"\n  {'stand-in route':<28} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for route, s in sorted(report["standin"].items()):
+        print(f"  {route:<28} {s['requests']:8d} {s['errors']:6d} {s['p50_ms']:8.1f} {s['p95_ms']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Logging pipeline for the webhook handler
+
+The handler logs through `logger` as before; this module decides what reaches
+the YcLoggingFormatter and on which thread:
+
+- log_level (default DEBUG) replaces the hard-coded level.
+- log_async=true (default): the request thread only puts the record on a
+  queue (QueueHandler); a QueueListener thread does the JSON formatting and
+  the write. flush() at the end of an update waits (bounded) for the queue.
+- log_sample_rates="payload=0.05,cache_debug=0.1": share of INFO/DEBUG
+  records kept per category. A record's category is extra={"category": ...}
+  or, for the mindset DatabaseManager, the "[CACHE_DEBUG]" prefix of its
+  message. WARNING and above are never sampled out.
+
+Expensive arguments are wrapped in lazy(): they are computed only for records
+that pass the level and the sampling.
+
+    logger.debug("DB pool stats: %s", lazy(db_pool.get_stats), extra={"category": "stats"})
+"""
+
+import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, Optional
+
+# Message prefixes of loggers that do not pass a category
+CATEGORY_PREFIXES = {"[CACHE_DEBUG]": "cache_debug"}
+
+
+class lazy:
+    """Log argument computed by fn(*args) only when the record is formatted."""
+
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn: Callable[..., Any], *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self) -> str:
+        return str(self.fn(*self.args))
+
+    __repr__ = __str__
+
+
+def record_category(record: logging.LogRecord) -> Optional[str]:
+    category = getattr(record, "category", None)
+    if category is None and isinstance(record.msg, str) and record.msg.startswith("["):
+        for prefix, name in CATEGORY_PREFIXES.items():
+            if record.msg.startswith(prefix):
+                return name
+    return category
+
+
+def parse_rates(spec: Optional[str]) -> Dict[str, float]:
+    """"payload=0.05, cache_debug=0.1" -> {"payload": 0.05, "cache_debug": 0.1}"""
+    rates = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a share of the INFO/DEBUG records of every category."""
+
+    def __init__(self, rates: Dict[str, float], seed: Optional[int] = None):
+        super().__init__()
+        self.rates = rates
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        category = record_category(record)
+        rate = self.rates.get(category)
+        if rate is None:
+            return True
+        keep = rate >= 1.0 or self._random.random() < rate
+        with self._lock:
+            counts = self.stats.setdefault(category, {"kept": 0, "dropped": 0})
+            counts["kept" if keep else "dropped"] += 1
+        return keep
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Counts records instead of blocking the request thread when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Level, sampling and (a)synchronous output of one logger."""
+
+    def __init__(self, logger: logging.Logger, handler: logging.Handler, level: int = logging.DEBUG,
+                 asynchronous: bool = True, rates: Optional[Dict[str, float]] = None,
+                 queue_size: int = 10_000, flush_timeout: float = 0.5, seed: Optional[int] = None):
+        """
+        Args:
+            logger: Logger to configure; its current handlers are replaced
+            handler: Handler that formats and writes records (the JSON console handler)
+            level: Logger level
+            asynchronous: Format and write on a QueueListener thread
+            rates: Category -> share of INFO/DEBUG records kept
+            queue_size: Records waiting for the listener; more are dropped and counted
+            flush_timeout: Longest wait of flush(), seconds
+            seed: Seed of the sampling (tests)
+        """
+        self.logger = logger
+        self.handler = handler
+        self.asynchronous = asynchronous
+        self.flush_timeout = flush_timeout
+        self.sampling = SamplingFilter(rates or {}, seed)
+        self.queue: Optional[queue.Queue] = None
+        self.listener: Optional[QueueListener] = None
+
+        logger.setLevel(level)
+        for old in list(logger.handlers):
+            logger.removeHandler(old)
+        if asynchronous:
+            self.queue = queue.Queue(queue_size)
+            front = _DroppingQueueHandler(self.queue)
+            self.listener = QueueListener(self.queue, handler, respect_handler_level=True)
+            self.listener.start()
+        else:
+            front = handler
+        front.addFilter(self.sampling)
+        self.front = front
+        logger.addHandler(front)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued records are written; False on timeout."""
+        if self.queue is None:
+            self.handler.flush()
+            return True
+        with self.queue.all_tasks_done:
+            done = self.queue.all_tasks_done.wait_for(
+                lambda: not self.queue.unfinished_tasks,
+                self.flush_timeout if timeout is None else timeout)
+        self.handler.flush()
+        return done
+
+    def stop(self) -> None:
+        """Write what is queued and stop the listener thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"async": self.asynchronous, "sampling": dict(self.sampling.stats)}
+        if self.queue is not None:
+            stats["queued"] = self.queue.qsize()
+            stats["dropped_full"] = self.front.dropped
+        return stats
+
+
+def pipeline_from_env(logger: logging.Logger, handler: logging.Handler) -> LogPipeline:
+    return LogPipeline(logger, handler,
+                       level=logging.getLevelName(os.getenv("log_level", "DEBUG").upper()),
+                       asynchronous=os.getenv("log_async", "true").lower() == "true",
+                       rates=parse_rates(os.getenv("log_sample_rates")),
+                       flush_timeout=float(os.getenv("log_flush_timeout", 0.5)))
@@ -0,0 +1,3 @@
+BEGIN;
+ALTER TABLE public.messages ADD COLUMN IF NOT EXISTS token_count integer;
+COMMIT;
@@ -0,0 +1,9 @@
+-- Covering index for "last N messages of a session" (ORDER BY created_at DESC LIMIT N).
+-- content is not in INCLUDE: btree entries are limited to ~2.7KB and long assistant
+-- answers would fail to insert; it is read from the heap for the N returned rows only.
+-- CONCURRENTLY cannot run inside a transaction block, so there is no BEGIN/COMMIT here.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_session_created_desc_idx
+    ON public.messages (session_id, created_at DESC) INCLUDE (role, token_count);
+
+-- Superseded by the index above
+DROP INDEX CONCURRENTLY IF EXISTS public.msg_session_created_idx;
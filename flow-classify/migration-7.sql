@@ -0,0 +1,36 @@
+-- Per-session message sequence numbers (1, 2, 3, ... in insert order) for the
+-- segmented history cache (cache/history_segments.py). Assigned by a trigger, so
+-- every writer (the handler, DatabaseManager, batched unit-of-work inserts) gets
+-- them without changes; a transaction-scoped advisory lock per session keeps
+-- concurrent inserts into one session from taking the same number.
+BEGIN;
+ALTER TABLE public.messages ADD COLUMN IF NOT EXISTS seq bigint;
+
+CREATE OR REPLACE FUNCTION public.messages_assign_seq() RETURNS trigger AS $$
+BEGIN
+    IF NEW.seq IS NULL THEN
+        PERFORM pg_advisory_xact_lock(hashtextextended(NEW.session_id::text, 0));
+        SELECT COALESCE(MAX(seq), 0) + 1 INTO NEW.seq
+        FROM public.messages WHERE session_id = NEW.session_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messages_assign_seq ON public.messages;
+CREATE TRIGGER messages_assign_seq BEFORE INSERT ON public.messages
+    FOR EACH ROW EXECUTE FUNCTION public.messages_assign_seq();
+
+-- Existing rows: the order fetch_history has always used
+UPDATE public.messages AS m SET seq = numbered.seq
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY created_at, id) AS seq
+    FROM public.messages
+) AS numbered
+WHERE m.id = numbered.id AND m.seq IS NULL;
+COMMIT;
+
+-- MAX(seq) and "seq BETWEEN a AND b" of one session are index range scans.
+-- CONCURRENTLY cannot run inside a transaction block.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS messages_session_seq_idx
+    ON public.messages (session_id, seq);
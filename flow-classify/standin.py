@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the services the function calls
+
+Emulates, on one local HTTP port:
+- OpenRouter chat completions: JSON answers for classifiers, plain or SSE
+  (stream=true) answers for the main conversation, optional moderate_user tool_calls
+- OpenAI embeddings and moderation
+- Telegram Bot API (sendMessage, editMessageText, sendAudio, ...; errors are 429s)
+- Suno generate: returns a taskId and queues the "complete" callback, which the
+  load generator fetches from /_standin/suno/callbacks; the audio is served too
+
+Every route draws its latency from a lognormal body plus a slow tail and fails
+with a configurable rate (PROFILE). Draws are seeded by the request body and
+how often that body was seen, so a replay gets the same latencies and answers
+whatever order concurrent requests arrive in.
+
+Usage:
+    python standin.py [--port 8700] [--profile profile.json] [--seed 1]
+
+and point the function at it (loadgen.py does this itself):
+    ai_endpoint=http://127.0.0.1:8700/api/v1/chat/completions
+    openai_api_base=http://127.0.0.1:8700/v1
+    telegram_api_base=http://127.0.0.1:8700
+    suno_api_url=http://127.0.0.1:8700/api/v1/generate
+    suno_callback_url=http://127.0.0.1:8700/_standin/suno/callback
+
+GET /_standin/stats returns per-route counts, errors and p50/p95/p99 of the
+emulated latency; POST /_standin/reset clears them.
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import math
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+# Per route: lognormal latency body (median_ms, sigma), slow tail (tail_p, tail_ms), error_rate.
+# chat_stream: median_ms is the time to the first token, then one token every token_ms.
+DEFAULT_PROFILE: Dict[str, Dict[str, Any]] = {
+    "chat": {"median_ms": 900, "sigma": 0.35, "tail_p": 0.03, "tail_ms": 4500, "error_rate": 0.0},
+    "chat_stream": {"median_ms": 500, "sigma": 0.3, "tail_p": 0.03, "tail_ms": 3000, "error_rate": 0.0,
+                    "token_ms": 25, "tokens": 60},
+    "embeddings": {"median_ms": 150, "sigma": 0.3, "tail_p": 0.01, "tail_ms": 1200, "error_rate": 0.0},
+    "moderation": {"median_ms": 200, "sigma": 0.3, "tail_p": 0.01, "tail_ms": 1500, "error_rate": 0.0},
+    "telegram": {"median_ms": 80, "sigma": 0.4, "tail_p": 0.01, "tail_ms": 800, "error_rate": 0.0},
+    "suno": {"median_ms": 600, "sigma": 0.3, "tail_p": 0.0, "tail_ms": 0, "error_rate": 0.0},
+    "suno_audio": {"median_ms": 100, "sigma": 0.3, "tail_p": 0.0, "tail_ms": 0, "error_rate": 0.0},
+    # Answers: share of intents that ask for a song, of main answers that call moderate_user,
+    # of moderation checks that flag, of emotion answers that are "Растерянность" > 90
+    "scenario": {"song_rate": 0.0, "tool_call_rate": 0.0, "flagged_rate": 0.0, "confused_rate": 0.0},
+}
+
+WORDS = ("песня", "слова", "чувство", "мелодия", "куплет", "припев", "вдохновение", "свет", "дорога",
+         "сердце", "голос", "ритм", "память", "тишина", "небо", "утро")
+
+# A few silent MPEG-1 Layer III frames (128 kbit/s, 44.1 kHz): enough for an ID3 retag
+SILENT_MP3 = (b"\xff\xfb\x90\x64" + bytes(413)) * 8
+
+
+def load_profile(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """DEFAULT_PROFILE with the routes/keys of a JSON file merged over it."""
+    profile = copy.deepcopy(DEFAULT_PROFILE)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for route, overrides in json.load(f).items():
+                profile.setdefault(route, {}).update(overrides)
+    return profile
+
+
+class StandIn:
+    """The stand-in server; start() runs it in a daemon thread."""
+
+    def __init__(self, profile: Optional[Dict[str, Dict[str, Any]]] = None, seed: int = 1,
+                 host: str = "127.0.0.1", port: int = 0, speed: float = 1.0):
+        """
+        Args:
+            profile: Route settings (DEFAULT_PROFILE by default)
+            seed: Seed of every latency/answer draw
+            host, port: Address to listen on (port 0 picks a free one)
+            speed: Divides every latency (10 = ten times faster than the profile)
+        """
+        self.profile = profile or load_profile()
+        self.seed = seed
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._seen: Dict[str, int] = {}
+        self._latencies: Dict[str, List[float]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._callbacks: deque = deque()
+        self._message_ids = 0
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point the function at this stand-in."""
+        return {
+            "ai_endpoint": f"{self.url}/api/v1/chat/completions",
+            "openai_api_base": f"{self.url}/v1",
+            "telegram_api_base": self.url,
+            "suno_api_url": f"{self.url}/api/v1/generate",
+            "suno_callback_url": f"{self.url}/_standin/suno/callback",
+        }
+
+    def start(self) -> "StandIn":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ──────────────────────────
+    #  DRAWS
+    # ──────────────────────────
+
+    def rng(self, route: str, body: bytes) -> random.Random:
+        """Random source of one request: seed + route + body + how often this body came before."""
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        with self._lock:
+            n = self._seen[f"{route}:{digest}"] = self._seen.get(f"{route}:{digest}", 0) + 1
+        return random.Random(f"{self.seed}:{route}:{digest}:{n}")
+
+    def latency(self, route: str, rng: random.Random) -> float:
+        """Emulated latency in seconds (already divided by speed)."""
+        p = self.profile[route]
+        if rng.random() < p.get("tail_p", 0):
+            ms = p.get("tail_ms", 0)
+        else:
+            ms = p.get("median_ms", 0) * math.exp(rng.gauss(0, p.get("sigma", 0)))
+        return ms / 1000 / self.speed
+
+    def fails(self, route: str, rng: random.Random) -> bool:
+        return rng.random() < self.profile[route].get("error_rate", 0)
+
+    def chance(self, name: str, rng: random.Random) -> bool:
+        return rng.random() < self.profile["scenario"].get(name, 0)
+
+    def record(self, route: str, seconds: float, error: bool) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(route, {"requests": 0, "errors": 0})
+            counters["requests"] += 1
+            counters["errors"] += error
+            self._latencies.setdefault(route, []).append(seconds * 1000 * self.speed)
+
+    def next_message_id(self) -> int:
+        with self._lock:
+            self._message_ids += 1
+            return self._message_ids
+
+    # ──────────────────────────
+    #  STATS / SUNO CALLBACKS
+    # ──────────────────────────
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per route: requests, errors and percentiles of the emulated (profile-scale) latency."""
+        with self._lock:
+            stats = {route: dict(counters) for route, counters in self._counters.items()}
+            latencies = {route: list(values) for route, values in self._latencies.items()}
+        for route, values in latencies.items():
+            stats[route].update(percentiles(values))
+        return stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._latencies.clear()
+            self._seen.clear()
+            self._callbacks.clear()
+
+    def add_callback(self, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            self._callbacks.append(payload)
+
+    def pop_callbacks(self) -> List[Dict[str, Any]]:
+        """Suno "complete" callbacks of the generations requested so far."""
+        with self._lock:
+            callbacks, self._callbacks = list(self._callbacks), deque()
+        return callbacks
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and mean of a list of milliseconds (0.0 for an empty list)."""
+    if not values:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    if len(values) == 1:
+        q = values * 99
+    else:
+        q = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50_ms": round(q[49], 1), "p95_ms": round(q[94], 1), "p99_ms": round(q[98], 1),
+            "mean_ms": round(statistics.fmean(values), 1)}
+
+
+def _sentence(rng: random.Random, tokens: int) -> List[str]:
+    words = [rng.choice(WORDS) for _ in range(tokens)]
+    for i in range(7, len(words), 8):
+        words[i] += "."
+    words[0] = words[0].capitalize()
+    return [word + " " for word in words[:-1]] + [words[-1].rstrip(".") + "."]
+
+
+def _classifier_answer(standin: StandIn, rng: random.Random) -> Dict[str, Any]:
+    """One JSON that satisfies every classifier prompt (intent, emotion, Suno preparation)."""
+    confused = standin.chance("confused_rate", rng)
+    return {
+        "class": "finalize_song" if standin.chance("song_rate", rng) else "chat",
+        "confidence": rng.randint(60, 99),
+        "emotions": [{"name": "Растерянность" if confused else "Радость", "intensity": 95 if confused else 40}],
+        "lyrics": "[Verse 1]\n" + "".join(_sentence(rng, 16)),
+        "style": "indie folk",
+        "name": "Песня " + rng.choice(WORDS),
+    }
+
+
+def _tool_call() -> Dict[str, Any]:
+    return {"index": 0, "id": "call_standin", "type": "function",
+            "function": {"name": "moderate_user",
+                         "arguments": json.dumps({"chat_id": 0, "user_id": 0, "additional_reason": "stand-in"})}}
+
+
+def _make_handler(standin: StandIn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status: int, payload: Any) -> None:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/_standin/stats":
+                return self._json(200, standin.get_stats())
+            if path == "/_standin/suno/callbacks":
+                return self._json(200, standin.pop_callbacks())
+            if path.startswith("/suno/audio/"):
+                rng = standin.rng("suno_audio", path.encode())
+                started = time.monotonic()
+                time.sleep(standin.latency("suno_audio", rng))
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(SILENT_MP3)))
+                self.end_headers()
+                self.wfile.write(SILENT_MP3)
+                return standin.record("suno_audio", time.monotonic() - started, False)
+            self._json(404, {"error": f"unknown path {path}"})
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            raw = self._body()
+            if path == "/_standin/reset":
+                standin.reset()
+                return self._json(200, {"ok": True})
+            if path == "/_standin/suno/callback":
+                return self._json(200, {"ok": True})
+            if path.endswith("/chat/completions"):
+                return self._chat(raw)
+            if path.endswith("/embeddings"):
+                return self._embeddings(raw)
+            if path.endswith("/moderations"):
+                return self._moderation(raw)
+            if path.startswith("/bot"):
+                return self._telegram(path.rsplit("/", 1)[-1], raw)
+            if path.endswith("/generate"):
+                return self._suno(raw)
+            self._json(404, {"error": f"unknown path {path}"})
+
+        # ──────────────────────────
+        #  ROUTES
+        # ──────────────────────────
+
+        def _chat(self, raw: bytes) -> None:
+            body = json.loads(raw or b"{}")
+            route = "chat_stream" if body.get("stream") else "chat"
+            rng = standin.rng(route, raw)
+            started = time.monotonic()
+            time.sleep(standin.latency(route, rng))
+            if standin.fails(route, rng):
+                standin.record(route, time.monotonic() - started, True)
+                return self._json(502, {"error": {"code": 502, "message": "stand-in upstream error"}})
+
+            model = body.get("model", "stand-in")
+            tool_call = bool(body.get("tools")) and standin.chance("tool_call_rate", rng)
+            if body.get("tools"):
+                tokens = _sentence(rng, standin.profile["chat_stream"].get("tokens", 60))
+            else:
+                tokens = [json.dumps(_classifier_answer(standin, rng), ensure_ascii=False)]
+
+            if route == "chat_stream":
+                self._stream(model, tokens, tool_call)
+            else:
+                message = {"role": "assistant", "content": "" if tool_call else "".join(tokens)}
+                if tool_call:
+                    message["tool_calls"] = [_tool_call()]
+                self._json(200, {"id": "gen-standin", "model": model, "object": "chat.completion",
+                                 "choices": [{"index": 0, "message": message,
+                                              "finish_reason": "tool_calls" if tool_call else "stop"}],
+                                 "usage": {"prompt_tokens": len(raw) // 4, "completion_tokens": len(tokens)}})
+            standin.record(route, time.monotonic() - started, False)
+
+        def _stream(self, model: str, tokens: List[str], tool_call: bool) -> None:
+            """SSE like OpenRouter: keep-alive comment, content deltas, tool_call fragments, [DONE]."""
+            token_seconds = standin.profile["chat_stream"].get("token_ms", 25) / 1000 / standin.speed
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def event(delta: Dict[str, Any], finish: Optional[str] = None) -> None:
+                chunk = {"id": "gen-standin", "model": model, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+                self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+
+            self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+            if tool_call:
+                call = _tool_call()
+                arguments = call["function"]["arguments"]
+                event({"role": "assistant", "tool_calls": [{**call, "function": {"name": "moderate_user", "arguments": ""}}]})
+                for i in range(0, len(arguments), 16):
+                    event({"tool_calls": [{"index": 0, "function": {"arguments": arguments[i:i + 16]}}]})
+                event({}, "tool_calls")
+            else:
+                for token in tokens:
+                    event({"role": "assistant", "content": token})
+                    time.sleep(token_seconds)
+                event({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _embeddings(self, raw: bytes) -> None:
+            body = json.loads(raw or b"{}")
+            rng = standin.rng("embeddings", raw)
+            started = time.monotonic()
+            time.sleep(standin.latency("embeddings", rng))
+            if standin.fails("embeddings", rng):
+                standin.record("embeddings", time.monotonic() - started, True)
+                return self._json(500, {"error": {"message": "stand-in upstream error"}})
+            inputs = body.get("input") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            dims = int(body.get("dimensions") or 1536)
+            data = []
+            for i, text in enumerate(inputs):
+                # Same text, same vector: derived from the text only
+                text_rng = random.Random(hashlib.blake2b(str(text).encode("utf-8"), digest_size=8).digest())
+                data.append({"object": "embedding", "index": i,
+                             "embedding": [round(text_rng.uniform(-1, 1), 6) for _ in range(dims)]})
+            self._json(200, {"object": "list", "data": data, "model": body.get("model", "text-embedding-3-small")})
+            standin.record("embeddings", time.monotonic() - started, False)
+
+        def _moderation(self, raw: bytes) -> None:
+            rng = standin.rng("moderation", raw)
+            started = time.monotonic()
+            time.sleep(standin.latency("moderation", rng))
+            if standin.fails("moderation", rng):
+                standin.record("moderation", time.monotonic() - started, True)
+                return self._json(500, {"error": {"message": "stand-in upstream error"}})
+            self._json(200, {"id": "modr-standin", "model": "omni-moderation-latest",
+                             "results": [{"flagged": standin.chance("flagged_rate", rng), "categories": {}}]})
+            standin.record("moderation", time.monotonic() - started, False)
+
+        def _telegram(self, method: str, raw: bytes) -> None:
+            body = json.loads(raw or b"{}")
+            rng = standin.rng("telegram", raw)
+            started = time.monotonic()
+            time.sleep(standin.latency("telegram", rng))
+            route = f"telegram.{method}"
+            if standin.fails("telegram", rng):
+                standin.record(route, time.monotonic() - started, True)
+                return self._json(429, {"ok": False, "error_code": 429,
+                                        "description": "Too Many Requests: retry after 1",
+                                        "parameters": {"retry_after": 1}})
+            result: Any = True
+            if method in ("sendMessage", "sendAudio", "editMessageText"):
+                result = {"message_id": body.get("message_id") or standin.next_message_id(),
+                          "chat": {"id": body.get("chat_id")}, "date": int(time.time()),
+                          "text": body.get("text", "")}
+            self._json(200, {"ok": True, "result": result})
+            standin.record(route, time.monotonic() - started, False)
+
+        def _suno(self, raw: bytes) -> None:
+            body = json.loads(raw or b"{}")
+            rng = standin.rng("suno", raw)
+            started = time.monotonic()
+            time.sleep(standin.latency("suno", rng))
+            if standin.fails("suno", rng):
+                standin.record("suno", time.monotonic() - started, True)
+                return self._json(500, {"code": 500, "msg": "stand-in upstream error"})
+            task_id = hashlib.blake2b(raw + str(rng.random()).encode(), digest_size=8).hexdigest()
+            standin.add_callback({"code": 200, "msg": "All generated successfully.", "data": {
+                    "callbackType": "complete", "task_id": task_id,
+                    "data": [{"id": task_id, "audio_url": f"{standin.url}/suno/audio/{task_id}.mp3",
+                              "title": body.get("title", ""), "tags": body.get("style", ""),
+                              "prompt": body.get("prompt", ""), "duration": 1.0}],
+            }})
+            self._json(200, {"code": 200, "msg": "success", "data": {"taskId": task_id}})
+            standin.record("suno", time.monotonic() - started, False)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--profile", help="JSON file merged over DEFAULT_PROFILE")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--speed", type=float, default=1.0, help="divide every latency by this")
+    args = parser.parse_args()
+
+    standin = StandIn(load_profile(args.profile), args.seed, args.host, args.port, args.speed)
+    print(f"Stand-in listening on {standin.url}")
+    for name, value in standin.env().items():
+        print(f"  {name}={value}")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
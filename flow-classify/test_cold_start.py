@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget: importing index must stay cheap.
+
+`python -X importtime -c "import index"` runs in a fresh interpreter. The test
+fails when a module that is only needed on rare paths (S3, ID3 tags, token
+counting, base64 bodies) is imported eagerly again, or when the whole import
+costs more than COLD_START_BUDGET_RATIO times `import requests` measured in the
+same way on the same machine (an absolute budget fails at random on busy runners).
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+COLD_START_BUDGET_RATIO = float(os.getenv("COLD_START_BUDGET_RATIO", 2.5))
+BASELINE_MODULE = "requests"  # part of index itself, so the ratio tracks what index adds
+LAZY_MODULES = ("boto3", "botocore", "mutagen", "tiktoken", "pydantic")
+ENV = {"bot_token": "cold-start", "operouter_key": "cold-start", "database_url": "postgresql://localhost/none"}
+
+
+def import_times(runs: int = 3, module: str = "index") -> dict:
+    """Cumulative import time (us) per top-level module when importing `module`, best of `runs`."""
+    best = {}
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=HERE, env=dict(os.environ, **ENV), capture_output=True, text=True, check=True)
+        for line in out.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            name, cumulative = name.strip(), int(cumulative)
+            best[name] = min(best.get(name, cumulative), cumulative)
+    return best
+
+
+def test_rare_dependencies_are_not_imported():
+    times = import_times(runs=1)
+    eager = [name for name in times if name.split(".")[0] in LAZY_MODULES]
+    assert not eager, f"imported at cold start: {eager}"
+
+
+def test_import_time_budget():
+    # Alternate the two imports so a slow spell of the runner hits both
+    best_index, best_baseline, times = None, None, {}
+    for _ in range(3):
+        times = import_times(runs=1)
+        baseline = import_times(runs=1, module=BASELINE_MODULE)[BASELINE_MODULE]
+        best_index = min(best_index or times["index"], times["index"])
+        best_baseline = min(best_baseline or baseline, baseline)
+    ratio = best_index / best_baseline
+    heaviest = sorted(((t, n) for n, t in times.items() if "." not in n and n != "index"), reverse=True)[:5]
+    assert ratio <= COLD_START_BUDGET_RATIO, (
+        f"import index took {best_index / 1000:.0f}ms, {ratio:.1f}x import {BASELINE_MODULE} "
+        f"({best_baseline / 1000:.0f}ms, budget {COLD_START_BUDGET_RATIO}x), "
+        f"heaviest: {[(n, round(t / 1000)) for t, n in heaviest]}")
+
+
+def load_with_bundle(bundle) -> dict:
+    """Prompts loaded by index from bundle, and whether they equal the prompt files."""
+    code = ("import json, index; print(json.dumps(index.load_prompts(index.PROMPT_BUNDLE) == "
+            "index.load_prompts('/nonexistent')))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True,
+                         env=dict(os.environ, prompt_bundle=str(bundle), **ENV))
+    return json.loads(out.stdout.strip().splitlines()[-1]), out.stderr
+
+
+def test_prompt_bundle_matches_files(tmp_path):
+    import build_prompts
+
+    bundle = tmp_path / "prompts.bundle.json"
+    built = build_prompts.build(str(bundle))
+    same, stderr = load_with_bundle(bundle)
+    assert same is True and "stale" not in stderr
+    assert set(built) == set(build_prompts.prompt_files())
+
+
+def test_bundle_older_than_a_prompt_file_is_ignored(tmp_path):
+    import build_prompts
+
+    bundle = tmp_path / "prompts.bundle.json"
+    build_prompts.build(str(bundle))
+    data = json.loads(bundle.read_text(encoding="utf-8"))
+    path = build_prompts.prompt_files()["system_prompt"]
+
+    # Same content with another mtime (e.g. unpacked from a zip): the hash decides, bundle is used
+    data["_sources"][path]["mtime"] -= 3600
+    bundle.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    assert "stale" not in load_with_bundle(bundle)[1]
+
+    # system_prompt.txt edited after the build: the old text must not be served
+    data["system_prompt"] = "old prompt text"
+    data["_sources"][path]["sha256"] = "0" * 64
+    bundle.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    same, stderr = load_with_bundle(bundle)
+    assert same is True and "stale" in stderr
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Logging pipeline: sampling per category, lazy arguments, formatting on the listener thread.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from log_pipeline import LogPipeline, lazy, parse_rates
+
+
+class Collect(logging.Handler):
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.lines = []
+        self.threads = set()
+
+    def emit(self, record):
+        time.sleep(self.delay)
+        self.lines.append(self.format(record))
+        self.threads.add(threading.get_ident())
+
+
+def make_pipeline(**kwargs):
+    logger = logging.getLogger(f"test-log-pipeline-{time.monotonic()}")
+    logger.propagate = False
+    handler = Collect(kwargs.pop("delay", 0.0))
+    return logger, handler, LogPipeline(logger, handler, seed=1, **kwargs)
+
+
+def test_sampling_by_category_and_prefix():
+    assert parse_rates(" payload=0.1, cache_debug=0 ,junk") == {"payload": 0.1, "cache_debug": 0.0}
+    logger, handler, pipeline = make_pipeline(asynchronous=False, rates={"payload": 0.2, "cache_debug": 0.0})
+    for _ in range(500):
+        logger.debug("Incoming body: %s", {}, extra={"category": "payload"})
+        logger.info("[CACHE_DEBUG] hit")
+    logger.warning("[CACHE_DEBUG] stale entry")
+    logger.debug("untagged")
+
+    stats = pipeline.get_stats()["sampling"]
+    assert 60 < stats["payload"]["kept"] < 140
+    assert stats["cache_debug"] == {"kept": 0, "dropped": 500}
+    assert handler.lines.count("[CACHE_DEBUG] stale entry") == 1 and "untagged" in handler.lines
+
+
+def test_lazy_arguments_are_built_only_for_written_records():
+    calls = []
+
+    def stats():
+        calls.append(1)
+        return {"idle": 2}
+
+    logger, handler, pipeline = make_pipeline(asynchronous=False, level=logging.INFO, rates={"stats": 0.0})
+    logger.debug("DB pool stats: %s", lazy(stats))
+    logger.info("DB pool stats: %s", lazy(stats), extra={"category": "stats"})
+    assert calls == []
+    logger.info("DB pool stats: %s", lazy(stats))
+    assert calls == [1] and handler.lines == ["DB pool stats: {'idle': 2}"]
+
+
+def test_async_formats_on_the_listener_and_flush_waits():
+    logger, handler, pipeline = make_pipeline(delay=0.002)
+    started = time.perf_counter()
+    for i in range(20):
+        logger.debug("update %d", i)
+    assert time.perf_counter() - started < 0.02  # the request thread did not wait for the handler
+    assert pipeline.flush(timeout=5)
+    assert handler.lines == [f"update {i}" for i in range(20)]
+    assert threading.get_ident() not in handler.threads
+    pipeline.stop()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Modules shipped next to index.py are copies of the shared implementations.
+
+The function is deployed from this directory alone, so index.py imports its
+own copy; this test fails as soon as a copy and its source drift apart.
+"""
+
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Module next to index.py -> source it is copied from
+SHARED_MODULES = {
+    "db_pool.py": "cache/db+cache/db_pool.py",
+    "fanout.py": "cache/fanout.py",
+    "proxy_health.py": "cache/proxy_health.py",
+    "telegram_dispatcher.py": "backup/sign-embded/mindset/telegram_dispatcher.py",
+    "token_window.py": "cache/token_window.py",
+    "unit_of_work.py": "cache/db+cache/unit_of_work.py",
+}
+
+
+def test_shipped_copies_match_their_source():
+    drifted = []
+    for name, source in SHARED_MODULES.items():
+        with open(os.path.join(HERE, name), "rb") as copy, open(os.path.join(ROOT, source), "rb") as original:
+            if copy.read() != original.read():
+                drifted.append(f"{name} != {source}")
+    assert not drifted, f"copy the source over the shipped module: {drifted}"
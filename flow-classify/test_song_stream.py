@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Streaming song ingestion: retag_stream through IterStream gives the same song as the
+old path (download to a file, MP3(path, ID3=EasyID3), set tags, save).
+
+A few silent MPEG frames are generated on the fly, so no fixture file or network is required.
+"""
+
+import io
+import os
+import sys
+
+from mutagen.easyid3 import EasyID3
+from mutagen.mp3 import MP3
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+for name, value in {"bot_token": "song-test", "operouter_key": "song-test",
+                    "database_url": "postgresql://localhost/none"}.items():
+    os.environ.setdefault(name, value)
+
+from index import AI_COMPOSER, IterStream, retag_stream
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, no padding: 417 bytes per frame
+FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+TAGS = {"title": "Song", "artist": "User", "composer": AI_COMPOSER}
+
+
+def make_mp3(path, with_tag: bool):
+    with open(path, "wb") as f:
+        f.write(FRAME * 20)
+    if with_tag:
+        tag = EasyID3()
+        tag["album"] = "Suno"
+        tag["title"] = "untitled"
+        tag.save(path)
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def old_path(path):
+    audio = MP3(path, ID3=EasyID3)
+    for key, value in TAGS.items():
+        audio[key] = value
+    audio.save()
+
+
+def check_same_song(tmp_path, with_tag: bool, chunk_size: int):
+    source = tmp_path / "source.mp3"
+    make_mp3(source, with_tag)
+    data = source.read_bytes()
+
+    body = IterStream(retag_stream(split(data, chunk_size), TAGS))
+    streamed = tmp_path / "streamed.mp3"
+    streamed.write_bytes(io.BufferedReader(body, 64).read())
+    assert body.bytes_read == streamed.stat().st_size
+
+    old_path(source)
+    old, new = MP3(source, ID3=EasyID3), MP3(streamed, ID3=EasyID3)
+    assert dict(new.tags) == dict(old.tags)
+    assert new.tags["title"] == ["Song"] and ("album" in new.tags) == with_tag
+    assert new.info.length == old.info.length
+    # The audio frames pass through untouched
+    assert streamed.read_bytes().endswith(FRAME * 20) and source.read_bytes().endswith(FRAME * 20)
+
+
+def test_existing_tag_is_rewritten_like_the_old_path(tmp_path):
+    # Chunks smaller than the ID3 header and not aligned with the tag end
+    check_same_song(tmp_path, with_tag=True, chunk_size=7)
+
+
+def test_untagged_song_gets_a_tag(tmp_path):
+    check_same_song(tmp_path, with_tag=False, chunk_size=1000)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+The local stand-in answers like the real services and replays deterministically.
+"""
+
+import json
+import os
+import sys
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from standin import StandIn, load_profile
+
+TOOLS = [{"type": "function", "function": {"name": "moderate_user"}}]
+
+
+def fast_standin(**scenario):
+    profile = load_profile()
+    profile["scenario"].update(scenario)
+    return StandIn(profile, seed=3, speed=1000).start()
+
+
+def test_classifier_answer_is_json_and_replays_identically():
+    standin = fast_standin(song_rate=0.5)
+    url = standin.env()["ai_endpoint"]
+    body = {"model": "openai/gpt-4o", "messages": [{"role": "user", "content": "Сделай песню"}]}
+    first = [requests.post(url, json=body).json() for _ in range(5)]
+    answers = [json.loads(r["choices"][0]["message"]["content"]) for r in first]
+    assert {"class", "confidence", "emotions", "lyrics", "style", "name"} <= set(answers[0])
+
+    # A fresh stand-in with the same seed gives the same answers in the same order
+    standin.stop()
+    again = fast_standin(song_rate=0.5)
+    assert [requests.post(again.env()["ai_endpoint"], json=body).json() for _ in range(5)] == first
+    assert again.get_stats()["chat"]["requests"] == 5
+    again.stop()
+
+
+def test_stream_emits_sse_content_and_tool_calls():
+    standin = fast_standin(tool_call_rate=1.0)
+    url = standin.env()["ai_endpoint"]
+    body = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "tools": TOOLS, "stream": True}
+    with requests.post(url, json=body, stream=True) as resp:
+        lines = [line for line in resp.iter_lines() if line]
+    assert lines[0].startswith(b":") and lines[-1] == b"data: [DONE]"
+    events = [json.loads(line[5:]) for line in lines[1:-1]]
+    arguments = "".join((e["choices"][0]["delta"].get("tool_calls") or [{}])[0].get("function", {}).get("arguments") or ""
+                        for e in events)
+    assert json.loads(arguments)["additional_reason"] == "stand-in"
+    standin.stop()
+
+
+def test_telegram_rate_limit_and_suno_callback():
+    profile = load_profile()
+    profile["telegram"]["error_rate"] = 1.0
+    standin = StandIn(profile, speed=1000).start()
+    resp = requests.post(f"{standin.url}/botTOKEN/sendMessage", json={"chat_id": 1, "text": "x"})
+    assert resp.status_code == 429 and resp.json()["parameters"]["retry_after"] == 1
+
+    task = requests.post(standin.env()["suno_api_url"], json={"title": "Песня", "prompt": "la"}).json()
+    callbacks = requests.get(f"{standin.url}/_standin/suno/callbacks").json()
+    assert callbacks[0]["data"]["task_id"] == task["data"]["taskId"]
+    audio = requests.get(callbacks[0]["data"]["data"][0]["audio_url"])
+    assert audio.headers["Content-Type"] == "audio/mpeg" and audio.content[:2] == b"\xff\xfb"
+    assert standin.pop_callbacks() == []
+    standin.stop()
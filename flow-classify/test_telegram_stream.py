@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Streamed replies: split point, edit throttle and the 4096-char rollover of TelegramStream.
+
+Telegram calls are recorded by fakes, so no network is required.
+"""
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+for name, value in {"bot_token": "stream-test", "operouter_key": "stream-test",
+                    "database_url": "postgresql://localhost/none"}.items():
+    os.environ.setdefault(name, value)
+
+import index
+from index import TelegramStream, tg_escape
+
+
+class FakeChat:
+    def __init__(self):
+        self.calls = []
+        self.messages = {}
+
+    def send(self, chat_id, text):
+        message_id = len(self.messages) + 1
+        self.calls.append(("send", message_id, text))
+        self.messages[message_id] = text
+        return message_id
+
+    def edit(self, chat_id, message_id, text):
+        self.calls.append(("edit", message_id, text))
+        self.messages[message_id] = text
+
+
+def make_stream(chat, **kwargs):
+    kwargs.setdefault("edit_interval", 0)
+    return TelegramStream(1, send=chat.send, edit=chat.edit, **kwargs)
+
+
+def test_first_message_waits_for_a_sentence_end():
+    chat = FakeChat()
+    stream = make_stream(chat, first_chars=100)
+    stream.feed("Hello")
+    stream.feed(" there")
+    assert chat.calls == []
+    stream.feed(". How")
+    assert chat.calls == [("send", 1, tg_escape("Hello there. How"))]
+
+
+def test_edits_are_throttled(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(index.time, "monotonic", lambda: clock[0])
+    chat = FakeChat()
+    stream = make_stream(chat, edit_interval=1.0)
+    stream.feed("One. ")
+    for word in ("two ", "three ", "four ", "five "):
+        clock[0] += 0.3
+        stream.feed(word)
+    # Nothing is edited until 1s after the send, then the whole text goes at once
+    assert chat.calls[1:] == [("edit", 1, tg_escape("One. two three four five "))]
+    stream.feed("six")
+    assert len(chat.calls) == 2
+    assert stream.close() == "One. two three four five six"
+    assert chat.calls[-1] == ("edit", 1, tg_escape("One. two three four five six"))
+
+
+def test_rollover_splits_on_a_line_and_every_sent_text_fits():
+    chat = FakeChat()
+    stream = make_stream(chat)
+    line = "a.b " * 30 + "\n"  # 121 raw chars, 181 escaped
+    reply = ""
+    for _ in range(40):
+        stream.feed(line)
+        reply += line
+    assert stream.close() == reply
+
+    assert all(len(text) <= TelegramStream.limit for _, _, text in chat.calls)
+    assert len(chat.messages) == 2
+    first, second = chat.messages[1], chat.messages[2]
+    assert first.endswith("\n") and first + second == tg_escape(reply)
+
+
+def test_split_point_never_cuts_an_escape_pair():
+    chat = FakeChat()
+    stream = make_stream(chat)
+    stream.feed("." * 3000)  # every char doubles when escaped, and there is no space to split on
+    stream.close()
+
+    assert [len(text) for text in chat.messages.values()] == [4096, 6000 - 4096]
+    assert all(not text.endswith("\\") or text.endswith("\\\\") for text in chat.messages.values())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Per-update spans: one summary per trace, nesting across threads, no-ops when disabled.
+"""
+
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from tracing import NOOP_SPAN, Tracer, propagate
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_tracer(**kwargs):
+    logger = logging.getLogger(f"test-tracing-{id(kwargs)}-{time.monotonic()}")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = Collect()
+    logger.addHandler(handler)
+    return Tracer(logger, **kwargs), handler.records
+
+
+def test_summary_has_stages_nesting_and_errors():
+    tracer, records = make_tracer()
+
+    @tracer.traced("llm.conversation")
+    def classify():
+        time.sleep(0.01)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with tracer.trace("update", request_id="r1"):
+            with tracer.span("llm.fan_out") as span:
+                span.set(calls=2)
+                for future in [pool.submit(propagate(classify)) for _ in range(2)]:
+                    future.result()
+            try:
+                with tracer.span("telegram.send"):
+                    raise ValueError("boom")
+            except ValueError:
+                pass
+            classify()  # outside the fan-out
+
+    assert len(records) == 1
+    summary = records[0].trace
+    assert summary["request_id"] == "r1" and summary["status"] == "ok"
+    assert summary["stages"]["llm.conversation"] >= 30
+    spans = summary["spans"]
+    assert [s.get("parent") for s in spans if s["name"] == "llm.conversation"] == ["llm.fan_out", "llm.fan_out", None]
+    assert next(s for s in spans if s["name"] == "llm.fan_out")["attrs"] == {"calls": 2}
+    assert next(s for s in spans if s["name"] == "telegram.send")["error"] == "ValueError"
+
+
+def test_spans_outside_a_trace_and_disabled_tracer_are_noops():
+    tracer, records = make_tracer()
+    assert tracer.span("db.turn_context") is NOOP_SPAN
+
+    disabled, disabled_records = make_tracer(enabled=False)
+
+    def fn():
+        return 1
+
+    assert disabled.traced("x")(fn) is fn
+    with disabled.trace("update"):
+        assert disabled.span("x") is NOOP_SPAN
+    assert records == [] and disabled_records == []
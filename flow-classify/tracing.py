@@ -0,0 +1,227 @@
+"""
+Spans and timers for the webhook handler
+
+Every update runs inside tracer.trace(); the handler's stages open spans
+(`with tracer.span("db.turn_context"):` or `@tracer.traced("moderation")`).
+When the update ends one JSON line is logged with its duration, per-stage
+totals and the span list, through the function's logger, so it passes the
+usual YcLoggingFormatter:
+
+    {"message": "update trace", "trace": {"name": "update", "duration_ms": 2140.3,
+     "stages": {"llm.stream": 1650.2, ...}, "spans": [...]}, "level": "INFO", ...}
+
+With tracing off (tracing_enabled=false) @traced returns the function itself
+and span() returns a shared no-op object, so nothing is measured or allocated.
+Spans opened outside a trace (warm-up, background threads) are no-ops as well.
+
+otel_enabled=true also mirrors every span into OpenTelemetry; exporting is up
+to the OpenTelemetry SDK configured in the environment (OTEL_* variables).
+opentelemetry is imported only then.
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+MAX_SPANS = 200  # per update; the stage totals stay exact beyond it
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """Spans of one update."""
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.stages: Dict[str, float] = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def add(self, name: str, started: float, duration_ms: float, parent: Optional[str],
+            attrs: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped += 1
+                return
+            span = {"name": name, "start_ms": round((started - self.started) * 1000, 1),
+                    "duration_ms": round(duration_ms, 1)}
+            if parent:
+                span["parent"] = parent
+            if attrs:
+                span["attrs"] = attrs
+            if error:
+                span["error"] = error
+            self.spans.append(span)
+
+    def summary(self, status: str) -> Dict[str, Any]:
+        with self.lock:
+            summary = {
+                "name": self.name,
+                "trace_id": self.trace_id,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                "stages": {name: round(ms, 1) for name, ms in sorted(self.stages.items(), key=lambda i: -i[1])},
+                "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+                **self.attrs,
+            }
+            if self.dropped:
+                summary["dropped_spans"] = self.dropped
+        return summary
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    """One timed stage; use as a context manager."""
+
+    __slots__ = ("trace", "name", "attrs", "started", "token", "otel_tracer", "otel_scope")
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict[str, Any], otel_tracer=None):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs or None
+        self.otel_tracer = otel_tracer
+        self.otel_scope = None
+
+    def set(self, **attrs) -> None:
+        """Attach attributes (sizes, model, status) to the span."""
+        self.attrs = {**(self.attrs or {}), **attrs}
+
+    def __enter__(self):
+        self.token = _current_span.set(self.name)
+        if self.otel_tracer is not None:
+            self.otel_scope = self.otel_tracer.start_as_current_span(self.name, attributes=self.attrs)
+            self.otel_scope.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        _current_span.reset(self.token)
+        parent = _current_span.get()
+        self.trace.add(self.name, self.started, duration_ms, parent, self.attrs,
+                       exc_type.__name__ if exc_type else None)
+        if self.otel_scope is not None:
+            if self.attrs:
+                from opentelemetry import trace as otel_trace
+                otel_trace.get_current_span().set_attributes(self.attrs)
+            self.otel_scope.__exit__(exc_type, exc, tb)
+        return False
+
+
+class _TraceScope:
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace = Trace(name, attrs)
+        self.otel_scope = None
+
+    def __enter__(self) -> Trace:
+        self.token = _current_trace.set(self.trace)
+        if self.tracer._otel is not None:
+            # Root of the update in OpenTelemetry, the stage spans become its children
+            self.otel_scope = self.tracer._otel.start_as_current_span(self.trace.name, attributes=self.trace.attrs)
+            self.otel_scope.__enter__()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self.token)
+        if self.otel_scope is not None:
+            self.otel_scope.__exit__(exc_type, exc, tb)
+        summary = self.trace.summary("error" if exc_type else "ok")
+        if exc_type:
+            summary["error"] = exc_type.__name__
+        self.tracer.emit(summary)
+        return False
+
+
+class Tracer:
+    """Creates per-update traces and their spans."""
+
+    def __init__(self, logger: logging.Logger, enabled: bool = True, otel: bool = False,
+                 level: int = logging.INFO):
+        """
+        Args:
+            logger: Logger that receives the summary line of every update
+            enabled: False turns every span and decorator into a no-op
+            otel: Mirror spans into OpenTelemetry (needs opentelemetry-api)
+            level: Level of the summary line
+        """
+        self.logger = logger
+        self.enabled = enabled
+        self.level = level
+        self._otel = None
+        if enabled and otel:
+            try:
+                from opentelemetry import trace as otel_trace
+                self._otel = otel_trace.get_tracer("flow-classify")
+            except ImportError:
+                logger.warning("otel_enabled is set but opentelemetry is not installed, spans stay local")
+
+    def trace(self, name: str, **attrs):
+        """Context manager around one update; logs its summary line on exit."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return _TraceScope(self, name, attrs)
+
+    def span(self, name: str, **attrs):
+        """Context manager timing one stage of the current update."""
+        if not self.enabled:
+            return NOOP_SPAN
+        trace = _current_trace.get()
+        if trace is None:
+            return NOOP_SPAN
+        return Span(trace, name, attrs, self._otel)
+
+    def traced(self, name: Optional[str] = None) -> Callable[[Callable], Callable]:
+        """Decorator: every call of the function is a span (named after the function by default)."""
+        def decorator(fn: Callable) -> Callable:
+            if not self.enabled:
+                return fn
+            span_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def emit(self, summary: Dict[str, Any]) -> None:
+        self.logger.log(self.level, "%s trace", summary["name"], extra={"trace": summary})
+
+
+def propagate(fn: Callable) -> Callable:
+    """Run fn in another thread within the caller's trace (for executor.submit)."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def tracer_from_env(logger: logging.Logger) -> Tracer:
+    return Tracer(logger,
+                  enabled=os.getenv("tracing_enabled", "true").lower() == "true",
+                  otel=os.getenv("otel_enabled", "false").lower() == "true")
@@ -0,0 +1,237 @@
+"""
+Per-request write buffer (unit of work)
+
+Collects the inserts and updates produced by one Telegram update and writes
+them in a single transaction, so a turn costs one commit instead of one per
+statement.
+
+This module contains:
+- UnitOfWork: ordered buffer of inserts/updates for messages, songs, tg_users and statuses
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+# Tables the buffer may write to
+TABLES = ("messages", "songs", "tg_users", "statuses")
+
+
+class UnitOfWork:
+    """
+    Ordered buffer of writes flushed in one transaction.
+
+    - Consecutive inserts into the same table (same columns) become one
+      multi-row INSERT via execute_values.
+    - Rows without an explicit created_at get NOW() + n microseconds, where n is
+      the enqueue order, so rows written in one transaction keep their order
+      (NOW() alone is the same for the whole transaction).
+    - An update of a row that is still pending is merged into its INSERT
+      (or into the pending UPDATE of the same row).
+    - flush() can be called early for writes that must be visible before an
+      external call; later writes go to the next transaction.
+    - Operations leave the buffer only once their transaction has committed:
+      a failed flush keeps them for the next flush, and the final flush on
+      exit logs whatever it had to drop.
+    - insert(..., returning=column) fills the pending row with the value the
+      database assigned (e.g. a trigger-set seq) once it is flushed, for
+      after_flush callbacks.
+    """
+
+    def __init__(self, pool, logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            pool: PgConnectionPool used for the flush
+            logger: Optional logger instance
+        """
+        self.pool = pool
+        self.logger = logger or logging.getLogger(__name__)
+        self._ops: List[Tuple[str, str, Any]] = []
+        self._after_flush: List[Callable[[], None]] = []
+        self._seq = 0
+        # Leading operations of _ops that the running flush is writing
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {"flushes": 0, "statements": 0, "rows": 0}
+
+    # ──────────────────────────
+    #  BUFFERING
+    # ──────────────────────────
+
+    def insert(self, table: str, row: Dict[str, Any], returning: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queue an INSERT of row into table and return the pending row.
+
+        Args:
+            returning: Column read back with RETURNING into the pending row after
+                the flush; rows are matched by their "id"
+        """
+        self._check_table(table)
+        with self._lock:
+            row = dict(row)
+            if "created_at" not in row:
+                row["_seq"] = self._seq
+                self._seq += 1
+            if returning:
+                row["_returning"] = returning
+            self._ops.append(("insert", table, row))
+        return row
+
+    def update(self, table: str, values: Dict[str, Any], key: Any, key_column: str = "id"):
+        """
+        Queue UPDATE table SET values WHERE key_column = key.
+
+        If a pending insert or update has that key, values are merged into it instead.
+        """
+        self._check_table(table)
+        with self._lock:
+            # Rows already being written must not change under the running flush
+            for op, op_table, payload in self._ops[self._in_flight:]:
+                if op_table != table:
+                    continue
+                if op == "insert" and payload.get(key_column) == key:
+                    payload.update(values)
+                    return
+                if op == "update" and payload[1:] == (key_column, key):
+                    payload[0].update(values)
+                    return
+            self._ops.append(("update", table, (dict(values), key_column, key)))
+
+    def after_flush(self, callback: Callable[[], None]):
+        """Run callback after the next successful flush (e.g. cache invalidation)."""
+        with self._lock:
+            self._after_flush.append(callback)
+
+    @property
+    def pending(self) -> int:
+        return len(self._ops)
+
+    def describe_pending(self) -> List[str]:
+        """Short description of every pending operation, for logs."""
+        with self._lock:
+            ops = list(self._ops)
+        return [f"insert {table} {payload.get('id')}" if op == "insert" else f"update {table} {payload[1]}={payload[2]}"
+                for op, table, payload in ops]
+
+    @staticmethod
+    def _check_table(table: str):
+        if table not in TABLES:
+            raise ValueError(f"UnitOfWork does not write to table {table!r}")
+
+    # ──────────────────────────
+    #  FLUSH
+    # ──────────────────────────
+
+    def _statements(self, ops: List[Tuple[str, str, Any]]) -> List[Tuple[str, str, Any]]:
+        """Group consecutive inserts with the same table and columns."""
+        statements = []
+        for op, table, payload in ops:
+            if op == "insert":
+                columns = tuple(c for c in payload if c not in ("_seq", "_returning"))
+                target = (table, columns, payload.get("_returning"))
+                prev = statements[-1] if statements else None
+                if prev and prev[0] == "insert" and prev[1] == target:
+                    prev[2].append(payload)
+                else:
+                    statements.append(("insert", target, [payload]))
+            else:
+                statements.append((op, table, payload))
+        return statements
+
+    @staticmethod
+    def _run_insert(cur, table: str, columns: Tuple[str, ...], rows: List[Dict[str, Any]],
+                    returning: Optional[str] = None):
+        ordered = "_seq" in rows[0]
+        names = list(columns) + (["created_at"] if ordered else [])
+        placeholders = ["%s"] * len(columns)
+        if ordered:
+            placeholders.append("NOW() + %s * INTERVAL '1 microsecond'")
+        values = [
+            [row[c] for c in columns] + ([row["_seq"]] if ordered else [])
+            for row in rows
+        ]
+        sql = f"INSERT INTO {table}({', '.join(names)}) VALUES %s"
+        if not returning:
+            execute_values(cur, sql, values, template=f"({', '.join(placeholders)})",
+                           page_size=max(len(values), 1))
+            return
+        returned = execute_values(cur, f"{sql} RETURNING id, {returning}", values,
+                                  template=f"({', '.join(placeholders)})",
+                                  page_size=max(len(values), 1), fetch=True)
+        by_id = {r[0]: r[1] for r in returned}
+        for row in rows:
+            row[returning] = by_id.get(row["id"])
+
+    def flush(self) -> int:
+        """
+        Write every pending operation in one transaction.
+
+        Returns:
+            Number of statements executed
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            ops = list(self._ops)
+            callbacks = list(self._after_flush)
+            self._in_flight = len(ops)
+        if not ops:
+            with self._lock:
+                del self._after_flush[:len(callbacks)]
+            for callback in callbacks:
+                callback()
+            return 0
+
+        statements = self._statements(ops)
+
+        def _run(conn):
+            with conn:
+                with conn.cursor() as cur:
+                    for op, target, payload in statements:
+                        if op == "insert":
+                            self._run_insert(cur, target[0], target[1], payload, target[2])
+                        else:
+                            values, key_column, key = payload
+                            assignments = ", ".join(f"{c} = %s" for c in values)
+                            cur.execute(f"UPDATE {target} SET {assignments} WHERE {key_column} = %s",
+                                        (*values.values(), key))
+
+        try:
+            self.pool.run(_run)
+        except Exception as e:
+            with self._lock:
+                self._in_flight = 0
+            self.logger.error("Unit of work flush failed, %d operations kept for the next flush: %s",
+                              len(ops), e)
+            raise
+        with self._lock:
+            del self._ops[:len(ops)]
+            del self._after_flush[:len(callbacks)]
+            self._in_flight = 0
+
+        self.stats["flushes"] += 1
+        self.stats["statements"] += len(statements)
+        self.stats["rows"] += len(ops)
+        self.logger.debug("Unit of work flushed %d operations in %d statements", len(ops), len(statements))
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                self.logger.warning("After-flush callback failed: %s", e)
+        return len(statements)
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Writes made before a failure are kept, as they were with per-statement commits
+        try:
+            self.flush()
+        except Exception:
+            self.logger.error("Unit of work dropped %d operations: %s", self.pending, self.describe_pending())
+            raise
@@ -0,0 +1,46 @@
+"""Asynchronous database access on top of the runtime's asyncpg pool.
+
+Mirrors :class:`Database` for the async pipeline. Queries use asyncpg's
+positional ``$1, $2`` placeholders; connections are borrowed from the
+shared pool for the duration of one call, so independent queries from
+concurrent updates (or from one update via ``asyncio.gather``) run in
+parallel on different connections.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import asyncpg
+
+from .async_runtime import AsyncRuntime
+
+
+class AsyncDatabase:
+    """Small async wrapper returning plain dictionaries."""
+
+    def __init__(self, runtime: AsyncRuntime) -> None:
+        self.runtime = runtime
+
+    async def query_one(self, sql: str, *params: Any) -> Optional[Dict[str, Any]]:
+        """Execute a SELECT returning a single row as a dictionary."""
+        pool = await self.runtime.db_pool()
+        row = await pool.fetchrow(sql, *params)
+        return dict(row) if row is not None else None
+
+    async def query_all(self, sql: str, *params: Any) -> List[Dict[str, Any]]:
+        """Execute a SELECT returning all rows as a list of dictionaries."""
+        pool = await self.runtime.db_pool()
+        return [dict(row) for row in await pool.fetch(sql, *params)]
+
+    async def execute(self, sql: str, *params: Any) -> None:
+        """Execute an INSERT/UPDATE/DELETE (autocommit)."""
+        pool = await self.runtime.db_pool()
+        await pool.execute(sql, *params)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[asyncpg.Connection]:
+        """Borrow one connection and run the block in a transaction."""
+        pool = await self.runtime.db_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                yield conn
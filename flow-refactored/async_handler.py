@@ -0,0 +1,156 @@
+"""Asynchronous request handler.
+
+Async counterpart of :class:`Handler`. Independent steps of a turn are
+awaited together instead of one after another:
+
+* saving the user message and loading the history;
+* intent and emotion classification;
+* saving the analysis and generating the reply.
+
+Every client comes from the shared :class:`AsyncRuntime`, so connections
+stay warm between invocations, and concurrent updates only contend for
+pool slots.
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from .async_database import AsyncDatabase
+from .async_llm_client import AsyncLLMClient
+from .async_runtime import AsyncRuntime
+from .async_telegram_client import AsyncTelegramClient
+from .config import Config
+from .utilities import parse_body, get_last_messages
+
+
+@lru_cache(maxsize=None)
+def _read_prompt(path: str) -> str:
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+class AsyncHandler:
+    """High-level orchestrator for the async pipeline."""
+
+    def __init__(self, config: Config, runtime: AsyncRuntime) -> None:
+        self.config = config
+        self.db = AsyncDatabase(runtime)
+        self.telegram = AsyncTelegramClient(config, runtime.http)
+        self.llm = AsyncLLMClient(config, runtime.proxied_http)
+        self._bot_id: Optional[str] = None
+
+    # -- Database helper methods --
+    async def _get_or_create_bot(self) -> str:
+        if self._bot_id is not None:
+            return self._bot_id
+        token_hash = uuid.uuid5(uuid.NAMESPACE_DNS, self.config.bot_token).hex
+        rec = await self.db.query_one("SELECT id FROM bots WHERE token = $1 LIMIT 1", token_hash)
+        if rec:
+            self._bot_id = str(rec['id'])
+        else:
+            bot_id = str(uuid.uuid4())
+            await self.db.execute(
+                "INSERT INTO bots(id, token, username, owner_id) VALUES ($1, $2, NULL, NULL)",
+                bot_id, token_hash,
+            )
+            self._bot_id = bot_id
+        return self._bot_id
+
+    async def _get_or_create_user(self, chat_id: int, full_name: str) -> str:
+        rec = await self.db.query_one("SELECT id FROM users WHERE chat_id = $1 LIMIT 1", chat_id)
+        if rec:
+            return str(rec['id'])
+        user_uuid = str(uuid.uuid4())
+        await self.db.execute(
+            "INSERT INTO users(id, chat_id, full_name) VALUES ($1, $2, $3)",
+            user_uuid, chat_id, full_name,
+        )
+        return user_uuid
+
+    async def _active_session(self, user_uuid: str, bot_id: str) -> str:
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.config.session_lifetime)
+        rec = await self.db.query_one(
+            "SELECT id, started_at FROM conversation_sessions WHERE user_id = $1 AND bot_id = $2 AND ended_at IS NULL ORDER BY started_at DESC LIMIT 1",
+            user_uuid, bot_id,
+        )
+        if rec and rec.get('started_at') and rec['started_at'] > cutoff:
+            return str(rec['id'])
+        session_uuid = str(uuid.uuid4())
+        await self.db.execute(
+            "INSERT INTO conversation_sessions(id, user_id, bot_id, started_at, model) VALUES ($1, $2, $3, NOW(), $4)",
+            session_uuid, user_uuid, bot_id, self.config.ai_model,
+        )
+        return session_uuid
+
+    async def _save_message(self, session_id: str, user_id: str, role: str, content: str,
+                            analysis: Optional[Dict[str, Any]] = None, message_id: Optional[str] = None) -> str:
+        message_id = message_id or str(uuid.uuid4())
+        await self.db.execute(
+            "INSERT INTO messages(id, session_id, user_id, role, content, analysis, created_at) VALUES ($1, $2, $3, $4, $5, $6, NOW())",
+            message_id, session_id, user_id, role, content, json.dumps(analysis) if analysis else None,
+        )
+        return message_id
+
+    # -- Main entry point --
+    async def handle(self, event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
+        body = parse_body(event)
+        if isinstance(body, dict) and 'message' in body:
+            return await self._handle_message(body['message'])
+        if isinstance(body, dict) and 'callback_query' in body:
+            await self._handle_callback(body['callback_query'])
+            return {'statusCode': 200, 'body': ''}
+        return {'statusCode': 200, 'body': ''}
+
+    # -- Message processing --
+    async def _handle_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = message['chat']['id']
+        text = message.get('text', '')
+        user = message['from']
+        full_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
+        bot_id, user_uuid = await asyncio.gather(
+            self._get_or_create_bot(),
+            self._get_or_create_user(chat_id, full_name),
+        )
+        session_id = await self._active_session(user_uuid, bot_id)
+
+        # The history is read in parallel with the insert and without the new message
+        # (whichever query finishes first), so it is appended here exactly once
+        user_msg_id = str(uuid.uuid4())
+        _, history = await asyncio.gather(
+            self._save_message(session_id, user_uuid, 'user', text, message_id=user_msg_id),
+            self.db.query_all("SELECT role, content FROM messages WHERE session_id = $1 AND id <> $2 "
+                              "ORDER BY created_at ASC", session_id, user_msg_id),
+        )
+        history = [{'role': str(r['role']), 'content': r['content']} for r in history]
+        user_msg = {'role': 'user', 'content': text}
+        last_msgs = get_last_messages(history + [user_msg], 8, force_last_user=True)
+
+        intent, emotion = await asyncio.gather(
+            self.llm.call_conversation(last_msgs, system_message=_read_prompt('knowledge_bases/determinate_intent.txt')),
+            self.llm.call_conversation(last_msgs, system_message=_read_prompt('knowledge_bases/detect_emotional_state.txt')),
+        )
+        save_analysis = self._save_message(session_id, user_uuid, 'assistant', '', {'intent': intent, 'emotion': emotion})
+
+        if intent.get('intent') == 'greet':
+            await asyncio.gather(save_analysis, self.telegram.send_message(chat_id, 'Привет! Чем могу помочь?'))
+        else:
+            _, reply = await asyncio.gather(
+                save_analysis,
+                self.llm.call_with_tools(
+                    [{'role': 'system', 'content': _read_prompt('system_prompt.txt')}, *history, user_msg],
+                    tools=[],
+                ),
+            )
+            await self.telegram.send_message(chat_id, reply)
+        return {'statusCode': 200, 'body': ''}
+
+    # -- Callback processing --
+    async def _handle_callback(self, callback: Dict[str, Any]) -> None:
+        data = callback['data']
+        callback_id = callback['id']
+        if data == 'hug_author':
+            await self.telegram.answer_callback(callback_id, '💞 Автору переданы объятия!')
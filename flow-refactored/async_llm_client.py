@@ -0,0 +1,80 @@
+"""Asynchronous LLM client for the async pipeline.
+
+Same requests as :class:`LLMClient`, sent through the runtime's shared
+``httpx.AsyncClient`` so the TLS connection to OpenRouter is reused
+between calls and invocations, and several completions of one turn
+(intent, emotion, reply) can be in flight at once.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+import httpx
+import tiktoken
+
+from .config import Config
+from .llm_client import LLMClient
+
+
+class AsyncLLMClient:
+    MAX_TOKENS: int = LLMClient.MAX_TOKENS
+    MODERATION_URL: str = 'https://api.openai.com/v1/moderations'
+
+    # Token counting and trimming do no I/O, so the sync implementation is shared
+    _count_tokens = LLMClient._count_tokens
+    _trim = LLMClient._trim
+
+    def __init__(self, config: Config, http: httpx.AsyncClient) -> None:
+        self.config = config
+        self.http = http
+        self.encoder = tiktoken.encoding_for_model('gpt-4o')
+
+    async def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        resp = await self.http.post(
+            self.config.ai_endpoint,
+            json=payload,
+            headers={'Authorization': f'Bearer {self.config.operouter_key}'},
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    @staticmethod
+    def _parse_content(data: Dict[str, Any]) -> Dict[str, Any]:
+        content = data.get('choices', [{}])[0].get('message', {}).get('content', '')
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            return {'content': content}
+
+    async def call_conversation(self, messages: List[Dict[str, str]], system_message: Optional[str] = None) -> Dict[str, Any]:
+        msgs: List[Dict[str, str]] = []
+        if system_message:
+            msgs.append({'role': 'system', 'content': system_message})
+        msgs.extend(messages)
+        data = await self._post({
+            'model': self.config.ai_model,
+            'messages': msgs,
+            'models': self.config.ai_models_fallback,
+        })
+        return self._parse_content(data)
+
+    async def call_with_tools(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]]) -> str:
+        data = await self._post({
+            'model': self.config.ai_model,
+            'messages': self._trim(messages.copy()),
+            'tools': tools,
+            'tool_choice': 'auto',
+            'models': self.config.ai_models_fallback,
+        })
+        return data.get('choices', [{}])[0].get('message', {}).get('content', '')
+
+    async def moderation_flagged(self, text: str) -> bool:
+        if not self.config.openai_api_key:
+            return False
+        resp = await self.http.post(
+            self.MODERATION_URL,
+            json={'input': text, 'model': 'omni-moderation-latest'},
+            headers={'Authorization': f'Bearer {self.config.openai_api_key}'},
+        )
+        resp.raise_for_status()
+        return resp.json().get('results', [{}])[0].get('flagged', False)
@@ -0,0 +1,128 @@
+"""Long-lived asyncio runtime shared by warm invocations.
+
+A serverless container keeps module globals between invocations, but
+``asyncio.run`` creates and closes a new event loop every time, which
+throws away every keep-alive connection bound to the old loop. This
+module owns one event loop running in a background thread together with
+the clients that must live on it:
+
+* ``http`` – direct ``httpx.AsyncClient`` (Telegram, Suno), HTTP/2 and keep-alive;
+* ``proxied_http`` – the same, routed through ``proxy_url`` (OpenRouter, OpenAI);
+* ``db_pool`` – ``asyncpg`` connection pool.
+
+Synchronous entry points submit coroutines with :meth:`AsyncRuntime.run`.
+Calls from several threads share the loop, so one container can process
+several updates concurrently.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Optional
+
+import asyncpg
+import httpx
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """Event loop thread plus the pooled HTTP and Postgres clients bound to it."""
+
+    def __init__(self, config: Config, db_pool_max_size: int = 10, keepalive_expiry: float = 60.0) -> None:
+        self.config = config
+        self.db_pool_max_size = db_pool_max_size
+        self.keepalive_expiry = keepalive_expiry
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='async-runtime', daemon=True)
+        self._thread.start()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._proxied_http: Optional[httpx.AsyncClient] = None
+        self._db_pool: Optional[asyncpg.Pool] = None
+        self._db_pool_lock: Optional[asyncio.Lock] = None
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the shared loop and wait for its result (from any thread)."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    # -- HTTP --
+    def _create_http_client(self, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        kwargs: dict = {
+            'timeout': httpx.Timeout(self.config.read_timeout, connect=self.config.connect_timeout),
+            'limits': httpx.Limits(max_connections=100, max_keepalive_connections=20,
+                                   keepalive_expiry=self.keepalive_expiry),
+            'proxy': proxy,
+        }
+        try:
+            return httpx.AsyncClient(http2=True, **kwargs)
+        except ImportError:
+            # http2=True needs the h2 package (httpx[http2])
+            logger.warning('h2 is not installed, falling back to HTTP/1.1 keep-alive')
+            return httpx.AsyncClient(**kwargs)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Direct client; created on first use and reused afterwards."""
+        if self._http is None:
+            self._http = self._create_http_client()
+        return self._http
+
+    @property
+    def proxied_http(self) -> httpx.AsyncClient:
+        """Client routed through ``proxy_url`` (the direct client if no proxy is configured)."""
+        if not self.config.proxy_url:
+            return self.http
+        if self._proxied_http is None:
+            self._proxied_http = self._create_http_client(self.config.proxy_url)
+        return self._proxied_http
+
+    # -- Postgres --
+    async def db_pool(self) -> asyncpg.Pool:
+        """Return the asyncpg pool, creating it on first use (must be awaited on the runtime loop)."""
+        if self._db_pool is not None:
+            return self._db_pool
+        if self._db_pool_lock is None:
+            self._db_pool_lock = asyncio.Lock()
+        async with self._db_pool_lock:
+            if self._db_pool is None:
+                self._db_pool = await asyncpg.create_pool(
+                    self.config.database_url,
+                    min_size=1,
+                    max_size=self.db_pool_max_size,
+                    max_inactive_connection_lifetime=300,
+                )
+        return self._db_pool
+
+    # -- Shutdown --
+    async def _aclose(self) -> None:
+        for client in (self._http, self._proxied_http):
+            if client is not None:
+                await client.aclose()
+        if self._db_pool is not None:
+            await self._db_pool.close()
+        self._http = self._proxied_http = self._db_pool = None
+
+    def close(self) -> None:
+        """Close the clients and stop the loop (tests and local runs; containers just exit)."""
+        self.run(self._aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+_runtime: Optional[AsyncRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime(config: Config) -> AsyncRuntime:
+    """Return the process-wide runtime, starting it on the first call."""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = AsyncRuntime(config)
+        return _runtime
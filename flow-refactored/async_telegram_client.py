@@ -0,0 +1,65 @@
+"""Asynchronous Telegram Bot API client for the async pipeline.
+
+Same methods as :class:`TelegramClient`, awaiting the runtime's shared
+``httpx.AsyncClient``. MarkdownV2 escaping is shared with the sync client.
+"""
+
+import json
+from typing import Any, Dict
+
+import httpx
+
+from .config import Config
+from .telegram_client import TelegramClient
+
+
+class AsyncTelegramClient:
+    """Async wrapper around the Telegram Bot API."""
+
+    SPECIAL_CHARS = TelegramClient.SPECIAL_CHARS
+    escape = TelegramClient.escape
+
+    def __init__(self, config: Config, http: httpx.AsyncClient) -> None:
+        self.config = config
+        self.http = http
+        self.base_url = f"https://api.telegram.org/bot{self.config.bot_token}"
+
+    async def _post(self, method: str, payload: Dict[str, Any]) -> None:
+        resp = await self.http.post(f"{self.base_url}/{method}", json=payload)
+        resp.raise_for_status()
+
+    async def send_message(self, chat_id: int, text: str, parse_mode: str = "MarkdownV2", disable_preview: bool = True) -> None:
+        await self._post("sendMessage", {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": parse_mode,
+            "disable_web_page_preview": disable_preview,
+        })
+
+    async def send_audio(self, chat_id: int, audio_url: str, title: str = "") -> None:
+        payload: Dict[str, Any] = {"chat_id": chat_id, "audio": audio_url}
+        if title:
+            payload["caption"] = title
+            payload["title"] = title
+        await self._post("sendAudio", payload)
+
+    async def send_markup(self, chat_id: int, text: str, markup: Dict[str, Any]) -> None:
+        await self._post("sendMessage", {
+            "chat_id": chat_id,
+            "text": text,
+            "reply_markup": json.dumps(markup),
+            "parse_mode": "MarkdownV2",
+        })
+
+    async def answer_callback(self, callback_query_id: str, text: str, show_alert: bool = False) -> None:
+        await self._post("answerCallbackQuery", {
+            "callback_query_id": callback_query_id,
+            "text": text,
+            "show_alert": show_alert,
+        })
+
+    async def send_chunks(self, chat_id: int, text: str, chunk_size: int = 4096) -> None:
+        # Chunks must arrive in order, so they are sent one after another
+        escaped = self.escape(text)
+        for i in range(0, len(escaped), chunk_size):
+            await self.send_message(chat_id, escaped[i:i + chunk_size])
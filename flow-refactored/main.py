@@ -9,6 +9,10 @@ function handler.
 
 from .config import Config
 from .handler import Handler
+from .async_handler import AsyncHandler
+from .async_runtime import get_runtime
+
+_async_handler = None
 
 
 def lambda_handler(event, context):
@@ -17,6 +21,20 @@ def lambda_handler(event, context):
     return handler.handle(event, context)
 
 
+def async_lambda_handler(event, context):
+    """Entry point for the async pipeline.
+
+    The runtime (event loop, HTTP/2 clients, asyncpg pool) and the handler
+    are created on the first invocation and reused by warm ones; concurrent
+    invocations share the same loop.
+    """
+    global _async_handler
+    runtime = get_runtime(Config())
+    if _async_handler is None:
+        _async_handler = AsyncHandler(runtime.config, runtime)
+    return runtime.run(_async_handler.handle(event, context))
+
+
 if __name__ == '__main__':
     # Example usage: pass a dummy event to test the handler
     dummy_event = {'body': '{}'}
@@ -22,6 +22,7 @@ import asyncio
 import json
 import logging
 import re
+import threading
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Pattern, Tuple
 
@@ -99,12 +100,17 @@ except FileNotFoundError:
     SYSTEM_PROMPT = ""
     logger.warning("system_prompt.txt not found – proceeding without it")
 
-# 2) HTTPX транспорт для прокси и таймаутов
-_http_transport = httpx.AsyncHTTPTransport(retries=3, proxy=settings.proxy_url)
+# 2) HTTPX транспорт для прокси и таймаутов: HTTP/2 + keep-alive, соединения
+#    живут между тёплыми вызовами (см. _event_loop ниже)
+_http_transport = httpx.AsyncHTTPTransport(
+    retries=3,
+    proxy=settings.proxy_url,
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60),
+)
 httpx_client = httpx.AsyncClient(
     transport=_http_transport,
-    timeout=httpx.Timeout(settings.read_timeout),
-    proxies=settings.proxy_url,
+    timeout=httpx.Timeout(settings.read_timeout, connect=settings.connect_timeout),
 )
 
 # 3) Клиент для модерации через OpenAI API
@@ -609,10 +615,23 @@ async def _async_entry(event: Dict[str, Any]) -> Dict[str, Any]:
     return {"statusCode": 200, "body": "OK"}
 
 
+# Один event loop на контейнер. asyncio.run() на каждый вызов закрывал loop,
+# а вместе с ним и keep-alive соединения httpx_client / aiogram-сессии.
+# Loop крутится в фоновом потоке, поэтому параллельные вызовы в одном
+# контейнере обрабатываются конкурентно.
+_event_loop = asyncio.new_event_loop()
+threading.Thread(target=_event_loop.run_forever, name="event-loop", daemon=True).start()
+
+
+def run_in_loop(coro: Any, timeout: Optional[float] = None) -> Any:
+    """Выполнить корутину на общем loop и дождаться результата (из любого потока)."""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop).result(timeout)
+
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Sync wrapper для Yandex Cloud Functions"""
     try:
-        return asyncio.run(_async_entry(event))
+        return run_in_loop(_async_entry(event))
     except Exception:
         # Всегда возвращаем 200, чтобы Telegram не зацикливал retries
         return {"statusCode": 200, "body": "error"}
@@ -629,4 +648,4 @@ if __name__ == "__main__":
         exit(1)
     body = Path(sys.argv[1]).read_text(encoding="utf-8")
     event_debug = {"body": body}
-    print(asyncio.run(_async_entry(event_debug)))
+    print(run_in_loop(_async_entry(event_debug)))
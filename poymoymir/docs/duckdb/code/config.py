@@ -11,11 +11,12 @@ Architecture:
 - Property accessors for backward compatibility
 """
 
+import hashlib
 import json
 import os
 from enum import Enum
 from textwrap import dedent
-from typing import List, Optional, Dict, Any, Union
+from typing import ClassVar, List, Optional, Dict, Any, Union
 from urllib.parse import urlparse
 
 from pydantic import BaseModel, Field, field_validator, model_validator
@@ -323,6 +324,17 @@ class PromptsConfig(BaseModel):
     intent_detection_template: str = Field(default="knowledge_bases/templates/detect_intent.txt.yaml", description="Template for intent detection prompt")
     state_detection_template: str = Field(default="knowledge_bases/templates/detect_state.txt.yaml", description="Template for state detection prompt")
     summarization_template: str = Field(default="knowledge_bases/templates/summarize_conversation.txt.yaml", description="Template for conversation summarization prompt")
+    prompt_bundle: Optional[str] = Field(default="knowledge_bases/prompts.bundle.json", description="Prebuilt rendered prompts, see build_bundle()")
+
+    # Prompt name -> field holding its template
+    PROMPT_TEMPLATES: ClassVar[Dict[str, str]] = {
+        "system_prompt": "system_prompt_template",
+        "prepare_suno_prompt": "prepare_suno_template",
+        "intent_detection_prompt": "intent_detection_template",
+        "emotion_detection_prompt": "emotion_detection_template",
+        "state_detection_prompt": "state_detection_template",
+        "summarization_prompt": "summarization_template",
+    }
 
     # Cached prompt content
     _system_prompt: Optional[str] = None
@@ -331,6 +343,7 @@ class PromptsConfig(BaseModel):
     _emotion_detection_prompt: Optional[str] = None
     _state_detection_prompt: Optional[str] = None
     _summarization_prompt: Optional[str] = None
+    _bundle: Optional[Dict[str, str]] = None
 
     def _load_file(self, file_path: str) -> str:
         """Load a text file with UTF-8 encoding"""
@@ -344,96 +357,125 @@ class PromptsConfig(BaseModel):
             _config_logger.error(f"Error loading prompt file {file_path}: {e}")
             return ""
 
-    @property
-    def system_prompt(self) -> str:
-        """Load and cache system prompt using template"""
-        if self._system_prompt is None:
-            if self.system_prompt_template:
+    @staticmethod
+    def _source_signature(path: str) -> Dict[str, Any]:
+        """Size, mtime and SHA-256 of a template, recorded by build_bundle()"""
+        with open(path, "rb") as f:
+            data = f.read()
+        return {"size": len(data), "mtime": int(os.stat(path).st_mtime),
+                "sha256": hashlib.sha256(data).hexdigest()}
+
+    @staticmethod
+    def _source_changed(path: str, built: Dict[str, Any]) -> bool:
+        """Whether a template differs from the one the bundle was rendered from"""
+        # stat() is enough while size and mtime match; otherwise (e.g. mtime reset by
+        # packaging) the file is hashed. A missing template cannot contradict the bundle.
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if st.st_size != built.get("size"):
+            return True
+        if int(st.st_mtime) == built.get("mtime"):
+            return False
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest() != built.get("sha256")
+
+    def _bundled_prompts(self) -> Dict[str, str]:
+        """Rendered prompts from prompt_bundle (one read), {} if there is no bundle"""
+        if self._bundle is None:
+            self._bundle = {}
+            if self.prompt_bundle:
+                try:
+                    with open(self.prompt_bundle, "rb") as f:
+                        bundle = json.loads(f.read())
+                    # Templates moved or edited since the build -> render them instead
+                    templates = {name: getattr(self, field) for name, field in self.PROMPT_TEMPLATES.items()}
+                    sources = bundle.get("sources")
+                    if (bundle.get("templates") == templates and sources is not None
+                            and not any(self._source_changed(path, sources.get(path, {}))
+                                        for path in templates.values() if path)):
+                        self._bundle = bundle.get("prompts", {})
+                    else:
+                        _config_logger.warning(f"Prompt bundle {self.prompt_bundle} does not match the templates, rendering them")
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    _config_logger.error(f"Error loading prompt bundle {self.prompt_bundle}: {e}")
+        return self._bundle
+
+    def _get_prompt(self, name: str) -> str:
+        """Load and cache a prompt: from the bundle if there is one, else by rendering its template"""
+        cached = getattr(self, f"_{name}")
+        if cached is not None:
+            return cached
+        prompt = self._bundled_prompts().get(name)
+        if prompt is None:
+            template = getattr(self, self.PROMPT_TEMPLATES[name])
+            if template:
                 try:
-                    self._system_prompt = Utils.render_template(self.system_prompt_template)
+                    prompt = Utils.render_template(template)
                 except Exception as e:
-                    _config_logger.error(f"Error rendering system prompt template: {e}")
-                    self._system_prompt = ""
+                    _config_logger.error(f"Error rendering {name} template: {e}")
+                    prompt = ""
             else:
-                _config_logger.error("No system prompt template specified")
-                self._system_prompt = ""
-        return self._system_prompt
+                _config_logger.error(f"No {name} template specified")
+                prompt = ""
+        setattr(self, f"_{name}", prompt)
+        return prompt
+
+    def build_bundle(self, path: Optional[str] = None) -> str:
+        """
+        Render every template into one JSON file (run at build time, not at cold start).
+
+        Args:
+            path: Output file (prompt_bundle by default)
+
+        Returns:
+            Path of the written bundle
+        """
+        path = path or self.prompt_bundle
+        bundle = {
+            "templates": {name: getattr(self, field) for name, field in self.PROMPT_TEMPLATES.items()},
+            "sources": {getattr(self, field): self._source_signature(getattr(self, field))
+                        for field in self.PROMPT_TEMPLATES.values() if getattr(self, field)},
+            "prompts": {name: Utils.render_template(getattr(self, field)) for name, field in self.PROMPT_TEMPLATES.items()},
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(bundle, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+    @property
+    def system_prompt(self) -> str:
+        """Load and cache system prompt using template"""
+        return self._get_prompt("system_prompt")
 
     @property
     def prepare_suno_prompt(self) -> str:
         """Load and cache Suno preparation prompt using template"""
-        if self._prepare_suno_prompt is None:
-            if self.prepare_suno_template:
-                try:
-                    self._prepare_suno_prompt = Utils.render_template(self.prepare_suno_template)
-                except Exception as e:
-                    _config_logger.error(f"Error rendering prepare suno template: {e}")
-                    self._prepare_suno_prompt = ""
-            else:
-                _config_logger.error("No prepare suno template specified")
-                self._prepare_suno_prompt = ""
-        return self._prepare_suno_prompt
+        return self._get_prompt("prepare_suno_prompt")
 
     @property
     def intent_detection_prompt(self) -> str:
         """Load and cache intent detection prompt using template"""
-        if self._intent_detection_prompt is None:
-            if self.intent_detection_template:
-                try:
-                    self._intent_detection_prompt = Utils.render_template(self.intent_detection_template)
-                except Exception as e:
-                    _config_logger.error(f"Error rendering intent detection template: {e}")
-                    self._intent_detection_prompt = ""
-            else:
-                _config_logger.error("No intent detection template specified")
-                self._intent_detection_prompt = ""
-        return self._intent_detection_prompt
+        return self._get_prompt("intent_detection_prompt")
 
     @property
     def emotion_detection_prompt(self) -> str:
         """Load and cache emotion detection prompt using template"""
-        if self._emotion_detection_prompt is None:
-            if self.emotion_detection_template:
-                try:
-                    from .utils import Utils
-                    self._emotion_detection_prompt = Utils.render_template(self.emotion_detection_template)
-                except Exception as e:
-                    _config_logger.error(f"Error rendering emotion detection template: {e}")
-                    self._emotion_detection_prompt = ""
-            else:
-                _config_logger.error("No emotion detection template specified")
-                self._emotion_detection_prompt = ""
-        return self._emotion_detection_prompt
+        return self._get_prompt("emotion_detection_prompt")
 
     @property
     def state_detection_prompt(self) -> str:
         """Load and cache state detection prompt using template"""
-        if self._state_detection_prompt is None:
-            if self.state_detection_template:
-                try:
-                    self._state_detection_prompt = Utils.render_template(self.state_detection_template)
-                except Exception as e:
-                    _config_logger.error(f"Error rendering state detection template: {e}")
-                    self._state_detection_prompt = ""
-            else:
-                _config_logger.error("No state detection template specified")
-                self._state_detection_prompt = ""
-        return self._state_detection_prompt
+        return self._get_prompt("state_detection_prompt")
 
     @property
     def summarization_prompt(self) -> str:
         """Load and cache conversation summarization prompt using template"""
-        if self._summarization_prompt is None:
-            if self.summarization_template:
-                try:
-                    self._summarization_prompt = Utils.render_template(self.summarization_template)
-                except Exception as e:
-                    _config_logger.error(f"Error rendering summarization template: {e}")
-                    self._summarization_prompt = ""
-            else:
-                _config_logger.error("No summarization template specified")
-                self._summarization_prompt = ""
-        return self._summarization_prompt
+        return self._get_prompt("summarization_prompt")
 
 class CacheConfig(BaseModel):
     """Redis cache configuration"""
@@ -826,7 +868,8 @@ class Config(BaseSettings):
                     intent_detection_template=get_env("intent_detection_template") or "knowledge_bases/templates/detect_intent.txt.yaml",
                     emotion_detection_template=get_env("emotion_detection_template") or "knowledge_bases/templates/detect_emotional_state.txt.yaml",
                     state_detection_template=get_env("state_detection_template") or "knowledge_bases/templates/detect_state.txt.yaml",
-                    summarization_template=get_env("summarization_template") or "knowledge_bases/templates/summarize_conversation.txt.yaml"
+                    summarization_template=get_env("summarization_template") or "knowledge_bases/templates/summarize_conversation.txt.yaml",
+                    prompt_bundle=get_env("prompt_bundle") or "knowledge_bases/prompts.bundle.json"
                 )
 
             )
@@ -12,6 +12,7 @@ from abc import ABC, abstractmethod
 
 from .langgraph_state import ConversationState, NodeResult
 from .config import Config
+from .fanout import FanOutExecutor, get_default_executor
 from .llm_manager import LLMManager
 from .database import DatabaseManager
 from .utils import Utils
@@ -69,7 +70,8 @@ class IntentDetectionNode(BaseNode):
             # Perform intent detection using LLM
             intent_result = self.llm_manager.llm_conversation(
                 state["last_8_messages"],
-                self.config.system_prompt_intent
+                self.config.system_prompt_intent,
+                cache_prompt="intent"
             )
 
             self.logger.debug("Intent detection result: %s", intent_result)
@@ -114,7 +116,8 @@ class EmotionAnalysisNode(BaseNode):
             # Perform emotion analysis using LLM
             emotion_result = self.llm_manager.llm_conversation(
                 state["last_8_user_messages"],
-                self.config.system_prompt_detect_emotion
+                self.config.system_prompt_detect_emotion,
+                cache_prompt="emotion"
             )
 
             self.logger.debug("Emotion analysis result: %s", emotion_result)
@@ -148,6 +151,68 @@ class EmotionAnalysisNode(BaseNode):
             return self._update_state(state, updates)
 
 
+class ParallelAnalysisNode:
+    """
+    Node that runs independent analysis nodes (intent, emotion, ...) concurrently.
+
+    Every wrapped node receives the same input state; their updates are merged
+    into one state. A node that fails or misses its deadline contributes its
+    fallback updates and an entry in "errors", so the workflow always continues.
+    """
+
+    # List fields that nodes extend rather than overwrite
+    APPEND_FIELDS = ("errors", "steps_completed")
+
+    def __init__(self, nodes: Dict[str, BaseNode], logger: logging.Logger,
+                 fallbacks: Optional[Dict[str, Dict[str, Any]]] = None,
+                 timeout: float = 10.0,
+                 executor: Optional[FanOutExecutor] = None):
+        """
+        Args:
+            nodes: name -> analysis node
+            logger: Logger instance
+            fallbacks: name -> state updates used when the node fails or times out
+            timeout: Deadline in seconds for every node
+            executor: Fan-out executor (process-wide one by default)
+        """
+        self.nodes = nodes
+        self.logger = logger
+        self.fallbacks = fallbacks or {}
+        self.timeout = timeout
+        self.executor = executor or get_default_executor(logger)
+
+    def execute(self, state: ConversationState) -> ConversationState:
+        self.logger.debug("Executing parallel analysis: %s", list(self.nodes))
+
+        result = self.executor.run(
+            {name: (lambda n=node: n.execute(state)) for name, node in self.nodes.items()},
+            timeout=self.timeout
+        )
+
+        new_state = state.copy()
+        for field in self.APPEND_FIELDS:
+            new_state[field] = list(state[field])
+
+        for name in self.nodes:
+            if name in result.results:
+                node_state = result.results[name]
+                for key, value in node_state.items():
+                    if key in self.APPEND_FIELDS:
+                        new_state[key].extend(value[len(state[key]):])
+                    elif value is not state.get(key):
+                        new_state[key] = value
+                continue
+
+            reason = "timeout" if name in result.timed_out else str(result.errors.get(name))
+            self.logger.error("Parallel analysis %s failed: %s", name, reason)
+            new_state.update(self.fallbacks.get(name, {}))
+            new_state["errors"].append(f"{name} failed: {reason}")
+            new_state["steps_completed"].append(name)
+
+        self.logger.debug("Parallel analysis finished in %.1fms", result.elapsed_ms)
+        return new_state
+
+
 class MessageSaveNode(BaseNode):
     """Node for saving user message and analysis to database."""
 
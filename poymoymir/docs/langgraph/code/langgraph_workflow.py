@@ -13,7 +13,7 @@ from langchain_core.runnables import RunnableConfig
 
 from .langgraph_state import ConversationState
 from .langgraph_nodes import (
-    IntentDetectionNode, EmotionAnalysisNode, MessageSaveNode,
+    IntentDetectionNode, EmotionAnalysisNode, ParallelAnalysisNode, MessageSaveNode,
     ConfusionHandlerNode, SongGenerationNode, FeedbackHandlerNode,
     ConversationNode
 )
@@ -161,6 +161,16 @@ class ConversationWorkflow:
         self.emotion_node = EmotionAnalysisNode(
             config, llm_manager, database, utils, logger
         )
+        # Intent and emotion are independent - run them concurrently
+        self.analysis_node = ParallelAnalysisNode(
+            {"intent_detection": self.intent_node, "emotion_analysis": self.emotion_node},
+            logger,
+            fallbacks={
+                "intent_detection": {"intent_analysis": {"intent": "unknown", "error": "timeout"}},
+                "emotion_analysis": {"emotion_analysis": {"emotions": [], "error": "timeout"}, "is_confused": False},
+            },
+            timeout=getattr(config, "llm_fanout_timeout", 10),
+        )
         self.message_save_node = MessageSaveNode(
             config, llm_manager, database, utils, logger
         )
@@ -191,8 +201,7 @@ class ConversationWorkflow:
         workflow = StateGraph(ConversationState)
 
         # Add nodes to the graph
-        workflow.add_node("intent_detection", self.intent_node.execute)
-        workflow.add_node("emotion_analysis", self.emotion_node.execute)
+        workflow.add_node("analysis", self.analysis_node.execute)
         workflow.add_node("message_save", self.message_save_node.execute)
         workflow.add_node("confusion", self.confusion_node.execute)
         workflow.add_node("song_generation", self.song_node.execute)
@@ -200,11 +209,10 @@ class ConversationWorkflow:
         workflow.add_node("conversation", self.conversation_node.execute)
 
         # Set entry point
-        workflow.set_entry_point("intent_detection")
+        workflow.set_entry_point("analysis")
 
         # Add edges between nodes
-        workflow.add_edge("intent_detection", "emotion_analysis")
-        workflow.add_edge("emotion_analysis", "message_save")
+        workflow.add_edge("analysis", "message_save")
 
         # Add conditional routing after message save
         workflow.add_conditional_edges(
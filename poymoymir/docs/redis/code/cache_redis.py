@@ -18,6 +18,7 @@ Key Features:
 - Automatic cache expiration
 - Batch operations support
 - Error handling and logging
+- In-process L1 tier (l1_cache.py) kept coherent by CLIENT TRACKING
 """
 
 import time
@@ -32,6 +33,7 @@ import redis
 from redis.exceptions import ResponseError, ConnectionError as RedisConnectionError
 
 from .config import Config
+from .l1_cache import L1_EXTEND_FRACTION, L1Cache, RedisTrackingInvalidator, parse_budgets
 from .utils import Utils
 
 
@@ -106,6 +108,16 @@ class CacheManager:
         # Fault tolerance configuration - enables graceful degradation when cache fails
         self._fault_tolerant = self.config.cache_fault_tolerant
 
+        # In-process L1 in front of get_cache; serves nothing until CLIENT TRACKING is on (Redis >= 6)
+        self.l1_enabled = getattr(self.config, "cache_l1_enabled", True)
+        self.l1 = L1Cache(
+            default_budget=getattr(self.config, "cache_l1_max_entries", 1000),
+            tenant_budgets=parse_budgets(getattr(self.config, "cache_l1_tenant_budgets", None)),
+            ttl=getattr(self.config, "cache_l1_ttl", 300),
+            logger=self.logger,
+        )
+        self._l1_invalidator: Optional[RedisTrackingInvalidator] = None
+
     @property
     def redis_client(self) -> redis.Redis:
         """Get Redis client instance, creating if necessary"""
@@ -175,9 +187,23 @@ class CacheManager:
         if not self._initialized:
             if self.ensure_index():
                 self._initialized = True
+                self._start_l1()
             else:
                 raise RuntimeError("Failed to initialize cache index")
 
+    def _start_l1(self):
+        """Start the L1 invalidation listener; without it the L1 stays disabled."""
+        if not self.l1_enabled or self._l1_invalidator is not None:
+            return
+        self._l1_invalidator = RedisTrackingInvalidator(self.redis_client, self.l1, [self.key_prefix],
+                                                        logger=self.logger)
+        if not self._l1_invalidator.start():
+            self._l1_invalidator = None
+
+    def _key_tenant(self, key: str) -> str:
+        """Tenant part of a key made by _generate_key."""
+        return key[len(self.key_prefix):].rsplit(":", 1)[0] if key.startswith(self.key_prefix) else ""
+
     def _escape_tag_value(self, value: Union[str, int, float, None]) -> str:
         """
         Escape TAG field values for RedisSearch queries.
@@ -310,6 +336,8 @@ class CacheManager:
             pipe.hset(key, mapping=entry_data)
             pipe.expire(key, ttl)
             pipe.execute()
+            # The tracking invalidation of our own write arrives asynchronously
+            self.l1.invalidate([key])
 
             self.logger.debug("Cached entry for key %s (tenant: %s, user: %s, ttl: %ds)",
                             key, tenant, user, ttl)
@@ -334,8 +362,31 @@ class CacheManager:
         """
         self._initialize()
 
+        tenant = self._key_tenant(key)
+        cached = self.l1.get(tenant, key)
+        if cached is not None:
+            if extend_ttl_seconds and self.l1.extend_due(key, extend_ttl_seconds * L1_EXTEND_FRACTION,
+                                                         extend_ttl_seconds):
+                self._extend_untracked(key, extend_ttl_seconds)
+            return cached
+
+        token = self.l1.begin(key)
+        result = None
+        ttl_left = None
         try:
-            if extend_ttl_seconds:
+            if self.l1.enabled:
+                # HGETALL + PTTL in one round trip: the L1 entry must not outlive the key.
+                # A sliding TTL is extended through the tracking connection, so it does
+                # not invalidate the entry being filled
+                pipe = self.redis_client.pipeline()
+                pipe.hgetall(key)
+                pipe.pttl(key)
+                data, pttl = pipe.execute()
+                if data and extend_ttl_seconds:
+                    self._extend_untracked(key, extend_ttl_seconds)
+                    pttl = extend_ttl_seconds * 1000
+                ttl_left = pttl / 1000 if pttl and pttl > 0 else None
+            elif extend_ttl_seconds:
                 # Atomic get + TTL extension
                 pipe = self.redis_client.pipeline()
                 pipe.hgetall(key)
@@ -348,24 +399,42 @@ class CacheManager:
             if not data:
                 return None
 
-            # Convert bytes to strings for text fields
-            result = {
-                "text": data.get(b"text", b"").decode("utf-8"),
-                "tenant": data.get(b"tenant", b"").decode("utf-8"),
-                "user": data.get(b"user", b"").decode("utf-8"),  # This is the hashed user ID
-                "created_at": int(data.get(b"created_at", b"0"))
-            }
-
-            # Include embedding if present (but don't decode it)
-            if b"embedding" in data:
-                result["embedding"] = data[b"embedding"]
+            result = self._decode_entry(data)
 
             self.logger.debug("Retrieved cache entry for key %s", key)
             return result
 
         except Exception as e:
             self.logger.error("Failed to retrieve cache entry: %s", e)
+            result = None
             return None
+        finally:
+            self.l1.fill(tenant, key, result, token, ttl=ttl_left)
+
+    def _extend_untracked(self, key: str, ttl: int):
+        """EXPIRE that does not invalidate this process's L1 entry of the key."""
+        try:
+            self._l1_invalidator.execute_untracked("EXPIRE", key, ttl)
+        except Exception as e:
+            # Tracking connection down (the L1 is being flushed anyway): a plain EXPIRE
+            self.logger.debug("L1 TTL extension of %s failed, extending directly: %s", key, e)
+            try:
+                self.redis_client.expire(key, ttl)
+            except Exception as e:
+                self.logger.error("Failed to extend cache entry TTL: %s", e)
+
+    @staticmethod
+    def _decode_entry(data: Dict[bytes, bytes]) -> Dict[str, Any]:
+        """HGETALL reply -> cache entry dict (the embedding stays packed)"""
+        result = {
+            "text": data.get(b"text", b"").decode("utf-8"),
+            "tenant": data.get(b"tenant", b"").decode("utf-8"),
+            "user": data.get(b"user", b"").decode("utf-8"),
+            "created_at": int(data.get(b"created_at", b"0"))
+        }
+        if b"embedding" in data:
+            result["embedding"] = data[b"embedding"]
+        return result
 
     def get_cache_by_signature(self,
                              tenant: str,
@@ -397,6 +466,7 @@ class CacheManager:
         """
         try:
             result = self.redis_client.delete(key)
+            self.l1.invalidate([key])
             if result > 0:
                 self.logger.debug("Deleted cache entry %s", key)
                 return True
@@ -405,6 +475,167 @@ class CacheManager:
             self.logger.error("Failed to delete cache entry: %s", e)
             return False
 
+    @staticmethod
+    def _as_text(text: Any) -> str:
+        """Cache text as put_cache stores it: lists and dicts as JSON, anything else via str()"""
+        if isinstance(text, str):
+            return text
+        if isinstance(text, (list, dict)):
+            return json.dumps(text, ensure_ascii=False)
+        return str(text)
+
+    def _embed_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings of texts in one batched request (LLMManager.embd_many); None where unavailable"""
+        if not self.config.cache_enable_embeddings or self.llm_manager is None or not texts:
+            return [None] * len(texts)
+        try:
+            embd_many = getattr(self.llm_manager, "embd_many", None)
+            if embd_many is not None:
+                vectors = embd_many(texts)
+            else:
+                vectors = [self.llm_manager.embd_text(text) for text in texts]
+        except Exception as e:
+            self.logger.error("Failed to generate embeddings for %d entries: %s", len(texts), e)
+            return [None] * len(texts)
+        return [vector if vector and isinstance(vector, list) else None for vector in vectors]
+
+    def put_cache_many(self,
+                       entries: List[Dict[str, Any]],
+                       ttl_seconds: Optional[int] = None) -> List[str]:
+        """
+        Store many cache entries: one batched embedding request, one pipeline
+        round trip per cache_batch_size entries.
+
+        Args:
+            entries: Dicts with tenant, user, key_signature, text and optionally ttl_seconds
+            ttl_seconds: TTL of entries without their own (uses default if None)
+
+        Returns:
+            List[str]: Generated cache keys, in the order of entries
+        """
+        self._initialize()
+
+        texts = [self._as_text(entry["text"]) for entry in entries]
+        keys = [self._generate_key(entry["tenant"], entry["key_signature"]) for entry in entries]
+        embeddings = self._embed_many(texts)
+        batch_size = getattr(self.config, "cache_batch_size", 100)
+        created_at = int(time.time())
+
+        try:
+            for start in range(0, len(entries), batch_size):
+                pipe = self.redis_client.pipeline(transaction=False)
+                for i in range(start, min(start + batch_size, len(entries))):
+                    entry_data = {
+                        "text": texts[i],
+                        "tenant": entries[i]["tenant"],
+                        "user": self._hash_user_id(entries[i]["user"]),
+                        "created_at": created_at
+                    }
+                    if embeddings[i] is not None:
+                        entry_data["embedding"] = self._pack_f32(embeddings[i])
+                    pipe.hset(keys[i], mapping=entry_data)
+                    pipe.expire(keys[i], entries[i].get("ttl_seconds") or ttl_seconds or self.default_ttl)
+                pipe.execute()
+            self.l1.invalidate(keys)
+
+            self.logger.debug("Cached %d entries (%d with embeddings)",
+                            len(keys), sum(e is not None for e in embeddings))
+            return keys
+
+        except Exception as e:
+            self.logger.error("Failed to cache %d entries: %s", len(entries), e)
+            raise
+
+    def get_cache_many(self,
+                       keys: List[str],
+                       extend_ttl_seconds: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Retrieve many cache entries: L1 first, then one pipeline round trip
+        per cache_batch_size missing keys.
+
+        Args:
+            keys: Cache keys
+            extend_ttl_seconds: Optional TTL extension (the EXPIREs go in the same
+                pipeline; the L1 is not used for these reads)
+
+        Returns:
+            Entries in the order of keys, None where not found
+        """
+        self._initialize()
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(keys)
+        use_l1 = not extend_ttl_seconds
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self.l1.get(self._key_tenant(key), key) if use_l1 else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.append(i)
+
+        batch_size = getattr(self.config, "cache_batch_size", 100)
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            tokens = [self.l1.begin(keys[i]) for i in chunk] if use_l1 else []
+            ttls: Dict[int, Optional[float]] = {}
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for i in chunk:
+                    pipe.hgetall(keys[i])
+                    if use_l1:
+                        pipe.pttl(keys[i])
+                    else:
+                        pipe.expire(keys[i], extend_ttl_seconds)
+                replies = pipe.execute()
+                for n, i in enumerate(chunk):
+                    data, pttl = replies[2 * n], replies[2 * n + 1]
+                    if data:
+                        results[i] = self._decode_entry(data)
+                        ttls[i] = pttl / 1000 if use_l1 and pttl and pttl > 0 else None
+            except Exception as e:
+                self.logger.error("Failed to retrieve %d cache entries: %s", len(chunk), e)
+            finally:
+                # Every begin() gets its fill(), also for keys not found or a failed pipeline
+                if use_l1:
+                    for n, i in enumerate(chunk):
+                        self.l1.fill(self._key_tenant(keys[i]), keys[i], results[i], tokens[n], ttl=ttls.get(i))
+
+        self.logger.debug("Retrieved %d of %d cache entries (%d from L1)",
+                        sum(r is not None for r in results), len(keys), len(keys) - len(missing))
+        return results
+
+    def get_cache_many_by_signature(self,
+                                    tenant: str,
+                                    key_signatures: List[str],
+                                    extend_ttl_seconds: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        """get_cache_many for signatures of one tenant"""
+        keys = [self._generate_key(tenant, signature) for signature in key_signatures]
+        return self.get_cache_many(keys, extend_ttl_seconds)
+
+    def delete_cache_many(self, keys: List[str]) -> int:
+        """
+        Delete many cache entries: one DEL per cache_batch_size keys.
+
+        Args:
+            keys: Cache keys to delete
+
+        Returns:
+            int: Number of entries deleted
+        """
+        if not keys:
+            return 0
+        batch_size = getattr(self.config, "cache_batch_size", 100)
+        try:
+            deleted = 0
+            for start in range(0, len(keys), batch_size):
+                deleted += self.redis_client.delete(*keys[start:start + batch_size])
+            self.l1.invalidate(keys)
+            self.logger.debug("Deleted %d of %d cache entries", deleted, len(keys))
+            return deleted
+        except Exception as e:
+            self.logger.error("Failed to delete %d cache entries: %s", len(keys), e)
+            return 0
+
     def knn_search(self,
                    tenant: str,
                    query_vector: List[float],
@@ -718,6 +949,8 @@ class CacheManager:
                 self.logger.debug("Cache not initialized, skipping clear_tenant_cache operation")
                 return 0
 
+            self.l1.clear_tenant(tenant)
+
             # Search for all keys with this tenant - use reasonable batch size
             batch_size = 1000  # Process in batches to avoid large result sets
             total_deleted = 0
@@ -797,6 +1030,7 @@ class CacheManager:
                 )
                 stats["tenant_documents"] = search_result[0]
 
+            stats["l1"] = self.l1.get_stats(tenant)
             return stats
 
         except Exception as e:
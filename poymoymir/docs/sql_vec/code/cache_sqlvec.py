@@ -517,8 +517,9 @@ class CacheSQLVecManager:
                   user: str,
                   key_signature: str,
                   text: str,
-                  ttl_seconds: Optional[int] = 86400) -> str:
-        """Store cache entry with automatically generated embedding."""
+                  ttl_seconds: Optional[int] = 86400,
+                  embed: bool = True) -> str:
+        """Store cache entry with automatically generated embedding (unless embed=False)."""
         self._initialize()
 
         # Ensure text is a string
@@ -543,7 +544,7 @@ class CacheSQLVecManager:
             """, (key, tenant, user_hash, text, current_time, expires_at, None))
 
             # Generate and store embedding if enabled and available
-            if (self.config.cache_enable_embeddings and
+            if (embed and self.config.cache_enable_embeddings and
                 not getattr(self, '_embeddings_disabled', False) and
                 self.llm_manager is not None):
                 try:
@@ -602,22 +603,25 @@ class CacheSQLVecManager:
                 """, (new_expires_at, key))
                 self._commit()
 
-            result = {
-                "text": row["text"],
-                "tenant": row["tenant"],
-                "user": row["user_hash"],
-                "created_at": row["created_at"]
-            }
-
-            if row["embedding"]:
-                result["embedding"] = row["embedding"]
-
-            return result
+            return self._row_to_entry(row)
 
         except Exception as e:
             self.logger.error("Failed to retrieve cache entry: %s", e)
             return None
 
+    @staticmethod
+    def _row_to_entry(row) -> Dict[str, Any]:
+        """cache_entries row -> cache entry dict (the embedding stays packed)"""
+        result = {
+            "text": row["text"],
+            "tenant": row["tenant"],
+            "user": row["user_hash"],
+            "created_at": row["created_at"]
+        }
+        if row["embedding"]:
+            result["embedding"] = row["embedding"]
+        return result
+
     def get_cache_by_signature(self,
                              tenant: str,
                              key_signature: str,
@@ -646,6 +650,165 @@ class CacheSQLVecManager:
             self.logger.error("Failed to delete cache entry: %s", e)
             return False
 
+    def _executemany(self, conn, query: str, rows: List[tuple]):
+        """executemany on the connection for both APSW and sqlite3"""
+        cursor = conn.executemany(query, rows)
+        if SQLITE_MODULE == 'apsw':
+            # APSW steps through the bindings as the cursor is iterated
+            for _ in cursor:
+                pass
+
+    def _embed_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings of texts in one batched request (LLMManager.embd_many); None where unavailable"""
+        if (not self.config.cache_enable_embeddings or getattr(self, '_embeddings_disabled', False) or
+                self.llm_manager is None or not texts):
+            return [None] * len(texts)
+        try:
+            embd_many = getattr(self.llm_manager, "embd_many", None)
+            if embd_many is not None:
+                vectors = embd_many(texts)
+            else:
+                vectors = [self.llm_manager.embd_text(text) for text in texts]
+        except Exception as e:
+            self.logger.error("Failed to generate embeddings for %d entries: %s", len(texts), e)
+            return [None] * len(texts)
+        return [vector if vector is not None and vector is not False and len(vector) else None
+                for vector in vectors]
+
+    def put_cache_many(self,
+                       entries: List[Dict[str, Any]],
+                       ttl_seconds: Optional[int] = None) -> List[str]:
+        """
+        Store many cache entries: one batched embedding request, executemany in one transaction.
+
+        Args:
+            entries: Dicts with tenant, user, key_signature, text and optionally ttl_seconds
+            ttl_seconds: TTL of entries without their own (uses default if None)
+
+        Returns:
+            Generated cache keys, in the order of entries
+        """
+        self._initialize()
+
+        texts = []
+        for entry in entries:
+            text = entry["text"]
+            if not isinstance(text, str):
+                text = json.dumps(text, ensure_ascii=False) if isinstance(text, (list, dict)) else str(text)
+            texts.append(text)
+        keys = [self._generate_key(entry["tenant"], entry["key_signature"]) for entry in entries]
+        embeddings = self._embed_many(texts)
+
+        current_time = int(time.time())
+        rows, vectors = [], []
+        for entry, key, text, embedding in zip(entries, keys, texts, embeddings):
+            packed = None
+            if embedding is not None:
+                try:
+                    packed = self._pack_f32(embedding)
+                    vectors.append((key, packed))
+                except Exception as e:
+                    self.logger.error("Failed to pack embedding for %s: %s", key, e)
+            ttl = entry.get("ttl_seconds") or ttl_seconds or self.default_ttl
+            rows.append((key, entry["tenant"], self._hash_user_id(entry["user"]), text,
+                         current_time, current_time + ttl, packed))
+
+        try:
+            conn = self._get_connection()
+            with conn:
+                self._executemany(conn, """
+                    INSERT OR REPLACE INTO cache_entries
+                    (id, tenant, user_hash, text, created_at, expires_at, embedding)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                if vectors:
+                    self._executemany(conn, """
+                        INSERT OR REPLACE INTO cache_vectors (id, embedding)
+                        VALUES (?, ?)
+                    """, vectors)
+
+            self.logger.debug("Cached %d entries (%d with embeddings)", len(rows), len(vectors))
+            return keys
+
+        except Exception as e:
+            self.logger.error("Failed to cache %d entries: %s", len(entries), e)
+            raise
+
+    def get_cache_many(self,
+                       keys: List[str],
+                       extend_ttl_seconds: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Retrieve many cache entries with one SELECT ... IN per cache_batch_size keys.
+
+        Returns:
+            Entries in the order of keys, None where not found
+        """
+        self._initialize()
+
+        found: Dict[str, Dict[str, Any]] = {}
+        unique = list(dict.fromkeys(keys))
+        batch_size = getattr(self.config, "cache_batch_size", 100)
+        current_time = int(time.time())
+        try:
+            conn = self._get_connection()
+            with conn:
+                for start in range(0, len(unique), batch_size):
+                    chunk = unique[start:start + batch_size]
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor = self._execute(f"""
+                        SELECT id, tenant, user_hash, text, created_at, expires_at, embedding
+                        FROM cache_entries
+                        WHERE id IN ({placeholders}) AND expires_at > ?
+                    """, (*chunk, current_time))
+                    for row in cursor.fetchall():
+                        found[row["id"]] = self._row_to_entry(row)
+
+                    if extend_ttl_seconds:
+                        self._execute(f"""
+                            UPDATE cache_entries SET expires_at = ?
+                            WHERE id IN ({placeholders}) AND expires_at > ?
+                        """, (current_time + extend_ttl_seconds, *chunk, current_time))
+
+        except Exception as e:
+            self.logger.error("Failed to retrieve %d cache entries: %s", len(keys), e)
+
+        return [dict(found[key]) if key in found else None for key in keys]
+
+    def get_cache_many_by_signature(self,
+                                    tenant: str,
+                                    key_signatures: List[str],
+                                    extend_ttl_seconds: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        """get_cache_many for signatures of one tenant."""
+        keys = [self._generate_key(tenant, signature) for signature in key_signatures]
+        return self.get_cache_many(keys, extend_ttl_seconds)
+
+    def delete_cache_many(self, keys: List[str]) -> int:
+        """Delete many cache entries in one transaction; returns the number deleted."""
+        if not keys:
+            return 0
+        batch_size = getattr(self.config, "cache_batch_size", 100)
+        try:
+            deleted = 0
+            conn = self._get_connection()
+            with conn:
+                for start in range(0, len(keys), batch_size):
+                    chunk = keys[start:start + batch_size]
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor = self._execute(f"DELETE FROM cache_entries WHERE id IN ({placeholders})", tuple(chunk))
+                    deleted += max(cursor.rowcount, 0)
+
+                if (self.config.cache_enable_embeddings and
+                    not getattr(self, '_embeddings_disabled', False)):
+                    # vec0 tables: one id per statement, as delete_cache does
+                    self._executemany(conn, "DELETE FROM cache_vectors WHERE id = ?", [(key,) for key in keys])
+
+            self.logger.debug("Deleted %d of %d cache entries", deleted, len(keys))
+            return deleted
+
+        except Exception as e:
+            self.logger.error("Failed to delete %d cache entries: %s", len(keys), e)
+            return 0
+
     def knn_search(self,
                    tenant: str,
                    query_vector: Union[List[float], 'numpy.ndarray'],
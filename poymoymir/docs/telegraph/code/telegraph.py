@@ -15,10 +15,12 @@ from requests import HTTPError
 try:
     from mindset.config import Config
     from mindset.logger import get_default_logger
+    from mindset.single_flight import get_single_flight_stats, single_flight
 except ImportError:
     # Fallback for direct execution
     from config import Config
     from logger import get_default_logger
+    from single_flight import get_single_flight_stats, single_flight
 
 
 class TelegraphManager:
@@ -81,6 +83,7 @@ class TelegraphManager:
             # Convert to string and wrap
             return [{"tag": "p", "children": [str(content)]}]
 
+    @single_flight()
     def create_page(self, tg_id: int, chat_id: int, title: str = "Меню пользователя",
                    content: Union[str, List[Dict]] = "", return_content: bool = True) -> Optional[Dict[str, Any]]:
         """
@@ -134,6 +137,7 @@ class TelegraphManager:
             self.logger.error("Exception while creating Telegraph page: %s", e)
             return None
 
+    @single_flight()
     def edit_page(self, page_path: str, title: str = None, content: Union[str, List[Dict]] = None,
                  return_content: bool = True) -> Optional[Dict[str, Any]]:
         """
@@ -186,6 +190,7 @@ class TelegraphManager:
             self.logger.error("Exception while editing Telegraph page: %s", e)
             return None
 
+    @single_flight()
     def get_page(self, page_path: str, return_content: bool = True) -> Optional[Dict[str, Any]]:
         """
         Get information about a Telegraph page.
@@ -225,6 +230,7 @@ class TelegraphManager:
             self.logger.error("Exception while getting Telegraph page: %s", e)
             return None
 
+    @single_flight()
     def get_page_list(self, offset: int = 0, limit: int = 50) -> Optional[Dict[str, Any]]:
         """
         Get a list of pages belonging to a Telegraph account.
@@ -267,3 +273,15 @@ class TelegraphManager:
         except Exception as e:
             self.logger.error("Exception while getting Telegraph pages list: %s", e)
             return None
+
+    def get_single_flight_stats(self) -> Dict[str, Any]:
+        """
+        Get counters of coalesced API calls.
+
+        Identical create/edit/get calls made while the same call is in flight
+        wait for it instead of hitting the API again (e.g. a retried webhook).
+
+        Returns:
+            Dict with calls, executed and coalesced counts per method
+        """
+        return get_single_flight_stats(self)